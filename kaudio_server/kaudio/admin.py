@@ -12,16 +12,138 @@
 
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from django.http import HttpResponse, HttpRequest
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpRequest
+from django.template.response import TemplateResponse
 from django.utils import timezone
+from django.utils.html import format_html
+from django.urls import path, reverse
 from django.db.models import QuerySet
+import hashlib
 from typing import Optional, Any, List
 from .models import (
     User, Artist, Genre, Album, Track, Playlist, UserActivity,
     Subscribe, UserSubscribe, UserAlbum, UserTrack, PlaylistTrack,
-    AlbumGenre, TrackGenre
+    AlbumGenre, TrackGenre, Job
 )
-from .utils.pdf_generator import generate_track_pdf, generate_album_pdf
+from .jobs import submit_job
+from .exports import export_response, popularity_score
+from .admin_stats import get_stats_snapshot
+from .totals import TOTALS
+from .profiling import diff_profiles, list_profiles, load_profile, profile_path
+
+
+def selection_key(kind: str, ids: List[int]) -> str:
+    """
+    Формирует ключ идемпотентности действия над выбранными объектами.
+    
+    Повторный запуск того же действия для тех же объектов, пока первая
+    задача ждет в очереди или выполняется, не создает новую задачу.
+    
+    Args:
+        kind: Тип задачи
+        ids: Отсортированные ID выбранных объектов
+        
+    Returns:
+        str: Ключ идемпотентности
+    """
+    digest = hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()
+    return f'{kind}:{digest}'
+
+
+def message_job_queued(model_admin: admin.ModelAdmin, request: HttpRequest, job: Job, message: str) -> None:
+    """
+    Сообщает о постановке фоновой задачи со ссылкой на нее.
+    
+    Args:
+        model_admin: Администратор модели
+        request: HTTP запрос
+        job: Фоновая задача
+        message: Текст сообщения
+    """
+    url = reverse('admin:kaudio_job_change', args=[job.pk])
+    model_admin.message_user(request, format_html('{} (<a href="{}">{}</a>)', message, url, _('состояние задачи')))
+
+
+def run_export(
+    model_admin: admin.ModelAdmin,
+    request: HttpRequest,
+    queryset: QuerySet,
+    kind: str,
+    file_format: str
+) -> Optional[HttpResponse]:
+    """
+    Экспортирует выбранные объекты сразу или фоновой задачей.
+    
+    Выборки больше EXPORT_SYNC_MAX_ROWS экспортируются задачей export_report,
+    файл которой доступен на странице задачи.
+    
+    Args:
+        model_admin: Администратор модели
+        request: HTTP запрос
+        queryset: Выбранные объекты
+        kind: Тип отчета (track или album)
+        file_format: pdf, csv или xlsx
+        
+    Returns:
+        Optional[HttpResponse]: Файл отчета или None, если экспорт поставлен в очередь
+    """
+    count = queryset.count()
+    if count <= settings.EXPORT_SYNC_MAX_ROWS:
+        return export_response(kind, queryset, file_format)
+    
+    # Выбор всех объектов передается без списка ID
+    ids = None if count == queryset.model.objects.count() else sorted(queryset.values_list('pk', flat=True))
+    job = submit_job(
+        'export_report',
+        {'kind': kind, 'file_format': file_format, 'ids': ids},
+        user=request.user,
+        idempotency_key=selection_key(f'export_report:{kind}:{file_format}', ids if ids is not None else ['all'])
+    )
+    message_job_queued(model_admin, request, job, _(
+        f'Экспорт {count} записей в {file_format.upper()} поставлен в очередь'
+    ))
+    return None
+
+
+def run_recalculate_totals(
+    model_admin: admin.ModelAdmin,
+    request: HttpRequest,
+    queryset: QuerySet,
+    kind: str,
+    label: str
+) -> None:
+    """
+    Пересчитывает итоги выбранных объектов сразу или фоновой задачей.
+    
+    Выборка до TOTALS_SYNC_MAX_ROWS объектов обновляется одним UPDATE
+    в запросе, большая - частями в задаче recalculate_*_totals.
+    
+    Args:
+        model_admin: Администратор модели
+        request: HTTP запрос
+        queryset: Выбранные объекты
+        kind: Тип итогов (album или playlist)
+        label: Название объектов во множественном числе для сообщения
+    """
+    spec = TOTALS[kind]
+    count = queryset.count()
+    if count <= settings.TOTALS_SYNC_MAX_ROWS:
+        updated = spec.update(queryset)
+        model_admin.message_user(request, _(f'Итоги пересчитаны для {updated} {label}'))
+        return
+    
+    # Выбор всех объектов передается без списка ID
+    ids = None if count == queryset.model.objects.count() else sorted(queryset.values_list('pk', flat=True))
+    job = submit_job(
+        spec.job_kind,
+        {spec.ids_param: ids},
+        user=request.user,
+        idempotency_key=selection_key(spec.job_kind, ids if ids is not None else ['all'])
+    )
+    message_job_queued(model_admin, request, job, _(
+        f'Пересчет итогов {count} {label} поставлен в очередь'
+    ))
 
 
 class AlbumGenreInline(admin.TabularInline):
@@ -256,7 +378,7 @@ class AlbumAdmin(admin.ModelAdmin):
         }),
     )
     inlines = [AlbumGenreInline, TrackInline]
-    actions = ['export_as_pdf', 'recalculate_duration', 'mark_as_released']
+    actions = ['export_as_pdf', 'export_as_csv', 'export_as_xlsx', 'recalculate_duration', 'mark_as_released']
     
     @admin.display(description=_('Исполнитель'), ordering='artist__email')
     def get_artist(self, obj: Album) -> str:
@@ -288,22 +410,13 @@ class AlbumAdmin(admin.ModelAdmin):
 
     def recalculate_duration(self, request: HttpRequest, queryset: QuerySet[Album]) -> None:
         """
-        Пересчитывает общую длительность выбранных альбомов.
+        Пересчитывает количество треков и общую длительность выбранных альбомов.
         
         Args:
             request: HTTP запрос
             queryset: Выбранные альбомы
         """
-        for album in queryset:
-            total_duration = sum(track.duration for track in album.tracks.all())
-            total_tracks = album.tracks.count()
-            Album.objects.filter(id=album.id).update(
-                total_duration=total_duration,
-                total_tracks=total_tracks
-            )
-        self.message_user(request, _(
-            f'Длительность пересчитана для {queryset.count()} альбомов'
-        ))
+        run_recalculate_totals(self, request, queryset, 'album', 'альбомов')
     recalculate_duration.short_description = _("Пересчитать длительность")
 
     def mark_as_released(self, request: HttpRequest, queryset: QuerySet[Album]) -> None:
@@ -320,7 +433,7 @@ class AlbumAdmin(admin.ModelAdmin):
         ))
     mark_as_released.short_description = _("Отметить как выпущенные сегодня")
 
-    def export_as_pdf(self, request: HttpRequest, queryset: QuerySet[Album]) -> HttpResponse:
+    def export_as_pdf(self, request: HttpRequest, queryset: QuerySet[Album]) -> Optional[HttpResponse]:
         """
         Экспортирует выбранные альбомы в PDF.
         
@@ -329,46 +442,86 @@ class AlbumAdmin(admin.ModelAdmin):
             queryset: Выбранные альбомы
             
         Returns:
-            HttpResponse: PDF файл с отчетом
+            Optional[HttpResponse]: PDF файл с отчетом или None, если экспорт поставлен в очередь
         """
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="albums_report_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        
-        generate_album_pdf(queryset, response)
-        return response
+        return run_export(self, request, queryset, 'album', 'pdf')
     export_as_pdf.short_description = _("Экспорт выбранных альбомов в PDF")
 
+    def export_as_csv(self, request: HttpRequest, queryset: QuerySet[Album]) -> Optional[HttpResponse]:
+        """
+        Экспортирует выбранные альбомы в CSV.
+        
+        Args:
+            request: HTTP запрос
+            queryset: Выбранные альбомы
+            
+        Returns:
+            Optional[HttpResponse]: CSV файл или None, если экспорт поставлен в очередь
+        """
+        return run_export(self, request, queryset, 'album', 'csv')
+    export_as_csv.short_description = _("Экспорт выбранных альбомов в CSV")
+
+    def export_as_xlsx(self, request: HttpRequest, queryset: QuerySet[Album]) -> Optional[HttpResponse]:
+        """
+        Экспортирует выбранные альбомы в XLSX.
+        
+        Args:
+            request: HTTP запрос
+            queryset: Выбранные альбомы
+            
+        Returns:
+            Optional[HttpResponse]: XLSX файл или None, если экспорт поставлен в очередь
+        """
+        return run_export(self, request, queryset, 'album', 'xlsx')
+    export_as_xlsx.short_description = _("Экспорт выбранных альбомов в XLSX")
+
 
 @admin.register(Track)
 class TrackAdmin(admin.ModelAdmin):
-    list_display = ['title', 'get_artist', 'get_album', 'duration_display', 'play_count', 'is_explicit']
+    list_display = [
+        'title', 'get_artist', 'get_album', 'duration_display', 'play_count', 'get_popularity_score', 'is_explicit'
+    ]
     list_filter = ['is_explicit', 'release_date']
     search_fields = ['title', 'artist__email', 'album__title']
     date_hierarchy = 'release_date'
     raw_id_fields = ['artist', 'album']
     readonly_fields = ['play_count', 'likes_count', 'get_popularity_score']
-    actions = ['export_as_pdf', 'reset_play_count', 'mark_as_explicit', 'mark_as_non_explicit']
+    actions = [
+        'export_as_pdf', 'export_as_csv', 'export_as_xlsx',
+        'reset_play_count', 'mark_as_explicit', 'mark_as_non_explicit'
+    ]
     
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """
+        Загружает исполнителя и альбом и вычисляет рейтинг популярности в том же запросе.
+        
+        Args:
+            request: HTTP запрос
+            
+        Returns:
+            QuerySet: Треки с аннотацией popularity
+        """
+        return super().get_queryset(request).select_related('artist', 'album').annotate(
+            popularity=popularity_score()
+        )
+    
+    @admin.display(description=_('Рейтинг популярности'), ordering='popularity')
     def get_popularity_score(self, obj):
         """Показывает рейтинг популярности трека"""
-        tracks = Track.objects.get_tracks_with_popularity().filter(id=obj.id)
-        if tracks:
-            return f"{tracks[0].popularity_score:.2f}"
-        return "0.00"
-    get_popularity_score.short_description = _('Рейтинг популярности')
+        return f"{obj.popularity:.2f}"
 
     def changelist_view(self, request, extra_context=None):
         """Добавляет статистику на страницу списка треков"""
         extra_context = extra_context or {}
         
-        # Получаем статистику по жанрам
-        genre_stats = Track.objects.get_genre_statistics()
-        
-        # Получаем топ-5 исполнителей
-        top_artists = Track.objects.get_top_artists_by_duration(limit=5)
+        # Статистика по жанрам и топ-5 исполнителей берутся из снимка,
+        # который пересчитывается периодической задачей
+        snapshot = get_stats_snapshot('track_changelist', user=request.user)
+        data = snapshot.data if snapshot is not None else {}
         
-        extra_context['genre_statistics'] = genre_stats
-        extra_context['top_artists'] = top_artists
+        extra_context['genre_statistics'] = data.get('genre_statistics', [])
+        extra_context['top_artists'] = data.get('top_artists', [])
+        extra_context['statistics_computed_at'] = snapshot.computed_at if snapshot is not None else None
         
         return super().changelist_view(request, extra_context=extra_context)
     
@@ -414,13 +567,19 @@ class TrackAdmin(admin.ModelAdmin):
 
     def export_as_pdf(self, request, queryset):
         """Экспортирует выбранные треки в PDF"""
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="tracks_report_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        
-        generate_track_pdf(queryset, response)
-        return response
+        return run_export(self, request, queryset, 'track', 'pdf')
     export_as_pdf.short_description = _("Экспорт выбранных треков в PDF")
 
+    def export_as_csv(self, request, queryset):
+        """Экспортирует выбранные треки в CSV"""
+        return run_export(self, request, queryset, 'track', 'csv')
+    export_as_csv.short_description = _("Экспорт выбранных треков в CSV")
+
+    def export_as_xlsx(self, request, queryset):
+        """Экспортирует выбранные треки в XLSX"""
+        return run_export(self, request, queryset, 'track', 'xlsx')
+    export_as_xlsx.short_description = _("Экспорт выбранных треков в XLSX")
+
 
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
@@ -468,17 +627,8 @@ class PlaylistAdmin(admin.ModelAdmin):
     make_private.short_description = _("Сделать приватными")
 
     def recalculate_tracks(self, request, queryset):
-        """Пересчитывает количество треков и общую длительность плейлистов"""
-        for playlist in queryset:
-            total_duration = sum(pt.track.duration for pt in playlist.playlist_tracks.all())
-            total_tracks = playlist.playlist_tracks.count()
-            Playlist.objects.filter(id=playlist.id).update(
-                total_duration=total_duration,
-                total_tracks=total_tracks
-            )
-        self.message_user(request, _(
-            f'Статистика пересчитана для {queryset.count()} плейлистов'
-        ))
+        """Пересчитывает количество треков и общую длительность выбранных плейлистов"""
+        run_recalculate_totals(self, request, queryset, 'playlist', 'плейлистов')
     recalculate_tracks.short_description = _("Пересчитать статистику")
 
 
@@ -625,3 +775,129 @@ class TrackGenreAdmin(admin.ModelAdmin):
     @admin.display(description=_('Жанр'), ordering='genre__title')
     def get_genre(self, obj):
         return obj.genre.title
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Административный интерфейс для просмотра фоновых задач.
+    
+    Задачи создаются только кодом, поэтому форма доступна лишь для чтения.
+    """
+    list_display = ['id', 'kind', 'queue', 'status', 'progress', 'user', 'created_at', 'finished_at']
+    list_filter = ['status', 'queue', 'kind']
+    search_fields = ['id', 'kind', 'idempotency_key']
+    date_hierarchy = 'created_at'
+    raw_id_fields = ['user']
+    readonly_fields = [
+        'kind', 'queue', 'params', 'idempotency_key', 'user', 'status', 'progress', 'progress_message',
+        'result', 'result_link', 'error', 'created_at', 'started_at', 'finished_at'
+    ]
+    
+    @admin.display(description=_('Файл результата'))
+    def result_link(self, obj: Job) -> str:
+        """
+        Ссылка на скачивание файла результата.
+        
+        Args:
+            obj: Объект задачи
+            
+        Returns:
+            str: HTML ссылки или пустая строка, если файла нет
+        """
+        if not obj.result_file:
+            return ''
+        return format_html('<a href="{}">{}</a>', reverse('job-result', args=[obj.pk]), obj.result_file.name)
+    
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        """
+        Запрещает создание задач вручную.
+        
+        Args:
+            request: HTTP запрос
+            
+        Returns:
+            bool: Всегда False
+        """
+        return False
+
+
+def profile_list_view(request: HttpRequest) -> TemplateResponse:
+    """
+    Список сохраненных профилей запросов.
+    
+    Args:
+        request: HTTP запрос
+        
+    Returns:
+        TemplateResponse: Страница со списком и формой сравнения
+    """
+    context = {
+        **admin.site.each_context(request),
+        'title': _('Профили запросов'),
+        'profiles': list_profiles(),
+        'profiling_enabled': settings.PROFILING_ENABLED,
+        'profiling_header': settings.PROFILING_HEADER,
+    }
+    return TemplateResponse(request, 'admin/kaudio/profiles/list.html', context)
+
+
+def profile_download_view(request: HttpRequest, profile_id: str, extension: str) -> FileResponse:
+    """
+    Скачивание отчета (json) или профиля cProfile (prof).
+    
+    Args:
+        request: HTTP запрос
+        profile_id: Идентификатор профиля
+        extension: json или prof
+        
+    Returns:
+        FileResponse: Файл профиля
+        
+    Raises:
+        Http404: Если профиль не найден
+    """
+    try:
+        return FileResponse(open(profile_path(profile_id, extension), 'rb'), as_attachment=True)
+    except (OSError, ValueError):
+        raise Http404(_('Профиль не найден'))
+
+
+def profile_diff_view(request: HttpRequest) -> TemplateResponse:
+    """
+    Сравнение двух профилей (параметры a и b).
+    
+    Args:
+        request: HTTP запрос
+        
+    Returns:
+        TemplateResponse: Изменения длительности, функций и SQL
+        
+    Raises:
+        Http404: Если профиль не найден
+    """
+    try:
+        before = load_profile(request.GET.get('a', ''))
+        after = load_profile(request.GET.get('b', ''))
+    except (OSError, ValueError):
+        raise Http404(_('Профиль не найден'))
+    context = {
+        **admin.site.each_context(request),
+        'title': _('Сравнение профилей'),
+        'before': before,
+        'after': after,
+        'diff': diff_profiles(before, after, settings.PROFILING_TOP),
+    }
+    return TemplateResponse(request, 'admin/kaudio/profiles/diff.html', context)
+
+
+# Подключаются в kaudio_server/urls.py перед admin.site.urls
+profile_urls = [
+    path('', admin.site.admin_view(profile_list_view), name='kaudio-profiles'),
+    path('diff/', admin.site.admin_view(profile_diff_view), name='kaudio-profiles-diff'),
+    path(
+        '<str:profile_id>.<str:extension>',
+        admin.site.admin_view(profile_download_view),
+        name='kaudio-profiles-download'
+    ),
+]
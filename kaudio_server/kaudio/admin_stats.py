@@ -0,0 +1,115 @@
+"""
+Снимки статистики для страниц административной панели.
+
+Агрегаты по всей таблице (статистика жанров, топ исполнителей) слишком
+дороги, чтобы считать их при каждом открытии списка. Они рассчитываются
+периодической задачей refresh_admin_stats и хранятся в модели
+StatsSnapshot; страница читает готовый снимок одним запросом.
+
+Если снимка нет или он старше ADMIN_STATS_MAX_AGE секунд, страница
+показывает имеющиеся данные и ставит пересчет в очередь.
+
+Пример:
+    @register_stats('track_changelist')
+    def track_changelist_stats() -> Dict[str, Any]:
+        return {'genre_statistics': [...], 'top_artists': [...]}
+
+    snapshot = get_stats_snapshot('track_changelist', user=request.user)
+"""
+
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import StatsSnapshot, Track, User
+from .routers import use_replica
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_stats(key: str) -> Callable[[Callable[[], Dict[str, Any]]], Callable[[], Dict[str, Any]]]:
+    """
+    Регистрирует функцию расчета снимка статистики.
+
+    Args:
+        key: Ключ снимка
+
+    Returns:
+        Callable: Декоратор
+    """
+    def decorator(func: Callable[[], Dict[str, Any]]) -> Callable[[], Dict[str, Any]]:
+        _providers[key] = func
+        return func
+    return decorator
+
+
+@register_stats('track_changelist')
+def track_changelist_stats() -> Dict[str, Any]:
+    """
+    Рассчитывает статистику для списка треков.
+
+    Returns:
+        Dict[str, Any]: Статистика по жанрам и топ-5 исполнителей по длительности
+    """
+    return {
+        'genre_statistics': list(Track.objects.get_genre_statistics()),
+        'top_artists': list(Track.objects.get_top_artists_by_duration(limit=5)),
+    }
+
+
+def refresh_stats_snapshot(key: str) -> StatsSnapshot:
+    """
+    Пересчитывает и сохраняет снимок статистики.
+
+    Args:
+        key: Ключ снимка
+
+    Returns:
+        StatsSnapshot: Обновленный снимок
+
+    Raises:
+        KeyError: Если расчет для ключа не зарегистрирован
+    """
+    # Агрегаты по всей таблице читаются с реплики, снимок пишется в основную базу
+    with use_replica():
+        data = _providers[key]()
+    snapshot, _ = StatsSnapshot.objects.update_or_create(
+        key=key,
+        defaults={'data': data, 'computed_at': timezone.now()}
+    )
+    return snapshot
+
+
+def refresh_all_stats_snapshots() -> int:
+    """
+    Пересчитывает все зарегистрированные снимки.
+
+    Returns:
+        int: Количество снимков
+    """
+    for key in _providers:
+        refresh_stats_snapshot(key)
+    return len(_providers)
+
+
+def get_stats_snapshot(key: str, user: Optional[User] = None) -> Optional[StatsSnapshot]:
+    """
+    Возвращает снимок статистики, при необходимости ставя пересчет в очередь.
+
+    Args:
+        key: Ключ снимка
+        user: Пользователь, открывший страницу
+
+    Returns:
+        Optional[StatsSnapshot]: Снимок или None, если он еще не рассчитан
+    """
+    snapshot = StatsSnapshot.objects.filter(key=key).first()
+    max_age = timedelta(seconds=settings.ADMIN_STATS_MAX_AGE)
+    if snapshot is None or snapshot.computed_at < timezone.now() - max_age:
+        from .jobs import submit_job
+
+        # Ключ идемпотентности не дает ставить пересчет при каждом открытии страницы
+        submit_job('refresh_admin_stats', {'key': key}, user=user, idempotency_key=f'refresh_admin_stats:{key}')
+    return snapshot
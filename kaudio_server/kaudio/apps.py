@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class KaudioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kaudio'
+
+    def ready(self) -> None:
+        # Подключает сигналы Celery для длительности задач в процессах воркеров
+        from . import metrics  # noqa: F401
@@ -0,0 +1,183 @@
+"""
+Асинхронные обработчики GET-запросов каталога для ASGI.
+
+Viewset с AsyncReadMixin при запуске под ASGI обрабатывает GET-запросы
+действий, у которых есть асинхронная версия (alist, aretrieve, astream),
+в цикле событий: объекты читаются асинхронным ORM, аудио отдается
+асинхронным итератором, и поток не занят на время передачи файла.
+Аутентификация, права и ограничения частоты выполняются теми же
+классами DRF, что и в синхронной версии.
+
+Остальные методы и действия, а также все запросы под WSGI (где
+асинхронный итератор пришлось бы целиком прочитать в память)
+обрабатываются синхронным viewset.
+
+Запуск под ASGI:
+    gunicorn kaudio_server.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Model, QuerySet
+from django.http import Http404, HttpRequest, HttpResponseBase, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.response import Response
+
+from .utils.audio_cache import open_audio
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def aread_chunks(file: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Читает файл частями, не блокируя цикл событий.
+
+    Файл закрывается после чтения или при отключении клиента.
+
+    Args:
+        file: Открытый файл
+        chunk_size: Размер части в байтах
+
+    Yields:
+        bytes: Очередная часть файла
+    """
+    try:
+        while True:
+            chunk = await asyncio.to_thread(file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+class AsyncReadMixin:
+    """
+    Асинхронные версии list и retrieve для viewset.
+
+    Для дополнительного действия достаточно определить корутину
+    a<имя действия> с той же сигнатурой.
+    """
+
+    def get_list_queryset(self) -> QuerySet:
+        """
+        Возвращает queryset списка до применения фильтров.
+
+        Returns:
+            QuerySet: Объекты списка
+        """
+        return self.get_queryset()
+
+    @classmethod
+    def as_view(cls, actions: Optional[Dict[str, str]] = None, **initkwargs: Any) -> Callable:
+        sync_view = super().as_view(actions, **initkwargs)
+        action = (actions or {}).get('get')
+        if action is None or not hasattr(cls, f'a{action}'):
+            return sync_view
+
+        async def view(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            if request.method != 'GET' or not isinstance(request, ASGIRequest):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, name in actions.items():
+                setattr(self, method, getattr(self, name))
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = sync_view.cls
+        view.initkwargs = sync_view.initkwargs
+        view.actions = sync_view.actions
+        return csrf_exempt(view)
+
+    async def adispatch(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+        """
+        Асинхронный аналог APIView.dispatch для GET-запроса.
+
+        Args:
+            request: Запрос Django
+            *args: Позиционные аргументы маршрута
+            **kwargs: Именованные аргументы маршрута
+
+        Returns:
+            HttpResponseBase: Ответ
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # Аутентификация, права и ограничения частоты - синхронные классы DRF
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await getattr(self, f'a{self.action}')(request, *args, **kwargs)
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aserialize(self, instance: Any, many: bool = False) -> Any:
+        """
+        Сериализует объекты вне цикла событий (поля могут обращаться к базе).
+
+        Args:
+            instance: Объект или список объектов
+            many: Список объектов
+
+        Returns:
+            Any: Данные сериализатора
+        """
+        return await sync_to_async(lambda: self.get_serializer(instance, many=many).data)()
+
+    async def aget_object(self) -> Model:
+        """
+        Асинхронный аналог get_object.
+
+        Returns:
+            Model: Объект
+
+        Raises:
+            Http404: Если объект не найден
+        """
+        queryset = await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
+
+    async def alist(self, request: Any, *args: Any, **kwargs: Any) -> Response:
+        if self.paginator is not None:
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+        queryset = await sync_to_async(lambda: self.filter_queryset(self.get_list_queryset()))()
+        objects: List[Model] = [obj async for obj in queryset]
+        return Response(await self.aserialize(objects, many=True))
+
+    async def aretrieve(self, request: Any, *args: Any, **kwargs: Any) -> Response:
+        return Response(await self.aserialize(await self.aget_object()))
+
+
+class AsyncStreamMixin(AsyncReadMixin):
+    """
+    Асинхронная отдача аудиофайла трека.
+    """
+
+    async def astream(self, request: Any, pk: Any = None) -> HttpResponseBase:
+        track = await self.aget_object()
+        if not track.audio_file:
+            return Response({'error': 'Аудиофайл не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        path = track.audio_file.path
+        audio = await asyncio.to_thread(open_audio, track.audio_file.name, path, track.play_count)
+        size = await asyncio.to_thread(os.path.getsize, path)
+        response = StreamingHttpResponse(aread_chunks(audio), content_type='audio/mpeg')
+        response['Content-Length'] = str(size)
+        response['Content-Disposition'] = f'inline; filename="{track.title}.mp3"'
+        return response
@@ -0,0 +1,37 @@
+"""
+Бэкенд SQLite с настройкой соединения для конкурентной нагрузки.
+
+Дополнительные ключи OPTIONS:
+    pragmas: PRAGMA, выполняемые при каждом новом соединении
+        (journal_mode=WAL, synchronous=NORMAL, mmap_size, cache_size)
+    transaction_mode: Режим BEGIN для блоков atomic (IMMEDIATE - блокировка
+        записи берется в начале транзакции, а не при первом изменении, что
+        исключает взаимную блокировку при повышении блокировки)
+
+В режиме WAL читатели не блокируются писателем, а synchronous=NORMAL
+выполняет fsync только при контрольной точке, а не при каждой фиксации.
+"""
+
+from typing import Any, Dict
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self) -> Dict[str, Any]:
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params: Dict[str, Any]) -> Any:
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self) -> None:
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,19 @@
+"""
+Нагрузочные сценарии и замер задержек API.
+
+Виртуальные пользователи выполняют сценарии (просмотр каталога, поиск,
+сессии прослушивания, правка плейлистов) внутри процесса через тестовый
+клиент Django или по HTTP против запущенного сервера. По каждому
+адресу считаются p50/p95/p99 задержки, пропускная способность и
+количество SQL-запросов на запрос; результаты сохраняются в JSON с
+коммитом, на котором сделан замер, и сравниваются с предыдущим
+замером.
+
+Запуск:
+    python manage.py benchmark --scenario browse --scenario search --concurrency 4
+    python manage.py benchmark --url http://127.0.0.1:8000 --compare latest --max-regression 20
+
+Пакет ничего не импортирует сам: clients тянет django.test, поэтому
+модули clients, runner, scenarios и middleware импортируются напрямую
+там, где нужны, а не при загрузке проекта.
+"""
@@ -0,0 +1,154 @@
+"""
+Клиенты, выполняющие запросы сценариев и записывающие замеры.
+"""
+
+import http.client
+import json
+import time
+import urllib.parse
+from contextlib import ExitStack
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .middleware import QUERY_COUNT_HEADER
+
+
+class Sample(NamedTuple):
+    """Замер одного запроса."""
+    endpoint: str
+    status: int
+    duration: float
+    queries: Optional[int]
+
+
+class BenchmarkClient:
+    """
+    Базовый клиент виртуального пользователя.
+
+    Наследники реализуют send; замеры накапливаются в samples.
+    """
+
+    def __init__(self) -> None:
+        self.samples: List[Sample] = []
+
+    def get(self, endpoint: str, path: str) -> int:
+        return self.request(endpoint, 'GET', path)
+
+    def post(self, endpoint: str, path: str, data: Optional[dict] = None) -> int:
+        return self.request(endpoint, 'POST', path, data)
+
+    def delete(self, endpoint: str, path: str) -> int:
+        return self.request(endpoint, 'DELETE', path)
+
+    def request(self, endpoint: str, method: str, path: str, data: Optional[dict] = None) -> int:
+        """
+        Выполняет запрос и записывает замер.
+
+        Args:
+            endpoint: Имя адреса в отчете
+            method: HTTP-метод
+            path: Путь с параметрами запроса
+            data: Тело запроса (JSON)
+
+        Returns:
+            int: Код ответа (0, если сервер не ответил)
+        """
+        started = time.perf_counter()
+        status, queries = self.send(method, path, data)
+        self.samples.append(Sample(endpoint, status, time.perf_counter() - started, queries))
+        return status
+
+    def send(self, method: str, path: str, data: Optional[dict]) -> Tuple[int, Optional[int]]:
+        """
+        Отправляет запрос.
+
+        Args:
+            method: HTTP-метод
+            path: Путь с параметрами запроса
+            data: Тело запроса (JSON)
+
+        Returns:
+            Tuple[int, Optional[int]]: Код ответа и количество SQL-запросов, если оно известно
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Освобождает ресурсы клиента."""
+
+
+class InProcessClient(BenchmarkClient):
+    """
+    Запросы через тестовый клиент Django в текущем процессе.
+
+    SQL-запросы считаются по всем базам, задержка включает все
+    промежуточные слои, кроме сетевого сервера.
+
+    Args:
+        user: Пользователь, от имени которого выполняются запросы
+    """
+
+    def __init__(self, user: Any) -> None:
+        super().__init__()
+        self.client = Client()
+        self.client.force_login(user)
+
+    def send(self, method: str, path: str, data: Optional[dict]) -> Tuple[int, Optional[int]]:
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = self.client.generic(
+                method,
+                path,
+                json.dumps(data) if data is not None else '',
+                content_type='application/json',
+                HTTP_ACCEPT='application/json',
+            )
+            # Потоковый ответ (аудио) читается целиком, как его получил бы клиент
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        return response.status_code, sum(len(queries) for queries in captured)
+
+
+class HttpClient(BenchmarkClient):
+    """
+    Запросы по HTTP к запущенному серверу через постоянное соединение.
+
+    Количество SQL-запросов известно, только если сервер запущен
+    с BENCHMARK_QUERY_HEADERS.
+
+    Args:
+        base_url: Адрес сервера
+        token: Токен API пользователя
+        timeout: Тайм-аут запроса в секундах
+    """
+
+    def __init__(self, base_url: str, token: str, timeout: float = 30) -> None:
+        super().__init__()
+        parsed = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parsed.netloc, timeout=timeout)
+        self.prefix = parsed.path.rstrip('/')
+        self.headers = {
+            'Authorization': f'Token {token}',
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+
+    def send(self, method: str, path: str, data: Optional[dict]) -> Tuple[int, Optional[int]]:
+        body = json.dumps(data).encode() if data is not None else None
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=self.headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Соединение будет открыто заново при следующем запросе
+            self.connection.close()
+            return 0, None
+        queries = response.getheader(QUERY_COUNT_HEADER)
+        return response.status, int(queries) if queries is not None else None
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,34 @@
+"""
+Заголовки с количеством и временем SQL-запросов для замеров по HTTP.
+
+Подключается в MIDDLEWARE при BENCHMARK_QUERY_HEADERS = True
+(переменная окружения BENCHMARK_QUERY_HEADERS=1); в обычной работе
+не используется.
+"""
+
+from typing import Callable
+
+from django.http import HttpRequest, HttpResponse
+
+from ..sql_counter import count_queries
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+QUERY_TIME_HEADER = 'X-Query-Time'
+
+
+class QueryCountMiddleware:
+    """
+    Добавляет в ответ количество SQL-запросов и их суммарное время (мс).
+
+    Учитываются запросы ко всем базам, выполненные в потоке запроса.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with count_queries() as counter:
+            response = self.get_response(request)
+        response[QUERY_COUNT_HEADER] = str(counter.count)
+        response[QUERY_TIME_HEADER] = f'{counter.duration * 1000:.3f}'
+        return response
@@ -0,0 +1,291 @@
+"""
+Запуск сценариев, статистика задержек и хранение результатов.
+"""
+
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .clients import BenchmarkClient, Sample
+from .scenarios import SCENARIOS, BenchmarkData
+
+RESULT_VERSION = 1
+
+
+class Comparison(NamedTuple):
+    """Изменение метрики адреса относительно предыдущего замера."""
+    endpoint: str
+    metric: str
+    before: float
+    after: float
+    change_pct: float
+    regression: bool
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Вычисляет перцентиль с линейной интерполяцией.
+
+    Args:
+        values: Значения
+        q: Перцентиль от 0 до 100
+
+    Returns:
+        float: Значение перцентиля (0 для пустого списка)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: Sequence[Sample]) -> Dict[str, Any]:
+    """
+    Считает статистику замеров.
+
+    Args:
+        samples: Замеры запросов
+
+    Returns:
+        Dict[str, Any]: Количество запросов и ошибок, задержки в мс, SQL-запросов на запрос
+    """
+    durations = [sample.duration * 1000 for sample in samples]
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not 200 <= sample.status < 400),
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'p99_ms': round(percentile(durations, 99), 3),
+        'mean_ms': round(sum(durations) / len(durations), 3) if durations else 0.0,
+        'max_ms': round(max(durations), 3) if durations else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    """
+    Возвращает коммит рабочей копии (с пометкой -dirty при изменениях).
+
+    Returns:
+        Optional[str]: Описание коммита или None вне репозитория git
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode:
+        return None
+    return result.stdout.strip() or None
+
+
+def run_benchmark(
+    make_client: Callable[[int], BenchmarkClient],
+    data: BenchmarkData,
+    scenarios: Iterable[str],
+    concurrency: int = 1,
+    iterations: int = 10,
+    duration: Optional[float] = None,
+    warmup: int = 1,
+    seed: int = 0,
+    target: str = 'in-process',
+) -> Dict[str, Any]:
+    """
+    Выполняет сценарии виртуальными пользователями и считает статистику.
+
+    Каждый пользователь выполняет warmup итераций без замеров, затем все
+    пользователи одновременно начинают замеряемые итерации. Случайный
+    выбор детерминирован: пользователь i использует seed и свой номер.
+
+    Args:
+        make_client: Создает клиент пользователя по его номеру
+        data: Объекты для сценариев
+        scenarios: Имена сценариев одной итерации
+        concurrency: Количество одновременных пользователей
+        iterations: Итераций на пользователя (если не задан duration)
+        duration: Длительность замера в секундах
+        warmup: Итераций прогрева на пользователя
+        seed: Начальное значение генератора случайных чисел
+        target: Описание цели для отчета
+
+    Returns:
+        Dict[str, Any]: Результат замера
+    """
+    scenarios = list(scenarios)
+    steps = [SCENARIOS[name] for name in scenarios]
+    started = {}
+
+    def start_clock() -> None:
+        started['at'] = time.perf_counter()
+
+    barrier = threading.Barrier(concurrency, action=start_clock)
+
+    def run_user(index: int) -> List[Sample]:
+        rng = random.Random(f'{seed}:{index}')
+        client = make_client(index)
+        try:
+            try:
+                for _ in range(warmup):
+                    for step in steps:
+                        step(client, data, rng, index)
+            except BaseException:
+                # Остальные пользователи не должны ждать упавшего
+                barrier.abort()
+                raise
+            client.samples.clear()
+            barrier.wait()
+            deadline = None if duration is None else time.perf_counter() + duration
+            iteration = 0
+            while (iteration < iterations) if deadline is None else (time.perf_counter() < deadline):
+                for step in steps:
+                    step(client, data, rng, index)
+                iteration += 1
+            return client.samples
+        finally:
+            client.close()
+            if concurrency > 1:
+                connections.close_all()
+
+    if concurrency == 1:
+        # В текущем потоке: запросы видят транзакцию вызывающего кода
+        user_samples = [run_user(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='kaudio-benchmark') as executor:
+            futures = [executor.submit(run_user, index) for index in range(concurrency)]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            # Исходная ошибка важнее прерванного ожидания остальных пользователей
+            raise next((e for e in errors if not isinstance(e, threading.BrokenBarrierError)), errors[0])
+        user_samples = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started['at']
+
+    samples = [sample for samples in user_samples for sample in samples]
+    by_endpoint: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+    return {
+        'version': RESULT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'commit': git_commit(),
+        'target': target,
+        'scenarios': scenarios,
+        'concurrency': concurrency,
+        'iterations': iterations if duration is None else None,
+        'duration': duration,
+        'warmup': warmup,
+        'seed': seed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+        'statuses': {str(status): count for status, count in sorted(Counter(s.status for s in samples).items())},
+        'total': summarize(samples),
+        'endpoints': {endpoint: summarize(by_endpoint[endpoint]) for endpoint in sorted(by_endpoint)},
+    }
+
+
+def save_result(result: Dict[str, Any], directory: Optional[str] = None) -> str:
+    """
+    Сохраняет результат замера в JSON.
+
+    Имя файла содержит время замера и коммит, поэтому файлы
+    упорядочены по времени.
+
+    Args:
+        result: Результат замера
+        directory: Каталог результатов (по умолчанию BENCHMARK_RESULTS_DIR)
+
+    Returns:
+        str: Путь к файлу
+    """
+    directory = directory or settings.BENCHMARK_RESULTS_DIR
+    os.makedirs(directory, exist_ok=True)
+    created_at = timezone.localtime(datetime.fromisoformat(result['created_at']))
+    path = os.path.join(directory, f'{created_at:%Y%m%d-%H%M%S}-{result["commit"] or "unknown"}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_result(path: str) -> Dict[str, Any]:
+    """
+    Загружает сохраненный результат замера.
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        Dict[str, Any]: Результат замера
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def latest_result(directory: Optional[str] = None) -> Optional[str]:
+    """
+    Возвращает путь к последнему сохраненному результату.
+
+    Args:
+        directory: Каталог результатов (по умолчанию BENCHMARK_RESULTS_DIR)
+
+    Returns:
+        Optional[str]: Путь к файлу или None, если результатов нет
+    """
+    directory = directory or settings.BENCHMARK_RESULTS_DIR
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, names[-1]) if names else None
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    max_regression: float = 10.0,
+) -> List[Comparison]:
+    """
+    Сравнивает p95 и количество SQL-запросов по адресам, общим для двух замеров.
+
+    Рост p95 больше max_regression процентов и любой рост количества
+    SQL-запросов на запрос считаются регрессией.
+
+    Args:
+        baseline: Предыдущий результат
+        current: Текущий результат
+        max_regression: Допустимый рост p95 в процентах
+
+    Returns:
+        List[Comparison]: Изменения метрик
+    """
+    comparisons = []
+    for endpoint, stats in current['endpoints'].items():
+        before_stats = baseline['endpoints'].get(endpoint)
+        if before_stats is None:
+            continue
+        for metric, limit in (('p95_ms', max_regression), ('queries_per_request', 0.0)):
+            before, after = before_stats.get(metric), stats.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else (0.0 if after == before else 100.0)
+            comparisons.append(Comparison(endpoint, metric, before, after, round(change, 1), change > limit))
+    return comparisons
@@ -0,0 +1,142 @@
+"""
+Сценарии виртуальных пользователей.
+
+Сценарий - функция (client, data, rng, user_index), выполняющая одну
+итерацию действий пользователя. Треки выбираются со смещением
+к популярным, как при реальном прослушивании; правки плейлиста
+возвращают его в исходное состояние, поэтому сценарии можно повторять.
+"""
+
+import random
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence
+from urllib.parse import quote
+
+from django.db.models import F
+
+from ..models import Album, Genre, Playlist, Track
+from .clients import BenchmarkClient
+
+BENCHMARK_PLAYLIST_TITLE = 'Benchmark'
+PLAY_SESSION_LENGTH = 5
+
+
+class BenchmarkData(NamedTuple):
+    """Объекты, к которым обращаются сценарии."""
+    user_id: int
+    track_ids: List[int]
+    album_ids: List[int]
+    playlist_ids: List[int]
+    search_terms: List[str]
+    genres: List[str]
+    years: List[int]
+
+
+def collect_data(user: Any, playlists: int = 1, limit: int = 1000) -> BenchmarkData:
+    """
+    Выбирает объекты каталога для сценариев.
+
+    Для правок создаются закрытые плейлисты пользователя (по одному
+    на виртуального пользователя), если их еще нет.
+
+    Args:
+        user: Пользователь, от имени которого выполняются сценарии
+        playlists: Количество плейлистов для правок
+        limit: Максимальное количество треков и альбомов
+
+    Returns:
+        BenchmarkData: Объекты для сценариев
+
+    Raises:
+        ValueError: Если в каталоге нет треков
+    """
+    tracks = list(
+        Track.objects.order_by(F('play_count').desc(), 'pk').values_list('pk', 'title', 'release_date')[:limit]
+    )
+    if not tracks:
+        raise ValueError('В каталоге нет треков')
+    album_ids = list(Album.objects.order_by('-release_date', 'pk').values_list('pk', flat=True)[:limit])
+    playlist_ids = []
+    for index in range(playlists):
+        playlist, _ = Playlist.objects.get_or_create(
+            user=user,
+            title=f'{BENCHMARK_PLAYLIST_TITLE} {index + 1}',
+            defaults={'is_public': False},
+        )
+        playlist_ids.append(playlist.pk)
+    terms = sorted({title.split()[0] for _, title, _ in tracks if title.split()})
+    years = sorted({release_date.year for _, _, release_date in tracks if release_date})
+    return BenchmarkData(
+        user_id=user.pk,
+        track_ids=[pk for pk, _, _ in tracks],
+        album_ids=album_ids,
+        playlist_ids=playlist_ids,
+        search_terms=terms,
+        genres=list(Genre.objects.order_by('pk').values_list('title', flat=True)[:limit]),
+        years=years,
+    )
+
+
+def pick(rng: random.Random, items: Sequence[Any]) -> Any:
+    """
+    Выбирает элемент со смещением к началу списка (к популярным).
+
+    Args:
+        rng: Генератор случайных чисел пользователя
+        items: Элементы, упорядоченные по популярности
+
+    Returns:
+        Any: Выбранный элемент
+    """
+    return items[int(len(items) * rng.random() ** 2)]
+
+
+def browse(client: BenchmarkClient, data: BenchmarkData, rng: random.Random, user_index: int) -> None:
+    """Просмотр каталога: списки, карточки альбома и трека, аналитика."""
+    client.get('tracks:list', '/api/tracks/?ordering=-play_count')
+    client.get('albums:list', '/api/albums/?ordering=-release_date')
+    if data.album_ids:
+        client.get('albums:detail', f'/api/albums/{pick(rng, data.album_ids)}/')
+    client.get('tracks:detail', f'/api/tracks/{pick(rng, data.track_ids)}/')
+    client.get('recent:tracks', '/api/recent/tracks/')
+    client.get('tracks-analytics', '/api/tracks-analytics/?time_range=week')
+
+
+def search(client: BenchmarkClient, data: BenchmarkData, rng: random.Random, user_index: int) -> None:
+    """Поиск и фильтры каталога."""
+    term = quote(rng.choice(data.search_terms)) if data.search_terms else ''
+    client.get('tracks:search', f'/api/tracks/?search={term}')
+    client.get('tracks:filter-title', f'/api/tracks/?title={term}')
+    client.get('albums:search', f'/api/albums/?search={term}')
+    if data.genres:
+        client.get('tracks:filter-genre', f'/api/tracks/?genre={quote(rng.choice(data.genres))}')
+    if data.years:
+        client.get('tracks:filter-year', f'/api/tracks/?year={rng.choice(data.years)}')
+    client.get('tracks:filter-rating', '/api/tracks/?min_rating=4&ordering=-avg_rating')
+
+
+def play(client: BenchmarkClient, data: BenchmarkData, rng: random.Random, user_index: int) -> None:
+    """Сессия прослушивания с лайком и его отменой."""
+    for _ in range(PLAY_SESSION_LENGTH):
+        client.post('tracks:play', f'/api/tracks/{pick(rng, data.track_ids)}/play/')
+    track_id = pick(rng, data.track_ids)
+    client.post('tracks:like', f'/api/tracks/{track_id}/like/')
+    client.delete('tracks:unlike', f'/api/tracks/{track_id}/unlike/')
+
+
+def playlist(client: BenchmarkClient, data: BenchmarkData, rng: random.Random, user_index: int) -> None:
+    """Просмотр плейлиста, добавление и удаление трека."""
+    playlist_id = data.playlist_ids[user_index % len(data.playlist_ids)]
+    # Закрытый плейлист доступен владельцу по параметру user_id
+    base, query = f'/api/playlists/{playlist_id}', f'?user_id={data.user_id}'
+    track_id = pick(rng, data.track_ids)
+    client.get('playlists:tracks', f'{base}/tracks/{query}')
+    client.post('playlists:add-track', f'{base}/add_track/{query}', {'track_id': track_id})
+    client.post('playlists:remove-track', f'{base}/remove_track/{query}', {'track_id': track_id})
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkClient, BenchmarkData, random.Random, int], None]] = {
+    'browse': browse,
+    'search': search,
+    'play': play,
+    'playlist': playlist,
+}
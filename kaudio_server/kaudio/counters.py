@@ -0,0 +1,197 @@
+"""
+Сверка денормализованных счетчиков с данными.
+
+Счетчики объявляются в models.py функцией counter_cache и в обычной
+работе меняются атомарными приращениями в сигналах дочерних моделей.
+Сверка находит родительские объекты, счетчики которых разошлись
+с дочерними строками, и пересчитывает только их коррелированными
+подзапросами. Каталог обходится частями по диапазонам первичного ключа
+в коротких транзакциях, поэтому таблицы надолго не блокируются.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import COUNTER_CACHES, CounterCache
+
+
+def aggregate_subquery(rows: QuerySet, group_by: str, aggregate: Any) -> Coalesce:
+    """
+    Формирует коррелированный подзапрос агрегата по строкам одного объекта.
+
+    Args:
+        rows: Строки, отфильтрованные по OuterRef('pk')
+        group_by: Поле внешнего ключа для группировки
+        aggregate: Агрегатная функция
+
+    Returns:
+        Coalesce: Значение агрегата или 0 для объекта без строк
+    """
+    subquery = rows.order_by().values(group_by).annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def update_in_chunks(
+    model: Type[models.Model],
+    update: Callable[[QuerySet], int],
+    ids: Optional[List[int]] = None,
+    chunk_size: int = 5000,
+    on_chunk: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    Выполняет set-based UPDATE частями, каждая часть - отдельная транзакция.
+
+    Args:
+        model: Модель обновляемых объектов
+        update: Функция, обновляющая переданный queryset и возвращающая количество строк
+        ids: ID объектов (None - все объекты)
+        chunk_size: Количество объектов в одном UPDATE
+        on_chunk: Вызывается с количеством обновленных и общим количеством объектов
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    manager = model.objects
+    if ids is not None:
+        chunks = [
+            manager.filter(pk__in=ids[start:start + chunk_size])
+            for start in range(0, len(ids), chunk_size)
+        ]
+        total = len(ids)
+    else:
+        bounds = manager.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None:
+            return 0
+        # Диапазоны ключа не требуют выборки списка ID всего каталога
+        chunks = [
+            manager.filter(pk__gte=start, pk__lt=start + chunk_size)
+            for start in range(bounds['low'], bounds['high'] + 1, chunk_size)
+        ]
+        total = manager.count()
+
+    updated = 0
+    for chunk in chunks:
+        with transaction.atomic():
+            updated += update(chunk)
+        if on_chunk is not None:
+            # Диапазоны ключа могут содержать пропуски, поэтому считаем строки, а не части
+            on_chunk(updated, total)
+    return updated
+
+
+def counter_caches(parent: Type[models.Model], counters: Optional[List[str]] = None) -> List[CounterCache]:
+    """
+    Возвращает счетчики родительской модели.
+
+    Args:
+        parent: Родительская модель
+        counters: Имена полей счетчиков (None - все)
+
+    Returns:
+        List[CounterCache]: Счетчики
+    """
+    return [
+        cache for cache in COUNTER_CACHES
+        if cache.parent is parent and (counters is None or cache.counter in counters)
+    ]
+
+
+def counter_models() -> Dict[str, Type[models.Model]]:
+    """
+    Возвращает модели, в которых объявлены счетчики.
+
+    Returns:
+        Dict[str, Type[models.Model]]: Модель по имени (album, playlist, track)
+    """
+    return {cache.parent._meta.model_name: cache.parent for cache in COUNTER_CACHES}
+
+
+def actual_counters(parent: Type[models.Model], counters: Optional[List[str]] = None) -> Dict[str, Coalesce]:
+    """
+    Формирует подзапросы фактических значений счетчиков по дочерним строкам.
+
+    Args:
+        parent: Родительская модель
+        counters: Имена полей счетчиков (None - все)
+
+    Returns:
+        Dict[str, Coalesce]: Выражение по имени поля счетчика
+    """
+    expressions = {}
+    for cache in counter_caches(parent, counters):
+        rows = cache.child.objects.filter(**{cache.foreign_key: OuterRef('pk')}, **(cache.conditions or {}))
+        aggregate = Count('pk') if cache.value is None else Sum(cache.value)
+        expressions[cache.counter] = aggregate_subquery(rows, cache.foreign_key, aggregate)
+    return expressions
+
+
+def update_counters(queryset: QuerySet, counters: Optional[List[str]] = None) -> int:
+    """
+    Пересчитывает счетчики объектов одним UPDATE.
+
+    Args:
+        queryset: Родительские объекты
+        counters: Имена полей счетчиков (None - все)
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    return queryset.update(**actual_counters(queryset.model, counters))
+
+
+def drifted_ids(queryset: QuerySet) -> List[int]:
+    """
+    Находит объекты, счетчики которых расходятся с дочерними строками.
+
+    Args:
+        queryset: Родительские объекты
+
+    Returns:
+        List[int]: ID объектов с расхождением
+    """
+    actual = actual_counters(queryset.model)
+    annotated = queryset.annotate(**{f'actual_{name}': expression for name, expression in actual.items()})
+    matches = Q()
+    for name in actual:
+        matches &= Q(**{name: models.F(f'actual_{name}')})
+    return list(annotated.exclude(matches).values_list('pk', flat=True))
+
+
+def fix_drift(queryset: QuerySet) -> int:
+    """
+    Пересчитывает счетчики только у объектов с расхождением.
+
+    Args:
+        queryset: Родительские объекты
+
+    Returns:
+        int: Количество исправленных объектов
+    """
+    ids = drifted_ids(queryset)
+    if not ids:
+        return 0
+    return update_counters(queryset.model.objects.filter(pk__in=ids))
+
+
+def reconcile_counters(
+    parent: Type[models.Model],
+    ids: Optional[List[int]] = None,
+    chunk_size: int = 5000,
+    on_chunk: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    Находит и исправляет расхождения счетчиков частями.
+
+    Args:
+        parent: Родительская модель
+        ids: ID объектов (None - все объекты)
+        chunk_size: Количество объектов в одной части
+        on_chunk: Вызывается с количеством обновленных и общим количеством объектов
+
+    Returns:
+        int: Количество исправленных объектов
+    """
+    return update_in_chunks(parent, fix_drift, ids, chunk_size, on_chunk)
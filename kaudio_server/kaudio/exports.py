@@ -0,0 +1,372 @@
+"""
+Экспорт отчетов по трекам и альбомам в PDF, CSV и XLSX.
+
+Данные читаются из базы порциями через iterator(chunk_size=...)
+с select_related/prefetch_related, а строки сразу записываются
+в выходной формат: CSV и XLSX отдаются потоково, PDF рисуется
+постранично. Большие выборки экспортируются фоновой задачей
+export_report, результат которой доступен для скачивания
+через /api/jobs/{id}/result/.
+"""
+
+import csv
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import F, FloatField, Model, Prefetch, QuerySet, Value
+from django.db.models.functions import Cast, Least
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .models import Album, Genre, Track
+
+FORMATS = {
+    'pdf': 'application/pdf',
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportSpec(NamedTuple):
+    """
+    Описание отчета: модель, колонки и способ получения строк.
+    """
+    model: Any
+    filename: str
+    title: Callable[[], str]
+    headers: Callable[[], List[str]]
+    widths: Sequence[float]
+    prepare: Callable[[QuerySet], QuerySet]
+    row: Callable[[Model], List[Any]]
+
+
+def _duration(seconds: Optional[int]) -> str:
+    """
+    Форматирует длительность в MM:SS.
+
+    Args:
+        seconds: Длительность в секундах
+
+    Returns:
+        str: Длительность в формате MM:SS
+    """
+    seconds = seconds or 0
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+
+def popularity_score() -> Any:
+    """
+    Выражение рейтинга популярности трека для аннотации.
+
+    Та же формула, что и в calculate_popularity_score, но вычисляется в базе.
+
+    Returns:
+        Any: Выражение Django ORM
+    """
+    plays = Least(Cast(F('play_count'), FloatField()) / 1000.0, Value(1.0))
+    likes = Least(Cast(F('likes_count'), FloatField()) / 100.0, Value(1.0))
+    return (plays * 0.6 + likes * 0.4) * 100
+
+
+def _prepare_tracks(queryset: QuerySet) -> QuerySet:
+    return queryset.select_related('artist', 'album').only(
+        'title', 'duration', 'play_count', 'likes_count', 'artist__email', 'album__title'
+    ).annotate(popularity=popularity_score())
+
+
+def _track_row(track: Track) -> List[Any]:
+    return [
+        track.title,
+        track.artist.email if track.artist else _('Нет исполнителя'),
+        track.album.title if track.album else _('Нет альбома'),
+        _duration(track.duration),
+        track.play_count,
+        track.likes_count,
+        round(track.popularity, 2),
+    ]
+
+
+def _prepare_albums(queryset: QuerySet) -> QuerySet:
+    return queryset.select_related('artist').only(
+        'title', 'release_date', 'total_tracks', 'total_duration', 'artist__email'
+    ).prefetch_related(Prefetch('genres', queryset=Genre.objects.only('title')))
+
+
+def _album_row(album: Album) -> List[Any]:
+    genres = ', '.join(genre.title for genre in album.genres.all())
+    return [
+        album.title,
+        album.artist.email if album.artist else _('Нет исполнителя'),
+        album.release_date.strftime('%d.%m.%Y') if album.release_date else '',
+        album.total_tracks,
+        _duration(album.total_duration),
+        genres or _('Нет жанров'),
+    ]
+
+
+EXPORTS: Dict[str, ExportSpec] = {
+    'track': ExportSpec(
+        model=Track,
+        filename='tracks_report',
+        title=lambda: _('Отчет по трекам'),
+        headers=lambda: [
+            _('Название'), _('Исполнитель'), _('Альбом'), _('Длительность'),
+            _('Прослушивания'), _('Лайки'), _('Рейтинг')
+        ],
+        widths=(3, 3, 3, 1.5, 1.5, 1, 1),
+        prepare=_prepare_tracks,
+        row=_track_row,
+    ),
+    'album': ExportSpec(
+        model=Album,
+        filename='albums_report',
+        title=lambda: _('Отчет по альбомам'),
+        headers=lambda: [
+            _('Название'), _('Исполнитель'), _('Дата выпуска'), _('Треков'), _('Длительность'), _('Жанры')
+        ],
+        widths=(3, 3, 1.5, 1, 1.5, 3),
+        prepare=_prepare_albums,
+        row=_album_row,
+    ),
+}
+
+
+def export_rows(spec: ExportSpec, queryset: QuerySet) -> Iterator[List[Any]]:
+    """
+    Перебирает строки отчета, читая базу порциями EXPORT_CHUNK_SIZE.
+
+    Args:
+        spec: Описание отчета
+        queryset: Экспортируемые объекты
+
+    Yields:
+        List[Any]: Значения ячеек строки
+    """
+    for obj in spec.prepare(queryset).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield spec.row(obj)
+
+
+class _Sink:
+    """
+    Буфер для потоковой записи: накапливает байты до очередной выдачи.
+    """
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class _Echo:
+    """
+    Псевдофайл для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv(headers: List[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """
+    Формирует CSV построчно.
+
+    Args:
+        headers: Заголовки колонок
+        rows: Строки
+
+    Yields:
+        bytes: Очередная строка CSV в UTF-8 (первая - с BOM для Excel)
+    """
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode() + writer.writerow(headers).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+# Управляющие символы, недопустимые в XML 1.0
+_XML_ILLEGAL = {code: None for code in range(32) if code not in (9, 10, 13)}
+
+
+def _xlsx_cell(value: Any) -> str:
+    """
+    Формирует ячейку листа XLSX.
+
+    Args:
+        value: Значение ячейки
+
+    Returns:
+        str: XML ячейки (число или строка)
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(str(value).translate(_XML_ILLEGAL))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Sequence[Any]) -> bytes:
+    return ('<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>').encode()
+
+
+def iter_xlsx(headers: List[str], rows: Iterable[Sequence[Any]], batch: int = 500) -> Iterator[bytes]:
+    """
+    Формирует XLSX построчно без сторонних библиотек.
+
+    Книга из одного листа со строками inlineStr пишется в ZIP без перемотки
+    (с дескрипторами данных), поэтому ее можно отдавать по мере формирования.
+
+    Args:
+        headers: Заголовки колонок
+        rows: Строки
+        batch: Количество строк между выдачами данных
+
+    Yields:
+        bytes: Очередной фрагмент файла
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(headers))
+            for index, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row))
+                if index % batch == 0:
+                    yield sink.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.pop()
+
+
+def write_export(
+    spec: ExportSpec,
+    queryset: QuerySet,
+    file_format: str,
+    output: BinaryIO,
+    on_row: Optional[Callable[[int], None]] = None
+) -> int:
+    """
+    Записывает отчет в файл.
+
+    Args:
+        spec: Описание отчета
+        queryset: Экспортируемые объекты
+        file_format: pdf, csv или xlsx
+        output: Файл для записи
+        on_row: Вызывается с количеством записанных строк
+
+    Returns:
+        int: Количество строк отчета
+    """
+    count = 0
+
+    def rows() -> Iterator[List[Any]]:
+        nonlocal count
+        for row in export_rows(spec, queryset):
+            yield row
+            count += 1
+            if on_row is not None:
+                on_row(count)
+
+    if file_format == 'pdf':
+        from .utils.pdf_generator import write_table_pdf
+        write_table_pdf(output, spec.title(), spec.headers(), rows(), spec.widths)
+    else:
+        chunks = iter_csv if file_format == 'csv' else iter_xlsx
+        for chunk in chunks(spec.headers(), rows()):
+            output.write(chunk)
+    return count
+
+
+def export_filename(spec: ExportSpec, file_format: str) -> str:
+    """
+    Формирует имя файла отчета с текущим временем.
+
+    Args:
+        spec: Описание отчета
+        file_format: Формат файла
+
+    Returns:
+        str: Имя файла
+    """
+    return f'{spec.filename}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{file_format}'
+
+
+def export_response(kind: str, queryset: QuerySet, file_format: str) -> HttpResponse:
+    """
+    Формирует ответ с отчетом для небольших выборок.
+
+    CSV и XLSX отдаются потоково, PDF пишется в ответ постранично.
+
+    Args:
+        kind: Тип отчета (track или album)
+        queryset: Экспортируемые объекты
+        file_format: pdf, csv или xlsx
+
+    Returns:
+        HttpResponse: Ответ с файлом отчета
+    """
+    spec = EXPORTS[kind]
+    if file_format == 'pdf':
+        response = HttpResponse(content_type=FORMATS['pdf'])
+        write_export(spec, queryset, 'pdf', response)
+    else:
+        chunks = iter_csv if file_format == 'csv' else iter_xlsx
+        response = StreamingHttpResponse(
+            chunks(spec.headers(), export_rows(spec, queryset)),
+            content_type=FORMATS[file_format]
+        )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(spec, file_format)}"'
+    return response
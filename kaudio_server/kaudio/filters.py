@@ -1,9 +1,46 @@
 import django_filters
+from datetime import MAXYEAR, MINYEAR, date
+from django.db.models import QuerySet
 from django_filters import FilterSet
 from typing import Dict, Any, List
 from .models import Track, Album, Artist, Playlist, UserActivity
 
 
+def year_range(field: str, year: int) -> Dict[str, Any]:
+    """
+    Формирует условие на год выпуска диапазоном дат.
+    
+    В отличие от field__year, диапазон использует индекс по полю даты.
+    
+    Args:
+        field: Поле даты
+        year: Год
+        
+    Returns:
+        Dict[str, Any]: Аргументы filter()
+    """
+    if not MINYEAR <= year < MAXYEAR:
+        return {'pk__in': []}
+    return {f'{field}__gte': date(year, 1, 1), f'{field}__lt': date(year + 1, 1, 1)}
+
+
+def filter_year(queryset: QuerySet, name: str, value: Any) -> QuerySet:
+    """
+    Фильтрует объекты по году в поле даты.
+    
+    Args:
+        queryset: Исходный набор объектов
+        name: Поле даты
+        value: Год
+        
+    Returns:
+        QuerySet: Отфильтрованный набор
+    """
+    if value is None:
+        return queryset
+    return queryset.filter(**year_range(name, int(value)))
+
+
 class TrackFilter(FilterSet):
     """
     Фильтр для модели Track.
@@ -22,7 +59,7 @@ class TrackFilter(FilterSet):
     artist = django_filters.CharFilter(field_name='artist__user__username', lookup_expr='icontains')
     album = django_filters.CharFilter(field_name='album__title', lookup_expr='icontains')
     genre = django_filters.CharFilter(field_name='genres__title', lookup_expr='icontains')
-    year = django_filters.NumberFilter(field_name='release_date__year')
+    year = django_filters.NumberFilter(field_name='release_date', method=filter_year)
     min_duration = django_filters.NumberFilter(field_name='duration', lookup_expr='gte')
     max_duration = django_filters.NumberFilter(field_name='duration', lookup_expr='lte')
     is_explicit = django_filters.BooleanFilter()
@@ -49,7 +86,7 @@ class AlbumFilter(FilterSet):
     title = django_filters.CharFilter(lookup_expr='icontains')
     artist = django_filters.CharFilter(field_name='artist__user__username', lookup_expr='icontains')
     genre = django_filters.CharFilter(field_name='genres__title', lookup_expr='icontains')
-    year = django_filters.NumberFilter(field_name='release_date__year')
+    year = django_filters.NumberFilter(field_name='release_date', method=filter_year)
     min_tracks = django_filters.NumberFilter(field_name='total_tracks', lookup_expr='gte')
     max_tracks = django_filters.NumberFilter(field_name='total_tracks', lookup_expr='lte')
     min_duration = django_filters.NumberFilter(field_name='total_duration', lookup_expr='gte')
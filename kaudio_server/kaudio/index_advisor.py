@@ -0,0 +1,222 @@
+"""
+Анализ планов запросов типичной нагрузки API.
+
+Нагрузка - список GET-адресов или файл с SQL. Адреса выполняются
+тестовым клиентом внутри транзакции, которая откатывается, SQL каждого
+запроса нормализуется (литералы заменяются на ?), и для каждой формы
+запроса выполняется EXPLAIN. По планам определяются таблицы, читаемые
+полным сканированием, сортировки во временном B-дереве, индексы,
+не использованные ни одним планом, и индексы, повторяющие префикс
+другого индекса той же таблицы.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+# Горячие формы запросов: сортировки и фильтры каталога, аналитика, активность
+DEFAULT_WORKLOAD = [
+    '/api/tracks/?ordering=-play_count',
+    '/api/tracks/?ordering=-likes_count',
+    '/api/tracks/?ordering=-avg_rating',
+    '/api/tracks/?year=2024',
+    '/api/tracks/?min_rating=4',
+    '/api/albums/?ordering=-release_date',
+    '/api/albums/?year=2024',
+    '/api/tracks-analytics/?time_range=week',
+    '/api/user-activities/?activity_type=like',
+]
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+_SPACES = re.compile(r'\s+')
+
+# SQLite: SEARCH t USING INDEX i / SCAN t; PostgreSQL: Index Scan using i / Seq Scan on t
+_INDEX_USED = re.compile(
+    r'USING (?:COVERING )?INDEX (\w+)|Index (?:Only )?Scan using (\w+)|Bitmap Index Scan on (\w+)'
+)
+_FULL_SCAN = re.compile(r'^\s*SCAN (?:TABLE )?(\w+)(?!.*USING)|Seq Scan on (\w+)')
+_TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|Sort Key')
+_COLUMN = re.compile(r'"(kaudio_\w+)"\."(\w+)"')
+_TABLE_PREFIX = 'kaudio_'
+
+
+class QueryPlan(NamedTuple):
+    """План одной формы запроса."""
+    sql: str
+    count: int
+    plan: List[str]
+    indexes: Set[str]
+    full_scans: Set[str]
+    temp_sort: bool
+
+
+class IndexReport(NamedTuple):
+    """Результат анализа нагрузки."""
+    plans: List[QueryPlan]
+    missing: Dict[str, Set[str]]
+    unused: List[Tuple[str, str, List[str]]]
+    redundant: List[Tuple[str, str, str]]
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Приводит SQL к форме запроса: литералы заменяются на ?, списки IN сворачиваются.
+
+    Args:
+        sql: Текст запроса
+
+    Returns:
+        str: Нормализованный запрос
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def capture_workload(paths: Iterable[str], user: Any) -> List[str]:
+    """
+    Выполняет GET-запросы к API и собирает выполненный SQL.
+
+    Все изменения, сделанные обработчиками, откатываются.
+
+    Args:
+        paths: Адреса запросов
+        user: Пользователь, от имени которого выполняются запросы
+
+    Returns:
+        List[str]: SQL в порядке выполнения
+    """
+    client = Client()
+    client.force_login(user)
+    statements: List[str] = []
+    with transaction.atomic():
+        for path in paths:
+            with CaptureQueriesContext(connection) as queries:
+                client.get(path, HTTP_ACCEPT='application/json')
+            statements.extend(query['sql'] for query in queries.captured_queries)
+        transaction.set_rollback(True)
+    return statements
+
+
+def explain(sql: str) -> List[str]:
+    """
+    Возвращает строки плана запроса.
+
+    Args:
+        sql: SELECT с подставленными значениями
+
+    Returns:
+        List[str]: Строки плана
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def table_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Возвращает неуникальные индексы таблиц приложения.
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: Столбцы индекса по имени индекса и таблице
+    """
+    result: Dict[str, Dict[str, List[str]]] = {}
+    with connection.cursor() as cursor:
+        for table in connection.introspection.table_names(cursor):
+            if not table.startswith(_TABLE_PREFIX):
+                continue
+            constraints = connection.introspection.get_constraints(cursor, table)
+            result[table] = {
+                name: info['columns'] for name, info in constraints.items()
+                if info['index'] and not info['unique'] and not info['primary_key']
+            }
+    return result
+
+
+def analyze(statements: Iterable[str]) -> IndexReport:
+    """
+    Строит планы форм запросов и подбирает изменения индексов.
+
+    Args:
+        statements: SQL нагрузки (с подставленными значениями)
+
+    Returns:
+        IndexReport: Планы, кандидаты в индексы, неиспользуемые и избыточные индексы
+    """
+    shapes: Counter = Counter()
+    samples: Dict[str, str] = {}
+    for sql in statements:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        shape = normalize_sql(sql)
+        shapes[shape] += 1
+        samples.setdefault(shape, sql)
+
+    plans = []
+    missing: Dict[str, Set[str]] = {}
+    used: Set[str] = set()
+    for shape, count in shapes.most_common():
+        plan = explain(samples[shape])
+        indexes: Set[str] = set()
+        full_scans: Set[str] = set()
+        for line in plan:
+            for match in _INDEX_USED.finditer(line):
+                indexes.add(next(name for name in match.groups() if name))
+            match = _FULL_SCAN.search(line)
+            # Подзапросы и CTE в плане тоже читаются через SCAN, учитываются только таблицы
+            if match and (match.group(1) or match.group(2)).startswith(_TABLE_PREFIX):
+                full_scans.add(match.group(1) or match.group(2))
+        temp_sort = any(_TEMP_SORT.search(line) for line in plan)
+        used |= indexes
+        plans.append(QueryPlan(shape, count, plan, indexes, full_scans, temp_sort))
+
+        # Кандидаты - столбцы условий и сортировки таблиц, читаемых целиком
+        _, _, tail = shape.partition(' WHERE ')
+        if not tail:
+            _, _, tail = shape.partition(' ORDER BY ')
+        for table, column in _COLUMN.findall(tail):
+            if table in full_scans and column != 'id':
+                missing.setdefault(table, set()).add(column)
+
+    indexes_by_table = table_indexes()
+    unused = [
+        (table, name, columns)
+        for table, by_name in sorted(indexes_by_table.items())
+        for name, columns in sorted(by_name.items())
+        if name not in used
+    ]
+    redundant = []
+    for table, by_name in sorted(indexes_by_table.items()):
+        for name, columns in sorted(by_name.items()):
+            for other, other_columns in sorted(by_name.items()):
+                if other == name or other_columns[:len(columns)] != columns:
+                    continue
+                # Из двух одинаковых индексов избыточным считается один
+                if other_columns == columns and other < name:
+                    continue
+                redundant.append((table, name, other))
+                break
+    return IndexReport(plans, missing, unused, redundant)
+
+
+def advise(paths: Optional[Iterable[str]] = None, user: Any = None, statements: Iterable[str] = ()) -> IndexReport:
+    """
+    Анализирует нагрузку из адресов API и готовых запросов.
+
+    Args:
+        paths: Адреса GET-запросов (None - DEFAULT_WORKLOAD)
+        user: Пользователь для запросов к API
+        statements: Дополнительные SQL-запросы
+
+    Returns:
+        IndexReport: Результат анализа
+    """
+    captured = capture_workload(DEFAULT_WORKLOAD if paths is None else paths, user) if user else []
+    return analyze([*captured, *statements])
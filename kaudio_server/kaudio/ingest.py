@@ -0,0 +1,460 @@
+"""
+Массовый импорт каталога треков.
+
+Аудиофайлы разбираются в дочерних процессах: процесс читает теги ID3v2
+и длительность, записывает файл в контентно-адресуемое хранилище и
+возвращает метаданные, не обращаясь к базе. Основной процесс создает
+исполнителей, альбомы, жанры, треки и связи с жанрами пакетами
+bulk_create, по одной транзакции на пакет. Сигналы моделей при этом
+не срабатывают, поэтому итоги затронутых альбомов пересчитываются
+в транзакции пакета: прерванный импорт не оставляет устаревших итогов,
+а обработка аудио созданных треков ставится в очередь явно.
+"""
+
+import csv
+import json
+import mmap
+import os
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+
+from .jobs import submit_jobs, track_audio_job_key
+from .models import Album, AlbumGenre, Artist, Genre, MediaBlob, Track, TrackGenre
+from .storage import media_storage
+from .totals import update_totals
+from .utils.mp3 import UnsupportedAudioFormat, audio_duration, read_id3_tags
+
+AUDIO_EXTENSIONS = ('.mp3',)
+
+# Колонки манифеста; path указывается относительно каталога манифеста
+MANIFEST_FIELDS = ('path', 'title', 'artist', 'album', 'track_number', 'release_date', 'genres')
+
+
+class CatalogEntry(NamedTuple):
+    """
+    Метаданные одного импортируемого трека.
+    """
+    source: str
+    title: str
+    artist: str
+    album: Optional[str]
+    track_number: Optional[int]
+    release_date: Optional[date]
+    genres: Tuple[str, ...]
+    duration: int
+    blob_name: str
+    sha256: str
+    size: int
+
+
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Читает манифест каталога в формате CSV или JSON.
+
+    JSON - список объектов с ключами MANIFEST_FIELDS, жанры - список
+    или строка; в CSV жанры перечисляются через точку с запятой.
+
+    Args:
+        path: Путь к файлу манифеста (.csv или .json)
+
+    Returns:
+        List[Dict[str, Any]]: Строки манифеста с абсолютным path
+
+    Raises:
+        ValueError: Если формат манифеста не поддерживается или нет колонки path
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8', newline='') as manifest:
+        if extension == '.csv':
+            rows = list(csv.DictReader(manifest))
+        elif extension == '.json':
+            rows = json.load(manifest)
+        else:
+            raise ValueError(f'Неподдерживаемый формат манифеста: {extension or path}')
+
+    root = os.path.dirname(os.path.abspath(path))
+    entries = []
+    for number, row in enumerate(rows, start=1):
+        if not row.get('path'):
+            raise ValueError(f'В строке {number} манифеста не указан path')
+        row = {key: value for key, value in row.items() if key in MANIFEST_FIELDS and value not in ('', None)}
+        row['path'] = os.path.join(root, row['path'])
+        entries.append(row)
+    return entries
+
+
+def scan_directory(root: str) -> List[Dict[str, Any]]:
+    """
+    Находит аудиофайлы в каталоге и его подкаталогах.
+
+    Args:
+        root: Каталог
+
+    Returns:
+        List[Dict[str, Any]]: Строки вида {'path': ...} в порядке путей
+    """
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(AUDIO_EXTENSIONS) and not filename.startswith('.'):
+                paths.append(os.path.join(directory, filename))
+    return [{'path': path} for path in sorted(paths)]
+
+
+def _parse_number(value: Any) -> Optional[int]:
+    """
+    Разбирает номер трека вида "3" или "3/12".
+
+    Args:
+        value: Значение из тега или манифеста
+
+    Returns:
+        Optional[int]: Номер или None
+    """
+    match = re.match(r'\s*(\d+)', str(value or ''))
+    if not match:
+        return None
+    return int(match.group(1)) or None
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    """
+    Разбирает дату выпуска вида "2024", "2024-05" или "2024-05-17".
+
+    Args:
+        value: Значение из тега или манифеста
+
+    Returns:
+        Optional[date]: Дата или None
+    """
+    match = re.match(r'\s*(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?', str(value or ''))
+    if not match:
+        return None
+    year, month, day = match.groups()
+    try:
+        return date(int(year), int(month or 1), int(day or 1))
+    except ValueError:
+        return None
+
+
+def _parse_genres(value: Any) -> Tuple[str, ...]:
+    """
+    Разбирает список жанров.
+
+    Ссылки на жанры ID3v1 вида "(17)" отбрасываются, если за ними следует название.
+
+    Args:
+        value: Список или строка с жанрами через точку с запятой
+
+    Returns:
+        Tuple[str, ...]: Названия жанров без повторов
+    """
+    items = value if isinstance(value, list) else str(value or '').split(';')
+    genres = []
+    for item in items:
+        title = re.sub(r'^\(\d+\)(?=.)', '', str(item).strip()).strip()[:100]
+        if title and title not in genres:
+            genres.append(title)
+    return tuple(genres)
+
+
+def probe_catalog_file(row: Dict[str, Any]) -> Tuple[Optional[CatalogEntry], str]:
+    """
+    Разбирает аудиофайл и записывает его в хранилище.
+
+    Выполняется в дочернем процессе и не обращается к базе. Значения
+    манифеста имеют приоритет над тегами файла. Файл записывается
+    в хранилище только после проверки метаданных.
+
+    Args:
+        row: Строка манифеста или каталога
+
+    Returns:
+        Tuple: Метаданные трека (или None) и текст ошибки
+    """
+    path = row['path']
+    try:
+        with open(path, 'rb') as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                tags = read_id3_tags(data)
+                duration = audio_duration(data)
+            values = {**tags, **row}
+            artist = str(values.get('artist', '')).strip()
+            if not artist:
+                return None, 'Не указан исполнитель'
+            source.seek(0)
+            blob_name, digest, size = media_storage.write_blob(os.path.basename(path), File(source))
+    except (UnsupportedAudioFormat, OSError, ValueError) as e:
+        return None, str(e)
+
+    return CatalogEntry(
+        source=path,
+        title=str(values.get('title') or os.path.splitext(os.path.basename(path))[0]).strip()[:255],
+        artist=artist[:150],
+        album=str(values['album']).strip()[:200] if values.get('album') else None,
+        track_number=_parse_number(values.get('track_number')),
+        release_date=_parse_date(values.get('release_date') or values.get('year')),
+        genres=_parse_genres(values.get('genres') or values.get('genre')),
+        duration=round(duration),
+        blob_name=blob_name,
+        sha256=digest,
+        size=size,
+    ), ''
+
+
+def _track_key(artist_id: int, album_id: Optional[int], title: str) -> Tuple[str, int, str]:
+    """
+    Возвращает ключ, по которому трек считается уже импортированным.
+
+    Args:
+        artist_id: ID исполнителя
+        album_id: ID альбома или None
+        title: Название трека
+
+    Returns:
+        Tuple[str, int, str]: Ключ трека
+    """
+    if album_id is not None:
+        return ('album', album_id, title)
+    return ('artist', artist_id, title)
+
+
+class CatalogWriter:
+    """
+    Записывает разобранные треки в базу пакетами.
+
+    Исполнители, альбомы и жанры кэшируются между пакетами, поэтому
+    каждый объект ищется и создается один раз за импорт. Трек с тем же
+    названием в том же альбоме (для синглов - у того же исполнителя)
+    пропускается: это делает повторный запуск после сбоя безопасным.
+    """
+
+    def __init__(self) -> None:
+        self.artists: Dict[str, int] = {}
+        self.genres: Dict[str, int] = {}
+        self.albums: Dict[Tuple[int, str], int] = {}
+        self.album_ids: Set[int] = set()
+
+    def write(self, entries: List[CatalogEntry]) -> Tuple[List[Track], int]:
+        """
+        Создает объекты пакета и пересчитывает итоги его альбомов в одной транзакции.
+
+        После фиксации транзакции для созданных треков ставится в очередь
+        обработка аудио (волновые формы, HLS, превью): сигналы сохранения
+        при bulk_create не срабатывают.
+
+        Args:
+            entries: Разобранные треки
+
+        Returns:
+            Tuple[List[Track], int]: Созданные треки и количество пропущенных
+        """
+        with transaction.atomic():
+            self._ensure_artists({entry.artist for entry in entries})
+            self._ensure_genres({genre for entry in entries for genre in entry.genres})
+            self._ensure_albums(entries)
+            created, skipped = self._create_tracks(entries)
+            album_ids = {track.album_id for track in created if track.album_id}
+            if album_ids:
+                update_totals(Album.objects.filter(pk__in=album_ids))
+                self.album_ids.update(album_ids)
+        if created:
+            submit_jobs(
+                'process_track_audio',
+                [{'track_id': track.pk} for track in created],
+                idempotency_keys=[track_audio_job_key(track.pk) for track in created]
+            )
+        return created, skipped
+
+    def _ensure_artists(self, names: Set[str]) -> None:
+        """
+        Находит или создает исполнителей по имени.
+
+        Args:
+            names: Имена исполнителей
+        """
+        missing = names - set(self.artists)
+        if not missing:
+            return
+        for pk, username in Artist.objects.filter(username__in=missing).order_by('pk').values_list('pk', 'username'):
+            self.artists.setdefault(username, pk)
+        created = Artist.objects.bulk_create([Artist(username=name) for name in sorted(missing - set(self.artists))])
+        self.artists.update({artist.username: artist.pk for artist in created})
+
+    def _ensure_genres(self, titles: Set[str]) -> None:
+        """
+        Находит или создает жанры по названию.
+
+        Args:
+            titles: Названия жанров
+        """
+        missing = titles - set(self.genres)
+        if not missing:
+            return
+        for pk, title in Genre.objects.filter(title__in=missing).order_by('pk').values_list('pk', 'title'):
+            self.genres.setdefault(title, pk)
+        created = Genre.objects.bulk_create([Genre(title=title) for title in sorted(missing - set(self.genres))])
+        self.genres.update({genre.title: genre.pk for genre in created})
+
+    def _ensure_albums(self, entries: List[CatalogEntry]) -> None:
+        """
+        Находит или создает альбомы по исполнителю и названию.
+
+        Дата выпуска нового альбома - самая ранняя дата его треков.
+
+        Args:
+            entries: Разобранные треки
+        """
+        release_dates: Dict[Tuple[int, str], Optional[date]] = {}
+        for entry in entries:
+            if entry.album is None:
+                continue
+            key = (self.artists[entry.artist], entry.album)
+            if key in self.albums:
+                continue
+            known = release_dates.get(key)
+            release_dates[key] = min(filter(None, [known, entry.release_date]), default=None)
+        if not release_dates:
+            return
+
+        existing = Album.objects.filter(
+            artist_id__in={artist_id for artist_id, _ in release_dates},
+            title__in={title for _, title in release_dates}
+        ).order_by('pk').values_list('pk', 'artist_id', 'title')
+        for pk, artist_id, title in existing:
+            self.albums.setdefault((artist_id, title), pk)
+        missing = [key for key in release_dates if key not in self.albums]
+        created = Album.objects.bulk_create([
+            Album(artist_id=artist_id, title=title, release_date=release_dates[(artist_id, title)] or date.today())
+            for artist_id, title in missing
+        ])
+        self.albums.update({key: album.pk for key, album in zip(missing, created)})
+
+    def _create_tracks(self, entries: List[CatalogEntry]) -> Tuple[List[Track], int]:
+        """
+        Создает треки, связи с жанрами и ссылки на аудиофайлы.
+
+        Номер трека, занятый в альбоме, заменяется следующим свободным.
+        Файлы пропущенных треков дочерние процессы уже записали в хранилище:
+        объекты, на которые не ссылается ни одна запись MediaBlob, удаляются.
+
+        Args:
+            entries: Разобранные треки
+
+        Returns:
+            Tuple[List[Track], int]: Созданные треки и количество пропущенных
+        """
+        album_ids = {self.albums[(self.artists[entry.artist], entry.album)] for entry in entries if entry.album}
+        titles = {entry.title for entry in entries}
+        artist_ids = {self.artists[entry.artist] for entry in entries}
+        existing = Track.objects.filter(
+            Q(album_id__in=album_ids) | Q(album__isnull=True, artist_id__in=artist_ids),
+            title__in=titles
+        ).values_list('artist_id', 'album_id', 'title')
+        # Название трека уникально в альбоме, у синглов - у исполнителя
+        seen = {_track_key(artist_id, album_id, title) for artist_id, album_id, title in existing}
+        numbers: Dict[int, Set[int]] = {}
+        for album_id, number in Track.objects.filter(album_id__in=album_ids).values_list('album_id', 'track_number'):
+            numbers.setdefault(album_id, set()).add(number)
+
+        tracks: List[Track] = []
+        genre_titles: List[Tuple[str, ...]] = []
+        blobs: Dict[str, Tuple[str, int, int]] = {}
+        skipped_blobs: Set[str] = set()
+        for entry in entries:
+            artist_id = self.artists[entry.artist]
+            album_id = self.albums[(artist_id, entry.album)] if entry.album else None
+            key = _track_key(artist_id, album_id, entry.title)
+            if key in seen:
+                skipped_blobs.add(entry.blob_name)
+                continue
+            seen.add(key)
+
+            track_number = entry.track_number
+            if album_id is not None:
+                used = numbers.setdefault(album_id, set())
+                if track_number is None or track_number in used:
+                    track_number = max(filter(None, used), default=0) + 1
+                used.add(track_number)
+            tracks.append(Track(
+                title=entry.title,
+                artist_id=artist_id,
+                album_id=album_id,
+                track_number=track_number,
+                release_date=entry.release_date,
+                duration=entry.duration,
+                audio_file=entry.blob_name,
+            ))
+            genre_titles.append(entry.genres)
+            _, _, count = blobs.get(entry.blob_name, (entry.sha256, entry.size, 0))
+            blobs[entry.blob_name] = (entry.sha256, entry.size, count + 1)
+
+        created = Track.objects.bulk_create(tracks)
+        media_storage.add_references(blobs)
+        self._remove_unreferenced(skipped_blobs - set(blobs))
+        TrackGenre.objects.bulk_create([
+            TrackGenre(track_id=track.pk, genre_id=self.genres[title])
+            for track, titles in zip(created, genre_titles)
+            for title in titles
+        ])
+        AlbumGenre.objects.bulk_create([
+            AlbumGenre(album_id=album_id, genre_id=genre_id)
+            for album_id, genre_id in {
+                (track.album_id, self.genres[title])
+                for track, titles in zip(created, genre_titles) if track.album_id
+                for title in titles
+            }
+        ], ignore_conflicts=True)
+        return created, len(entries) - len(created)
+
+    def _remove_unreferenced(self, names: Set[str]) -> None:
+        """
+        Удаляет объекты хранилища, на которые нет записей MediaBlob.
+
+        Объект с записью уже используется другим треком или изображением
+        (например, при повторном импорте того же файла) и не удаляется.
+
+        Args:
+            names: Имена объектов пропущенных треков
+        """
+        if not names:
+            return
+        referenced = set(MediaBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        for name in names - referenced:
+            media_storage.remove_blob(name)
+
+
+def read_state(path: str) -> Set[str]:
+    """
+    Читает пути файлов, импортированных при предыдущих запусках.
+
+    Args:
+        path: Файл состояния
+
+    Returns:
+        Set[str]: Абсолютные пути исходных файлов
+    """
+    try:
+        with open(path, encoding='utf-8') as state:
+            return {line.rstrip('\n') for line in state if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def append_state(path: str, sources: Iterable[str]) -> None:
+    """
+    Дописывает пути импортированных файлов в файл состояния.
+
+    Вызывается после фиксации транзакции пакета.
+
+    Args:
+        path: Файл состояния
+        sources: Абсолютные пути исходных файлов
+    """
+    with open(path, 'a', encoding='utf-8') as state:
+        state.writelines(f'{source}\n' for source in sources)
@@ -0,0 +1,321 @@
+"""
+Фоновые задачи с очередями, ключами идемпотентности, прогрессом и результатом.
+
+Тяжелая работа регистрируется обработчиком через декоратор register_job
+и ставится в очередь функцией submit_job. Состояние задачи хранится
+в модели Job и доступно через /api/jobs/{id}/.
+
+Очереди:
+- latency: короткие задачи, результата которых ждет пользователь
+- bulk: массовые пересчеты, экспорт и прочая долгая работа
+
+Пример:
+    @register_job('recalculate_album_totals', queue=BULK_QUEUE)
+    def recalculate_album_totals(job: Job, album_ids: List[int]) -> Dict[str, Any]:
+        ...
+        job.set_progress(done, total)
+        return {'updated': total}
+
+    job = submit_job('recalculate_album_totals', {'album_ids': ids}, user=request.user)
+"""
+
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Job, User
+
+logger = logging.getLogger(__name__)
+
+LATENCY_QUEUE = 'latency'
+BULK_QUEUE = 'bulk'
+
+
+class JobHandler(NamedTuple):
+    """
+    Зарегистрированный обработчик задачи.
+    """
+    func: Callable[..., Any]
+    queue: str
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+class UnknownJobKind(KeyError):
+    """
+    Исключение для задачи незарегистрированного типа.
+    """
+
+
+def register_job(kind: str, queue: str = BULK_QUEUE) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Регистрирует обработчик задачи.
+
+    Обработчик получает объект Job и параметры задачи как именованные
+    аргументы; возвращаемое значение (JSON) сохраняется как результат.
+
+    Args:
+        kind: Тип задачи
+        queue: Очередь Celery
+
+    Returns:
+        Callable: Декоратор
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        _handlers[kind] = JobHandler(func, queue)
+        return func
+    return decorator
+
+
+def get_job_handler(kind: str) -> JobHandler:
+    """
+    Возвращает обработчик задачи.
+
+    Args:
+        kind: Тип задачи
+
+    Returns:
+        JobHandler: Обработчик и очередь
+
+    Raises:
+        UnknownJobKind: Если тип не зарегистрирован
+    """
+    # Обработчики регистрируются при импорте модуля задач
+    from . import tasks  # noqa: F401
+    try:
+        return _handlers[kind]
+    except KeyError:
+        raise UnknownJobKind(kind)
+
+
+def submit_job(
+    kind: str,
+    params: Optional[Dict[str, Any]] = None,
+    user: Optional[User] = None,
+    idempotency_key: Optional[str] = None
+) -> Job:
+    """
+    Создает задачу и ставит ее в очередь после фиксации транзакции.
+
+    Пока задача с тем же ключом идемпотентности ждет в очереди или
+    выполняется, новая не создается и возвращается существующая; слишком
+    долго ждущая задача отправляется в очередь повторно. Если задача
+    завершена, ключ переходит к новой задаче.
+
+    Args:
+        kind: Тип задачи
+        params: Параметры обработчика (JSON)
+        user: Пользователь, запустивший задачу
+        idempotency_key: Ключ идемпотентности
+
+    Returns:
+        Job: Созданная или существующая задача
+
+    Raises:
+        UnknownJobKind: Если тип не зарегистрирован
+    """
+    handler = get_job_handler(kind)
+    defaults = {
+        'kind': kind,
+        'queue': handler.queue,
+        'params': params or {},
+        'user': user if user is not None and user.is_authenticated else None,
+    }
+
+    if idempotency_key is None:
+        job = Job.objects.create(**defaults)
+    else:
+        try:
+            with transaction.atomic():
+                existing = Job.objects.select_for_update().filter(idempotency_key=idempotency_key).first()
+                if existing is not None and not existing.is_finished:
+                    requeue_stale_job(existing)
+                    return existing
+                if existing is not None:
+                    # Ключ занят завершенной задачей: освобождаем его для новой
+                    existing.idempotency_key = None
+                    existing.save(update_fields=['idempotency_key'])
+                job = Job.objects.create(idempotency_key=idempotency_key, **defaults)
+        except IntegrityError:
+            # Ту же задачу одновременно поставил другой запрос
+            return Job.objects.get(idempotency_key=idempotency_key)
+
+    from .tasks import enqueue, run_job
+    enqueue(run_job, str(job.pk), queue=job.queue)
+    return job
+
+
+def submit_jobs(
+    kind: str,
+    params_list: List[Dict[str, Any]],
+    user: Optional[User] = None,
+    idempotency_keys: Optional[List[Optional[str]]] = None
+) -> List[Job]:
+    """
+    Создает пакет задач одного типа одним INSERT и ставит их в очередь.
+
+    Каждая задача уходит в очередь отдельным сообщением, поэтому воркеры
+    выполняют их параллельно. Ключи идемпотентности обрабатываются так же,
+    как в submit_job.
+
+    Args:
+        kind: Тип задачи
+        params_list: Параметры обработчика для каждой задачи
+        user: Пользователь, запустивший задачи
+        idempotency_keys: Ключи идемпотентности в порядке params_list
+
+    Returns:
+        List[Job]: Созданные или существующие задачи в порядке params_list
+
+    Raises:
+        UnknownJobKind: Если тип не зарегистрирован
+    """
+    handler = get_job_handler(kind)
+    keys = idempotency_keys or [None] * len(params_list)
+    user = user if user is not None and user.is_authenticated else None
+
+    with transaction.atomic():
+        used = Job.objects.select_for_update().filter(idempotency_key__in=[key for key in keys if key])
+        active = {job.idempotency_key: job for job in used if not job.is_finished}
+        for job in active.values():
+            requeue_stale_job(job)
+        # Ключи завершенных задач переходят к новым
+        used.filter(status__in=[Job.STATUS_SUCCEEDED, Job.STATUS_FAILED]).update(idempotency_key=None)
+        created = Job.objects.bulk_create([
+            Job(kind=kind, queue=handler.queue, params=params or {}, user=user, idempotency_key=key)
+            for params, key in zip(params_list, keys)
+            if key not in active
+        ])
+
+    from .tasks import enqueue, run_job
+    for job in created:
+        enqueue(run_job, str(job.pk), queue=job.queue)
+    new = iter(created)
+    return [active[key] if key in active else next(new) for key in keys]
+
+
+def requeue_stale_job(job: Job) -> bool:
+    """
+    Повторно отправляет в очередь задачу, которая слишком долго ждет исполнителя
+    или выполняется дольше JOB_RUNNING_LEASE.
+
+    Сообщение могло потеряться, если брокер был недоступен при постановке,
+    а исполнитель мог завершиться аварийно посреди работы. В обоих случаях
+    задача осталась бы активной, навсегда удерживая ключ идемпотентности.
+    Брошенная задача возвращается в pending. Повторная доставка безопасна:
+    execute_job забирает задачу условным UPDATE. Статус и время постановки
+    обновляются тоже условным UPDATE, поэтому из параллельных запросов
+    задачу отправляет только один.
+
+    Args:
+        job: Задача
+
+    Returns:
+        bool: True, если задача отправлена повторно
+    """
+    now = timezone.now()
+    reclaimed = Job.objects.filter(
+        pk=job.pk,
+        status=Job.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOB_RUNNING_LEASE)
+    ).update(status=Job.STATUS_PENDING, started_at=None, enqueued_at=now, progress=0, progress_message='')
+    requeued = reclaimed or Job.objects.filter(
+        pk=job.pk,
+        status=Job.STATUS_PENDING,
+        enqueued_at__lt=now - timedelta(seconds=settings.JOB_REENQUEUE_AFTER)
+    ).update(enqueued_at=now)
+    if not requeued:
+        return False
+
+    if reclaimed:
+        job.status, job.started_at, job.enqueued_at = Job.STATUS_PENDING, None, now
+        job.progress, job.progress_message = 0, ''
+
+    from .tasks import enqueue, run_job
+    logger.warning('Фоновая задача %s (%s) повторно отправлена в очередь', job.pk, job.kind)
+    enqueue(run_job, str(job.pk), queue=job.queue)
+    return True
+
+
+def track_audio_job_key(track_id: int) -> str:
+    """
+    Возвращает ключ идемпотентности обработки аудиофайла трека.
+
+    Args:
+        track_id: ID трека
+
+    Returns:
+        str: Ключ идемпотентности
+    """
+    return f'process_track_audio:{track_id}'
+
+
+def track_processing_job(track_id: int, user: Optional[User] = None) -> Optional[Job]:
+    """
+    Возвращает ожидающую задачу обработки аудиофайла трека.
+
+    Задача ставится сигналом сохранения трека без пользователя, поэтому
+    представления загрузки привязывают ее к загрузившему пользователю,
+    чтобы он мог следить за ней через /api/jobs/{id}/.
+
+    Args:
+        track_id: ID трека
+        user: Пользователь, загрузивший трек
+
+    Returns:
+        Optional[Job]: Задача или None, если обработка не ставилась
+    """
+    job = Job.objects.filter(idempotency_key=track_audio_job_key(track_id)).first()
+    if job is not None and job.user_id is None and user is not None and user.is_authenticated:
+        Job.objects.filter(pk=job.pk).update(user=user)
+        job.user = user
+    return job
+
+
+def execute_job(job_id: str) -> Optional[Job]:
+    """
+    Выполняет задачу в текущем процессе.
+
+    Задачу забирает только один исполнитель: статус меняется с pending
+    на running условным UPDATE, поэтому повторная доставка сообщения
+    брокером не запускает работу второй раз. Результат записывается тоже
+    условным UPDATE: если задачу вернули в pending по истечении
+    JOB_RUNNING_LEASE, запоздавший исполнитель не перезаписывает состояние
+    нового запуска.
+
+    Args:
+        job_id: ID задачи
+
+    Returns:
+        Optional[Job]: Задача после выполнения или None, если ее забрал другой исполнитель
+    """
+    started_at = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status=Job.STATUS_PENDING).update(
+        status=Job.STATUS_RUNNING, started_at=started_at
+    )
+    if not claimed:
+        return None
+
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = get_job_handler(job.kind).func(job, **job.params)
+    except Exception as e:
+        logger.exception('Фоновая задача %s (%s) завершилась с ошибкой', job.pk, job.kind)
+        job.status = Job.STATUS_FAILED
+        job.error = f'{type(e).__name__}: {e}'
+    else:
+        job.status = Job.STATUS_SUCCEEDED
+        job.result = result
+        job.progress = 100
+    job.finished_at = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, started_at=started_at).update(
+        status=job.status, error=job.error, result=job.result, progress=job.progress, finished_at=job.finished_at
+    )
+    if not finished:
+        logger.warning('Фоновая задача %s (%s) была возвращена в очередь до завершения', job.pk, job.kind)
+    return job
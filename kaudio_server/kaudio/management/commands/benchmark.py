@@ -0,0 +1,173 @@
+"""
+Команда для замера задержек API под сценариями пользователей.
+
+По умолчанию запросы выполняются в текущем процессе тестовым клиентом
+Django (ограничение частоты отключается, чтобы замерять обработчики,
+а не корзины); с --url - по HTTP против запущенного сервера. Результат
+печатается, сохраняется в BENCHMARK_RESULTS_DIR и может сравниваться
+с предыдущим замером.
+"""
+
+from typing import Any, Dict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from kaudio.benchmarks.clients import HttpClient, InProcessClient
+from kaudio.benchmarks.runner import compare_results, latest_result, load_result, run_benchmark, save_result
+from kaudio.benchmarks.scenarios import SCENARIOS, collect_data
+
+
+class Command(BaseCommand):
+    help = 'Выполняет сценарии пользователей и замеряет задержки, пропускную способность и SQL-запросы API'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=sorted(SCENARIOS),
+            help='Сценарий (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Адрес запущенного сервера (по умолчанию запросы выполняются в текущем процессе)'
+        )
+        parser.add_argument(
+            '--user',
+            default=None,
+            help='Имя пользователя для запросов к API (по умолчанию - первый суперпользователь)'
+        )
+        parser.add_argument('--concurrency', type=int, default=1, help='Количество одновременных пользователей')
+        parser.add_argument('--iterations', type=int, default=10, help='Итераций сценариев на пользователя')
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=None,
+            help='Длительность замера в секундах вместо количества итераций'
+        )
+        parser.add_argument('--warmup', type=int, default=1, help='Итераций прогрева без замеров')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение выбора треков и запросов')
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Каталог результатов (по умолчанию BENCHMARK_RESULTS_DIR)'
+        )
+        parser.add_argument('--no-save', action='store_true', help='Не сохранять результат')
+        parser.add_argument(
+            '--compare',
+            default=None,
+            help='Файл предыдущего результата или latest - последний сохраненный'
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=None,
+            help='Завершиться с ошибкой, если p95 вырос больше чем на заданный процент или выросло число SQL-запросов'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть не меньше 1')
+
+        users = get_user_model().objects.order_by('pk')
+        if options['user']:
+            user = users.filter(username=options['user']).first()
+        else:
+            user = users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Не найден пользователь для запросов к API, укажите --user')
+
+        baseline = None
+        if options['compare']:
+            path = latest_result(options['output']) if options['compare'] == 'latest' else options['compare']
+            if path is None:
+                raise CommandError('Нет сохраненных результатов для сравнения')
+            try:
+                baseline = load_result(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+        try:
+            data = collect_data(user, playlists=options['concurrency'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        scenarios = options['scenario'] or list(SCENARIOS)
+        benchmark = dict(
+            data=data,
+            scenarios=scenarios,
+            concurrency=options['concurrency'],
+            iterations=options['iterations'],
+            duration=options['duration'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+        )
+        if options['url']:
+            token, _ = Token.objects.get_or_create(user=user)
+            result = run_benchmark(
+                lambda index: HttpClient(options['url'], token.key),
+                target=options['url'],
+                **benchmark
+            )
+        else:
+            with override_settings(THROTTLE_BUCKETS={}):
+                result = run_benchmark(lambda index: InProcessClient(user), **benchmark)
+
+        self.report(result)
+        if not options['no_save']:
+            self.stdout.write(f'\nРезультат сохранен: {save_result(result, options["output"])}')
+
+        if baseline is not None:
+            self.compare(baseline, result, options['max_regression'])
+
+    def report(self, result: Dict[str, Any]) -> None:
+        """
+        Печатает статистику замера.
+
+        Args:
+            result: Результат замера
+        """
+        total = result['total']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{result["target"]}, коммит {result["commit"] or "-"}, сценарии: {", ".join(result["scenarios"])}, '
+            f'пользователей: {result["concurrency"]}'
+        ))
+        self.stdout.write(
+            f'Запросов: {total["requests"]} за {result["elapsed_s"]:.1f} с, '
+            f'{result["throughput_rps"]:.1f} запросов/с, ошибок: {total["errors"]}'
+        )
+        self.stdout.write(
+            f'{"адрес":<24}{"запросов":>9}{"ошибок":>8}{"p50 мс":>10}{"p95 мс":>10}{"p99 мс":>10}{"SQL":>8}'
+        )
+        for endpoint, stats in [*result['endpoints'].items(), ('всего', total)]:
+            queries = stats['queries_per_request']
+            self.stdout.write(
+                f'{endpoint:<24}{stats["requests"]:>9}{stats["errors"]:>8}'
+                f'{stats["p50_ms"]:>10.1f}{stats["p95_ms"]:>10.1f}{stats["p99_ms"]:>10.1f}'
+                f'{"-" if queries is None else f"{queries:.1f}":>8}'
+            )
+        self.stdout.write(f'Коды ответов: {result["statuses"]}')
+
+    def compare(self, baseline: Dict[str, Any], result: Dict[str, Any], max_regression: Any) -> None:
+        """
+        Печатает изменения относительно предыдущего замера.
+
+        Args:
+            baseline: Предыдущий результат
+            result: Текущий результат
+            max_regression: Допустимый рост p95 в процентах или None
+
+        Raises:
+            CommandError: Если задан max_regression и есть регрессии
+        """
+        comparisons = compare_results(baseline, result, 10.0 if max_regression is None else max_regression)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nСравнение с коммитом {baseline["commit"] or "-"}:'))
+        for item in comparisons:
+            line = f'  {item.endpoint:<24}{item.metric:<20}{item.before:>10.2f} -> {item.after:<10.2f}{item.change_pct:+.1f}%'
+            self.stdout.write(self.style.ERROR(line) if item.regression else line)
+        regressions = [item for item in comparisons if item.regression]
+        if max_regression is not None and regressions:
+            raise CommandError(f'Регрессий производительности: {len(regressions)}')
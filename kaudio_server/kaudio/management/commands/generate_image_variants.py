@@ -0,0 +1,96 @@
+"""
+Команда для создания уменьшенных копий уже загруженных изображений.
+
+Изображения обрабатываются в пуле процессов: дочерние процессы только
+читают и пишут файлы, а карта копий сохраняется в базу основным процессом.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from kaudio.models import IMAGE_VARIANT_FIELDS
+from kaudio.utils.images import render_image_variants
+
+
+def _render(job: Tuple[str, int, str]) -> Tuple[str, int, str, Dict[str, Any], str]:
+    """
+    Обрабатывает одно изображение в дочернем процессе.
+
+    Args:
+        job: Метка модели, ID экземпляра и имя файла
+
+    Returns:
+        Tuple: Исходные данные задания, карта копий и текст ошибки
+    """
+    model_label, pk, name = job
+    try:
+        return model_label, pk, name, render_image_variants(name), ''
+    except OSError as e:
+        return model_label, pk, name, {'source': name}, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии WebP и JPEG для существующих изображений'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов (по умолчанию - число ядер)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать карту копий для всех изображений'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        jobs = list(self.collect_jobs(options['force']))
+        if not jobs:
+            self.stdout.write('Нет изображений для обработки')
+            return
+
+        # Дочерние процессы не должны наследовать открытые соединения с базой
+        connections.close_all()
+        started = time.monotonic()
+        processed = failed = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_render, job) for job in jobs]
+            for future in as_completed(futures):
+                model_label, pk, name, variants, error = future.result()
+                model = next(model for model in IMAGE_VARIANT_FIELDS if model._meta.label == model_label)
+                field_name = IMAGE_VARIANT_FIELDS[model]
+                model.objects.filter(pk=pk, **{field_name: name}).update(image_variants=variants)
+                processed += 1
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{model_label} #{pk}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибками: {failed}, '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def collect_jobs(self, force: bool) -> Iterator[Tuple[str, int, str]]:
+        """
+        Находит изображения без актуальной карты копий.
+
+        Args:
+            force: Обрабатывать все изображения
+
+        Returns:
+            Iterator[Tuple[str, int, str]]: Метка модели, ID и имя файла
+        """
+        for model, field_name in IMAGE_VARIANT_FIELDS.items():
+            rows = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list('pk', field_name, 'image_variants')
+            for pk, name, variants in rows.iterator(chunk_size=2000):
+                if force or (variants or {}).get('source') != name:
+                    yield model._meta.label, pk, name
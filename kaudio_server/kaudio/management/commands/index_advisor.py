@@ -0,0 +1,88 @@
+"""
+Команда для анализа индексов по планам запросов типичной нагрузки.
+
+Выполняет GET-запросы к API (по умолчанию - горячие сортировки и фильтры
+каталога) и запросы из SQL-файла, строит EXPLAIN для каждой формы
+запроса и печатает полные сканирования, кандидатов в индексы,
+неиспользуемые и избыточные индексы.
+"""
+
+from typing import Any, List
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from kaudio.index_advisor import DEFAULT_WORKLOAD, advise
+
+
+class Command(BaseCommand):
+    help = 'Строит планы запросов типичной нагрузки и предлагает изменения индексов'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--url',
+            action='append',
+            help='Адрес GET-запроса (можно указать несколько раз, по умолчанию - типичная нагрузка)'
+        )
+        parser.add_argument(
+            '--sql-file',
+            default=None,
+            help='Файл с SQL-запросами, разделенными ";"'
+        )
+        parser.add_argument(
+            '--user',
+            default=None,
+            help='Имя пользователя для запросов к API (по умолчанию - первый суперпользователь)'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        statements: List[str] = []
+        if options['sql_file']:
+            try:
+                with open(options['sql_file'], encoding='utf-8') as f:
+                    statements = [sql.strip() for sql in f.read().split(';') if sql.strip()]
+            except OSError as e:
+                raise CommandError(str(e))
+
+        paths = options['url']
+        if paths is None and options['sql_file']:
+            paths = []
+        user = None
+        if paths is None or paths:
+            users = get_user_model().objects.order_by('pk')
+            if options['user']:
+                user = users.filter(username=options['user']).first()
+            else:
+                user = users.filter(is_superuser=True).first()
+            if user is None:
+                raise CommandError('Не найден пользователь для запросов к API, укажите --user')
+
+        report = advise(DEFAULT_WORKLOAD if paths is None else paths, user, statements)
+
+        for plan in report.plans:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'[x{plan.count}] {plan.sql}'))
+            for line in plan.plan:
+                self.stdout.write(f'    {line}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Полные сканирования и кандидаты в индексы:'))
+        scans = sorted({table for plan in report.plans for table in plan.full_scans})
+        if not scans:
+            self.stdout.write('  нет')
+        for table in scans:
+            columns = ', '.join(sorted(report.missing.get(table, ()))) or '-'
+            self.stdout.write(f'  {table}: {columns}')
+        sorts = sum(plan.temp_sort for plan in report.plans)
+        if sorts:
+            self.stdout.write(f'  Сортировок во временном B-дереве: {sorts}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Индексы, не использованные нагрузкой:'))
+        if not report.unused:
+            self.stdout.write('  нет')
+        for table, name, columns in report.unused:
+            self.stdout.write(f'  {table}.{name} ({", ".join(columns)})')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Избыточные индексы:'))
+        if not report.redundant:
+            self.stdout.write('  нет')
+        for table, name, other in report.redundant:
+            self.stdout.write(f'  {table}.{name} покрывается {other}')
@@ -0,0 +1,128 @@
+"""
+Команда для массового импорта каталога треков из каталога с файлами или манифеста.
+
+Аудиофайлы разбираются в пуле процессов, объекты создаются пакетами
+bulk_create, итоги альбомов пересчитываются один раз в конце, обработка
+аудио созданных треков ставится в очередь после каждого пакета. Пути
+импортированных файлов дописываются в файл состояния после каждого
+пакета, поэтому прерванный импорт продолжается с места остановки.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from kaudio.ingest import (
+    CatalogEntry, CatalogWriter, append_state, probe_catalog_file, read_manifest, read_state, scan_directory
+)
+
+
+class Command(BaseCommand):
+    help = 'Импортирует треки из каталога с аудиофайлами или манифеста CSV/JSON'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            'source',
+            help='Каталог с аудиофайлами или манифест (.csv, .json)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов разбора файлов (по умолчанию - число ядер)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Количество треков в одной транзакции (по умолчанию INGEST_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--state',
+            default=None,
+            help='Файл состояния импорта (по умолчанию .ingest-state в каталоге или <манифест>.state)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать импорт заново, не учитывая файл состояния'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        source = os.path.abspath(options['source'])
+        batch_size = options['batch_size'] or settings.INGEST_BATCH_SIZE
+        try:
+            if os.path.isdir(source):
+                rows = scan_directory(source)
+                state = options['state'] or os.path.join(source, '.ingest-state')
+            else:
+                rows = read_manifest(source)
+                state = options['state'] or f'{source}.state'
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['restart'] and os.path.exists(state):
+            os.remove(state)
+        done = read_state(state)
+        pending = [row for row in rows if row['path'] not in done]
+        if done:
+            self.stdout.write(f'Пропущено файлов из предыдущих запусков: {len(rows) - len(pending)}')
+
+        self.started = time.monotonic()
+        self.verbosity = options['verbosity']
+        self.writer = CatalogWriter()
+        self.state = state
+        self.total = len(pending)
+        self.processed = self.created = self.skipped = self.failed = self.bytes = 0
+
+        # Дочерние процессы не должны наследовать открытые соединения с базой
+        connections.close_all()
+        batch: List[CatalogEntry] = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for (entry, error), row in zip(executor.map(probe_catalog_file, pending, chunksize=8), pending):
+                if entry is None:
+                    self.failed += 1
+                    self.processed += 1
+                    self.stderr.write(f'{row["path"]}: {error}')
+                    continue
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    self.write_batch(batch)
+                    batch = []
+            if batch:
+                self.write_batch(batch)
+
+        albums = len(self.writer.album_ids)
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов {self.total}: создано треков {self.created}, пропущено {self.skipped}, '
+            f'с ошибками {self.failed}, обновлено альбомов {albums}, за {elapsed:.1f} с '
+            f'({self.processed / elapsed:.1f} файлов/с, {self.bytes / elapsed / 2 ** 20:.1f} МБ/с)'
+        ))
+        if self.created:
+            self.stdout.write(f'Обработка аудио (волновые формы, HLS, превью) поставлена в очередь: {self.created}')
+
+    def write_batch(self, batch: List[CatalogEntry]) -> None:
+        """
+        Записывает пакет треков и отмечает его файлы в файле состояния.
+
+        Args:
+            batch: Разобранные треки
+        """
+        created, skipped = self.writer.write(batch)
+        append_state(self.state, [entry.source for entry in batch])
+        self.created += len(created)
+        self.skipped += skipped
+        self.processed += len(batch)
+        self.bytes += sum(entry.size for entry in batch)
+        if self.verbosity > 1:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            self.stdout.write(
+                f'{self.processed}/{self.total}: {self.processed / elapsed:.1f} файлов/с, '
+                f'{self.bytes / elapsed / 2 ** 20:.1f} МБ/с'
+            )
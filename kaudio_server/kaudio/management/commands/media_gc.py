@@ -0,0 +1,153 @@
+"""
+Команда обслуживания контентно-адресуемого хранилища медиафайлов.
+
+Пересчитывает счетчики ссылок MediaBlob по фактическим значениям файловых
+полей, удаляет объекты без ссылок и, по запросу, переносит файлы,
+сохраненные до дедупликации, в хранилище cas/.
+"""
+
+import os
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import FileField
+from django.utils import timezone
+
+from kaudio.models import MEDIA_MODELS, MediaBlob
+from kaudio.storage import CAS_PREFIX, get_media_storage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает ссылки на медиафайлы и удаляет файлы без ссылок'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--import-legacy',
+            action='store_true',
+            help='Перенести файлы со старыми путями в контентно-адресуемое хранилище'
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=3600,
+            help='Не удалять объекты моложе заданного количества секунд'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать изменения, ничего не удаляя'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        dry_run: bool = options['dry_run']
+        if options['import_legacy'] and not dry_run:
+            self.import_legacy()
+
+        # Объекты, созданные после начала подсчета, могут ссылаться на еще
+        # не зафиксированные строки, поэтому свежие объекты не проверяются
+        started = timezone.now()
+        references = self.count_references()
+        storage = get_media_storage()
+        updated = removed = 0
+
+        blobs = MediaBlob.objects.filter(created_at__lt=started - timedelta(seconds=options['grace']))
+        for blob in blobs.iterator(chunk_size=2000):
+            count = references.pop(blob.name, 0)
+            if count == blob.ref_count:
+                continue
+            if count == 0:
+                removed += 1
+                if not dry_run:
+                    self.remove(blob)
+            else:
+                updated += 1
+                if not dry_run:
+                    MediaBlob.objects.filter(pk=blob.pk).update(ref_count=count)
+
+        # Файлы, на которые есть ссылки, но нет записи (например, после восстановления из бэкапа)
+        for name, count in references.items():
+            if not storage.exists(name):
+                self.stderr.write(f'Файл отсутствует на диске: {name}')
+                continue
+            updated += 1
+            if not dry_run:
+                MediaBlob.objects.update_or_create(
+                    name=name,
+                    defaults={
+                        'sha256': os.path.splitext(os.path.basename(name))[0],
+                        'size': storage.size(name),
+                        'ref_count': count,
+                    }
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено счетчиков: {updated}, удалено объектов: {removed}'
+        ))
+
+    def remove(self, blob: MediaBlob) -> None:
+        """
+        Удаляет объект без ссылок, если с момента проверки ссылки не добавлялись.
+
+        Args:
+            blob: Объект со счетчиком, прочитанным при проверке
+        """
+        with transaction.atomic():
+            locked = MediaBlob.objects.select_for_update().filter(pk=blob.pk, ref_count=blob.ref_count).first()
+            if locked is None:
+                return
+            locked.delete()
+            get_media_storage().remove_blob(blob.name)
+
+    def count_references(self) -> Counter:
+        """
+        Считает ссылки на объекты хранилища во всех файловых полях.
+
+        Returns:
+            Counter: Количество ссылок по имени объекта
+        """
+        references: Counter = Counter()
+        for model in MEDIA_MODELS:
+            for field in model._meta.get_fields():
+                if not isinstance(field, FileField):
+                    continue
+                names = model.objects.filter(
+                    **{f'{field.attname}__startswith': f'{CAS_PREFIX}/'}
+                ).values_list(field.attname, flat=True)
+                references.update(names.iterator(chunk_size=2000))
+        return references
+
+    def import_legacy(self) -> None:
+        """
+        Переносит файлы со старыми путями в хранилище cas/.
+
+        Одинаковые файлы сохраняются один раз, исходные файлы удаляются
+        после обновления всех ссылающихся на них записей.
+        """
+        storage = get_media_storage()
+        moved: Dict[str, str] = {}
+
+        for model in MEDIA_MODELS:
+            for field in model._meta.get_fields():
+                if not isinstance(field, FileField):
+                    continue
+                rows = model.objects.exclude(**{f'{field.attname}__startswith': f'{CAS_PREFIX}/'}).exclude(
+                    **{field.attname: ''}
+                ).exclude(**{f'{field.attname}__isnull': True}).values_list('pk', field.attname)
+
+                for pk, name in rows.iterator(chunk_size=2000):
+                    if name not in moved:
+                        if not storage.exists(name):
+                            self.stderr.write(f'Файл отсутствует на диске: {name}')
+                            continue
+                        with storage.open(name, 'rb') as source:
+                            moved[name] = storage.save(name, File(source, name=name))
+                    # Счетчики ссылок выравниваются пересчетом после переноса
+                    model.objects.filter(pk=pk).update(**{field.attname: moved[name]})
+
+        for name in moved:
+            os.remove(storage.path(name))
+        self.stdout.write(f'Перенесено файлов: {len(moved)}')
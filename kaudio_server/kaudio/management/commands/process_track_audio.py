@@ -0,0 +1,240 @@
+"""
+Команда для пакетного расчета производных данных аудиофайлов треков.
+
+Файлы обрабатываются в пуле процессов: дочерние процессы только читают
+аудиофайлы и возвращают результат, запись в базу выполняет основной процесс.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from kaudio.models import Track, TrackWaveform
+from kaudio.tasks import save_track_preview
+from kaudio.utils.hls import PLAYLIST_NAME, hls_directory, package_track
+from kaudio.utils.preview import cut_preview_file
+from kaudio.utils.waveform import UnsupportedAudioFormat, compute_waveforms
+
+KINDS = ('waveform', 'hls', 'preview')
+
+
+def _waveform(job: Tuple[int, str, str, Tuple[int, ...]]) -> Tuple[int, str, Optional[Dict[int, bytes]], str]:
+    """
+    Вычисляет волновую форму одного трека в дочернем процессе.
+
+    Args:
+        job: ID трека, путь к файлу, версия аудиофайла и разрешения
+
+    Returns:
+        Tuple: ID трека, версия, пики по разрешению (или None) и текст ошибки
+    """
+    track_id, path, version, resolutions = job
+    try:
+        peaks, _ = compute_waveforms(path, resolutions)
+        return track_id, version, peaks, ''
+    except (UnsupportedAudioFormat, OSError) as e:
+        return track_id, version, None, str(e)
+
+
+def _hls(job: Tuple[int, str, str]) -> Tuple[int, str]:
+    """
+    Упаковывает один трек в HLS в дочернем процессе.
+
+    Args:
+        job: ID трека, путь к файлу и версия аудиофайла
+
+    Returns:
+        Tuple[int, str]: ID трека и текст ошибки
+    """
+    track_id, path, version = job
+    try:
+        package_track(path, track_id, version, settings.HLS_SEGMENT_DURATION)
+        return track_id, ''
+    except (UnsupportedAudioFormat, OSError) as e:
+        return track_id, str(e)
+
+
+def _preview(job: Tuple[int, str, str, float, Optional[float]]) -> Tuple[int, str, Optional[bytes], str]:
+    """
+    Вырезает превью одного трека в дочернем процессе.
+
+    Args:
+        job: ID трека, имя и путь аудиофайла, длительность и смещение превью
+
+    Returns:
+        Tuple: ID трека, имя аудиофайла, содержимое превью (или None) и текст ошибки
+    """
+    track_id, name, path, duration, offset = job
+    try:
+        return track_id, name, cut_preview_file(path, duration, offset), ''
+    except (UnsupportedAudioFormat, OSError) as e:
+        return track_id, name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает волновые формы, пакеты HLS и превью для аудиофайлов треков'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов (по умолчанию - число ядер)'
+        )
+        parser.add_argument(
+            '--kind',
+            choices=KINDS,
+            action='append',
+            help='Тип данных для расчета (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать данные для всех треков, а не только для отсутствующих'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        kinds = options['kind'] or KINDS
+        # Дочерние процессы не должны наследовать открытые соединения с базой
+        tracks = {kind: self.pending_tracks(kind, options['force']) for kind in kinds}
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            if 'waveform' in kinds:
+                self.process_waveforms(executor, tracks['waveform'])
+            if 'hls' in kinds:
+                self.process_hls(executor, tracks['hls'])
+            if 'preview' in kinds:
+                self.process_previews(executor, tracks['preview'])
+
+    def process_waveforms(self, executor: ProcessPoolExecutor, tracks: List[Track]) -> None:
+        """
+        Рассчитывает волновые формы и сохраняет их в базу.
+
+        Args:
+            executor: Пул процессов
+            tracks: Треки для обработки
+        """
+        resolutions = tuple(settings.WAVEFORM_RESOLUTIONS)
+        started = time.monotonic()
+        failed = 0
+        futures = [
+            executor.submit(_waveform, (track.pk, track.audio_file.path, track.audio_version, resolutions))
+            for track in tracks
+        ]
+        for future in as_completed(futures):
+            track_id, version, peaks, error = future.result()
+            if peaks is None:
+                failed += 1
+                self.stderr.write(f'Трек #{track_id}: {error}')
+                continue
+            with transaction.atomic():
+                TrackWaveform.objects.filter(track_id=track_id).delete()
+                TrackWaveform.objects.bulk_create([
+                    TrackWaveform(track_id=track_id, resolution=resolution, peaks=data, audio_version=version)
+                    for resolution, data in peaks.items()
+                ])
+        self.report('Волновые формы', len(tracks), failed, started)
+
+    def process_hls(self, executor: ProcessPoolExecutor, tracks: List[Track]) -> None:
+        """
+        Упаковывает треки в HLS.
+
+        Args:
+            executor: Пул процессов
+            tracks: Треки для обработки
+        """
+        started = time.monotonic()
+        failed = 0
+        futures = [
+            executor.submit(_hls, (track.pk, track.audio_file.path, track.audio_version))
+            for track in tracks
+        ]
+        for future in as_completed(futures):
+            track_id, error = future.result()
+            if error:
+                failed += 1
+                self.stderr.write(f'Трек #{track_id}: {error}')
+        self.report('HLS', len(tracks), failed, started)
+
+    def process_previews(self, executor: ProcessPoolExecutor, tracks: List[Track]) -> None:
+        """
+        Вырезает превью треков и сохраняет их.
+
+        Args:
+            executor: Пул процессов
+            tracks: Треки для обработки
+        """
+        started = time.monotonic()
+        failed = 0
+        futures = [
+            executor.submit(_preview, (
+                track.pk,
+                track.audio_file.name,
+                track.audio_file.path,
+                settings.TRACK_PREVIEW_DURATION,
+                settings.TRACK_PREVIEW_OFFSET
+            ))
+            for track in tracks
+        ]
+        for future in as_completed(futures):
+            track_id, name, content, error = future.result()
+            if content is None:
+                failed += 1
+                self.stderr.write(f'Трек #{track_id}: {error}')
+                continue
+            save_track_preview(track_id, name, content)
+        self.report('Превью', len(tracks), failed, started)
+
+    def report(self, title: str, total: int, failed: int, started: float) -> None:
+        """
+        Выводит итог обработки.
+
+        Args:
+            title: Тип данных
+            total: Количество треков
+            failed: Количество ошибок
+            started: Время начала (time.monotonic)
+        """
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: обработано треков {total}, с ошибками {failed}, '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def pending_tracks(self, kind: str, force: bool) -> List[Track]:
+        """
+        Находит треки, для которых нужно рассчитать данные.
+
+        Args:
+            kind: Тип данных (waveform, hls или preview)
+            force: Обрабатывать все треки с аудиофайлом
+
+        Returns:
+            List[Track]: Треки для обработки
+        """
+        tracks = Track.objects.exclude(audio_file='').exclude(audio_file__isnull=True).only(
+            'id', 'audio_file', 'preview_version'
+        )
+        if force:
+            return list(tracks.iterator(chunk_size=2000))
+
+        if kind == 'waveform':
+            ready = set(TrackWaveform.objects.values_list('track_id', 'audio_version').distinct())
+            return [
+                track for track in tracks.iterator(chunk_size=2000)
+                if (track.pk, track.audio_version) not in ready
+            ]
+        if kind == 'preview':
+            return [
+                track for track in tracks.iterator(chunk_size=2000)
+                if track.preview_version != track.audio_version
+            ]
+        return [
+            track for track in tracks.iterator(chunk_size=2000)
+            if not default_storage.exists(f'{hls_directory(track.pk, track.audio_version)}/{PLAYLIST_NAME}')
+        ]
@@ -0,0 +1,206 @@
+"""
+Команда для профилирования импорта и замера времени холодного старта.
+
+Каждый замер выполняется в отдельном интерпретаторе, запускаемом так же,
+как процесс веб-сервера (django.setup и загрузка URLconf с админкой)
+или воркер Celery (загрузка модулей задач). Профиль импорта строится
+по выводу python -X importtime.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Код запуска процесса каждого типа
+TARGETS = {
+    'web': (
+        'import django; django.setup(); '
+        'from importlib import import_module; from django.conf import settings; '
+        'import_module(settings.ROOT_URLCONF)'
+    ),
+    'worker': (
+        'import django; django.setup(); '
+        'from kaudio_server.celery_app import celery; celery.loader.import_default_modules()'
+    ),
+}
+
+IMPORTTIME_PREFIX = 'import time:'
+
+
+class ImportTiming(NamedTuple):
+    """
+    Время импорта одного модуля в микросекундах.
+    """
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """
+    Разбирает вывод python -X importtime.
+
+    Args:
+        output: Содержимое stderr интерпретатора
+
+    Returns:
+        List[ImportTiming]: Время импорта модулей в порядке завершения импорта
+    """
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith(IMPORTTIME_PREFIX):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len(IMPORTTIME_PREFIX):].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            # Строка заголовка таблицы
+            continue
+        stripped = name.lstrip()
+        # Вложенность импорта обозначается отступом по два пробела
+        depth = (len(name) - len(stripped) - 1) // 2
+        timings.append(ImportTiming(stripped.rstrip(), self_us, cumulative_us, depth))
+    return timings
+
+
+def package_totals(timings: List[ImportTiming]) -> Dict[str, int]:
+    """
+    Суммирует собственное время импорта по пакетам верхнего уровня.
+
+    Args:
+        timings: Время импорта модулей
+
+    Returns:
+        Dict[str, int]: Время в микросекундах по имени пакета
+    """
+    totals: Dict[str, int] = defaultdict(int)
+    for timing in timings:
+        totals[timing.module.split('.', 1)[0]] += timing.self_us
+    return dict(totals)
+
+
+class Command(BaseCommand):
+    help = 'Профилирует импорт модулей и замеряет время холодного старта процессов сервера'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--target',
+            choices=sorted(TARGETS),
+            default='web',
+            help='Тип процесса: web (сервер и админка) или worker (воркер Celery)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=25,
+            help='Количество самых дорогих модулей и пакетов в отчете'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=0,
+            help='Замерить холодный старт указанное количество раз вместо профиля импорта'
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            default=None,
+            help='Завершиться с ошибкой, если медианное время старта больше заданного'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        code = TARGETS[options['target']]
+        if options['repeat'] > 0:
+            self.benchmark(code, options['repeat'], options['max_ms'])
+        else:
+            self.profile(code, options['top'])
+
+    def run_target(self, code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+        """
+        Запускает процесс в новом интерпретаторе.
+
+        Args:
+            code: Код запуска процесса
+            importtime: Включить профилирование импорта
+
+        Returns:
+            subprocess.CompletedProcess: Результат выполнения
+
+        Raises:
+            CommandError: Если процесс завершился с ошибкой
+        """
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'kaudio_server.settings'
+        ))
+        result = subprocess.run(
+            command + ['-c', code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode:
+            tail = [line for line in result.stderr.splitlines() if not line.startswith(IMPORTTIME_PREFIX)]
+            raise CommandError('Процесс завершился с ошибкой:\n' + '\n'.join(tail[-20:]))
+        return result
+
+    def profile(self, code: str, top: int) -> None:
+        """
+        Выводит самые дорогие по импорту модули и пакеты.
+
+        Args:
+            code: Код запуска процесса
+            top: Количество строк в каждой таблице
+        """
+        timings = parse_importtime(self.run_target(code, importtime=True).stderr)
+        total = sum(timing.cumulative_us for timing in timings if timing.depth == 0)
+        self.stdout.write(f'Импортировано модулей: {len(timings)}, всего {total / 1000:.1f} мс')
+
+        self.stdout.write('\nМодули по суммарному времени (с вложенными импортами), мс:')
+        for timing in sorted(timings, key=lambda timing: timing.cumulative_us, reverse=True)[:top]:
+            self.stdout.write(
+                f'{timing.cumulative_us / 1000:>9.1f} {timing.self_us / 1000:>9.1f}  '
+                f'{"  " * timing.depth}{timing.module}'
+            )
+
+        self.stdout.write('\nПакеты по собственному времени модулей, мс:')
+        totals = package_totals(timings)
+        for package, self_us in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f'{self_us / 1000:>9.1f}  {package}')
+
+    def benchmark(self, code: str, repeat: int, max_ms: Optional[float] = None) -> None:
+        """
+        Замеряет время холодного старта процесса.
+
+        Args:
+            code: Код запуска процесса
+            repeat: Количество запусков
+            max_ms: Допустимое медианное время в миллисекундах
+
+        Raises:
+            CommandError: Если медиана превышает max_ms
+        """
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self.run_target(code)
+            durations.append((time.perf_counter() - started) * 1000)
+
+        median = statistics.median(durations)
+        self.stdout.write(self.style.SUCCESS(
+            f'Холодный старт ({repeat} запусков): медиана {median:.0f} мс, '
+            f'минимум {min(durations):.0f} мс, максимум {max(durations):.0f} мс'
+        ))
+        if max_ms is not None and median > max_ms:
+            raise CommandError(f'Медианное время старта {median:.0f} мс больше допустимого {max_ms:.0f} мс')
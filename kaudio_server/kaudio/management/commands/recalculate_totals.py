@@ -0,0 +1,47 @@
+"""
+Команда для пересчета итогов альбомов и плейлистов по всему каталогу.
+
+Итоги обновляются частями по диапазонам первичного ключа: каждая часть -
+один UPDATE с коррелированными подзапросами в отдельной транзакции.
+"""
+
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kaudio.totals import TOTALS, recalculate_in_chunks
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество треков и общую длительность альбомов и плейлистов'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--model',
+            choices=sorted(TOTALS),
+            action='append',
+            help='Модель для пересчета (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Количество объектов в одном UPDATE (по умолчанию TOTALS_CHUNK_SIZE)'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        chunk_size = options['chunk_size'] or settings.TOTALS_CHUNK_SIZE
+        for kind in options['model'] or sorted(TOTALS):
+            started = time.monotonic()
+
+            def on_chunk(done: int, total: int) -> None:
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{kind}: {done}/{total}')
+
+            updated = recalculate_in_chunks(TOTALS[kind], chunk_size=chunk_size, on_chunk=on_chunk)
+            self.stdout.write(self.style.SUCCESS(
+                f'{TOTALS[kind].model._meta.verbose_name_plural}: обновлено {updated}, '
+                f'за {time.monotonic() - started:.1f} с'
+            ))
@@ -0,0 +1,55 @@
+"""
+Команда для сверки денормализованных счетчиков с дочерними строками.
+
+Каталог обходится частями по диапазонам первичного ключа; в каждой части
+расхождения находятся одним SELECT, а пересчитываются только объекты
+с расхождением.
+"""
+
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kaudio.counters import counter_models, drifted_ids, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики альбомов, плейлистов и треков с данными и исправляет расхождения'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--model',
+            choices=sorted(counter_models()),
+            action='append',
+            help='Модель для сверки (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Количество объектов в одной части (по умолчанию TOTALS_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только посчитать объекты с расхождениями, не исправляя их'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        chunk_size = options['chunk_size'] or settings.TOTALS_CHUNK_SIZE
+        models = counter_models()
+        for kind in options['model'] or sorted(models):
+            model = models[kind]
+            started = time.monotonic()
+            if options['check']:
+                drift = len(drifted_ids(model.objects.all()))
+                self.stdout.write(f'{model._meta.verbose_name_plural}: расхождений {drift}')
+                continue
+
+            fixed = reconcile_counters(model, chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: исправлено {fixed}, '
+                f'за {time.monotonic() - started:.1f} с'
+            ))
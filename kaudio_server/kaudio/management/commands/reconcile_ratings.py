@@ -0,0 +1,53 @@
+"""
+Команда для сверки хранимых агрегатов оценок треков и альбомов с отзывами.
+
+Агрегаты пересчитываются частями по диапазонам первичного ключа: каждая
+часть - один UPDATE с коррелированными подзапросами в отдельной транзакции.
+"""
+
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kaudio.ratings import RATED_MODELS, count_drift, reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сумму, количество и распределение оценок треков и альбомов с отзывами'
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--model',
+            choices=sorted(RATED_MODELS),
+            action='append',
+            help='Модель для сверки (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Количество объектов в одном UPDATE (по умолчанию TOTALS_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только посчитать объекты с расхождениями, не исправляя их'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        chunk_size = options['chunk_size'] or settings.TOTALS_CHUNK_SIZE
+        for kind in options['model'] or sorted(RATED_MODELS):
+            model = RATED_MODELS[kind]
+            started = time.monotonic()
+            drift = count_drift(model.objects.all())
+            if options['check']:
+                self.stdout.write(f'{model._meta.verbose_name_plural}: расхождений {drift}')
+                continue
+
+            updated = reconcile_ratings(model, chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: расхождений {drift}, пересчитано {updated}, '
+                f'за {time.monotonic() - started:.1f} с'
+            ))
@@ -0,0 +1,560 @@
+"""
+Метрики в формате Prometheus, общие для всех процессов сервера.
+
+Каждый процесс (воркер gunicorn, процесс Celery) накапливает счетчики
+и гистограммы в памяти, а поток процесса раз в METRICS_FLUSH_INTERVAL
+секунд атомарно записывает их снимок в свой файл в METRICS_DIR.
+/metrics суммирует снимки всех процессов на машине, поэтому Prometheus
+видит общие значения, какой бы воркер ни ответил. Снимки завершившихся
+процессов переносятся в общий архив, и счетчики не уменьшаются при
+перезапуске воркеров; показатели-уровни (очередь записи) учитываются
+только для работающих процессов.
+
+Собираются:
+- длительность запросов по маршрутам (гистограмма), количество и время
+  SQL-запросов, байты отданных потоков - MetricsMiddleware;
+- попадания в кэш начала аудиофайлов и отклоненные запросы;
+- длина очереди записи процесса;
+- длина очередей Celery в брокере (при запросе /metrics) и длительность
+  задач Celery (сигналы воркера).
+
+Пример:
+    inc('kaudio_cache_requests_total', cache='audio_head', result='hit')
+"""
+
+import atexit
+import fcntl
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+from .sql_counter import QueryCounter, count_queries
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_NAME = 'archive.json'
+LOCK_NAME = '.lock'
+
+# Имя - тип и описание; порядок определяет порядок вывода
+METRICS: Dict[str, Tuple[str, str]] = {
+    'kaudio_http_request_duration_seconds': ('histogram', 'Длительность обработки запросов по маршрутам'),
+    'kaudio_sql_queries_total': ('counter', 'Количество SQL-запросов по маршрутам'),
+    'kaudio_sql_query_duration_seconds_total': ('counter', 'Суммарное время SQL-запросов по маршрутам'),
+    'kaudio_stream_bytes_total': ('counter', 'Байты отданных аудиофайлов и сегментов'),
+    'kaudio_cache_requests_total': ('counter', 'Обращения к кэшам по результату'),
+    'kaudio_cache_hit_ratio': ('gauge', 'Доля попаданий в кэш'),
+    'kaudio_requests_shed_total': ('counter', 'Запросы, отклоненные ограничением частоты и сбросом нагрузки'),
+    'kaudio_write_queue_backlog': ('gauge', 'Операции, ожидающие в очереди записи'),
+    'kaudio_celery_broker_up': ('gauge', 'Доступность брокера Celery'),
+    'kaudio_celery_queue_length': ('gauge', 'Задачи, ожидающие в очереди Celery'),
+    'kaudio_celery_task_duration_seconds': ('histogram', 'Длительность задач Celery'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_pid: Optional[int] = None
+_name: Optional[str] = None
+_dirty = False
+_gauges: List[List[Any]] = []
+_counters: Dict[Key, float] = {}
+# Количество наблюдений по верхним границам корзин (не накопленное) и сумма
+_histograms: Dict[Key, Tuple[Dict[str, int], List[float]]] = {}
+_task_started: Dict[str, float] = {}
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _start_process() -> None:
+    """
+    Начинает учет в текущем процессе.
+
+    Вызывается под _lock. Процесс, созданный fork, не наследует
+    значения родителя и получает собственный файл снимка и поток записи.
+    """
+    global _pid, _name, _dirty, _gauges
+    _pid = os.getpid()
+    _name = f'{_pid}-{uuid.uuid4().hex[:8]}.json'
+    _dirty = False
+    _gauges = []
+    _counters.clear()
+    _histograms.clear()
+    threading.Thread(target=_flush_loop, name='kaudio-metrics', daemon=True).start()
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    """
+    Увеличивает счетчик.
+
+    Args:
+        name: Имя счетчика
+        value: Приращение
+        **labels: Метки
+    """
+    global _dirty
+    if not settings.METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        if _pid != os.getpid():
+            _start_process()
+        _counters[key] = _counters.get(key, 0) + value
+        _dirty = True
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """
+    Добавляет наблюдение в гистограмму.
+
+    Args:
+        name: Имя гистограммы
+        value: Наблюдение
+        **labels: Метки
+    """
+    global _dirty
+    if not settings.METRICS_ENABLED:
+        return
+    bound = next((bound for bound in histogram_buckets(name) if value <= bound), None)
+    bucket = '+Inf' if bound is None else repr(float(bound))
+    key = (name, _labels(labels))
+    with _lock:
+        if _pid != os.getpid():
+            _start_process()
+        buckets, total = _histograms.setdefault(key, ({}, [0.0]))
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        total[0] += value
+        _dirty = True
+
+
+def histogram_buckets(name: str) -> Iterable[float]:
+    """
+    Возвращает верхние границы корзин гистограммы.
+
+    Args:
+        name: Имя гистограммы
+
+    Returns:
+        Iterable[float]: Границы по возрастанию
+    """
+    if name == 'kaudio_celery_task_duration_seconds':
+        return settings.METRICS_TASK_BUCKETS
+    return settings.METRICS_LATENCY_BUCKETS
+
+
+def process_gauges() -> List[List[Any]]:
+    """
+    Возвращает показатели-уровни текущего процесса.
+
+    Returns:
+        List[List[Any]]: Имя, метки и значение
+    """
+    from .write_queue import backlog
+
+    return [['kaudio_write_queue_backlog', [], backlog()]]
+
+
+def flush() -> None:
+    """Записывает снимок метрик текущего процесса, если они изменились."""
+    if _pid != os.getpid():
+        return
+    with _flush_lock:
+        _flush()
+
+
+def _flush() -> None:
+    global _dirty, _gauges
+    gauges = process_gauges()
+    with _lock:
+        # Уровни (очередь записи) меняются и без новых наблюдений
+        if not _dirty and gauges == _gauges:
+            return
+        snapshot = {
+            'pid': _pid,
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+            'histograms': [
+                [name, labels, dict(buckets), total[0]] for (name, labels), (buckets, total) in _histograms.items()
+            ],
+            'gauges': gauges,
+        }
+        path = os.path.join(settings.METRICS_DIR, _name)
+        _dirty = False
+        _gauges = gauges
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
+    except OSError:
+        logger.exception('Не удалось записать снимок метрик %s', path)
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+atexit.register(flush)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Samples:
+    """Значения метрик, суммированные по процессам."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Tuple[Dict[str, int], float]] = {}
+        self.gauges: Dict[Key, float] = {}
+
+    def add(self, snapshot: Dict[str, Any], gauges: bool = True) -> None:
+        """
+        Добавляет снимок процесса.
+
+        Args:
+            snapshot: Снимок
+            gauges: Учитывать уровни (только для работающих процессов)
+        """
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            self.counters[key] = self.counters.get(key, 0) + value
+        for name, labels, buckets, total in snapshot.get('histograms', []):
+            key = (name, tuple(map(tuple, labels)))
+            merged, merged_total = self.histograms.get(key, ({}, 0.0))
+            for bound, count in buckets.items():
+                merged[bound] = merged.get(bound, 0) + count
+            self.histograms[key] = (merged, merged_total + total)
+        for name, labels, value in snapshot.get('gauges', []) if gauges else []:
+            key = (name, tuple(map(tuple, labels)))
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики и гистограммы в формате снимка для архива.
+
+        Returns:
+            Dict[str, Any]: Снимок без уровней
+        """
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+            'histograms': [
+                [name, labels, buckets, total] for (name, labels), (buckets, total) in self.histograms.items()
+            ],
+        }
+
+
+def collect() -> Samples:
+    """
+    Суммирует снимки всех процессов.
+
+    Снимки завершившихся процессов переносятся в архив под блокировкой
+    каталога, чтобы параллельный сбор не учел их дважды.
+
+    Returns:
+        Samples: Суммированные значения
+    """
+    flush()
+    directory = settings.METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    samples = Samples()
+    with open(os.path.join(directory, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = Samples()
+        archive.add(_read(os.path.join(directory, ARCHIVE_NAME)) or {})
+        dead = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json') or name == ARCHIVE_NAME:
+                continue
+            snapshot = _read(os.path.join(directory, name))
+            if snapshot is None:
+                continue
+            if _process_alive(snapshot['pid']):
+                samples.add(snapshot)
+            else:
+                archive.add(snapshot, gauges=False)
+                dead.append(name)
+        if dead:
+            path = os.path.join(directory, ARCHIVE_NAME)
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump(archive.snapshot(), f)
+            os.replace(f'{path}.tmp', path)
+            for name in dead:
+                os.remove(os.path.join(directory, name))
+    samples.add(archive.snapshot())
+    return samples
+
+
+def reset_metrics() -> None:
+    """Удаляет снимки всех процессов и значения текущего процесса."""
+    global _dirty
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _dirty = False
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.json'):
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+def celery_queues() -> List[str]:
+    """
+    Возвращает очереди Celery из настроек маршрутизации.
+
+    Returns:
+        List[str]: Имена очередей
+    """
+    queues = {settings.CELERY_TASK_DEFAULT_QUEUE}
+    queues.update(route['queue'] for route in settings.CELERY_TASK_ROUTES.values() if 'queue' in route)
+    return sorted(queues)
+
+
+def celery_queue_lengths() -> Optional[Dict[str, int]]:
+    """
+    Возвращает длину очередей Celery в брокере Redis.
+
+    Returns:
+        Optional[Dict[str, int]]: Длина по очередям или None, если брокер недоступен
+    """
+    try:
+        import redis
+
+        client = redis.Redis.from_url(
+            settings.METRICS_CELERY_BROKER_URL, socket_connect_timeout=0.2, socket_timeout=0.2
+        )
+        queues = celery_queues()
+        pipeline = client.pipeline()
+        for queue in queues:
+            pipeline.llen(queue)
+        return dict(zip(queues, pipeline.execute()))
+    except Exception as e:
+        logger.warning('Брокер Celery недоступен для метрик: %s', e)
+        return None
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_metrics() -> str:
+    """
+    Формирует ответ /metrics в текстовом формате Prometheus.
+
+    Returns:
+        str: Метрики всех процессов
+    """
+    samples = collect()
+    gauges = samples.gauges
+
+    cache_requests: Dict[str, Dict[str, float]] = {}
+    for (name, labels), value in samples.counters.items():
+        if name == 'kaudio_cache_requests_total':
+            labels = dict(labels)
+            cache_requests.setdefault(labels['cache'], {})[labels['result']] = value
+    for cache, results in cache_requests.items():
+        total = sum(results.values())
+        if total:
+            gauges[('kaudio_cache_hit_ratio', (('cache', cache),))] = results.get('hit', 0) / total
+
+    if settings.METRICS_CELERY_BROKER_URL:
+        lengths = celery_queue_lengths()
+        gauges[('kaudio_celery_broker_up', ())] = 0 if lengths is None else 1
+        for queue, length in (lengths or {}).items():
+            gauges[('kaudio_celery_queue_length', (('queue', queue),))] = length
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        if kind == 'histogram':
+            series = {key: value for key, value in samples.histograms.items() if key[0] == name}
+        else:
+            series = {key: value for key, value in (samples.counters if kind == 'counter' else gauges).items() if key[0] == name}
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (_, labels), value in sorted(series.items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            buckets, total = value
+            bounds = sorted(float(bound) for bound in buckets if bound != '+Inf')
+            cumulative = 0
+            for bound in bounds:
+                cumulative += buckets[repr(bound)]
+                lines.append(f'{name}_bucket{_format_labels([*labels, ("le", repr(bound))])} {cumulative}')
+            count = cumulative + buckets.get('+Inf', 0)
+            lines.append(f'{name}_bucket{_format_labels([*labels, ("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Отдает метрики Prometheus.
+
+    Доступ - с адресов METRICS_ALLOWED_IPS, с токеном METRICS_TOKEN
+    (Authorization: Bearer) или для сотрудников.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        HttpResponse: Метрики или 403
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    user = getattr(request, 'user', None)
+    if not (
+        request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        or (token and hmac.compare_digest(authorization, f'Bearer {token}'))
+        or (user is not None and user.is_staff)
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def route_name(request: HttpRequest) -> str:
+    """
+    Возвращает метку маршрута запроса.
+
+    Args:
+        request: Запрос
+
+    Returns:
+        str: Имя маршрута, шаблон пути или unmatched
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """
+    Учитывает длительность запросов, SQL-запросы и байты отданных потоков.
+
+    Стоит первым, чтобы учитывать и запросы, отклоненные сбросом
+    нагрузки. Статика и медиа не учитываются. Байты потоков берутся
+    из Content-Length ответа: разорванные клиентом соединения
+    учитываются целиком.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.exempt = tuple(prefix for prefix in (settings.STATIC_URL, settings.MEDIA_URL) if prefix)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(self.exempt):
+            return self.get_response(request)
+        started = time.perf_counter()
+        with count_queries() as counter:
+            response = self.get_response(request)
+        self.record(request, response, counter, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> Any:
+        if request.path.startswith(self.exempt):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        with count_queries() as counter:
+            response = await self.get_response(request)
+        self.record(request, response, counter, time.perf_counter() - started)
+        return response
+
+    def record(self, request: HttpRequest, response: Any, counter: QueryCounter, duration: float) -> None:
+        """
+        Учитывает обработанный запрос.
+
+        Args:
+            request: Запрос
+            response: Ответ
+            counter: SQL-запросы, выполненные при обработке
+            duration: Длительность обработки в секундах
+        """
+        route = route_name(request)
+        observe(
+            'kaudio_http_request_duration_seconds',
+            duration,
+            method=request.method,
+            route=route,
+            status=response.status_code
+        )
+        if counter.count:
+            inc('kaudio_sql_queries_total', counter.count, route=route)
+            inc('kaudio_sql_query_duration_seconds_total', counter.duration, route=route)
+        if response.streaming and response.has_header('Content-Length'):
+            inc('kaudio_stream_bytes_total', int(response['Content-Length']), route=route)
+
+
+@task_prerun.connect
+def _task_prerun(task_id: Optional[str] = None, **kwargs: Any) -> None:
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id: Optional[str] = None, task: Any = None, state: Optional[str] = None, **kwargs: Any) -> None:
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        observe(
+            'kaudio_celery_task_duration_seconds',
+            time.perf_counter() - started,
+            task=getattr(task, 'name', 'unknown'),
+            state=state or 'UNKNOWN'
+        )
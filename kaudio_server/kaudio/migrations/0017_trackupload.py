@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:08
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0016_remove_track_unique_track_title_in_album_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('upload_length', models.PositiveBigIntegerField(verbose_name='Размер файла (байт)')),
+                ('offset', models.PositiveBigIntegerField(default=0, verbose_name='Загружено (байт)')),
+                ('metadata', models.JSONField(blank=True, default=dict, verbose_name='Метаданные трека')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('track', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='kaudio.track', verbose_name='Трек')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка трека',
+                'verbose_name_plural': 'Загрузки треков',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:11
+
+import kaudio.models
+import kaudio.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0017_trackupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь в хранилище')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер (байт)')),
+                ('ref_count', models.PositiveIntegerField(default=1, verbose_name='Количество ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Медиаобъект',
+                'verbose_name_plural': 'Медиаобъекты',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='album',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to=kaudio.models.get_album_image_path, verbose_name='Изображение обложки'),
+        ),
+        migrations.AlterField(
+            model_name='artist',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to=kaudio.models.get_artist_image_path, verbose_name='Изображение обложки'),
+        ),
+        migrations.AlterField(
+            model_name='playlist',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to=kaudio.models.get_playlist_image_path, verbose_name='Изображение обложки'),
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='audio_file',
+            field=models.FileField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to='tracks/', verbose_name='Аудиофайл'),
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to=kaudio.models.get_track_image_path, verbose_name='Изображение обложки'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=kaudio.storage.get_media_storage, upload_to=kaudio.models.get_profile_image_path, verbose_name='Изображение профиля'),
+        ),
+    ]
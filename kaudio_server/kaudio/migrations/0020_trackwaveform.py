@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0019_album_image_variants_artist_image_variants_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackWaveform',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(verbose_name='Количество точек')),
+                ('peaks', models.BinaryField(verbose_name='Пики (int8, пары min/max)')),
+                ('audio_version', models.CharField(max_length=12, verbose_name='Версия аудиофайла')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waveforms', to='kaudio.track', verbose_name='Трек')),
+            ],
+            options={
+                'verbose_name': 'Волновая форма',
+                'verbose_name_plural': 'Волновые формы',
+                'ordering': ['track', 'resolution'],
+                'unique_together': {('track', 'resolution')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:25
+
+import kaudio.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0020_trackwaveform'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='preview_file',
+            field=models.FileField(blank=True, editable=False, null=True, storage=kaudio.storage.get_media_storage, upload_to='track_previews/', verbose_name='Превью'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='preview_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12, verbose_name='Версия аудиофайла превью'),
+        ),
+    ]
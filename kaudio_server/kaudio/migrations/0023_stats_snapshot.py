@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0022_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Ключ')),
+                ('data', models.JSONField(default=dict, verbose_name='Данные')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+            ],
+            options={
+                'verbose_name': 'Снимок статистики',
+                'verbose_name_plural': 'Снимки статистики',
+                'ordering': ['key'],
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:46
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """Заполняет агрегаты оценок по существующим отзывам."""
+    for model_name, review_name, field in (('Track', 'TrackReview', 'track'), ('Album', 'AlbumReview', 'album')):
+        model = apps.get_model('kaudio', model_name)
+        review_model = apps.get_model('kaudio', review_name)
+        aggregates = defaultdict(dict)
+        rows = review_model.objects.values_list(f'{field}_id', 'rating').annotate(count=Count('id')).order_by()
+        for target_id, rating, count in rows.iterator():
+            aggregates[target_id][rating] = count
+        for target_id, counts in aggregates.items():
+            model.objects.filter(pk=target_id).update(
+                rating_sum=sum(rating * count for rating, count in counts.items()),
+                rating_count=sum(counts.values()),
+                **{f'rating_{rating}': count for rating, count in counts.items()}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0023_stats_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0024_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['release_date'], name='kaudio_albu_release_dc6983_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['play_count'], name='kaudio_trac_play_co_179ba0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['likes_count'], name='kaudio_trac_likes_c_c9f12d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['release_date'], name='kaudio_trac_release_66ba4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['avg_rating'], name='kaudio_trac_avg_rat_2c0a69_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', 'activity_type', 'track'], name='kaudio_user_user_id_3c7839_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['track', 'activity_type', 'timestamp'], name='kaudio_user_track_i_4fb48e_idx'),
+        ),
+        # Прежние индексы удаляются после создания покрывающих их составных
+        migrations.RemoveIndex(
+            model_name='useractivity',
+            name='kaudio_user_user_id_beacb0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='useractivity',
+            name='kaudio_user_track_i_9d3e47_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='useractivity',
+            name='kaudio_user_album_i_c4a0ef_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0025_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='unsupported_audio_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12, verbose_name='Версия аудиофайла неподдерживаемого формата'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0026_track_unsupported_audio_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='enqueued_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Постановка в очередь'),
+        ),
+    ]
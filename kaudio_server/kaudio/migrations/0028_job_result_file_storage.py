@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-19 19:19
+
+import os
+import shutil
+
+import kaudio.storage
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_result_files(apps, schema_editor):
+    """Переносит файлы результатов задач из публичного MEDIA_ROOT в JOB_RESULTS_DIR."""
+    Job = apps.get_model('kaudio', 'Job')
+    names = Job.objects.exclude(result_file='').exclude(result_file=None).values_list('result_file', flat=True)
+    for name in names.iterator():
+        source = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(source):
+            continue
+        target = os.path.join(settings.JOB_RESULTS_DIR, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(source, target)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaudio', '0027_job_enqueued_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, null=True, storage=kaudio.storage.get_job_result_storage, upload_to='jobs/', verbose_name='Файл результата'),
+        ),
+        migrations.RunPython(move_result_files, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,30 @@
+import hashlib
 import os
+import uuid
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
+from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
 from django.core.files.storage import default_storage
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.db.models import Avg
-from typing import Optional, Any, Dict, List, Union
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.db.models import Case, F, QuerySet, When
+from django.db.models.functions import Cast, Greatest
+from django.db.models.lookups import GreaterThan
+from typing import Optional, Any, Dict, Iterator, List, NamedTuple, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
 from django.core.files import File
 from django.core.files.temp import NamedTemporaryFile
 from urllib.request import urlopen
 
 from .managers import UserActivityManager, TrackManager
+from .storage import CAS_PREFIX, get_job_result_storage, get_media_storage
+from .utils.hls import remove_hls_packages
 
 
 def get_artist_image_path(instance: 'Artist', filename: str) -> str:
@@ -103,6 +113,7 @@ class User(AbstractUser):
     
     profile_image = models.ImageField(
         upload_to=get_profile_image_path,
+        storage=get_media_storage,
         verbose_name='Изображение профиля',
         null=True,
         blank=True
@@ -113,6 +124,11 @@ class User(AbstractUser):
         default='user',
         verbose_name=_('Роль')
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Уменьшенные копии изображения')
+    )
     
     @property
     def img_profile_url(self) -> Optional[str]:
@@ -194,10 +210,16 @@ class Artist(models.Model):
     )
     cover_image = models.ImageField(
         upload_to=get_artist_image_path,
+        storage=get_media_storage,
         verbose_name=_('Изображение обложки'),
         blank=True,
         null=True
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Уменьшенные копии изображения')
+    )
     is_verified = models.BooleanField(
         default=False,
         verbose_name=_('Верифицирован')
@@ -274,7 +296,72 @@ class Genre(models.Model):
         return self.title
 
 
-class Album(models.Model):
+class RatingAggregates(models.Model):
+    """
+    Абстрактная модель хранимых агрегатов оценок.
+    
+    Сумма, количество и распределение оценок 1-5 обновляются атомарными
+    приращениями при создании, изменении и удалении отзывов, поэтому
+    средний рейтинг и гистограмма читаются без агрегации отзывов.
+    """
+    
+    RATING_VALUES = range(1, 6)
+    
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Сумма оценок')
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Количество оценок')
+    )
+    rating_1 = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценок 1')
+    )
+    rating_2 = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценок 2')
+    )
+    rating_3 = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценок 3')
+    )
+    rating_4 = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценок 4')
+    )
+    rating_5 = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценок 5')
+    )
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def average_rating(self) -> Optional[float]:
+        """
+        Средняя оценка по хранимым агрегатам.
+        
+        Returns:
+            Optional[float]: Средняя оценка или None, если оценок нет
+        """
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+    
+    def rating_distribution(self) -> Dict[int, int]:
+        """
+        Распределение оценок по хранимым агрегатам.
+        
+        Returns:
+            Dict[int, int]: Количество отзывов по каждой оценке от 1 до 5
+        """
+        return {value: getattr(self, f'rating_{value}') for value in self.RATING_VALUES}
+
+
+class Album(RatingAggregates):
     """
     Модель альбома.
     
@@ -297,10 +384,16 @@ class Album(models.Model):
     )
     cover_image = models.ImageField(
         upload_to=get_album_image_path,
+        storage=get_media_storage,
         verbose_name=_('Изображение обложки'),
         blank=True,
         null=True
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Уменьшенные копии изображения')
+    )
     total_tracks = models.PositiveIntegerField(
         default=0,
         verbose_name=_('Всего треков')
@@ -328,6 +421,9 @@ class Album(models.Model):
         verbose_name = _('Альбом')
         verbose_name_plural = _('Альбомы')
         ordering = ['-release_date']
+        indexes = [
+            models.Index(fields=['release_date']),
+        ]
     
     def __str__(self) -> str:
         """
@@ -339,7 +435,7 @@ class Album(models.Model):
         return self.title
 
 
-class Track(models.Model):
+class Track(RatingAggregates):
     """
     Модель трека.
     
@@ -367,6 +463,7 @@ class Track(models.Model):
     )
     audio_file = models.FileField(
         upload_to='tracks/',
+        storage=get_media_storage,
         verbose_name=_('Аудиофайл'),
         null=True,
         blank=True
@@ -383,6 +480,7 @@ class Track(models.Model):
     )
     cover_image = models.ImageField(
         upload_to=get_track_image_path,
+        storage=get_media_storage,
         verbose_name=_('Изображение обложки'),
         blank=True,
         null=True
@@ -423,6 +521,28 @@ class Track(models.Model):
         default=None,
         verbose_name=_('Средний рейтинг')
     )
+    preview_file = models.FileField(
+        upload_to='track_previews/',
+        storage=get_media_storage,
+        verbose_name=_('Превью'),
+        null=True,
+        blank=True,
+        editable=False
+    )
+    preview_version = models.CharField(
+        max_length=12,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name=_('Версия аудиофайла превью')
+    )
+    unsupported_audio_version = models.CharField(
+        max_length=12,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name=_('Версия аудиофайла неподдерживаемого формата')
+    )
     
     objects = TrackManager()
     
@@ -430,6 +550,12 @@ class Track(models.Model):
         verbose_name = _('Трек')
         verbose_name_plural = _('Треки')
         ordering = ['album', 'track_number']
+        indexes = [
+            models.Index(fields=['play_count']),
+            models.Index(fields=['likes_count']),
+            models.Index(fields=['release_date']),
+            models.Index(fields=['avg_rating']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['album', 'track_number'],
@@ -450,6 +576,22 @@ class Track(models.Model):
         """
         return self.title
 
+    @property
+    def audio_version(self) -> str:
+        """
+        Возвращает короткий идентификатор текущего аудиофайла.
+        
+        Меняется при замене аудиофайла и используется в URL производных
+        данных (волновой формы, сегментов HLS), чтобы их можно было
+        кэшировать бессрочно.
+        
+        Returns:
+            str: Идентификатор версии или пустая строка, если файла нет
+        """
+        if not self.audio_file:
+            return ''
+        return hashlib.sha1(self.audio_file.name.encode()).hexdigest()[:12]
+
     def clean(self) -> None:
         """
         Валидация модели трека.
@@ -477,6 +619,362 @@ class Track(models.Model):
             })
 
 
+class TrackWaveform(models.Model):
+    """
+    Модель предрасчитанной волновой формы трека.
+    
+    Хранит пары пиков (min, max) в формате int8 для одного разрешения.
+    Для каждого трека хранится несколько разрешений.
+    """
+    
+    track = models.ForeignKey(
+        Track,
+        on_delete=models.CASCADE,
+        related_name='waveforms',
+        verbose_name=_('Трек')
+    )
+    resolution = models.PositiveIntegerField(
+        verbose_name=_('Количество точек')
+    )
+    peaks = models.BinaryField(
+        verbose_name=_('Пики (int8, пары min/max)')
+    )
+    audio_version = models.CharField(
+        max_length=12,
+        verbose_name=_('Версия аудиофайла')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    
+    class Meta:
+        verbose_name = _('Волновая форма')
+        verbose_name_plural = _('Волновые формы')
+        ordering = ['track', 'resolution']
+        unique_together = ['track', 'resolution']
+    
+    def __str__(self) -> str:
+        """
+        Строковое представление волновой формы.
+        
+        Returns:
+            str: Название трека и разрешение
+        """
+        return f'{self.track} ({self.resolution})'
+
+
+class TrackUpload(models.Model):
+    """
+    Модель сессии возобновляемой загрузки трека.
+    
+    Хранит объявленный размер файла, текущее смещение и метаданные трека,
+    пока аудиофайл загружается частями по протоколу tus.
+    Трек создается только после получения последнего байта.
+    """
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='track_uploads',
+        verbose_name=_('Пользователь')
+    )
+    filename = models.CharField(
+        max_length=255,
+        verbose_name=_('Имя файла')
+    )
+    upload_length = models.PositiveBigIntegerField(
+        verbose_name=_('Размер файла (байт)')
+    )
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_('Загружено (байт)')
+    )
+    metadata = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Метаданные трека')
+    )
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name=_('SHA-256')
+    )
+    track = models.OneToOneField(
+        Track,
+        on_delete=models.SET_NULL,
+        related_name='upload',
+        verbose_name=_('Трек'),
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Дата обновления')
+    )
+    
+    class Meta:
+        verbose_name = _('Загрузка трека')
+        verbose_name_plural = _('Загрузки треков')
+        ordering = ['-created_at']
+    
+    def __str__(self) -> str:
+        """
+        Строковое представление загрузки.
+        
+        Returns:
+            str: Имя файла и прогресс загрузки
+        """
+        return f'{self.filename} ({self.offset}/{self.upload_length})'
+
+    @property
+    def is_complete(self) -> bool:
+        """
+        Проверяет, получены ли все байты файла.
+        
+        Returns:
+            bool: True, если смещение достигло объявленного размера
+        """
+        return self.offset >= self.upload_length
+
+
+class MediaBlob(models.Model):
+    """
+    Модель объекта контентно-адресуемого хранилища.
+    
+    Хранит SHA-256 содержимого и количество ссылок на файл
+    из полей моделей. Файл удаляется с диска, когда ссылок не остается.
+    """
+    
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name=_('Путь в хранилище')
+    )
+    sha256 = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name=_('SHA-256')
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name=_('Размер (байт)')
+    )
+    ref_count = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_('Количество ссылок')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    
+    class Meta:
+        verbose_name = _('Медиаобъект')
+        verbose_name_plural = _('Медиаобъекты')
+        ordering = ['-created_at']
+    
+    def __str__(self) -> str:
+        """
+        Строковое представление медиаобъекта.
+        
+        Returns:
+            str: Путь в хранилище и количество ссылок
+        """
+        return f'{self.name} ({self.ref_count})'
+
+
+class Job(models.Model):
+    """
+    Модель фоновой задачи.
+    
+    Хранит параметры, состояние, прогресс и результат задачи,
+    выполняемой воркером Celery. Ключ идемпотентности не дает
+    поставить одну и ту же работу в очередь дважды.
+    """
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _('В очереди')),
+        (STATUS_RUNNING, _('Выполняется')),
+        (STATUS_SUCCEEDED, _('Выполнена')),
+        (STATUS_FAILED, _('Ошибка')),
+    ]
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    kind = models.CharField(
+        max_length=100,
+        verbose_name=_('Тип задачи')
+    )
+    queue = models.CharField(
+        max_length=50,
+        verbose_name=_('Очередь')
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Параметры')
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name=_('Ключ идемпотентности')
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='jobs',
+        verbose_name=_('Пользователь'),
+        null=True,
+        blank=True
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True,
+        verbose_name=_('Статус')
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Прогресс (%)')
+    )
+    progress_message = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Этап')
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name=_('Результат')
+    )
+    result_file = models.FileField(
+        upload_to='jobs/',
+        storage=get_job_result_storage,
+        verbose_name=_('Файл результата'),
+        null=True,
+        blank=True
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name=_('Ошибка')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    enqueued_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Постановка в очередь')
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Начало выполнения')
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Окончание выполнения')
+    )
+    
+    class Meta:
+        verbose_name = _('Фоновая задача')
+        verbose_name_plural = _('Фоновые задачи')
+        ordering = ['-created_at']
+    
+    def __str__(self) -> str:
+        """
+        Строковое представление задачи.
+        
+        Returns:
+            str: Тип и статус задачи
+        """
+        return f'{self.kind} ({self.get_status_display()})'
+    
+    @property
+    def is_finished(self) -> bool:
+        """
+        Проверяет, завершена ли задача.
+        
+        Returns:
+            bool: True для выполненной или завершенной с ошибкой задачи
+        """
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+    
+    def set_progress(self, done: int, total: int, message: str = '') -> None:
+        """
+        Сохраняет прогресс выполнения.
+        
+        Запись в базу выполняется только при изменении процента или этапа.
+        
+        Args:
+            done: Выполнено единиц работы
+            total: Всего единиц работы
+            message: Описание текущего этапа
+        """
+        progress = min(100, done * 100 // total) if total else 0
+        if progress == self.progress and message == self.progress_message:
+            return
+        self.progress = progress
+        self.progress_message = message
+        Job.objects.filter(pk=self.pk).update(progress=progress, progress_message=message)
+
+
+class StatsSnapshot(models.Model):
+    """
+    Модель снимка статистики для административной панели.
+    
+    Агрегаты по всей таблице пересчитываются периодической задачей,
+    а страницы админки читают готовый снимок одним запросом.
+    """
+    
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name=_('Ключ')
+    )
+    data = models.JSONField(
+        default=dict,
+        verbose_name=_('Данные')
+    )
+    computed_at = models.DateTimeField(
+        verbose_name=_('Дата расчета')
+    )
+    
+    class Meta:
+        verbose_name = _('Снимок статистики')
+        verbose_name_plural = _('Снимки статистики')
+        ordering = ['key']
+    
+    def __str__(self) -> str:
+        """
+        Строковое представление снимка.
+        
+        Returns:
+            str: Ключ и дата расчета
+        """
+        return f'{self.key} ({self.computed_at:%Y-%m-%d %H:%M})'
+
+
 class Playlist(models.Model):
     """
     Модель плейлиста.
@@ -497,6 +995,7 @@ class Playlist(models.Model):
     )
     cover_image = models.ImageField(
         upload_to=get_playlist_image_path,
+        storage=get_media_storage,
         verbose_name=_('Изображение обложки'),
         blank=True,
         null=True
@@ -615,11 +1114,12 @@ class UserActivity(models.Model):
         verbose_name = _('Активность пользователя')
         verbose_name_plural = _('Активности пользователей')
         ordering = ['-timestamp']
+        # Индексы по track и album создаются для внешних ключей,
+        # (user, activity_type) покрывается составным индексом ниже
         indexes = [
-            models.Index(fields=['user', 'activity_type']),
+            models.Index(fields=['user', 'activity_type', 'track']),
+            models.Index(fields=['track', 'activity_type', 'timestamp']),
             models.Index(fields=['timestamp']),
-            models.Index(fields=['track']),
-            models.Index(fields=['album']),
         ]
     
     def __str__(self) -> str:
@@ -670,57 +1170,6 @@ class UserActivity(models.Model):
                 'artist': 'Для подписки на исполнителя должен быть указан исполнитель'
             })
 
-    def save(self, *args: Any, **kwargs: Any) -> None:
-        """
-        Переопределенный метод сохранения.
-        
-        Обновляет статистику связанных объектов при сохранении активности.
-        
-        Args:
-            *args: Позиционные аргументы
-            **kwargs: Именованные аргументы
-        """
-        if self.activity_type == 'play' and self.track:
-            self.track.play_count += 1
-            self.track.save(update_fields=['play_count'])
-        
-        elif self.activity_type == 'like' and self.track:
-            self.track.likes_count += 1
-            self.track.save(update_fields=['likes_count'])
-        
-        elif self.activity_type == 'like_album' and self.album:
-            self.album.likes_count += 1
-            self.album.save(update_fields=['likes_count'])
-        
-        super().save(*args, **kwargs)
-
-    def delete(self, *args: Any, **kwargs: Any) -> tuple[int, Dict[str, int]]:
-        """
-        Переопределенный метод удаления.
-        
-        Обновляет статистику связанных объектов при удалении активности.
-        
-        Args:
-            *args: Позиционные аргументы
-            **kwargs: Именованные аргументы
-            
-        Returns:
-            tuple[int, Dict[str, int]]: Результат удаления
-        """
-        if self.activity_type == 'play' and self.track:
-            self.track.play_count = max(0, self.track.play_count - 1)
-            self.track.save(update_fields=['play_count'])
-        
-        elif self.activity_type == 'like' and self.track:
-            self.track.likes_count = max(0, self.track.likes_count - 1)
-            self.track.save(update_fields=['likes_count'])
-        
-        elif self.activity_type == 'like_album' and self.album:
-            self.album.likes_count = max(0, self.album.likes_count - 1)
-            self.album.save(update_fields=['likes_count'])
-        
-        return super().delete(*args, **kwargs)
-
 
 class Subscribe(models.Model):
     """
@@ -1100,19 +1549,566 @@ class AlbumReview(Review):
         unique_together = ('author', 'album')
 
 
-@receiver([post_save, post_delete], sender=TrackReview)
-def update_track_rating(sender: Any, instance: TrackReview, **kwargs: Any) -> None:
+# Модель отзыва -> поле оцениваемого объекта
+RATED_REVIEWS = {TrackReview: 'track', AlbumReview: 'album'}
+
+
+def track_avg_rating(rating_sum: Any, rating_count: Any) -> Case:
+    """
+    Выражение среднего рейтинга трека для UPDATE.
+    
+    Args:
+        rating_sum: Выражение суммы оценок
+        rating_count: Выражение количества оценок
+        
+    Returns:
+        Case: Средний рейтинг или NULL, если оценок нет
+    """
+    return Case(
+        When(
+            GreaterThan(rating_count, 0),
+            then=Cast(rating_sum * 1.0 / rating_count, models.DecimalField(max_digits=3, decimal_places=2))
+        ),
+        default=None
+    )
+
+
+def apply_rating_delta(
+    model: Any,
+    pk: Optional[int],
+    added: Optional[int] = None,
+    removed: Optional[int] = None
+) -> None:
     """
-    Сигнал для обновления среднего рейтинга трека.
+    Атомарно изменяет агрегаты оценок объекта одним UPDATE.
     
-    Вызывается при сохранении или удалении отзыва на трек.
+    Args:
+        model: Модель оцениваемого объекта (Track или Album)
+        pk: ID объекта
+        added: Добавленная оценка
+        removed: Удаленная оценка
+    """
+    if pk is None or added == removed:
+        return
+    count = (added is not None) - (removed is not None)
+    total = (added or 0) - (removed or 0)
+    changes = {
+        'rating_sum': F('rating_sum') + total,
+        'rating_count': F('rating_count') + count,
+    }
+    if added is not None:
+        changes[f'rating_{added}'] = F(f'rating_{added}') + 1
+    if removed is not None:
+        changes[f'rating_{removed}'] = F(f'rating_{removed}') - 1
+    if model is Track:
+        # Правые части UPDATE видят значения до изменения
+        changes['avg_rating'] = track_avg_rating(F('rating_sum') + total, F('rating_count') + count)
+    model.objects.filter(pk=pk).update(**changes)
+
+
+def _review_snapshot(instance: Review, field: str) -> tuple:
+    """
+    Возвращает объект и оценку отзыва, загруженные из базы.
+    
+    Args:
+        instance: Отзыв
+        field: Поле оцениваемого объекта
+        
+    Returns:
+        tuple: ID объекта и оценка (None для отложенных полей)
+    """
+    values = instance.__dict__
+    return values.get(f'{field}_id'), values.get('rating')
+
+
+def remember_review_rating(sender: Any, instance: Review, **kwargs: Any) -> None:
+    """
+    Сигнал для запоминания оценки отзыва при загрузке.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Экземпляр отзыва
+        **kwargs: Дополнительные аргументы
+    """
+    instance._rating_snapshot = _review_snapshot(instance, RATED_REVIEWS[sender])
+
+
+def update_rating_on_save(sender: Any, instance: Review, created: bool, **kwargs: Any) -> None:
+    """
+    Сигнал для обновления агрегатов оценок при создании или изменении отзыва.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Экземпляр отзыва
+        created: Создан ли отзыв
+        **kwargs: Дополнительные аргументы
+    """
+    field = RATED_REVIEWS[sender]
+    model = sender._meta.get_field(field).related_model
+    target_id, rating = _review_snapshot(instance, field)
+    if created:
+        apply_rating_delta(model, target_id, added=rating)
+    else:
+        old_target_id, old_rating = instance._rating_snapshot
+        if old_target_id is None or old_rating is None:
+            # Отзыв загружен с отложенными полями: прежняя оценка неизвестна
+            from .ratings import reconcile_ratings
+            reconcile_ratings(model, ids=[target_id])
+        elif old_target_id == target_id:
+            apply_rating_delta(model, target_id, added=rating, removed=old_rating)
+        else:
+            apply_rating_delta(model, old_target_id, removed=old_rating)
+            apply_rating_delta(model, target_id, added=rating)
+    instance._rating_snapshot = (target_id, rating)
+
+
+def update_rating_on_delete(sender: Any, instance: Review, **kwargs: Any) -> None:
+    """
+    Сигнал для обновления агрегатов оценок при удалении отзыва.
     
     Args:
         sender: Отправитель сигнала
         instance: Экземпляр отзыва
         **kwargs: Дополнительные аргументы
     """
-    track = instance.track
-    avg_rating = track.reviews.aggregate(avg=Avg('rating'))['avg']
-    track.avg_rating = avg_rating
-    track.save(update_fields=['avg_rating'])
+    field = RATED_REVIEWS[sender]
+    model = sender._meta.get_field(field).related_model
+    origin = kwargs.get('origin')
+    if isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model):
+        # Отзывы удаляются каскадом вместе с самим объектом
+        return
+    target_id, rating = instance._rating_snapshot
+    if target_id is None or rating is None:
+        target_id = getattr(instance, f'{field}_id')
+        from .ratings import reconcile_ratings
+        # Удаленный отзыв уже не учитывается при пересчете
+        reconcile_ratings(model, ids=[target_id])
+        return
+    apply_rating_delta(model, target_id, removed=rating)
+
+
+def _connect_rating_signals() -> None:
+    """
+    Подключает обработчики оценок к моделям RATED_REVIEWS.
+    
+    Обработчики подключаются с sender, чтобы не вызываться при загрузке
+    и сохранении экземпляров остальных моделей проекта.
+    """
+    for review_model in RATED_REVIEWS:
+        uid = f'rating_aggregates:{review_model._meta.label}'
+        post_init.connect(remember_review_rating, sender=review_model, dispatch_uid=uid)
+        post_save.connect(update_rating_on_save, sender=review_model, dispatch_uid=uid)
+        post_delete.connect(update_rating_on_delete, sender=review_model, dispatch_uid=uid)
+
+
+_connect_rating_signals()
+
+
+class CounterCache(NamedTuple):
+    """
+    Описание денормализованного счетчика родительского объекта.
+    
+    Счетчик равен количеству дочерних строк (value=None) или сумме
+    поля value дочерних строк, удовлетворяющих условиям conditions
+    (точное равенство полей дочерней модели). Путь value может вести
+    через внешний ключ (track__duration): такое значение учитывается
+    при добавлении и удалении строки, а его последующие изменения
+    исправляет сверка.
+    """
+    child: Any
+    foreign_key: str
+    counter: str
+    value: Optional[str] = None
+    conditions: Optional[Dict[str, Any]] = None
+    
+    @property
+    def parent(self) -> Any:
+        """
+        Модель объекта, хранящего счетчик.
+        
+        Returns:
+            Any: Родительская модель
+        """
+        return self.child._meta.get_field(self.foreign_key).related_model
+
+
+COUNTER_CACHES: List[CounterCache] = []
+
+
+def counter_cache(
+    child: Any,
+    foreign_key: str,
+    counter: str,
+    value: Optional[str] = None,
+    **conditions: Any
+) -> CounterCache:
+    """
+    Объявляет счетчик, поддерживаемый атомарными приращениями.
+    
+    При создании, изменении и удалении дочерней строки счетчик родителя
+    меняется одним UPDATE с F-выражением, без пересчета по всем строкам.
+    
+    Args:
+        child: Дочерняя модель
+        foreign_key: Внешний ключ дочерней модели на родителя
+        counter: Поле счетчика родительской модели
+        value: Суммируемое поле дочерней строки (None - количество строк)
+        **conditions: Условия учета строки
+        
+    Returns:
+        CounterCache: Описание счетчика
+    """
+    cache = CounterCache(child, foreign_key, counter, value, conditions or None)
+    COUNTER_CACHES.append(cache)
+    uid = f'counter_cache:{child._meta.label}'
+    post_init.connect(remember_counter_values, sender=child, dispatch_uid=uid)
+    post_save.connect(update_counters_on_save, sender=child, dispatch_uid=uid)
+    post_delete.connect(update_counters_on_delete, sender=child, dispatch_uid=uid)
+    return cache
+
+
+def _counter_caches(child: Any) -> List[CounterCache]:
+    """
+    Возвращает счетчики, зависящие от дочерней модели.
+    
+    Args:
+        child: Дочерняя модель
+        
+    Returns:
+        List[CounterCache]: Счетчики
+    """
+    return [cache for cache in COUNTER_CACHES if cache.child is child]
+
+
+# Вклад по пути через внешний ключ, который не загружался при чтении строки
+UNRESOLVED = object()
+
+
+def _counter_contribution(cache: CounterCache, instance: models.Model, resolve: bool) -> Optional[tuple]:
+    """
+    Вычисляет вклад дочерней строки в счетчик.
+    
+    Значения читаются из __dict__, чтобы не загружать отложенные поля.
+    
+    Args:
+        cache: Счетчик
+        instance: Дочерняя строка
+        resolve: Загрузить значение по пути через внешний ключ (иначе UNRESOLVED)
+        
+    Returns:
+        Optional[tuple]: ID родителя и вклад; (None, 0), если строка не учитывается;
+            None, если поля строки не загружены
+    """
+    values = instance.__dict__
+    attname = cache.child._meta.get_field(cache.foreign_key).attname
+    names = [attname, *(cache.conditions or {})]
+    if cache.value is not None and '__' not in cache.value:
+        names.append(cache.value)
+    if any(name not in values for name in names):
+        return None
+    
+    parent_id = values[attname]
+    if parent_id is None or any(values[name] != expected for name, expected in (cache.conditions or {}).items()):
+        return (None, 0)
+    if cache.value is None:
+        return (parent_id, 1)
+    if '__' not in cache.value:
+        return (parent_id, values[cache.value] or 0)
+    if not resolve:
+        return (parent_id, UNRESOLVED)
+    value: Any = instance
+    try:
+        for name in cache.value.split('__'):
+            value = getattr(value, name)
+    except ObjectDoesNotExist:
+        value = None
+    return (parent_id, value or 0)
+
+
+# Приращения счетчиков открытых блоков defer_counter_updates (от внешнего к внутреннему)
+_deferred_counter_deltas: ContextVar[tuple] = ContextVar('kaudio_deferred_counter_deltas', default=())
+
+
+@contextmanager
+def defer_counter_updates() -> Iterator[Dict[tuple, Dict[str, int]]]:
+    """
+    Откладывает обновление счетчиков до конца блока.
+    
+    Приращения от строк, измененных в блоке, суммируются и при выходе
+    применяются одним UPDATE на родительский объект; во вложенном блоке
+    они передаются внешнему. Если блок завершился исключением,
+    приращения отбрасываются вместе с его изменениями.
+    
+    Yields:
+        Dict[tuple, Dict[str, int]]: Накопленные приращения по (модель, ID) и полю счетчика
+    """
+    deltas: Dict[tuple, Dict[str, int]] = {}
+    token = _deferred_counter_deltas.set(_deferred_counter_deltas.get() + (deltas,))
+    try:
+        yield deltas
+    finally:
+        _deferred_counter_deltas.reset(token)
+    _apply_counter_deltas(deltas)
+
+
+def _apply_counter_deltas(deltas: Dict[tuple, Dict[str, int]]) -> None:
+    """
+    Применяет приращения счетчиков: один UPDATE на родительский объект.
+    
+    Внутри defer_counter_updates приращения только накапливаются.
+    
+    Args:
+        deltas: Приращения по (модель, ID) и полю счетчика
+    """
+    deferred = _deferred_counter_deltas.get()
+    if deferred:
+        for key, changes in deltas.items():
+            target = deferred[-1].setdefault(key, {})
+            for counter, delta in changes.items():
+                target[counter] = target.get(counter, 0) + delta
+        return
+    for (model, pk), changes in deltas.items():
+        expressions = {}
+        for counter, delta in changes.items():
+            if delta > 0:
+                expressions[counter] = F(counter) + delta
+            elif delta < 0:
+                # Счетчик, уже разошедшийся с данными, не уходит ниже нуля
+                expressions[counter] = Greatest(F(counter) + delta, 0)
+        if expressions:
+            model.objects.filter(pk=pk).update(**expressions)
+
+
+def _add_delta(deltas: Dict[tuple, Dict[str, int]], cache: CounterCache, contribution: tuple, sign: int) -> None:
+    """
+    Добавляет вклад строки в накапливаемые приращения.
+    
+    Args:
+        deltas: Приращения по (модель, ID) и полю счетчика
+        cache: Счетчик
+        contribution: ID родителя и вклад
+        sign: 1 для добавления, -1 для удаления
+    """
+    parent_id, value = contribution
+    if parent_id is None or not value:
+        return
+    changes = deltas.setdefault((cache.parent, parent_id), {})
+    changes[cache.counter] = changes.get(cache.counter, 0) + sign * value
+
+
+def remember_counter_values(sender: Any, instance: models.Model, **kwargs: Any) -> None:
+    """
+    Сигнал для запоминания вклада строки в счетчики при загрузке.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Дочерняя строка
+        **kwargs: Дополнительные аргументы
+    """
+    instance._counter_snapshot = [
+        _counter_contribution(cache, instance, resolve=False) for cache in _counter_caches(sender)
+    ]
+
+
+def update_counters_on_save(sender: Any, instance: models.Model, created: bool, **kwargs: Any) -> None:
+    """
+    Сигнал для обновления счетчиков при создании или изменении дочерней строки.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Дочерняя строка
+        created: Создана ли строка
+        **kwargs: Дополнительные аргументы
+    """
+    deltas: Dict[tuple, Dict[str, int]] = {}
+    stale = set()
+    snapshot = getattr(instance, '_counter_snapshot', [])
+    for index, cache in enumerate(_counter_caches(sender)):
+        new = _counter_contribution(cache, instance, resolve=created)
+        if created:
+            if new is not None:
+                _add_delta(deltas, cache, new, 1)
+            continue
+        
+        old = snapshot[index] if index < len(snapshot) else None
+        if old is None or new is None:
+            # Строка загружена с отложенными полями: прежний вклад неизвестен
+            attname = sender._meta.get_field(cache.foreign_key).attname
+            stale.add((cache.parent, old[0] if old is not None else getattr(instance, attname)))
+        elif UNRESOLVED in (old[1], new[1]):
+            # Вклад по внешнему ключу не пересчитывается, пока строка у того же родителя
+            if old[0] != new[0]:
+                stale.update({(cache.parent, old[0]), (cache.parent, new[0])})
+        elif old != new:
+            _add_delta(deltas, cache, old, -1)
+            _add_delta(deltas, cache, new, 1)
+    _apply_counter_deltas(deltas)
+    
+    if stale:
+        from .counters import reconcile_counters
+        for parent, parent_id in stale:
+            if parent_id is not None:
+                reconcile_counters(parent, ids=[parent_id])
+    remember_counter_values(sender, instance)
+
+
+def update_counters_on_delete(sender: Any, instance: models.Model, **kwargs: Any) -> None:
+    """
+    Сигнал для обновления счетчиков при удалении дочерней строки.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Дочерняя строка
+        **kwargs: Дополнительные аргументы
+    """
+    origin = kwargs.get('origin')
+    deltas: Dict[tuple, Dict[str, int]] = {}
+    snapshot = getattr(instance, '_counter_snapshot', [])
+    for index, cache in enumerate(_counter_caches(sender)):
+        parent = cache.parent
+        if isinstance(origin, parent) or (isinstance(origin, QuerySet) and origin.model is parent):
+            # Строки удаляются каскадом вместе с самим родителем
+            continue
+        old = snapshot[index] if index < len(snapshot) else None
+        if old is None or old[1] is UNRESOLVED:
+            old = _counter_contribution(cache, instance, resolve=True)
+        if old is not None:
+            _add_delta(deltas, cache, old, -1)
+    _apply_counter_deltas(deltas)
+
+
+counter_cache(Track, 'album', 'total_tracks')
+counter_cache(Track, 'album', 'total_duration', value='duration')
+counter_cache(PlaylistTrack, 'playlist', 'total_tracks')
+counter_cache(PlaylistTrack, 'playlist', 'total_duration', value='track__duration')
+counter_cache(UserActivity, 'track', 'play_count', activity_type='play')
+counter_cache(UserActivity, 'track', 'likes_count', activity_type='like')
+counter_cache(UserActivity, 'album', 'likes_count', activity_type='like_album')
+
+
+MEDIA_MODELS = (User, Artist, Album, Track, Playlist)
+
+# Поля изображений, для которых создаются уменьшенные копии
+IMAGE_VARIANT_FIELDS = {
+    User: 'profile_image',
+    Artist: 'cover_image',
+    Album: 'cover_image',
+}
+
+
+def _media_field_names(instance: models.Model) -> Dict[str, Optional[str]]:
+    """
+    Возвращает имена файлов во всех файловых полях экземпляра.
+    
+    Значения читаются напрямую из __dict__, чтобы не загружать
+    отложенные поля дополнительными запросами.
+    
+    Args:
+        instance: Экземпляр модели с файловыми полями
+        
+    Returns:
+        Dict[str, Optional[str]]: Имя поля и имя файла в хранилище
+    """
+    names: Dict[str, Optional[str]] = {}
+    for field in instance._meta.get_fields():
+        if isinstance(field, models.FileField) and field.attname in instance.__dict__:
+            value = instance.__dict__[field.attname]
+            names[field.attname] = getattr(value, 'name', value) or None
+    return names
+
+
+def _release_media(names: List[str]) -> None:
+    """
+    Освобождает ссылки на объекты хранилища после фиксации транзакции.
+    
+    Args:
+        names: Имена файлов, на которые больше нет ссылок
+    """
+    storage = get_media_storage()
+    for name in names:
+        if name and name.startswith(f'{CAS_PREFIX}/'):
+            transaction.on_commit(lambda name=name: storage.delete(name))
+
+
+def remember_media_files(sender: Any, instance: models.Model, **kwargs: Any) -> None:
+    """
+    Сигнал для запоминания файлов, загруженных вместе с экземпляром.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Экземпляр модели
+        **kwargs: Дополнительные аргументы
+    """
+    instance._media_snapshot = _media_field_names(instance)
+
+
+def handle_media_changes(sender: Any, instance: models.Model, **kwargs: Any) -> None:
+    """
+    Сигнал для обработки замененных файлов.
+    
+    Освобождает ссылки на прежние файлы и ставит в очередь создание
+    уменьшенных копий для новых изображений, волновой формы, пакета
+    HLS и превью для нового аудиофайла.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Экземпляр модели
+        **kwargs: Дополнительные аргументы
+    """
+    previous = getattr(instance, '_media_snapshot', {})
+    current = _media_field_names(instance)
+    changed = [
+        attname for attname, name in previous.items()
+        if attname in current and current[attname] != name
+    ]
+    _release_media([previous[attname] for attname in changed])
+    instance._media_snapshot = current
+    if kwargs.get('created'):
+        # Файл мог быть сохранен в хранилище заранее и передан по имени
+        changed = [attname for attname, name in current.items() if name]
+    
+    from .jobs import submit_job, track_audio_job_key
+    from .tasks import enqueue, generate_image_variants
+    variant_field = IMAGE_VARIANT_FIELDS.get(sender)
+    if variant_field in changed:
+        enqueue(generate_image_variants, sender._meta.label, instance.pk, variant_field)
+    if sender is Track and 'audio_file' in changed:
+        submit_job(
+            'process_track_audio',
+            {'track_id': instance.pk},
+            idempotency_key=track_audio_job_key(instance.pk)
+        )
+
+
+def release_deleted_media(sender: Any, instance: models.Model, **kwargs: Any) -> None:
+    """
+    Сигнал для освобождения ссылок на файлы удаленного экземпляра.
+    
+    Для треков также удаляются пакеты HLS.
+    
+    Args:
+        sender: Отправитель сигнала
+        instance: Экземпляр модели
+        **kwargs: Дополнительные аргументы
+    """
+    _release_media(list(_media_field_names(instance).values()))
+    if sender is Track:
+        track_id = instance.pk
+        transaction.on_commit(lambda: remove_hls_packages(track_id))
+
+
+def _connect_media_signals() -> None:
+    """
+    Подключает обработчики файлов к моделям MEDIA_MODELS.
+    
+    Обработчики подключаются с sender, чтобы не вызываться при загрузке
+    и сохранении экземпляров остальных моделей проекта.
+    """
+    for model in MEDIA_MODELS:
+        uid = f'media_files:{model._meta.label}'
+        post_init.connect(remember_media_files, sender=model, dispatch_uid=uid)
+        post_save.connect(handle_media_changes, sender=model, dispatch_uid=uid)
+        post_delete.connect(release_deleted_media, sender=model, dispatch_uid=uid)
+
+
+_connect_media_signals()
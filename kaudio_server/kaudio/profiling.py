@@ -0,0 +1,446 @@
+"""
+Профилирование отдельных запросов по требованию.
+
+ProfilingMiddleware профилирует запрос с вероятностью
+PROFILING_SAMPLE_RATE или по заголовку PROFILING_HEADER от сотрудника
+(сессия или токен API). Режим PROFILING_MODE:
+- cprofile - детерминированный профиль вызовов cProfile;
+- sample - статистический: отдельный поток снимает стек потока запроса
+  каждые PROFILING_SAMPLE_INTERVAL секунд, запрос почти не замедляется.
+Время SQL собирается по формам запросов (литералы заменены на ?).
+
+Профиль сохраняется в PROFILING_DIR как JSON-отчет (для cProfile еще и
+файл .prof для pstats/snakeviz); хранятся последние PROFILING_MAX_FILES
+профилей. Список, скачивание и сравнение профилей - в админке.
+
+При PROFILING_ENABLED = False middleware исключается из цепочки при
+запуске (MiddlewareNotUsed) и не добавляет накладных расходов. Под ASGI
+cProfile видит только синхронную часть обработки.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .sql_counter import QueryCounter, count_queries
+
+# Время создания в начале: идентификаторы упорядочены по времени
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-\d{6}-[0-9a-f]{6}$')
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+
+def function_name(filename: str, line: int, name: str) -> str:
+    """
+    Формирует имя функции в отчете, одинаковое для обоих режимов.
+
+    Args:
+        filename: Файл
+        line: Строка определения
+        name: Имя функции
+
+    Returns:
+        str: Имя вида файл:строка(функция)
+    """
+    return f'{filename}:{line}({name})'
+
+
+class SqlTimer(QueryCounter):
+    """Обертка выполнения SQL, собирающая количество и время по формам запросов."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Загружается только при профилировании
+        from .index_advisor import normalize_sql
+
+        self.normalize = normalize_sql
+        self.statements: Dict[str, List[float]] = {}
+
+    def observe(self, sql: str, duration: float) -> None:
+        super().observe(sql, duration)
+        entry = self.statements.setdefault(self.normalize(sql), [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def report(self, top: int) -> Dict[str, Any]:
+        """
+        Формирует раздел SQL отчета.
+
+        Args:
+            top: Количество форм запросов в отчете
+
+        Returns:
+            Dict[str, Any]: Общее количество и время, самые дорогие формы запросов
+        """
+        ordered = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'count': self.count,
+            'time_ms': round(self.duration * 1000, 3),
+            'statements': [
+                {'sql': sql, 'count': int(count), 'time_ms': round(duration * 1000, 3)}
+                for sql, (count, duration) in ordered[:top]
+            ],
+        }
+
+
+class StackSampler:
+    """
+    Статистический профилировщик потока.
+
+    Args:
+        thread_id: Идентификатор профилируемого потока
+        interval: Интервал снятия стека в секундах
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='kaudio-profiler', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(function_name(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def report(self, top: int) -> Dict[str, Any]:
+        """
+        Формирует раздел функций отчета.
+
+        Время функций оценивается как количество снимков, умноженное
+        на интервал: собственное - где функция на вершине стека, общее -
+        где она есть в стеке.
+
+        Args:
+            top: Количество функций в отчете
+
+        Returns:
+            Dict[str, Any]: Количество снимков, функции и свернутые стеки
+        """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        interval_ms = self.interval * 1000
+        return {
+            'samples': sum(self.stacks.values()),
+            'interval_ms': interval_ms,
+            'functions': [
+                {
+                    'function': name,
+                    'calls': None,
+                    'tottime_ms': round(own[name] * interval_ms, 3),
+                    'cumtime_ms': round(count * interval_ms, 3),
+                }
+                for name, count in total.most_common(top)
+            ],
+            # Формат свернутых стеков flamegraph.pl / speedscope
+            'stacks': [
+                {'stack': ';'.join(stack), 'count': count}
+                for stack, count in self.stacks.most_common(top)
+            ],
+        }
+
+
+def cprofile_report(profiler: cProfile.Profile, top: int) -> Dict[str, Any]:
+    """
+    Формирует раздел функций отчета по профилю cProfile.
+
+    Args:
+        profiler: Профилировщик после выполнения запроса
+        top: Количество функций в отчете
+
+    Returns:
+        Dict[str, Any]: Функции с наибольшим общим временем
+    """
+    stats = pstats.Stats(profiler).stats
+    ordered = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return {
+        'functions': [
+            {
+                'function': function_name(*key),
+                'calls': calls,
+                'tottime_ms': round(tottime * 1000, 3),
+                'cumtime_ms': round(cumtime * 1000, 3),
+            }
+            for key, (_, calls, tottime, cumtime, _) in ordered[:top]
+        ],
+    }
+
+
+def profile_path(profile_id: str, extension: str = 'json') -> str:
+    """
+    Возвращает путь к файлу профиля.
+
+    Args:
+        profile_id: Идентификатор профиля
+        extension: json или prof
+
+    Returns:
+        str: Путь к файлу
+
+    Raises:
+        ValueError: Если идентификатор некорректен
+    """
+    if not PROFILE_ID.match(profile_id) or extension not in ('json', 'prof'):
+        raise ValueError(f'Некорректный профиль: {profile_id}')
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.{extension}')
+
+
+def save_profile(report: Dict[str, Any], profiler: Optional[cProfile.Profile] = None) -> str:
+    """
+    Сохраняет профиль и удаляет самые старые сверх PROFILING_MAX_FILES.
+
+    Args:
+        report: Отчет
+        profiler: Профилировщик cProfile для сохранения файла .prof
+
+    Returns:
+        str: Идентификатор профиля
+    """
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profile_id = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}'
+    report = dict(report, id=profile_id, has_prof=profiler is not None)
+    if profiler is not None:
+        profiler.dump_stats(profile_path(profile_id, 'prof'))
+    path = profile_path(profile_id)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    # Список профилей не видит недописанный файл
+    os.replace(f'{path}.tmp', path)
+    rotate_profiles()
+    return profile_id
+
+
+def profile_ids() -> List[str]:
+    """
+    Возвращает идентификаторы сохраненных профилей, новые первыми.
+
+    Returns:
+        List[str]: Идентификаторы
+    """
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-5] for name in names if name.endswith('.json') and PROFILE_ID.match(name[:-5])]
+    return sorted(ids, reverse=True)
+
+
+def rotate_profiles() -> None:
+    """Удаляет самые старые профили сверх PROFILING_MAX_FILES."""
+    for profile_id in profile_ids()[settings.PROFILING_MAX_FILES:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(profile_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def load_profile(profile_id: str) -> Dict[str, Any]:
+    """
+    Загружает отчет профиля.
+
+    Args:
+        profile_id: Идентификатор профиля
+
+    Returns:
+        Dict[str, Any]: Отчет
+
+    Raises:
+        ValueError: Если идентификатор некорректен
+        FileNotFoundError: Если профиль удален
+    """
+    with open(profile_path(profile_id), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """
+    Возвращает сводки сохраненных профилей, новые первыми.
+
+    Returns:
+        List[Dict[str, Any]]: Отчеты без разделов функций и стеков
+    """
+    summaries = []
+    for profile_id in profile_ids():
+        try:
+            report = load_profile(profile_id)
+        except (OSError, ValueError):
+            # Удален при ротации другим процессом
+            continue
+        summaries.append({key: value for key, value in report.items() if key not in ('functions', 'stacks')})
+    return summaries
+
+
+def _diff_rows(before: Dict[str, Dict], after: Dict[str, Dict], metric: str, top: int) -> List[Dict[str, Any]]:
+    rows = []
+    for key in set(before) | set(after):
+        old = before.get(key, {}).get(metric, 0.0)
+        new = after.get(key, {}).get(metric, 0.0)
+        rows.append({'name': key, 'before': old, 'after': new, 'delta': round(new - old, 3)})
+    rows.sort(key=lambda row: abs(row['delta']), reverse=True)
+    return rows[:top]
+
+
+def diff_profiles(before: Dict[str, Any], after: Dict[str, Any], top: int = 50) -> Dict[str, Any]:
+    """
+    Сравнивает два профиля по функциям и формам SQL.
+
+    Функции сравниваются по общему времени, формы SQL - по суммарному
+    времени; строки упорядочены по модулю изменения.
+
+    Args:
+        before: Отчет первого профиля
+        after: Отчет второго профиля
+        top: Количество строк в каждом разделе
+
+    Returns:
+        Dict[str, Any]: Изменение длительности, функций и SQL
+    """
+    return {
+        'duration_ms': {
+            'before': before['duration_ms'],
+            'after': after['duration_ms'],
+            'delta': round(after['duration_ms'] - before['duration_ms'], 3),
+        },
+        'sql_count': {'before': before['sql']['count'], 'after': after['sql']['count']},
+        'functions': _diff_rows(
+            {row['function']: row for row in before.get('functions', [])},
+            {row['function']: row for row in after.get('functions', [])},
+            'cumtime_ms',
+            top,
+        ),
+        'sql': _diff_rows(
+            {row['sql']: row for row in before['sql']['statements']},
+            {row['sql']: row for row in after['sql']['statements']},
+            'time_ms',
+            top,
+        ),
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует выбранные запросы и сохраняет профили.
+
+    Должен стоять после AuthenticationMiddleware: профилирование
+    по заголовку доступно только сотрудникам.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        forced = self.forced(request)
+        if not forced and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        response, profile_id = self.profile(request)
+        if forced and profile_id is not None:
+            response[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    def forced(self, request: HttpRequest) -> bool:
+        """
+        Проверяет, запросил ли профилирование сотрудник.
+
+        Args:
+            request: Запрос
+
+        Returns:
+            bool: Есть заголовок PROFILING_HEADER и пользователь - сотрудник
+        """
+        if settings.PROFILING_HEADER not in request.headers:
+            return False
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # Клиенты API передают токен, который DRF проверит только в представлении
+            try:
+                user, _ = TokenAuthentication().authenticate(request) or (None, None)
+            except AuthenticationFailed:
+                return False
+        return user is not None and user.is_staff
+
+    def profile(self, request: HttpRequest) -> Tuple[HttpResponse, Optional[str]]:
+        """
+        Выполняет запрос под профилировщиком и сохраняет профиль.
+
+        Args:
+            request: Запрос
+
+        Returns:
+            Tuple[HttpResponse, Optional[str]]: Ответ и идентификатор профиля
+        """
+        top = settings.PROFILING_TOP
+        timer = SqlTimer()
+        profiler = None
+        started = time.perf_counter()
+        with count_queries(timer):
+            if settings.PROFILING_MODE == 'sample':
+                sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+                sampler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    sampler.stop()
+                functions = sampler.report(top)
+            else:
+                profiler = cProfile.Profile()
+                try:
+                    response = profiler.runcall(self.get_response, request)
+                except ValueError:
+                    # Профилировщик уже запущен в этом потоке (например, отладчиком)
+                    return self.get_response(request), None
+                functions = cprofile_report(profiler, top)
+        duration = time.perf_counter() - started
+
+        user = getattr(request, 'user', None)
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': user.get_username() if user is not None and user.is_authenticated else None,
+            'mode': 'sample' if profiler is None else 'cprofile',
+            'duration_ms': round(duration * 1000, 3),
+            'sql': timer.report(top),
+            **functions,
+        }
+        try:
+            return response, save_profile(report, profiler)
+        except OSError:
+            # Профиль не должен ломать сам запрос
+            return response, None
@@ -0,0 +1,103 @@
+"""
+Сверка хранимых агрегатов оценок треков и альбомов с отзывами.
+
+В обычной работе агрегаты (сумма, количество и распределение оценок)
+меняются приращениями в сигналах отзывов. Сверка пересчитывает их
+по таблицам отзывов set-based UPDATE с коррелированными подзапросами,
+например после массовых операций в обход сигналов.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from django.db import models
+from django.db.models import Count, OuterRef, Q, QuerySet, Sum
+
+from .models import Album, AlbumReview, RatingAggregates, Track, TrackReview, track_avg_rating
+from .counters import aggregate_subquery, update_in_chunks
+
+RATED_MODELS: Dict[str, Type[RatingAggregates]] = {
+    'track': Track,
+    'album': Album,
+}
+
+# Оцениваемая модель -> модель отзыва и ее поле оцениваемого объекта
+REVIEW_MODELS: Dict[Type[RatingAggregates], Tuple[Type[models.Model], str]] = {
+    Track: (TrackReview, 'track'),
+    Album: (AlbumReview, 'album'),
+}
+
+
+def _actual_aggregates(model: Type[RatingAggregates]) -> Dict[str, models.Expression]:
+    """
+    Формирует подзапросы фактических агрегатов оценок по отзывам.
+
+    Args:
+        model: Track или Album
+
+    Returns:
+        Dict[str, models.Expression]: Выражение по имени поля агрегата
+    """
+    review_model, field = REVIEW_MODELS[model]
+    reviews = review_model.objects.filter(**{field: OuterRef('pk')})
+    actual = {
+        'rating_sum': aggregate_subquery(reviews, field, Sum('rating')),
+        'rating_count': aggregate_subquery(reviews, field, Count('pk')),
+    }
+    for value in RatingAggregates.RATING_VALUES:
+        actual[f'rating_{value}'] = aggregate_subquery(reviews, field, Count('pk', filter=Q(rating=value)))
+    return actual
+
+
+def update_ratings(queryset: QuerySet) -> int:
+    """
+    Пересчитывает агрегаты оценок объектов одним UPDATE.
+
+    Args:
+        queryset: Треки или альбомы
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    changes = _actual_aggregates(queryset.model)
+    if queryset.model is Track:
+        changes['avg_rating'] = track_avg_rating(changes['rating_sum'], changes['rating_count'])
+    return queryset.update(**changes)
+
+
+def count_drift(queryset: QuerySet) -> int:
+    """
+    Считает объекты, хранимые агрегаты которых расходятся с отзывами.
+
+    Args:
+        queryset: Треки или альбомы
+
+    Returns:
+        int: Количество объектов с расхождением
+    """
+    actual = _actual_aggregates(queryset.model)
+    annotated = queryset.annotate(**{f'actual_{name}': expression for name, expression in actual.items()})
+    matches = Q()
+    for name in actual:
+        matches &= Q(**{name: models.F(f'actual_{name}')})
+    return annotated.exclude(matches).count()
+
+
+def reconcile_ratings(
+    model: Type[RatingAggregates],
+    ids: Optional[List[int]] = None,
+    chunk_size: int = 5000,
+    on_chunk: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    Пересчитывает агрегаты оценок частями.
+
+    Args:
+        model: Track или Album
+        ids: ID объектов (None - все объекты)
+        chunk_size: Количество объектов в одном UPDATE
+        on_chunk: Вызывается с количеством обновленных и общим количеством объектов
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    return update_in_chunks(model, update_ratings, ids, chunk_size, on_chunk)
@@ -0,0 +1,261 @@
+"""
+Маршрутизация чтения на реплики базы данных.
+
+Запросы безопасными методами (GET, HEAD, OPTIONS) читают с реплики
+из DATABASE_REPLICAS, остальные - с основной базы. После первой записи
+запрос до конца читает с основной базы, а в ответ ставится cookie,
+по которой следующие запросы клиента в течение REPLICA_PIN_SECONDS тоже
+идут на основную базу: клиент всегда видит собственные изменения.
+
+Отставание каждой реплики проверяется не чаще раза в
+REPLICA_LAG_CHECK_INTERVAL секунд; реплики с отставанием больше
+REPLICA_MAX_LAG или недоступные пропускаются, а если подходящих нет,
+чтение идет на основную базу. Фоновые расчеты (статистика, экспорт)
+включают чтение с реплик явно через use_replica().
+"""
+
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Отставание реплики PostgreSQL в секундах; 0, если все полученные изменения применены
+_POSTGRESQL_LAG = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+# Время проверки и отставание по псевдониму реплики (None - реплика недоступна)
+_lag_checks: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+class RoutingState:
+    """Маршрутизация текущего запроса или фоновой задачи."""
+
+    def __init__(self, replica: bool, sticky: bool) -> None:
+        # Разрешено ли чтение с реплики
+        self.replica = replica
+        # Переключаться ли на основную базу после записи
+        self.sticky = sticky
+        self.wrote = False
+        self.alias: Optional[str] = None
+
+    @property
+    def pinned(self) -> bool:
+        return not self.replica or (self.sticky and self.wrote)
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar('kaudio_db_routing', default=None)
+
+
+def replica_lag(alias: str) -> Optional[float]:
+    """
+    Измеряет отставание реплики.
+
+    Для баз без встроенной репликации (например, копии SQLite при локальной
+    проверке) проверяется только доступность, отставание считается нулевым.
+
+    Args:
+        alias: Псевдоним реплики
+
+    Returns:
+        Optional[float]: Отставание в секундах или None, если реплика недоступна
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(_POSTGRESQL_LAG)
+                return float(cursor.fetchone()[0] or 0)
+            cursor.execute('SELECT 1')
+            return 0.0
+    except DatabaseError as e:
+        logger.warning('Реплика %s недоступна: %s', alias, e)
+        return None
+
+
+def healthy_replicas() -> List[str]:
+    """
+    Возвращает реплики с допустимым отставанием.
+
+    Returns:
+        List[str]: Псевдонимы реплик
+    """
+    now = time.monotonic()
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        checked_at, lag = _lag_checks.get(alias, (None, None))
+        if checked_at is None or now - checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL:
+            lag = replica_lag(alias)
+            _lag_checks[alias] = (now, lag)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            healthy.append(alias)
+    return healthy
+
+
+def reset_lag_checks() -> None:
+    """Сбрасывает сохраненные результаты проверки отставания реплик."""
+    _lag_checks.clear()
+
+
+def mark_written() -> None:
+    """
+    Отмечает запись, выполненную в другом потоке (например, потоком-писателем).
+
+    Дальнейшее чтение текущего запроса идет с основной базы, клиент
+    закрепляется за ней так же, как после записи в самом запросе.
+    """
+    state = _state.get()
+    if state is not None:
+        state.wrote = True
+
+
+@contextmanager
+def use_replica(sticky: bool = False) -> Iterator[RoutingState]:
+    """
+    Направляет чтение в блоке на реплику.
+
+    Args:
+        sticky: Читать с основной базы после первой записи в блоке
+
+    Yields:
+        RoutingState: Состояние маршрутизации блока
+    """
+    state = RoutingState(replica=bool(settings.DATABASE_REPLICAS), sticky=sticky)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary() -> Iterator[RoutingState]:
+    """
+    Направляет чтение в блоке на основную базу.
+
+    Yields:
+        RoutingState: Состояние маршрутизации блока
+    """
+    state = RoutingState(replica=False, sticky=True)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер Django: чтение - с реплики текущего запроса, запись - в основную базу."""
+
+    def db_for_read(self, model: Any, **hints: Any) -> Optional[str]:
+        state = _state.get()
+        if state is None:
+            return None
+        if state.pinned:
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            # Реплика выбирается один раз, чтобы запрос не читал с разных копий
+            replicas = healthy_replicas()
+            state.alias = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model: Any, **hints: Any) -> str:
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Any, obj2: Any, **hints: Any) -> Optional[bool]:
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Включает чтение с реплик для запросов безопасными методами.
+
+    Должен стоять перед SessionMiddleware, чтобы запись сессии тоже
+    закрепляла клиента за основной базой. Работает и под WSGI, и под ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.routing_state(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin_client(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        state = self.routing_state(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin_client(state, response)
+
+    def routing_state(self, request: HttpRequest) -> RoutingState:
+        """
+        Создает состояние маршрутизации запроса.
+
+        Args:
+            request: Запрос
+
+        Returns:
+            RoutingState: Чтение с реплики разрешено для безопасных методов без cookie закрепления
+        """
+        replica = (
+            bool(settings.DATABASE_REPLICAS)
+            and request.method in SAFE_METHODS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+        return RoutingState(replica=replica, sticky=True)
+
+    def pin_client(self, state: RoutingState, response: HttpResponse) -> HttpResponse:
+        """
+        Закрепляет клиента за основной базой, если запрос что-то записал.
+
+        Args:
+            state: Состояние маршрутизации запроса
+            response: Ответ
+
+        Returns:
+            HttpResponse: Ответ
+        """
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
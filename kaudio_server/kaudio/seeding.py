@@ -0,0 +1,611 @@
+"""
+Генерация синтетического каталога для проверки на больших объемах.
+
+Популярность исполнителей, треков и активность пользователей
+распределены по закону Ципфа: немногие треки собирают большую часть
+прослушиваний, немногие пользователи - большую часть активности.
+Данные полностью определяются параметром seed; у каждой таблицы свой
+генератор, поэтому изменение объема активности не меняет каталог.
+
+Строки пишутся напрямую в таблицы пакетами с заранее назначенными
+первичными ключами: COPY для PostgreSQL, executemany для остальных баз.
+Сигналы моделей не срабатывают, поэтому счетчики, агрегаты оценок
+и слушатели исполнителей пересчитываются один раз в конце.
+"""
+
+import io
+import json
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.db.models import Count, OuterRef
+
+from .counters import aggregate_subquery, counter_models, update_counters, update_in_chunks
+from .models import (
+    Album, AlbumGenre, AlbumReview, Artist, Genre, Playlist, PlaylistTrack, Track, TrackGenre, TrackReview, User,
+    UserActivity,
+)
+from .ratings import RATED_MODELS, reconcile_ratings
+
+# Объем по умолчанию (масштаб 1)
+DEFAULT_COUNTS = {
+    'users': 100_000,
+    'artists': 5_000,
+    'albums': 20_000,
+    'tracks': 200_000,
+    'playlists': 50_000,
+    'playlist_tracks': 1_000_000,
+    'track_reviews': 200_000,
+    'album_reviews': 50_000,
+    'activities': 10_000_000,
+}
+
+GENRES = [
+    'Rock', 'Pop', 'Hip-Hop', 'Electronic', 'Jazz', 'Classical', 'Metal', 'Indie', 'R&B', 'Folk',
+    'Punk', 'Blues', 'Soul', 'Reggae', 'Country', 'Ambient', 'Techno', 'House', 'Drum & Bass', 'Trap',
+    'Lo-Fi', 'Synthwave', 'Funk', 'Disco', 'Latin', 'K-Pop', 'Soundtrack', 'Post-Rock', 'Shoegaze', 'Chanson',
+]
+ADJECTIVES = [
+    'Silent', 'Golden', 'Electric', 'Broken', 'Midnight', 'Neon', 'Frozen', 'Wild', 'Distant', 'Velvet',
+    'Burning', 'Hidden', 'Endless', 'Crimson', 'Lonely', 'Northern', 'Paper', 'Glass', 'Hollow', 'Summer',
+]
+NOUNS = [
+    'Dreams', 'River', 'Lights', 'Heart', 'City', 'Ocean', 'Echo', 'Skyline', 'Memory', 'Road',
+    'Fire', 'Garden', 'Signal', 'Horizon', 'Shadow', 'Storm', 'Mirror', 'Season', 'Wave', 'Engine',
+]
+REVIEW_TEXTS = [
+    'Отлично!', 'Слушаю каждый день', 'Неплохо, но не мое', 'Лучший релиз года', 'Слабее прошлых работ',
+    'Затягивает с первых секунд', 'Хорошо для фона', 'Переслушал несколько раз',
+]
+# Распределение оценок отзывов 1..5
+RATING_WEIGHTS = [0.05, 0.07, 0.15, 0.33, 0.40]
+# Доли типов активности (прослушивание создает две строки: трека и альбома)
+ACTIVITY_WEIGHTS = {
+    'play': 0.85,
+    'like': 0.06,
+    'like_album': 0.02,
+    'add_to_playlist': 0.04,
+    'remove_from_playlist': 0.01,
+    'follow_artist': 0.02,
+}
+# Период, за который генерируются события
+HISTORY_DAYS = 365
+
+
+def scaled_counts(scale: float, overrides: Optional[Dict[str, Optional[int]]] = None) -> Dict[str, int]:
+    """
+    Возвращает объем данных для масштаба.
+
+    Args:
+        scale: Множитель DEFAULT_COUNTS
+        overrides: Явно заданные количества (None - по масштабу)
+
+    Returns:
+        Dict[str, int]: Количество строк по виду данных
+    """
+    counts = {name: max(1, int(count * scale)) for name, count in DEFAULT_COUNTS.items()}
+    for name, value in (overrides or {}).items():
+        if value is not None:
+            counts[name] = value
+    return counts
+
+
+class ZipfSampler:
+    """
+    Выбор ID с вероятностью, обратной степени ранга.
+
+    Ранги назначаются ID случайной перестановкой, поэтому популярные
+    объекты не совпадают с первыми по порядку создания.
+
+    Args:
+        ids: ID объектов
+        exponent: Показатель распределения
+        rng: Генератор случайных чисел
+    """
+
+    def __init__(self, ids: np.ndarray, exponent: float, rng: np.random.Generator) -> None:
+        weights = 1.0 / np.arange(1, len(ids) + 1, dtype=np.float64) ** exponent
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+        self.ids = rng.permutation(ids)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """
+        Выбирает ID с повторениями.
+
+        Args:
+            rng: Генератор случайных чисел
+            size: Количество
+
+        Returns:
+            np.ndarray: Выбранные ID
+        """
+        ranks = np.searchsorted(self.cdf, rng.random(size), side='right')
+        return self.ids[np.minimum(ranks, len(self.ids) - 1)]
+
+
+def chunked(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    """
+    Разбивает строки на пакеты.
+
+    Args:
+        rows: Строки
+        size: Размер пакета
+
+    Yields:
+        List[tuple]: Очередной пакет
+    """
+    batch: List[tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_value(value: Any) -> str:
+    """
+    Записывает значение в текстовом формате COPY PostgreSQL.
+
+    Args:
+        value: Значение, подготовленное для базы
+
+    Returns:
+        str: Представление значения
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+class BulkInserter:
+    """
+    Пакетная вставка строк в таблицу модели в обход ORM.
+
+    Строка - кортеж значений полей fields; остальные поля получают
+    значения по умолчанию модели.
+
+    Args:
+        model: Модель
+        fields: Имена заполняемых полей (включая первичный ключ)
+        batch_size: Количество строк в одной транзакции
+
+    Raises:
+        ValueError: Если у незаполняемого обязательного поля нет значения по умолчанию
+    """
+
+    def __init__(self, model: Type[models.Model], fields: Sequence[str], batch_size: int) -> None:
+        self.model = model
+        self.batch_size = batch_size
+        opts = model._meta
+        given = [opts.get_field(name) for name in fields]
+        rest = [field for field in opts.concrete_fields if field.name not in fields]
+        for field in rest:
+            if field.get_default() is None and not field.null:
+                raise ValueError(f'{opts.label}.{field.name}: нет значения по умолчанию')
+        self.defaults = tuple(self.prepare(field, field.get_default()) for field in rest)
+        # Подготовка нужна только для типов, которые драйвер не принимает как есть;
+        # даты приводятся напрямую операциями бэкенда, минуя обработку поля
+        ops = connections[DEFAULT_DB_ALIAS].ops
+        self.converters: List[Tuple[int, Callable[[Any], Any]]] = []
+        for index, field in enumerate(given):
+            if isinstance(field, models.DateTimeField):
+                self.converters.append((index, ops.adapt_datetimefield_value))
+            elif isinstance(field, models.DateField):
+                self.converters.append((index, ops.adapt_datefield_value))
+            elif isinstance(field, (models.DecimalField, models.JSONField)):
+                self.converters.append((index, partial(self.prepare, field)))
+        columns = [field.column for field in given + rest]
+        quoted = ', '.join(connection.ops.quote_name(column) for column in columns)
+        table = connection.ops.quote_name(opts.db_table)
+        self.insert_sql = f'INSERT INTO {table} ({quoted}) VALUES ({", ".join(["%s"] * len(columns))})'
+        self.copy_sql = f'COPY {table} ({quoted}) FROM STDIN'
+
+    @staticmethod
+    def prepare(field: models.Field, value: Any) -> Any:
+        """
+        Приводит значение поля к виду для базы.
+
+        Args:
+            field: Поле модели
+            value: Значение
+
+        Returns:
+            Any: Значение для вставки
+        """
+        if value is not None and isinstance(field, models.JSONField):
+            return json.dumps(value, cls=field.encoder)
+        return field.get_db_prep_save(value, connection)
+
+    def insert(self, rows: Iterable[tuple]) -> int:
+        """
+        Вставляет строки пакетами.
+
+        Args:
+            rows: Значения полей fields
+
+        Returns:
+            int: Количество вставленных строк
+        """
+        total = 0
+        for batch in chunked(rows, self.batch_size):
+            if self.converters:
+                prepared = []
+                for row in batch:
+                    row = list(row)
+                    for index, convert in self.converters:
+                        row[index] = convert(row[index])
+                    prepared.append(tuple(row) + self.defaults)
+            else:
+                prepared = [row + self.defaults for row in batch]
+            with transaction.atomic(), connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    data = '\n'.join('\t'.join(map(_copy_value, row)) for row in prepared) + '\n'
+                    cursor.copy_expert(self.copy_sql, io.StringIO(data))
+                else:
+                    cursor.executemany(self.insert_sql, prepared)
+            total += len(prepared)
+        return total
+
+
+def next_id(model: Type[models.Model]) -> int:
+    """
+    Возвращает первый свободный первичный ключ модели.
+
+    Args:
+        model: Модель
+
+    Returns:
+        int: Ключ после наибольшего существующего
+    """
+    return (model.objects.aggregate(last=models.Max('pk'))['last'] or 0) + 1
+
+
+class CatalogSeeder:
+    """
+    Генератор синтетического каталога.
+
+    Args:
+        counts: Количество строк по виду данных (см. DEFAULT_COUNTS)
+        seed: Начальное значение генераторов
+        exponent: Показатель распределения Ципфа
+        batch_size: Количество строк в одной транзакции
+        log: Вызывается с сообщениями о ходе генерации
+    """
+
+    def __init__(
+        self,
+        counts: Dict[str, int],
+        seed: int = 0,
+        exponent: float = 1.1,
+        batch_size: int = 20000,
+        log: Callable[[str], None] = lambda message: None,
+    ) -> None:
+        self.counts = counts
+        self.seed = seed
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.log = log
+        self.now = datetime.now(dt_timezone.utc).replace(microsecond=0)
+        self.prefix = f'seed{seed}'
+
+    def rng(self, name: str) -> np.random.Generator:
+        """
+        Возвращает генератор таблицы, зависящий только от seed и имени.
+
+        Args:
+            name: Имя таблицы
+
+        Returns:
+            np.random.Generator: Генератор случайных чисел
+        """
+        return np.random.default_rng([self.seed, *name.encode()])
+
+    def insert(self, model: Type[models.Model], fields: Sequence[str], rows: Iterable[tuple]) -> int:
+        """
+        Вставляет строки и сообщает о скорости.
+
+        Args:
+            model: Модель
+            fields: Имена заполняемых полей
+            rows: Значения полей
+
+        Returns:
+            int: Количество строк
+        """
+        started = time.monotonic()
+        total = BulkInserter(model, fields, self.batch_size).insert(rows)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.log(f'{model._meta.db_table}: {total} строк за {elapsed:.1f} с ({total / elapsed:.0f} строк/с)')
+        return total
+
+    def title(self, rng: np.random.Generator) -> str:
+        """Название из случайных слов."""
+        return f'{ADJECTIVES[rng.integers(len(ADJECTIVES))]} {NOUNS[rng.integers(len(NOUNS))]}'
+
+    def moment(self, rng: np.random.Generator, days: int = HISTORY_DAYS) -> datetime:
+        """Случайный момент за последние days дней."""
+        return self.now - timedelta(seconds=int(rng.integers(days * 86400)))
+
+    def run(self) -> None:
+        """
+        Генерирует весь каталог и пересчитывает денормализованные данные.
+
+        Raises:
+            ValueError: Если данные с таким seed уже сгенерированы
+        """
+        if User.objects.filter(username=f'{self.prefix}_user1').exists():
+            raise ValueError(f'Данные с seed={self.seed} уже сгенерированы')
+        self.seed_genres()
+        self.seed_users()
+        self.seed_artists()
+        self.seed_albums()
+        self.seed_tracks()
+        self.seed_playlists()
+        self.seed_reviews()
+        self.seed_activities()
+        self.recalculate()
+        if connection.vendor == 'postgresql':
+            # Ключи назначены явно, последовательности нужно сдвинуть
+            seeded = [User, Artist, Genre, Album, Track, AlbumGenre, TrackGenre, Playlist, PlaylistTrack,
+                      TrackReview, AlbumReview, UserActivity]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), seeded):
+                    cursor.execute(sql)
+
+    def seed_genres(self) -> None:
+        existing = dict(Genre.objects.values_list('title', 'pk'))
+        missing = [title for title in GENRES if title not in existing]
+        start = next_id(Genre)
+        self.insert(Genre, ['id', 'title'], ((start + i, title) for i, title in enumerate(missing)))
+        self.genre_ids = np.array(
+            list(Genre.objects.filter(title__in=GENRES).values_list('pk', flat=True)), dtype=np.int64
+        )
+
+    def seed_users(self) -> None:
+        rng = self.rng('users')
+        count = self.counts['users']
+        # Один хеш на всех: пароль seed
+        password = make_password('seed')
+        start = next_id(User)
+        joined = rng.integers(3 * 365 * 86400, size=count).tolist()
+
+        def rows() -> Iterator[tuple]:
+            for i in range(count):
+                name = f'{self.prefix}_user{i + 1}'
+                yield (start + i, name, f'{name}@seed.local', password, 'user',
+                       self.now - timedelta(seconds=joined[i]))
+
+        self.insert(User, ['id', 'username', 'email', 'password', 'role', 'date_joined'], rows())
+        self.user_ids = np.arange(start, start + count, dtype=np.int64)
+
+    def seed_artists(self) -> None:
+        rng = self.rng('artists')
+        count = self.counts['artists']
+        password = make_password('seed')
+        user_start, start = next_id(User), next_id(Artist)
+        names = [f'{self.prefix}_artist{i + 1}' for i in range(count)]
+        self.insert(
+            User,
+            ['id', 'username', 'email', 'password', 'role', 'date_joined'],
+            ((user_start + i, name, f'{name}@seed.local', password, 'artist', self.now) for i, name in enumerate(names))
+        )
+        verified = (rng.random(count) < 0.1).tolist()
+        self.insert(
+            Artist,
+            ['id', 'user', 'username', 'email', 'is_verified'],
+            ((start + i, user_start + i, name, f'{name}@seed.local', verified[i]) for i, name in enumerate(names))
+        )
+        self.artist_ids = np.arange(start, start + count, dtype=np.int64)
+
+    def seed_albums(self) -> None:
+        rng = self.rng('albums')
+        count = self.counts['albums']
+        start = next_id(Album)
+        # Популярные исполнители выпускают больше альбомов
+        artists = ZipfSampler(self.artist_ids, self.exponent, rng).sample(rng, count).tolist()
+        released = rng.integers(30 * 365, size=count).tolist()
+        today = self.now.date()
+        self.album_artists = dict(zip(range(start, start + count), artists))
+        self.album_dates = {start + i: today - timedelta(days=released[i]) for i in range(count)}
+        self.insert(
+            Album,
+            ['id', 'title', 'artist', 'release_date'],
+            ((start + i, self.title(rng), artists[i], self.album_dates[start + i]) for i in range(count))
+        )
+        self.album_ids = np.arange(start, start + count, dtype=np.int64)
+
+    def seed_tracks(self) -> None:
+        rng = self.rng('tracks')
+        count = self.counts['tracks']
+        start = next_id(Track)
+        # Треки альбома идут подряд, размеры альбомов случайны
+        albums = np.sort(rng.choice(self.album_ids, size=count)).tolist()
+        durations = np.clip(rng.normal(210, 60, size=count), 45, 900).astype(np.int64).tolist()
+        explicit = (rng.random(count) < 0.1).tolist()
+        self.track_albums = albums
+        self.track_durations = durations
+        genres = ZipfSampler(self.genre_ids, self.exponent, rng)
+        track_genres: List[Tuple[int, int]] = []
+        album_genres: Dict[int, set] = {}
+
+        def rows() -> Iterator[tuple]:
+            number, titles, previous = 0, set(), None
+            for i in range(count):
+                album = albums[i]
+                if album != previous:
+                    number, titles, previous = 0, set(), album
+                number += 1
+                title = self.title(rng)
+                if title in titles:
+                    title = f'{title} {number}'
+                titles.add(title)
+                for genre in dict.fromkeys(genres.sample(rng, int(rng.integers(1, 4))).tolist()):
+                    track_genres.append((start + i, genre))
+                    album_genres.setdefault(album, set()).add(genre)
+                yield (start + i, title, self.album_artists[album], album, number, self.album_dates[album],
+                       durations[i], explicit[i])
+
+        self.insert(
+            Track,
+            ['id', 'title', 'artist', 'album', 'track_number', 'release_date', 'duration', 'is_explicit'],
+            rows()
+        )
+        self.track_ids = np.arange(start, start + count, dtype=np.int64)
+        self.tracks = ZipfSampler(self.track_ids, self.exponent, rng)
+        start_track_genre = next_id(TrackGenre)
+        self.insert(
+            TrackGenre,
+            ['id', 'track', 'genre'],
+            ((start_track_genre + i, track, genre) for i, (track, genre) in enumerate(track_genres))
+        )
+        album_rows = [(album, genre) for album in sorted(album_genres) for genre in sorted(album_genres[album])]
+        start_album_genre = next_id(AlbumGenre)
+        self.insert(
+            AlbumGenre,
+            ['id', 'album', 'genre'],
+            ((start_album_genre + i, album, genre) for i, (album, genre) in enumerate(album_rows))
+        )
+
+    def seed_playlists(self) -> None:
+        rng = self.rng('playlists')
+        count = self.counts['playlists']
+        start, item_start = next_id(Playlist), next_id(PlaylistTrack)
+        owners = rng.choice(self.user_ids, size=count).tolist()
+        public = (rng.random(count) < 0.8).tolist()
+        created = [self.moment(rng) for _ in range(count)]
+        self.insert(
+            Playlist,
+            ['id', 'title', 'user', 'is_public', 'creation_date'],
+            ((start + i, self.title(rng), owners[i], public[i], created[i]) for i in range(count))
+        )
+        self.playlist_ids = np.arange(start, start + count, dtype=np.int64)
+        # Длины плейлистов - геометрическое распределение со средним playlist_tracks / playlists
+        mean = max(1.0, self.counts['playlist_tracks'] / count)
+        lengths = np.minimum(rng.geometric(1 / mean, size=count), len(self.track_ids)).tolist()
+
+        def rows() -> Iterator[tuple]:
+            item = item_start
+            for i in range(count):
+                tracks = dict.fromkeys(self.tracks.sample(rng, lengths[i]).tolist())
+                for position, track in enumerate(tracks, start=1):
+                    yield (item, start + i, track, position, created[i] + timedelta(minutes=position))
+                    item += 1
+
+        self.insert(PlaylistTrack, ['id', 'playlist', 'track', 'position', 'added_at'], rows())
+
+    def seed_reviews(self) -> None:
+        for model, kind, field, targets in (
+            (TrackReview, 'track_reviews', 'track', self.tracks),
+            (AlbumReview, 'album_reviews', 'album', ZipfSampler(self.album_ids, self.exponent, self.rng('albums'))),
+        ):
+            rng = self.rng(kind)
+            count = self.counts[kind]
+            start = next_id(model)
+            authors = rng.choice(self.user_ids, size=count).tolist()
+            objects = targets.sample(rng, count).tolist()
+            ratings = (rng.choice(5, size=count, p=RATING_WEIGHTS) + 1).tolist()
+            texts = rng.integers(len(REVIEW_TEXTS), size=count).tolist()
+
+            def rows() -> Iterator[tuple]:
+                seen = set()
+                index = start
+                for i in range(count):
+                    # Один отзыв автора на объект
+                    if (authors[i], objects[i]) in seen:
+                        continue
+                    seen.add((authors[i], objects[i]))
+                    moment = self.moment(rng)
+                    yield (index, authors[i], objects[i], ratings[i], REVIEW_TEXTS[texts[i]], moment, moment)
+                    index += 1
+
+            self.insert(model, ['id', 'author', field, 'rating', 'text', 'created_at', 'updated_at'], rows())
+
+    def seed_activities(self) -> None:
+        rng = self.rng('activities')
+        count = self.counts['activities']
+        start = next_id(UserActivity)
+        users = ZipfSampler(self.user_ids, self.exponent, rng)
+        types = list(ACTIVITY_WEIGHTS)
+        weights = list(ACTIVITY_WEIGHTS.values())
+        # Прослушивание - две строки, поэтому строк на событие больше одной
+        rows_per_event = 1 + ACTIVITY_WEIGHTS['play']
+        first_track = int(self.track_ids[0])
+        span = HISTORY_DAYS * 86400
+        since = self.now.timestamp() - span
+
+        def rows() -> Iterator[tuple]:
+            index, end, liked = start, start + count, set()
+            # События генерируются частями и идут по времени в порядке ключей
+            while index < end:
+                size = self.batch_size
+                kinds = rng.choice(len(types), size=size, p=weights).tolist()
+                user_ids = users.sample(rng, size).tolist()
+                track_ids = self.tracks.sample(rng, size).tolist()
+                playlist_ids = rng.choice(self.playlist_ids, size=size).tolist()
+                listened = rng.random(size).tolist()
+                progress = (index - start) / count + np.sort(rng.random(size)) * size * rows_per_event / count
+                moments = (since + np.minimum(progress, 1.0) * span).tolist()
+                for i in range(size):
+                    if index >= end:
+                        return
+                    kind, user, track = types[kinds[i]], user_ids[i], track_ids[i]
+                    position = track - first_track
+                    album = self.track_albums[position]
+                    moment = datetime.fromtimestamp(moments[i], dt_timezone.utc)
+                    if kind in ('like', 'like_album', 'follow_artist'):
+                        # Повторный лайк или подписка превращается в прослушивание
+                        key = (kind, user, album if kind == 'like_album' else track)
+                        if key in liked:
+                            kind = 'play'
+                        else:
+                            liked.add(key)
+                    if kind == 'play':
+                        duration = max(1, int(self.track_durations[position] * listened[i]))
+                        yield (index, user, 'play', track, None, None, None, duration, moment)
+                        index += 1
+                        if index < end:
+                            yield (index, user, 'play', None, album, None, None, duration, moment)
+                            index += 1
+                    elif kind == 'like':
+                        yield (index, user, kind, track, None, None, None, None, moment)
+                        index += 1
+                    elif kind == 'like_album':
+                        yield (index, user, kind, None, album, None, None, None, moment)
+                        index += 1
+                    elif kind == 'follow_artist':
+                        yield (index, user, kind, None, None, None, self.album_artists[album], None, moment)
+                        index += 1
+                    else:
+                        yield (index, user, kind, track, None, playlist_ids[i], None, None, moment)
+                        index += 1
+
+        self.insert(
+            UserActivity,
+            ['id', 'user', 'activity_type', 'track', 'album', 'playlist', 'artist', 'duration', 'timestamp'],
+            rows()
+        )
+
+    def recalculate(self) -> None:
+        """Пересчитывает счетчики, агрегаты оценок и слушателей исполнителей."""
+        started = time.monotonic()
+        for model in counter_models().values():
+            update_in_chunks(model, update_counters)
+        for model in RATED_MODELS.values():
+            reconcile_ratings(model)
+        plays = UserActivity.objects.filter(activity_type='play', track__artist=OuterRef('pk'))
+        listeners = aggregate_subquery(plays, 'track__artist', Count('pk'))
+        update_in_chunks(Artist, lambda queryset: queryset.update(monthly_listeners=listeners))
+        self.log(f'Счетчики пересчитаны за {time.monotonic() - started:.1f} с')
@@ -3,11 +3,42 @@ from rest_framework.request import Request
 from .models import (
     User, Artist, Genre, Album, Track, Playlist, UserActivity, 
     Subscribe, UserSubscribe, UserAlbum, UserTrack, PlaylistTrack,
-    AlbumGenre, TrackGenre, Statistics, TrackReview, AlbumReview
+    AlbumGenre, TrackGenre, Statistics, TrackReview, AlbumReview, Job
 )
 from django.utils.translation import gettext_lazy as _
 from typing import Dict, Any, Optional, List, Union
 from django.db.models import Model
+from django.urls import reverse
+
+
+def build_image_variant_urls(obj: Model, field_name: str, request: Optional[Request]) -> Dict[str, Dict[str, str]]:
+    """
+    Формирует карту URL уменьшенных копий изображения для атрибута srcset.
+    
+    Args:
+        obj: Объект модели с полем image_variants
+        field_name: Имя поля исходного изображения
+        request: HTTP запрос для построения абсолютных URL
+        
+    Returns:
+        Dict[str, Dict[str, str]]: URL копий по формату и ширине,
+        пустой словарь, если копии еще не готовы
+    """
+    image = getattr(obj, field_name)
+    variants = obj.image_variants or {}
+    if not image or variants.get('source') != image.name:
+        return {}
+    
+    storage = image.storage
+    urls: Dict[str, Dict[str, str]] = {}
+    for image_format, sizes in variants.items():
+        if image_format == 'source':
+            continue
+        urls[image_format] = {
+            width: request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+            for width, name in sizes.items()
+        }
+    return urls
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -18,10 +49,11 @@ class UserSerializer(serializers.ModelSerializer):
     """
     profile_image_url = serializers.SerializerMethodField()
     img_profile_url = serializers.SerializerMethodField()  # для обратной совместимости
+    profile_image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'profile_image', 'profile_image_url', 'img_profile_url', 'role', 'last_login', 'date_joined']
+        fields = ['id', 'username', 'email', 'profile_image', 'profile_image_url', 'img_profile_url', 'profile_image_variants', 'role', 'last_login', 'date_joined']
         read_only_fields = ['last_login', 'date_joined']
 
     def get_profile_image_url(self, obj: User) -> Optional[str]:
@@ -59,6 +91,18 @@ class UserSerializer(serializers.ModelSerializer):
             return self.context['request'].build_absolute_uri(obj.profile_image.url)
         return None
 
+    def get_profile_image_variants(self, obj: User) -> Dict[str, Dict[str, str]]:
+        """
+        Получает URL уменьшенных копий изображения профиля.
+        
+        Args:
+            obj: Объект пользователя
+            
+        Returns:
+            Dict[str, Dict[str, str]]: URL копий по формату и ширине
+        """
+        return build_image_variant_urls(obj, 'profile_image', self.context.get('request'))
+
 
 class ArtistSerializer(serializers.ModelSerializer):
     """
@@ -68,12 +112,13 @@ class ArtistSerializer(serializers.ModelSerializer):
     """
     cover_image_url = serializers.SerializerMethodField()
     img_cover_url = serializers.SerializerMethodField()  # для обратной совместимости
+    cover_image_variants = serializers.SerializerMethodField()
     user = UserSerializer(read_only=True)
     username = serializers.CharField(read_only=True)
     
     class Meta:
         model = Artist
-        fields = ['id', 'bio', 'email', 'cover_image', 'cover_image_url', 'img_cover_url', 'is_verified', 'monthly_listeners', 'user', 'username']
+        fields = ['id', 'bio', 'email', 'cover_image', 'cover_image_url', 'img_cover_url', 'cover_image_variants', 'is_verified', 'monthly_listeners', 'user', 'username']
         read_only_fields = ['monthly_listeners', 'username']
 
     def get_cover_image_url(self, obj: Artist) -> Optional[str]:
@@ -104,6 +149,18 @@ class ArtistSerializer(serializers.ModelSerializer):
             return self.context['request'].build_absolute_uri(obj.cover_image.url)
         return None
 
+    def get_cover_image_variants(self, obj: Artist) -> Dict[str, Dict[str, str]]:
+        """
+        Получает URL уменьшенных копий изображения обложки исполнителя.
+        
+        Args:
+            obj: Объект исполнителя
+            
+        Returns:
+            Dict[str, Dict[str, str]]: URL копий по формату и ширине
+        """
+        return build_image_variant_urls(obj, 'cover_image', self.context.get('request'))
+
 
 class GenreSerializer(serializers.ModelSerializer):
     """
@@ -129,14 +186,29 @@ class AlbumSerializer(serializers.ModelSerializer):
         write_only=True
     )
     genres = GenreSerializer(many=True, read_only=True)
+    cover_image_variants = serializers.SerializerMethodField()
+    avg_rating = serializers.FloatField(source='average_rating', read_only=True)
 
     class Meta:
         model = Album
         fields = [
             'id', 'title', 'artist', 'artist_id', 'release_date', 
-            'cover_image', 'total_tracks', 'total_duration', 'genres'
+            'cover_image', 'cover_image_variants', 'total_tracks', 'total_duration', 'genres',
+            'avg_rating', 'rating_count'
         ]
-        read_only_fields = ['total_tracks', 'total_duration']
+        read_only_fields = ['total_tracks', 'total_duration', 'rating_count']
+
+    def get_cover_image_variants(self, obj: Album) -> Dict[str, Dict[str, str]]:
+        """
+        Получает URL уменьшенных копий обложки альбома.
+        
+        Args:
+            obj: Объект альбома
+            
+        Returns:
+            Dict[str, Dict[str, str]]: URL копий по формату и ширине
+        """
+        return build_image_variant_urls(obj, 'cover_image', self.context.get('request'))
 
 
 class TrackSerializer(serializers.ModelSerializer):
@@ -162,6 +234,9 @@ class TrackSerializer(serializers.ModelSerializer):
     genres = GenreSerializer(many=True, read_only=True)
     calculated_avg_rating = serializers.FloatField(read_only=True)
     total_plays = serializers.IntegerField(read_only=True)
+    waveform_url = serializers.SerializerMethodField()
+    hls_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Track
@@ -169,9 +244,62 @@ class TrackSerializer(serializers.ModelSerializer):
             'id', 'title', 'artist', 'artist_id', 'album', 'album_id',
             'audio_file', 'track_number', 'release_date', 'cover_image',
             'duration', 'play_count', 'likes_count', 'is_explicit',
-            'lyrics', 'genres', 'calculated_avg_rating', 'total_plays', 'avg_rating'
+            'lyrics', 'genres', 'calculated_avg_rating', 'total_plays', 'avg_rating', 'rating_count',
+            'waveform_url', 'hls_url', 'preview_url'
+        ]
+        read_only_fields = [
+            'play_count', 'likes_count', 'calculated_avg_rating', 'total_plays', 'avg_rating', 'rating_count'
         ]
-        read_only_fields = ['play_count', 'likes_count', 'calculated_avg_rating', 'total_plays', 'avg_rating']
+    
+    def get_waveform_url(self, obj: Track) -> Optional[str]:
+        """
+        Получает URL волновой формы с версией аудиофайла для бессрочного кэширования.
+        
+        Args:
+            obj: Объект трека
+            
+        Returns:
+            Optional[str]: URL волновой формы или None, если аудиофайла нет
+        """
+        if not obj.audio_file:
+            return None
+        url = f"{reverse('track-waveform', args=[obj.pk])}?v={obj.audio_version}"
+        request: Optional[Request] = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_hls_url(self, obj: Track) -> Optional[str]:
+        """
+        Получает URL плейлиста HLS трека.
+        
+        Args:
+            obj: Объект трека
+            
+        Returns:
+            Optional[str]: URL плейлиста или None, если аудиофайла нет
+        """
+        if not obj.audio_file:
+            return None
+        url = reverse('track-hls', args=[obj.pk])
+        request: Optional[Request] = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_preview_url(self, obj: Track) -> Optional[str]:
+        """
+        Получает URL превью трека.
+        
+        Превью хранится по адресу, зависящему от содержимого, поэтому
+        ссылка меняется вместе с превью.
+        
+        Args:
+            obj: Объект трека
+            
+        Returns:
+            Optional[str]: URL превью или None, если превью для текущего аудиофайла еще нет
+        """
+        if not obj.preview_file or not obj.audio_file or obj.preview_version != obj.audio_version:
+            return None
+        request: Optional[Request] = self.context.get('request')
+        return request.build_absolute_uri(obj.preview_file.url) if request else obj.preview_file.url
     
     def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -582,4 +710,64 @@ class AlbumReviewSerializer(ReviewSerializer):
             raise serializers.ValidationError(
                 'Вы не можете оставить отзыв на альбом, который не прослушивали.'
             )
-        return data 
\ No newline at end of file
+        return data 
+
+
+class RatingDistributionSerializer(serializers.Serializer):
+    """
+    Сериализатор распределения оценок трека или альбома.
+    
+    Данные берутся из хранимых агрегатов, без обращения к отзывам.
+    """
+    average = serializers.FloatField(source='average_rating', read_only=True)
+    count = serializers.IntegerField(source='rating_count', read_only=True)
+    distribution = serializers.SerializerMethodField()
+
+    def get_distribution(self, obj: Union[Track, Album]) -> Dict[str, int]:
+        """
+        Получает количество отзывов по каждой оценке.
+        
+        Args:
+            obj: Трек или альбом
+            
+        Returns:
+            Dict[str, int]: Количество отзывов по оценке от 1 до 5
+        """
+        return {str(value): count for value, count in obj.rating_distribution().items()}
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для модели Job.
+    
+    Предоставляет состояние, прогресс и результат фоновой задачи.
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    result_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'queue', 'status', 'status_display', 'progress', 'progress_message',
+            'result', 'result_url', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_result_url(self, obj: Job) -> Optional[str]:
+        """
+        Получает URL скачивания файла результата.
+        
+        Файл хранится вне MEDIA_ROOT и отдается только через /api/jobs/{id}/result/
+        с проверкой доступа к задаче.
+        
+        Args:
+            obj: Объект задачи
+            
+        Returns:
+            Optional[str]: URL файла или None, если файла нет
+        """
+        if not obj.result_file:
+            return None
+        url = reverse('job-result', args=[obj.pk])
+        request: Optional[Request] = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,64 @@
+"""
+Подсчет SQL-запросов, выполненных при обработке запроса или задачи.
+
+Обертка выполнения SQL подключается ко всем базам на время блока
+count_queries. Используется метриками, профилированием и заголовками
+замеров, поэтому модуль не зависит ни от чего, кроме django.db.
+"""
+
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from django.db import connections
+
+
+class QueryCounter:
+    """
+    Обертка выполнения SQL, считающая запросы и их время.
+
+    Подклассы переопределяют observe, чтобы учитывать запросы подробнее.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe(sql, time.perf_counter() - started)
+
+    def observe(self, sql: str, duration: float) -> None:
+        """
+        Учитывает выполненный запрос.
+
+        Args:
+            sql: Текст запроса
+            duration: Время выполнения в секундах
+        """
+        self.count += 1
+        self.duration += duration
+
+
+@contextmanager
+def count_queries(counter: Optional[QueryCounter] = None) -> Iterator[QueryCounter]:
+    """
+    Подключает обертку ко всем базам на время блока.
+
+    Учитываются запросы, выполненные в текущем потоке (или контексте
+    асинхронного запроса).
+
+    Args:
+        counter: Обертка (по умолчанию - новый QueryCounter)
+
+    Yields:
+        QueryCounter: Обертка с накопленными значениями
+    """
+    counter = counter if counter is not None else QueryCounter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield counter
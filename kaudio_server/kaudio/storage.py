@@ -0,0 +1,347 @@
+"""
+Контентно-адресуемое хранилище медиафайлов.
+
+Файлы сохраняются под именем, полученным из SHA-256 их содержимого,
+и раскладываются по вложенным каталогам (cas/ab/cd/<sha256>.<ext>),
+чтобы в одном каталоге не накапливались сотни тысяч файлов.
+Повторная загрузка того же содержимого не записывает данные на диск
+повторно, а лишь увеличивает счетчик ссылок на объект MediaBlob.
+Изменение счетчика и запись или удаление файла выполняются в одной
+транзакции с блокировкой строки объекта, поэтому параллельные сохранение
+и удаление одного содержимого не оставляют запись без файла.
+
+Файлы результатов фоновых задач хранятся отдельно, вне MEDIA_ROOT,
+и не имеют публичного URL: их отдает представление с проверкой доступа.
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+CAS_PREFIX = 'cas'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def compute_sha256(content: File) -> str:
+    """
+    Считает SHA-256 содержимого файла.
+
+    Хэш всегда считается по сохраняемым данным: от него зависит имя
+    объекта, и переданным заранее значениям не доверяем.
+
+    Args:
+        content: Файл Django
+
+    Returns:
+        str: Шестнадцатеричный SHA-256
+    """
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name_for(digest: str, filename: str) -> str:
+    """
+    Формирует имя объекта в хранилище по SHA-256 и исходному имени файла.
+
+    Args:
+        digest: SHA-256 содержимого
+        filename: Исходное имя файла (используется только расширение)
+
+    Returns:
+        str: Относительный путь вида cas/ab/cd/<sha256>.<ext>
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if not extension[1:].isalnum() or len(extension) > 10:
+        extension = ''
+    return f'{CAS_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с дедупликацией по содержимому.
+
+    Имя, сформированное upload_to, используется только для определения
+    расширения. Файлы, сохраненные до перехода на это хранилище, продолжают
+    открываться по своим старым путям.
+    """
+
+    def get_available_name(self, name: str, max_length: Optional[int] = None) -> str:
+        """
+        Возвращает имя без изменений.
+
+        Итоговое имя определяется содержимым в _save, поэтому подбирать
+        свободное имя не нужно.
+
+        Args:
+            name: Исходное имя файла
+            max_length: Максимальная длина имени
+
+        Returns:
+            str: То же имя
+        """
+        return name
+
+    def _save(self, name: str, content: File) -> str:
+        """
+        Сохраняет содержимое, если такого объекта еще нет, и увеличивает счетчик ссылок.
+
+        Args:
+            name: Имя, сформированное upload_to
+            content: Сохраняемый файл
+
+        Returns:
+            str: Имя объекта в хранилище
+        """
+        digest = compute_sha256(content)
+        blob_name = blob_name_for(digest, name)
+        with transaction.atomic():
+            # Ссылка добавляется до записи файла: строка объекта остается
+            # заблокированной, и параллельный delete не удалит файл
+            self._add_reference(blob_name, digest, content.size)
+            self._write_file(blob_name, content)
+        return blob_name
+
+    def write_blob(self, name: str, content: File) -> Tuple[str, str, int]:
+        """
+        Записывает содержимое под именем из SHA-256, не создавая ссылку на объект.
+
+        Временные файлы загрузки переносятся переименованием, остальные
+        записываются во временный файл рядом с объектом и атомарно
+        переименовываются, поэтому параллельные загрузки одного содержимого
+        безопасны. Не обращается к базе, поэтому может вызываться в дочерних
+        процессах; ссылки затем добавляются через add_references.
+
+        Args:
+            name: Исходное имя файла (используется только расширение)
+            content: Сохраняемый файл
+
+        Returns:
+            Tuple[str, str, int]: Имя объекта, SHA-256 и размер в байтах
+        """
+        digest = compute_sha256(content)
+        blob_name = blob_name_for(digest, name)
+        return blob_name, digest, self._write_file(blob_name, content)
+
+    def _write_file(self, blob_name: str, content: File) -> int:
+        """
+        Записывает файл объекта, если его еще нет на диске.
+
+        Args:
+            blob_name: Имя объекта в хранилище
+            content: Сохраняемый файл
+
+        Returns:
+            int: Размер файла в байтах
+        """
+        full_path = self.path(blob_name)
+
+        if not os.path.exists(full_path):
+            directory = os.path.dirname(full_path)
+            os.makedirs(directory, exist_ok=True)
+            if hasattr(content, 'temporary_file_path'):
+                try:
+                    file_move_safe(content.temporary_file_path(), full_path)
+                except FileExistsError:
+                    pass
+            else:
+                temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.tmp')
+                with open(temp_path, 'wb') as destination:
+                    for chunk in content.chunks(HASH_CHUNK_SIZE):
+                        destination.write(chunk)
+                os.replace(temp_path, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+
+        return os.path.getsize(full_path)
+
+    def delete(self, name: str) -> None:
+        """
+        Уменьшает счетчик ссылок и удаляет файл, когда ссылок не осталось.
+
+        Файлы со старыми путями (сохраненные до дедупликации) удаляются
+        сразу. Объект cas/ без записи MediaBlob уже удален или еще не
+        зафиксирован параллельным сохранением, поэтому его файл не трогаем.
+
+        Args:
+            name: Имя объекта в хранилище
+        """
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        if not name.startswith(f'{CAS_PREFIX}/'):
+            super().delete(name)
+            return
+
+        MediaBlob = apps.get_model('kaudio', 'MediaBlob')
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            self.remove_blob(name)
+
+    def remove_blob(self, name: str) -> None:
+        """
+        Удаляет файл объекта и его уменьшенные копии, не изменяя записи MediaBlob.
+
+        Вызывается под блокировкой строки объекта после удаления записи.
+
+        Args:
+            name: Имя объекта в хранилище
+        """
+        super().delete(name)
+        self._delete_derivatives(name)
+
+    def _delete_derivatives(self, name: str) -> None:
+        """
+        Удаляет производные файлы (уменьшенные копии), лежащие рядом с объектом.
+
+        Копии называются по полному имени объекта с расширением. Копии
+        в прежнем формате (<sha256>_<ширина>) удаляются, только если рядом
+        не осталось объекта с тем же содержимым и другим расширением.
+
+        Args:
+            name: Имя удаленного объекта в хранилище
+        """
+        directory, filename = os.path.split(self.path(name))
+        stem = os.path.splitext(filename)[0]
+        try:
+            entries = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        prefixes = [f'{filename}_']
+        if not any(entry.startswith(f'{stem}.') and '_' not in entry for entry in entries):
+            prefixes.append(f'{stem}_')
+        for entry in entries:
+            if entry.startswith(tuple(prefixes)):
+                os.remove(os.path.join(directory, entry))
+
+    def _add_reference(self, name: str, digest: str, size: int) -> None:
+        """
+        Увеличивает счетчик ссылок на объект, создавая запись при необходимости.
+
+        Вызывается в транзакции: UPDATE блокирует строку объекта до ее конца.
+
+        Args:
+            name: Имя объекта в хранилище
+            digest: SHA-256 содержимого
+            size: Размер файла в байтах
+        """
+        MediaBlob = apps.get_model('kaudio', 'MediaBlob')
+        if MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, sha256=digest, size=size)
+        except IntegrityError:
+            # Запись одновременно создало параллельное сохранение
+            MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+    def add_references(self, blobs: Dict[str, Tuple[str, int, int]]) -> None:
+        """
+        Добавляет ссылки на объекты, записанные write_blob, пакетом запросов.
+
+        Счетчики существующих объектов увеличиваются одним UPDATE на каждое
+        значение приращения, новые записи создаются одним INSERT. Вызывается
+        в транзакции: если файл нового объекта успел удалить параллельный
+        delete, транзакция откатывается.
+
+        Args:
+            blobs: SHA-256, размер и количество ссылок по имени объекта
+
+        Raises:
+            FileNotFoundError: Если файл объекта удален после write_blob
+        """
+        MediaBlob = apps.get_model('kaudio', 'MediaBlob')
+        existing = set(MediaBlob.objects.filter(name__in=list(blobs)).values_list('name', flat=True))
+        by_count: Dict[int, List[str]] = {}
+        for name in existing:
+            by_count.setdefault(blobs[name][2], []).append(name)
+        for count, names in by_count.items():
+            MediaBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') + count)
+        created = MediaBlob.objects.bulk_create([
+            MediaBlob(name=name, sha256=digest, size=size, ref_count=count)
+            for name, (digest, size, count) in blobs.items()
+            if name not in existing
+        ])
+        for blob in created:
+            if not self.exists(blob.name):
+                raise FileNotFoundError(f'Файл объекта удален при сохранении: {blob.name}')
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage() -> ContentAddressedStorage:
+    """
+    Возвращает хранилище для файловых полей моделей.
+
+    Используется как вызываемый объект в параметре storage, чтобы
+    миграции не зависели от настроек MEDIA_ROOT.
+
+    Returns:
+        ContentAddressedStorage: Экземпляр хранилища
+    """
+    return media_storage
+
+
+class PrivateFileStorage(FileSystemStorage):
+    """
+    Файловое хранилище вне MEDIA_ROOT без публичного URL.
+
+    Каталог читается из настройки при каждом обращении, поэтому
+    хранилище следует за ее изменением (в том числе в тестах).
+    """
+
+    def __init__(self, setting: str) -> None:
+        super().__init__()
+        self.setting = setting
+
+    @property
+    def base_location(self) -> str:
+        return getattr(settings, self.setting)
+
+    @property
+    def location(self) -> str:
+        return os.path.abspath(self.base_location)
+
+    def url(self, name: str) -> str:
+        """
+        Запрещает прямые ссылки на файлы.
+
+        Raises:
+            ValueError: Всегда, файлы отдаются только представлениями
+        """
+        raise ValueError(f'Файл {name} недоступен по прямой ссылке')
+
+
+job_result_storage = PrivateFileStorage('JOB_RESULTS_DIR')
+
+
+def get_job_result_storage() -> PrivateFileStorage:
+    """
+    Возвращает хранилище файлов результатов фоновых задач.
+
+    Returns:
+        PrivateFileStorage: Экземпляр хранилища
+    """
+    return job_result_storage
@@ -1,5 +1,52 @@
+import logging
+import mmap
+import tempfile
+from typing import Any, Dict, List, Optional
+
 from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.mail import send_mail
+from django.db import transaction
+
+from .admin_stats import refresh_all_stats_snapshots, refresh_stats_snapshot
+from .counters import counter_models, reconcile_counters
+from .exports import EXPORTS, export_filename, write_export
+from .jobs import BULK_QUEUE, execute_job, register_job
+from .models import Job, Track, TrackWaveform
+from .routers import use_replica
+from .totals import TOTALS, recalculate_in_chunks
+from .utils.hls import package_track
+from .utils.mp3 import UnsupportedAudioFormat
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task: Any, *args: Any, queue: Optional[str] = None) -> None:
+    """
+    Ставит задачу в очередь после фиксации текущей транзакции.
+
+    Недоступность брокера не должна ломать и задерживать запрос, поэтому
+    отправка выполняется без повторных попыток, а ошибки только
+    записываются в лог.
+
+    Args:
+        task: Задача Celery
+        *args: Аргументы задачи
+        queue: Очередь (по умолчанию - из CELERY_TASK_ROUTES)
+    """
+    options = {'queue': queue} if queue else {}
+
+    def send() -> None:
+        try:
+            task.apply_async(args, retry=False, **options)
+        except Exception:
+            logger.exception('Не удалось поставить задачу %s в очередь', task.name)
+
+    transaction.on_commit(send)
+
 
 @shared_task
 def print_hello():
@@ -15,6 +62,343 @@ def send_statistics_email():
         ['to@example.com'],
         fail_silently=False,
     ) 
-    
-# celery -A kaudio_server.celery_app:celery worker -l info --pool=solo
-# celery -A kaudio_server.celery_app:celery beat -l info
\ No newline at end of file
+
+
+@shared_task(ignore_result=True)
+def refresh_admin_stats() -> None:
+    """
+    Пересчитывает снимки статистики административной панели.
+    """
+    count = refresh_all_stats_snapshots()
+    logger.info('Обновлено снимков статистики: %s', count)
+
+
+@shared_task(ignore_result=True)
+def reconcile_counter_caches() -> None:
+    """
+    Исправляет расхождения денормализованных счетчиков с данными.
+
+    Счетчики меняются приращениями в сигналах, поэтому расходятся только
+    после массовых операций в обход сигналов или сбоев между запросами.
+    """
+    for name, model in counter_models().items():
+        fixed = reconcile_counters(model, chunk_size=settings.TOTALS_CHUNK_SIZE)
+        if fixed:
+            logger.warning('Исправлены счетчики %s: %s', name, fixed)
+
+
+@shared_task(ignore_result=True)
+def generate_image_variants(model_label: str, pk: int, field_name: str) -> None:
+    """
+    Создает уменьшенные копии изображения и сохраняет их карту в модели.
+
+    Args:
+        model_label: Метка модели вида kaudio.Artist
+        pk: ID экземпляра
+        field_name: Имя поля изображения
+    """
+    from .utils.images import render_image_variants
+
+    model = apps.get_model(model_label)
+    name = model.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+    variants = {}
+    if name:
+        try:
+            variants = render_image_variants(name)
+        except OSError:
+            # Поврежденный или неподдерживаемый файл: отмечаем как обработанный
+            logger.warning('Не удалось обработать изображение %s', name)
+            variants = {'source': name}
+    # Условие на имя файла защищает от перезаписи, если изображение успели заменить
+    model.objects.filter(pk=pk, **{field_name: name or ''}).update(image_variants=variants)
+
+
+@shared_task(ignore_result=True)
+def probe_track_metadata(track_id: int) -> None:
+    """
+    Уточняет длительность трека по кадрам аудиофайла.
+
+    Итоги альбома обновляются счетчиками при сохранении трека.
+
+    Args:
+        track_id: ID трека
+    """
+    track = Track.objects.filter(pk=track_id).only('id', 'album', 'duration', 'audio_file').first()
+    if track is None or not track.audio_file:
+        return
+
+    from .utils.mp3 import audio_duration
+
+    try:
+        with open(track.audio_file.path, 'rb') as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                duration = round(audio_duration(data))
+    except (ValueError, OSError) as e:
+        logger.warning('Не удалось определить длительность трека %s: %s', track_id, e)
+        return
+    if track.duration != duration:
+        track.duration = duration
+        track.save(update_fields=['duration'])
+
+
+def mark_unsupported_audio(track: Track) -> None:
+    """
+    Запоминает, что аудиофайл трека не удалось разобрать.
+
+    Производные данные такого файла не появятся, поэтому представления
+    по этой отметке отвечают 415 и не ставят обработку повторно. Отметка
+    относится к версии аудиофайла и теряет силу при его замене.
+
+    Args:
+        track: Трек
+    """
+    Track.objects.filter(pk=track.pk, audio_file=track.audio_file.name).update(
+        unsupported_audio_version=track.audio_version
+    )
+
+
+@shared_task(ignore_result=True)
+def generate_track_waveform(track_id: int) -> None:
+    """
+    Вычисляет волновую форму трека во всех разрешениях WAVEFORM_RESOLUTIONS.
+
+    Args:
+        track_id: ID трека
+    """
+    track = Track.objects.filter(pk=track_id).first()
+    if track is None:
+        return
+    if not track.audio_file:
+        TrackWaveform.objects.filter(track=track).delete()
+        return
+
+    from .utils.waveform import compute_waveforms
+
+    try:
+        peaks, duration = compute_waveforms(track.audio_file.path, tuple(settings.WAVEFORM_RESOLUTIONS))
+    except UnsupportedAudioFormat as e:
+        logger.warning('Не удалось построить волновую форму трека %s: %s', track_id, e)
+        mark_unsupported_audio(track)
+        return
+
+    with transaction.atomic():
+        TrackWaveform.objects.filter(track=track).delete()
+        TrackWaveform.objects.bulk_create([
+            TrackWaveform(
+                track=track,
+                resolution=resolution,
+                peaks=data,
+                audio_version=track.audio_version
+            )
+            for resolution, data in peaks.items()
+        ])
+
+
+@shared_task(ignore_result=True)
+def package_track_hls(track_id: int) -> None:
+    """
+    Нарезает аудиофайл трека на сегменты HLS.
+
+    Args:
+        track_id: ID трека
+    """
+    track = Track.objects.filter(pk=track_id).first()
+    if track is None or not track.audio_file:
+        return
+    try:
+        package_track(track.audio_file.path, track.pk, track.audio_version, settings.HLS_SEGMENT_DURATION)
+    except UnsupportedAudioFormat as e:
+        logger.warning('Не удалось упаковать трек %s в HLS: %s', track_id, e)
+        mark_unsupported_audio(track)
+
+
+def save_track_preview(track_id: int, audio_name: str, content: bytes) -> bool:
+    """
+    Сохраняет превью трека, если аудиофайл за это время не заменили.
+
+    Args:
+        track_id: ID трека
+        audio_name: Имя аудиофайла, из которого вырезано превью
+        content: Содержимое превью
+
+    Returns:
+        bool: True, если превью сохранено
+    """
+    with transaction.atomic():
+        track = Track.objects.select_for_update().filter(pk=track_id, audio_file=audio_name).first()
+        if track is None:
+            return False
+        previous = track.preview_file.name
+        # Прежнее превью освобождается сигналом сохранения трека
+        track.preview_file.save(f'{track_id}.mp3', ContentFile(content), save=False)
+        if track.preview_file.name == previous:
+            # То же содержимое: снимаем лишнюю ссылку, добавленную при сохранении
+            track.preview_file.storage.delete(previous)
+        track.preview_version = track.audio_version
+        track.save(update_fields=['preview_file', 'preview_version'])
+    return True
+
+
+@shared_task(ignore_result=True)
+def generate_track_preview(track_id: int) -> None:
+    """
+    Вырезает превью трека длительностью TRACK_PREVIEW_DURATION.
+
+    Args:
+        track_id: ID трека
+    """
+    track = Track.objects.filter(pk=track_id).first()
+    if track is None:
+        return
+    if not track.audio_file:
+        if track.preview_file:
+            track.preview_file = None
+            track.preview_version = ''
+            track.save(update_fields=['preview_file', 'preview_version'])
+        return
+
+    from .utils.preview import cut_preview_file
+
+    try:
+        content = cut_preview_file(
+            track.audio_file.path,
+            settings.TRACK_PREVIEW_DURATION,
+            settings.TRACK_PREVIEW_OFFSET
+        )
+    except UnsupportedAudioFormat as e:
+        logger.warning('Не удалось вырезать превью трека %s: %s', track_id, e)
+        mark_unsupported_audio(track)
+        return
+    save_track_preview(track.pk, track.audio_file.name, content)
+
+
+@shared_task(ignore_result=True)
+def run_job(job_id: str) -> None:
+    """
+    Выполняет фоновую задачу Job.
+
+    Args:
+        job_id: ID задачи
+    """
+    execute_job(job_id)
+
+
+@register_job('process_track_audio', queue=BULK_QUEUE)
+def process_track_audio(job: Job, track_id: int) -> Dict[str, Any]:
+    """
+    Рассчитывает производные данные нового аудиофайла трека.
+
+    Пока задача выполняется, повторная постановка возвращает ее же, поэтому
+    если аудиофайл заменили во время обработки, шаги повторяются для нового.
+
+    Args:
+        job: Фоновая задача
+        track_id: ID трека
+
+    Returns:
+        Dict[str, Any]: Имя обработанного аудиофайла
+    """
+    steps = [
+        ('probe', probe_track_metadata),
+        ('waveform', generate_track_waveform),
+        ('hls', package_track_hls),
+        ('preview', generate_track_preview),
+    ]
+    processed = None
+    audio_file = Track.objects.filter(pk=track_id).values_list('audio_file', flat=True).first()
+    while audio_file != processed:
+        processed = audio_file
+        for index, (name, step) in enumerate(steps):
+            job.set_progress(index, len(steps), name)
+            step(track_id)
+        audio_file = Track.objects.filter(pk=track_id).values_list('audio_file', flat=True).first()
+    return {'track_id': track_id, 'audio_file': processed}
+
+
+@register_job('recalculate_album_totals', queue=BULK_QUEUE)
+def recalculate_album_totals(job: Job, album_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Пересчитывает количество треков и общую длительность альбомов.
+
+    Args:
+        job: Фоновая задача
+        album_ids: ID альбомов (None - все альбомы)
+
+    Returns:
+        Dict[str, Any]: Количество обработанных альбомов
+    """
+    updated = recalculate_in_chunks(
+        TOTALS['album'], album_ids, settings.TOTALS_CHUNK_SIZE, on_chunk=job.set_progress
+    )
+    return {'updated': updated}
+
+
+@register_job('recalculate_playlist_totals', queue=BULK_QUEUE)
+def recalculate_playlist_totals(job: Job, playlist_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Пересчитывает количество треков и общую длительность плейлистов.
+
+    Args:
+        job: Фоновая задача
+        playlist_ids: ID плейлистов (None - все плейлисты)
+
+    Returns:
+        Dict[str, Any]: Количество обработанных плейлистов
+    """
+    updated = recalculate_in_chunks(
+        TOTALS['playlist'], playlist_ids, settings.TOTALS_CHUNK_SIZE, on_chunk=job.set_progress
+    )
+    return {'updated': updated}
+
+
+@register_job('export_report', queue=BULK_QUEUE)
+def export_report(job: Job, kind: str, file_format: str, ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Формирует отчет по трекам или альбомам и сохраняет его как файл результата.
+
+    Args:
+        job: Фоновая задача
+        kind: Тип отчета (track или album)
+        file_format: pdf, csv или xlsx
+        ids: ID экспортируемых объектов (None - все)
+
+    Returns:
+        Dict[str, Any]: Количество строк и формат отчета
+    """
+    spec = EXPORTS[kind]
+    queryset = spec.model.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    def on_row(count: int) -> None:
+        if count % settings.EXPORT_CHUNK_SIZE == 0:
+            job.set_progress(count, total)
+
+    # Отчет читается с реплики, прогресс и результат пишутся в основную базу
+    with tempfile.TemporaryFile() as output, use_replica():
+        total = len(ids) if ids is not None else queryset.count()
+        rows = write_export(spec, queryset, file_format, output, on_row)
+        output.seek(0)
+        job.result_file.save(export_filename(spec, file_format), File(output), save=False)
+    Job.objects.filter(pk=job.pk).update(result_file=job.result_file.name)
+    return {'rows': rows, 'format': file_format}
+
+
+@register_job('refresh_admin_stats', queue=BULK_QUEUE)
+def refresh_admin_stats_job(job: Job, key: str) -> Dict[str, Any]:
+    """
+    Пересчитывает снимок статистики, устаревший к открытию страницы админки.
+
+    Args:
+        job: Фоновая задача
+        key: Ключ снимка
+
+    Returns:
+        Dict[str, Any]: Ключ и дата расчета снимка
+    """
+    snapshot = refresh_stats_snapshot(key)
+    return {'key': key, 'computed_at': snapshot.computed_at.isoformat()}
+
+# celery -A kaudio_server.celery_app:celery worker -l info --pool=solo -Q latency
+# celery -A kaudio_server.celery_app:celery worker -l info -Q bulk
+# celery -A kaudio_server.celery_app:celery beat -l info
@@ -0,0 +1,363 @@
+"""
+Ограничение частоты запросов и сброс нагрузки.
+
+TokenBucketThrottle - ограничение DRF по алгоритму token bucket для
+каждого пользователя (анонимов - по IP) и класса действий: у viewset
+атрибут throttle_scopes сопоставляет действию класс из THROTTLE_BUCKETS
+(емкость корзины и пополнение в секунду). Корзины хранятся в Redis
+(THROTTLE_REDIS_URL) и общие для всех процессов; если Redis недоступен,
+используются корзины в памяти процесса, а подключение повторяется
+через THROTTLE_REDIS_RETRY секунд. При исчерпании корзины DRF отвечает
+429 с Retry-After.
+
+LoadSheddingMiddleware ограничивает количество одновременно
+обрабатываемых запросов процесса (отдельно - изменяющих) и отвечает 503
+с Retry-After, пока база не перегружена очередью ожидающих запросов.
+Отклоненные запросы учитываются по причинам (shed_counts): в памяти
+процесса сразу, в Redis - фоновым потоком, чтобы учет не обращался
+к Redis на пути запроса и не блокировал цикл событий ASGI.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import inc
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Пополнение корзины по времени сервера Redis и списание одного токена.
+# Возвращает 1 и 0, если токен списан, иначе 0 и время ожидания токена
+_TAKE_TOKEN = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+SHED_KEY = 'kaudio:shed'
+
+_redis_lock = threading.Lock()
+_redis: Any = None
+_redis_failed_at: Optional[float] = None
+_take_token_script: Any = None
+
+_memory_lock = threading.Lock()
+# Токены, время последнего пополнения, емкость и пополнение по ключу корзины;
+# порядок - от давно не использованных к недавним
+_memory_buckets: 'OrderedDict[str, Tuple[float, float, float, float]]' = OrderedDict()
+_memory_shed: Dict[str, int] = {}
+MEMORY_BUCKETS_LIMIT = 100000
+
+# Отклоненные запросы, еще не учтенные в Redis, и поток, который их отправляет
+_pending_shed: Dict[str, int] = {}
+_shed_flusher: Optional[threading.Thread] = None
+SHED_FLUSH_INTERVAL = 0.5
+
+
+def get_redis() -> Any:
+    """
+    Возвращает клиент Redis для корзин или None, если Redis недоступен.
+
+    Returns:
+        Any: Клиент redis.Redis или None
+    """
+    global _redis, _redis_failed_at, _take_token_script
+    url = settings.THROTTLE_REDIS_URL
+    if not url:
+        return None
+    if _redis is not None:
+        return _redis
+    if _redis_failed_at is not None and time.monotonic() - _redis_failed_at < settings.THROTTLE_REDIS_RETRY:
+        return None
+    with _redis_lock:
+        if _redis is not None:
+            return _redis
+        try:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_connect_timeout=0.2, socket_timeout=0.2)
+            client.ping()
+        except Exception as e:
+            _redis_failed_at = time.monotonic()
+            logger.warning('Redis для ограничения частоты недоступен, используются корзины в памяти: %s', e)
+            return None
+        _take_token_script = client.register_script(_TAKE_TOKEN)
+        _redis = client
+        _redis_failed_at = None
+        return _redis
+
+
+def _redis_error(e: Exception) -> None:
+    """
+    Отключает Redis после ошибки до следующей попытки подключения.
+
+    Args:
+        e: Ошибка
+    """
+    global _redis, _redis_failed_at
+    logger.warning('Ошибка Redis при ограничении частоты: %s', e)
+    _redis = None
+    _redis_failed_at = time.monotonic()
+
+
+def _take_memory_token(key: str, capacity: float, rate: float) -> float:
+    """
+    Списывает токен из корзины в памяти процесса.
+
+    Args:
+        key: Ключ корзины
+        capacity: Емкость корзины
+        rate: Пополнение в секунду
+
+    Returns:
+        float: 0, если токен списан, иначе время ожидания в секундах
+    """
+    now = time.monotonic()
+    with _memory_lock:
+        tokens, ts, _, _ = _memory_buckets.pop(key, (capacity, now, capacity, rate))
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        _memory_buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now, capacity, rate)
+        # Полностью пополнившиеся корзины не отличаются от новых; при
+        # превышении лимита вытесняются и давно не использованные
+        while _memory_buckets:
+            oldest, (left, updated, size, refill) = next(iter(_memory_buckets.items()))
+            if len(_memory_buckets) <= MEMORY_BUCKETS_LIMIT and left + (now - updated) * refill < size:
+                break
+            del _memory_buckets[oldest]
+        return wait
+
+
+def take_token(key: str, capacity: float, rate: float) -> float:
+    """
+    Списывает токен из корзины.
+
+    Args:
+        key: Ключ корзины
+        capacity: Емкость корзины
+        rate: Пополнение в секунду
+
+    Returns:
+        float: 0, если токен списан, иначе время ожидания в секундах
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            allowed, wait = _take_token_script(keys=[f'kaudio:bucket:{key}'], args=[capacity, rate], client=client)
+            return 0.0 if int(allowed) else float(wait)
+        except Exception as e:
+            _redis_error(e)
+    return _take_memory_token(key, capacity, rate)
+
+
+def record_shed(reason: str) -> None:
+    """
+    Учитывает отклоненный запрос.
+
+    Args:
+        reason: Причина (throttle:<класс>, concurrency, write_concurrency)
+    """
+    global _shed_flusher
+    inc('kaudio_requests_shed_total', reason=reason)
+    with _memory_lock:
+        _memory_shed[reason] = _memory_shed.get(reason, 0) + 1
+        if not settings.THROTTLE_REDIS_URL:
+            return
+        _pending_shed[reason] = _pending_shed.get(reason, 0) + 1
+        if _shed_flusher is None:
+            _shed_flusher = threading.Thread(target=_flush_shed, name='kaudio-shed', daemon=True)
+            _shed_flusher.start()
+
+
+def _flush_shed() -> None:
+    """
+    Переносит накопленные счетчики отклоненных запросов в Redis.
+
+    Работает в фоновом потоке, пока есть что отправлять, и отправляет
+    накопленное не чаще раза в SHED_FLUSH_INTERVAL секунд. Если Redis
+    недоступен, счетчики остаются только в памяти процесса.
+    """
+    global _shed_flusher
+    while True:
+        with _memory_lock:
+            pending = dict(_pending_shed)
+            _pending_shed.clear()
+            if not pending:
+                _shed_flusher = None
+                return
+        client = get_redis()
+        if client is not None:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for reason, count in pending.items():
+                    pipeline.hincrby(SHED_KEY, reason, count)
+                pipeline.execute()
+            except Exception as e:
+                _redis_error(e)
+        time.sleep(SHED_FLUSH_INTERVAL)
+
+
+def shed_counts() -> Dict[str, int]:
+    """
+    Возвращает количество отклоненных запросов по причинам.
+
+    Returns:
+        Dict[str, int]: Общие счетчики из Redis или счетчики процесса
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            return {key.decode(): int(value) for key, value in client.hgetall(SHED_KEY).items()}
+        except Exception as e:
+            _redis_error(e)
+    with _memory_lock:
+        return dict(_memory_shed)
+
+
+def reset_throttling() -> None:
+    """Очищает корзины и счетчики в памяти процесса и состояние подключения к Redis."""
+    global _redis, _redis_failed_at
+    _redis = None
+    _redis_failed_at = None
+    with _memory_lock:
+        _memory_buckets.clear()
+        _memory_shed.clear()
+        _pending_shed.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket на пользователя и класс действий.
+
+    Класс действия берется из атрибута viewset throttle_scopes
+    ({действие: класс}); действия без класса не ограничиваются.
+    """
+
+    def allow_request(self, request: Any, view: Any) -> bool:
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if scope is None or scope not in settings.THROTTLE_BUCKETS:
+            return True
+        capacity, rate = settings.THROTTLE_BUCKETS[scope]
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        wait = take_token(f'{scope}:{ident}', capacity, rate)
+        if wait <= 0:
+            return True
+        self.wait_seconds = wait
+        record_shed(f'throttle:{scope}')
+        return False
+
+    def wait(self) -> Optional[float]:
+        return self.wait_seconds
+
+
+class LoadSheddingMiddleware:
+    """
+    Ограничивает количество одновременно обрабатываемых запросов процесса.
+
+    Запросы сверх LOAD_SHED_MAX_CONCURRENT (изменяющие - сверх
+    LOAD_SHED_MAX_CONCURRENT_WRITES) сразу получают 503 с Retry-After,
+    а не ждут в очереди к базе. Статика и медиа не учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.active = 0
+        self.active_writes = 0
+        self.exempt = tuple(prefix for prefix in (settings.STATIC_URL, settings.MEDIA_URL) if prefix)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(self.exempt):
+            return self.get_response(request)
+        write = request.method not in SAFE_METHODS
+        rejected = self.acquire(write)
+        if rejected is not None:
+            return rejected
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(write)
+
+    async def __acall__(self, request: HttpRequest) -> Any:
+        if request.path.startswith(self.exempt):
+            return await self.get_response(request)
+        write = request.method not in SAFE_METHODS
+        rejected = self.acquire(write)
+        if rejected is not None:
+            return rejected
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(write)
+
+    def acquire(self, write: bool) -> Optional[JsonResponse]:
+        """
+        Занимает место для запроса.
+
+        Args:
+            write: Изменяющий запрос
+
+        Returns:
+            Optional[JsonResponse]: Ответ 503, если мест нет, иначе None
+        """
+        with self.lock:
+            if self.active >= settings.LOAD_SHED_MAX_CONCURRENT:
+                reason = 'concurrency'
+            elif write and self.active_writes >= settings.LOAD_SHED_MAX_CONCURRENT_WRITES:
+                reason = 'write_concurrency'
+            else:
+                self.active += 1
+                self.active_writes += write
+                return None
+        record_shed(reason)
+        response = JsonResponse({'error': 'Сервер перегружен, повторите запрос позже'}, status=503)
+        response['Retry-After'] = str(math.ceil(settings.LOAD_SHED_RETRY_AFTER))
+        return response
+
+    def release(self, write: bool) -> None:
+        """
+        Освобождает место запроса.
+
+        Args:
+            write: Изменяющий запрос
+        """
+        with self.lock:
+            self.active -= 1
+            self.active_writes -= write
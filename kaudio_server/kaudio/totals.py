@@ -0,0 +1,69 @@
+"""
+Пересчет денормализованных итогов альбомов и плейлистов.
+
+Количество треков и общая длительность - счетчики из models.py,
+пересчитываемые одним UPDATE с коррелированными подзапросами,
+без загрузки объектов в Python.
+Для всего каталога UPDATE выполняется частями по диапазонам первичного
+ключа, чтобы не держать долгие блокировки.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Type
+
+from django.db import models
+from django.db.models import QuerySet
+
+from .counters import update_counters, update_in_chunks
+from .models import Album, Playlist
+
+TOTALS_COUNTERS = ['total_tracks', 'total_duration']
+
+
+def update_totals(queryset: QuerySet) -> int:
+    """
+    Пересчитывает количество треков и длительность альбомов или плейлистов одним UPDATE.
+
+    Args:
+        queryset: Альбомы или плейлисты
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    return update_counters(queryset, TOTALS_COUNTERS)
+
+
+class TotalsSpec(NamedTuple):
+    """
+    Описание пересчитываемых итогов модели.
+    """
+    model: Type[models.Model]
+    update: Callable[[QuerySet], int]
+    job_kind: str
+    ids_param: str
+
+
+TOTALS: Dict[str, TotalsSpec] = {
+    'album': TotalsSpec(Album, update_totals, 'recalculate_album_totals', 'album_ids'),
+    'playlist': TotalsSpec(Playlist, update_totals, 'recalculate_playlist_totals', 'playlist_ids'),
+}
+
+
+def recalculate_in_chunks(
+    spec: TotalsSpec,
+    ids: Optional[List[int]] = None,
+    chunk_size: int = 5000,
+    on_chunk: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    Пересчитывает итоги частями.
+
+    Args:
+        spec: Описание итогов
+        ids: ID объектов (None - все объекты)
+        chunk_size: Количество объектов в одном UPDATE
+        on_chunk: Вызывается с количеством обновленных и общим количеством объектов
+
+    Returns:
+        int: Количество обновленных объектов
+    """
+    return update_in_chunks(spec.model, spec.update, ids, chunk_size, on_chunk)
@@ -9,7 +9,7 @@ URL конфигурация для приложения kaudio.
 - Оптимизированные эндпоинты
 """
 
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
@@ -19,7 +19,8 @@ from .views import (
     TrackGenreViewSet, StatisticsViewSet, TrackReviewViewSet, AlbumReviewViewSet,
     OptimizedTrackListView, OptimizedPlaylistListView, OptimizedUserReviewsView,
     login_view, register_view, upload_track_view, recent_tracks, recent_albums,
-    get_tracks_analytics, get_user_activity, social_login_view
+    get_tracks_analytics, get_user_activity, social_login_view, hls_file, JobViewSet,
+    load_shedding_stats
 )
 
 # Роутер для ViewSet'ов
@@ -41,6 +42,7 @@ router.register(r'track-genres', TrackGenreViewSet)
 router.register(r'statistics', StatisticsViewSet, basename='statistics')
 router.register(r'track-reviews', TrackReviewViewSet, basename='track-review')
 router.register(r'album-reviews', AlbumReviewViewSet, basename='album-review')
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     # Основные API маршруты через роутер
@@ -60,9 +62,17 @@ urlpatterns = [
     path('recent/tracks/', recent_tracks, name='recent-tracks'),
     path('recent/albums/', recent_albums, name='recent-albums'),
     
+    # Плейлисты и сегменты HLS (неизменяемые, кэшируются бессрочно)
+    re_path(
+        r'^tracks/(?P<track_id>\d+)/hls/(?P<version>[0-9a-f]{12})/(?P<name>index\.m3u8|seg_\d{5}\.mp3)$',
+        hls_file,
+        name='track-hls-file'
+    ),
+    
     # Аналитика и статистика
     path('tracks-analytics/', get_tracks_analytics, name='tracks-analytics'),
     path('user-activity/', get_user_activity, name='user-activity'),
+    path('load-shedding/', load_shedding_stats, name='load-shedding'),
     
     # Оптимизированные эндпоинты для улучшенной производительности
     path('optimized/tracks/', OptimizedTrackListView.as_view(), name='optimized-tracks'),
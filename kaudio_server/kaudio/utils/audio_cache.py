@@ -0,0 +1,361 @@
+"""
+Кэш начальных фрагментов аудиофайлов для быстрого первого байта.
+
+Начало каждого закэшированного файла хранится отдельным файлом в общем
+каталоге (по умолчанию в /dev/shm) и отображается в память через mmap,
+поэтому одни и те же страницы разделяются всеми процессами сервера.
+Размер кэша ограничен бюджетом в байтах; при превышении удаляются
+фрагменты, к которым дольше всего не обращались (время изменения файла
+обновляется при каждом попадании).
+
+Ключ кэша - имя файла в хранилище. Имена в хранилище с адресацией по
+содержимому не переиспользуются для другого содержимого, поэтому
+инвалидация не нужна.
+"""
+
+import fcntl
+import hashlib
+import io
+import logging
+import mmap
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from ..metrics import inc
+
+logger = logging.getLogger(__name__)
+
+HEAD_SUFFIX = '.head'
+WARM_LOCK_NAME = '.warm.lock'
+
+
+class AudioHeadCache:
+    """
+    LRU-кэш начальных фрагментов аудиофайлов с бюджетом в байтах.
+    """
+
+    def __init__(self, directory: str, budget: int, head_size: int) -> None:
+        """
+        Args:
+            directory: Общий каталог фрагментов
+            budget: Максимальный суммарный размер фрагментов в байтах
+            head_size: Размер фрагмента в байтах
+        """
+        self.directory = directory
+        self.budget = budget
+        self.head_size = head_size
+        # Отображения, открытые текущим процессом
+        self._maps: 'OrderedDict[str, mmap.mmap]' = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        """
+        Возвращает путь к фрагменту файла хранилища.
+
+        Args:
+            name: Имя файла в хранилище
+
+        Returns:
+            str: Путь к фрагменту
+        """
+        return os.path.join(self.directory, hashlib.sha1(name.encode()).hexdigest() + HEAD_SUFFIX)
+
+    def get(self, name: str, size: int) -> Optional[mmap.mmap]:
+        """
+        Возвращает закэшированное начало файла.
+
+        Args:
+            name: Имя файла в хранилище
+            size: Текущий размер файла; фрагмент другой длины считается устаревшим
+
+        Returns:
+            Optional[mmap.mmap]: Отображение фрагмента или None при промахе
+        """
+        path = self._path(name)
+        try:
+            # Обновление времени изменения - отметка использования для LRU
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(name)
+            return None
+
+        with self._lock:
+            head = self._maps.get(name)
+            if head is not None:
+                self._maps.move_to_end(name)
+                return head
+
+        try:
+            with open(path, 'rb') as source:
+                head = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(head) != min(size, self.head_size):
+            head.close()
+            os.remove(path)
+            return None
+
+        with self._lock:
+            self._maps[name] = head
+            self._trim_maps()
+        return head
+
+    def put(self, name: str, path: str) -> None:
+        """
+        Помещает в кэш начало файла.
+
+        Args:
+            name: Имя файла в хранилище
+            path: Путь к файлу на диске
+        """
+        target = self._path(name)
+        if os.path.exists(target):
+            return
+        with open(path, 'rb') as source:
+            head = source.read(self.head_size)
+        temp_path = os.path.join(self.directory, f'.{uuid.uuid4().hex}.tmp')
+        with open(temp_path, 'wb') as destination:
+            destination.write(head)
+        os.replace(temp_path, target)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Удаляет давно не использованные фрагменты сверх бюджета.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(HEAD_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def warm(self, files: Iterable[Tuple[str, str]]) -> int:
+        """
+        Заполняет кэш файлами в порядке убывания приоритета, пока хватает бюджета.
+
+        Args:
+            files: Пары (имя в хранилище, путь на диске)
+
+        Returns:
+            int: Количество закэшированных файлов
+        """
+        used = 0
+        count = 0
+        for name, path in files:
+            try:
+                size = min(os.path.getsize(path), self.head_size)
+                if used + size > self.budget:
+                    break
+                self.put(name, path)
+            except OSError:
+                continue
+            used += size
+            count += 1
+        return count
+
+    def _forget(self, name: str) -> None:
+        """
+        Забывает отображение фрагмента, удаленного из общего каталога.
+
+        Отображение не закрывается явно: его может еще читать поток ответа,
+        оно будет закрыто сборщиком мусора.
+
+        Args:
+            name: Имя файла в хранилище
+        """
+        with self._lock:
+            self._maps.pop(name, None)
+
+    def _trim_maps(self) -> None:
+        """
+        Забывает старые отображения процесса сверх бюджета.
+
+        Вызывается под блокировкой.
+        """
+        total = sum(len(head) for head in self._maps.values())
+        while total > self.budget and len(self._maps) > 1:
+            _, head = self._maps.popitem(last=False)
+            total -= len(head)
+
+
+class HeadCachedFile(io.RawIOBase):
+    """
+    Файлоподобный объект: начало читается из кэша, остаток - с диска.
+    """
+
+    def __init__(self, head: mmap.mmap, path: str, size: int) -> None:
+        """
+        Args:
+            head: Закэшированное начало файла
+            path: Путь к файлу на диске
+            size: Размер файла
+        """
+        super().__init__()
+        self.head = memoryview(head)
+        self.path = path
+        self.size = size
+        self.position = 0
+        self.tail: Optional[io.BufferedReader] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer: bytearray) -> int:
+        if self.position < len(self.head):
+            count = min(len(buffer), len(self.head) - self.position)
+            buffer[:count] = self.head[self.position:self.position + count]
+        else:
+            # Файл с диска открывается только когда закончился фрагмент из памяти
+            if self.tail is None:
+                self.tail = open(self.path, 'rb')
+            self.tail.seek(self.position)
+            count = self.tail.readinto(buffer)
+        self.position += count
+        return count
+
+    def close(self) -> None:
+        if self.tail is not None:
+            self.tail.close()
+            self.tail = None
+        self.head.release()
+        super().close()
+
+
+_cache: Optional[AudioHeadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_head_cache() -> Optional[AudioHeadCache]:
+    """
+    Возвращает кэш процесса или None, если кэш отключен (AUDIO_HEAD_CACHE_BYTES = 0).
+
+    Returns:
+        Optional[AudioHeadCache]: Кэш начальных фрагментов
+    """
+    global _cache
+    if not settings.AUDIO_HEAD_CACHE_BYTES:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.directory != settings.AUDIO_HEAD_CACHE_DIR:
+            _cache = AudioHeadCache(
+                settings.AUDIO_HEAD_CACHE_DIR,
+                settings.AUDIO_HEAD_CACHE_BYTES,
+                settings.AUDIO_HEAD_CACHE_HEAD_SIZE
+            )
+        return _cache
+
+
+def open_audio(name: str, path: str, play_count: int) -> io.RawIOBase:
+    """
+    Открывает аудиофайл для отдачи, по возможности с началом из кэша.
+
+    Файлы популярных треков (не меньше AUDIO_HEAD_CACHE_MIN_PLAYS
+    прослушиваний) помещаются в кэш при первом промахе.
+
+    Args:
+        name: Имя файла в хранилище
+        path: Путь к файлу на диске
+        play_count: Количество прослушиваний трека
+
+    Returns:
+        io.RawIOBase: Файлоподобный объект для чтения
+    """
+    cache = get_audio_head_cache()
+    if cache is None:
+        return open(path, 'rb')
+
+    size = os.path.getsize(path)
+    head = cache.get(name, size)
+    inc('kaudio_cache_requests_total', cache='audio_head', result='miss' if head is None else 'hit')
+    if head is None and play_count >= settings.AUDIO_HEAD_CACHE_MIN_PLAYS:
+        try:
+            cache.put(name, path)
+            head = cache.get(name, size)
+        except OSError:
+            logger.exception('Не удалось поместить в кэш начало файла %s', name)
+    if head is None:
+        return open(path, 'rb')
+    return HeadCachedFile(head, path, size)
+
+
+def warm_audio_head_cache() -> int:
+    """
+    Заполняет кэш началами файлов самых прослушиваемых треков.
+
+    Прогрев выполняет только один процесс на сервере: остальные пропускают
+    его, не получив блокировку.
+
+    Returns:
+        int: Количество закэшированных файлов
+    """
+    cache = get_audio_head_cache()
+    if cache is None:
+        return 0
+
+    from ..models import Track
+
+    with open(os.path.join(cache.directory, WARM_LOCK_NAME), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        tracks = Track.objects.exclude(audio_file='').exclude(audio_file__isnull=True).order_by(
+            '-play_count'
+        ).only('id', 'audio_file')
+        return cache.warm(
+            (track.audio_file.name, track.audio_file.path)
+            for track in tracks.iterator(chunk_size=500)
+        )
+
+
+def start_warming() -> None:
+    """
+    Запускает прогрев кэша в фоновом потоке, если он включен AUDIO_HEAD_CACHE_WARM_ON_STARTUP.
+    """
+    if not settings.AUDIO_HEAD_CACHE_WARM_ON_STARTUP or get_audio_head_cache() is None:
+        return
+
+    def run() -> None:
+        from django.db import connection
+        try:
+            count = warm_audio_head_cache()
+            logger.info('Кэш начала аудиофайлов прогрет: %s файлов', count)
+        except Exception:
+            logger.exception('Не удалось прогреть кэш начала аудиофайлов')
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name='audio-head-cache-warmup', daemon=True).start()
@@ -0,0 +1,243 @@
+"""
+Упаковка MP3 в HLS (packed audio) без перекодирования.
+
+Файл режется по границам кадров MPEG на сегменты заданной длительности.
+Каждый сегмент начинается с тега ID3 с меткой времени
+com.apple.streaming.transportStreamTimestamp, как требует спецификация
+HLS для packed audio. Плейлист и сегменты кладутся в каталог,
+имя которого содержит версию аудиофайла, поэтому их можно кэшировать бессрочно.
+
+Модуль не импортирует модели и может использоваться в дочерних процессах.
+"""
+
+import fcntl
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Iterator, List, Tuple
+
+from django.core.files.storage import default_storage
+
+from .mp3 import Buffer, Mp3Frame, UnsupportedAudioFormat, is_info_frame, iter_frames
+
+HLS_PREFIX = 'hls'
+PLAYLIST_NAME = 'index.m3u8'
+TIMESTAMP_OWNER = b'com.apple.streaming.transportStreamTimestamp\x00'
+
+
+def hls_directory(track_id: int, version: str) -> str:
+    """
+    Возвращает каталог пакета HLS для версии аудиофайла трека.
+
+    Args:
+        track_id: ID трека
+        version: Версия аудиофайла
+
+    Returns:
+        str: Относительный путь в хранилище
+    """
+    return f'{HLS_PREFIX}/{track_id}/{version}'
+
+
+def segment_name(index: int) -> str:
+    """
+    Возвращает имя файла сегмента.
+
+    Args:
+        index: Порядковый номер сегмента
+
+    Returns:
+        str: Имя файла
+    """
+    return f'seg_{index:05d}.mp3'
+
+
+def _syncsafe(value: int) -> bytes:
+    """
+    Кодирует число в 28-битный syncsafe формат ID3v2.4.
+
+    Args:
+        value: Число
+
+    Returns:
+        bytes: 4 байта
+    """
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def timestamp_tag(seconds: float) -> bytes:
+    """
+    Формирует тег ID3 с PTS начала сегмента (90 кГц, 33 бита).
+
+    Args:
+        seconds: Время начала сегмента
+
+    Returns:
+        bytes: Тег ID3v2.4 с одним кадром PRIV
+    """
+    pts = round(seconds * 90000) & ((1 << 33) - 1)
+    payload = TIMESTAMP_OWNER + struct.pack('>Q', pts)
+    frame = b'PRIV' + _syncsafe(len(payload)) + b'\x00\x00' + payload
+    return b'ID3\x04\x00\x00' + _syncsafe(len(frame)) + frame
+
+
+def split_segments(frames: List[Mp3Frame], segment_duration: float) -> Iterator[List[Mp3Frame]]:
+    """
+    Группирует кадры в сегменты не короче заданной длительности.
+
+    Args:
+        frames: Кадры файла
+        segment_duration: Целевая длительность сегмента в секундах
+
+    Yields:
+        List[Mp3Frame]: Кадры очередного сегмента
+    """
+    current: List[Mp3Frame] = []
+    elapsed = 0.0
+    for frame in frames:
+        current.append(frame)
+        elapsed += frame.duration
+        if elapsed >= segment_duration:
+            yield current
+            current, elapsed = [], 0.0
+    if current:
+        yield current
+
+
+def build_segments(data: Buffer, segment_duration: float) -> Iterator[Tuple[bytes, float]]:
+    """
+    Нарезает MP3 на сегменты HLS.
+
+    Первый кадр сегмента может ссылаться на резерв битов предыдущего кадра,
+    поэтому при переходе сразу к середине трека возможен короткий артефакт
+    в начале сегмента; при последовательном воспроизведении кадры идут подряд.
+
+    Args:
+        data: Содержимое MP3 файла
+        segment_duration: Целевая длительность сегмента в секундах
+
+    Yields:
+        Tuple[bytes, float]: Содержимое сегмента и его длительность
+
+    Raises:
+        UnsupportedAudioFormat: Если файл не является MP3
+    """
+    frames = list(iter_frames(data))
+    if frames and is_info_frame(data, frames[0]):
+        frames = frames[1:]
+    if not frames or any(frame.layer != 3 for frame in frames):
+        raise UnsupportedAudioFormat('Для HLS поддерживаются только MP3 (MPEG Layer III)')
+
+    start = 0.0
+    for segment in split_segments(frames, segment_duration):
+        duration = sum(frame.duration for frame in segment)
+        body = b''.join(bytes(data[frame.offset:frame.offset + frame.length]) for frame in segment)
+        yield timestamp_tag(start) + body, duration
+        start += duration
+
+
+def build_playlist(durations: List[float]) -> str:
+    """
+    Формирует VOD плейлист m3u8.
+
+    Args:
+        durations: Длительности сегментов в секундах
+
+    Returns:
+        str: Текст плейлиста
+    """
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{math.ceil(max(durations))}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        '#EXT-X-INDEPENDENT-SEGMENTS',
+    ]
+    for index, duration in enumerate(durations):
+        lines.append(f'#EXTINF:{duration:.3f},')
+        lines.append(segment_name(index))
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def remove_hls_packages(track_id: int) -> None:
+    """
+    Удаляет все пакеты HLS трека.
+
+    Args:
+        track_id: ID трека
+    """
+    shutil.rmtree(default_storage.path(f'{HLS_PREFIX}/{track_id}'), ignore_errors=True)
+
+
+def _write_file(path: str, content: bytes) -> None:
+    """
+    Записывает файл пакета с правами, заданными для хранилища.
+
+    Args:
+        path: Путь к файлу
+        content: Содержимое
+    """
+    with open(path, 'wb') as destination:
+        destination.write(content)
+    if default_storage.file_permissions_mode is not None:
+        os.chmod(path, default_storage.file_permissions_mode)
+
+
+def package_track(path: str, track_id: int, version: str, segment_duration: float) -> str:
+    """
+    Создает пакет HLS для аудиофайла трека и удаляет пакеты прежних версий.
+
+    Пакет собирается во временном каталоге и переименовывается в каталог
+    версии целиком, поэтому читатели видят либо прежний пакет, либо новый
+    со всеми сегментами. Замена и удаление прежних версий выполняются под
+    блокировкой трека, чтобы параллельные упаковки не мешали друг другу.
+
+    Args:
+        path: Путь к аудиофайлу
+        track_id: ID трека
+        version: Версия аудиофайла
+        segment_duration: Целевая длительность сегмента в секундах
+
+    Returns:
+        str: Имя плейлиста в хранилище
+
+    Raises:
+        UnsupportedAudioFormat: Если файл не является MP3
+    """
+    root = default_storage.path(f'{HLS_PREFIX}/{track_id}')
+    os.makedirs(root, exist_ok=True)
+    building = tempfile.mkdtemp(prefix='.', suffix='.tmp', dir=root)
+    durations: List[float] = []
+
+    try:
+        with open(path, 'rb') as source:
+            try:
+                data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise UnsupportedAudioFormat('Пустой файл')
+            with data:
+                for index, (content, duration) in enumerate(build_segments(data, segment_duration)):
+                    _write_file(os.path.join(building, segment_name(index)), content)
+                    durations.append(duration)
+        _write_file(os.path.join(building, PLAYLIST_NAME), build_playlist(durations).encode())
+        os.chmod(building, default_storage.directory_permissions_mode or 0o755)
+
+        with open(os.path.join(root, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            target = os.path.join(root, version)
+            if os.path.exists(target):
+                # Повторная упаковка той же версии: прежний пакет убираем в сторону
+                os.replace(target, tempfile.mkdtemp(prefix='.', suffix='.old', dir=root) + '/package')
+            os.replace(building, target)
+            for entry in os.listdir(root):
+                if entry != version and (not entry.startswith('.') or entry.endswith('.old')):
+                    shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+
+    return f'{hls_directory(track_id, version)}/{PLAYLIST_NAME}'
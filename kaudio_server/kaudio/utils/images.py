@@ -0,0 +1,125 @@
+"""
+Генерация уменьшенных копий изображений обложек и профилей.
+
+Для каждого исходного изображения создаются копии фиксированной ширины
+в форматах WebP и JPEG. Копии сохраняются рядом с оригиналом под именами
+вида <имя>_<ширина>.<расширение>, поэтому для одинаковых файлов
+контентно-адресуемого хранилища они создаются один раз.
+
+Модуль не импортирует модели и может использоваться в дочерних процессах.
+"""
+
+import io
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def variant_name(name: str, width: int, image_format: str) -> str:
+    """
+    Формирует имя уменьшенной копии рядом с оригиналом.
+
+    Имя включает расширение оригинала: объекты с одинаковым содержимым,
+    но разными расширениями хранятся отдельно и не делят копии.
+
+    Args:
+        name: Имя исходного файла в хранилище
+        width: Ширина копии в пикселях
+        image_format: Ключ формата из VARIANT_FORMATS
+
+    Returns:
+        str: Имя файла копии
+    """
+    return f'{name}_{width}.{VARIANT_FORMATS[image_format][1]}'
+
+
+def variant_widths(original_width: int) -> List[int]:
+    """
+    Возвращает ширины копий без увеличения исходного изображения.
+
+    Args:
+        original_width: Ширина оригинала в пикселях
+
+    Returns:
+        List[int]: Отсортированный список ширин
+    """
+    return sorted({min(width, original_width) for width in settings.IMAGE_VARIANT_WIDTHS})
+
+
+def save_variant(name: str, content: bytes) -> None:
+    """
+    Записывает уменьшенную копию точно под заданным именем.
+
+    Storage.save при занятом имени подобрал бы другое, и параллельные
+    обработчики одного изображения записали бы копию под разными именами.
+    Поэтому копия пишется во временный файл рядом и атомарно
+    переименовывается: одинаковое содержимое просто заменяет друг друга.
+
+    Args:
+        name: Имя копии в хранилище
+        content: Содержимое копии
+    """
+    path = default_storage.path(name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as destination:
+            destination.write(content)
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(temp_path, default_storage.file_permissions_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def render_image_variants(name: str) -> Dict[str, Any]:
+    """
+    Создает уменьшенные копии изображения во всех форматах.
+
+    Уже существующие копии не пересоздаются.
+
+    Args:
+        name: Имя исходного файла в хранилище
+
+    Returns:
+        Dict[str, Any]: Имена копий по формату и ширине, а также
+        ключ source с именем исходного файла
+    """
+    with default_storage.open(name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    variants: Dict[str, Any] = {image_format: {} for image_format in VARIANT_FORMATS}
+
+    for width in variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+
+        for image_format, (pil_format, _) in VARIANT_FORMATS.items():
+            target = variant_name(name, width, image_format)
+            if not default_storage.exists(target):
+                frame = resized
+                if pil_format == 'JPEG' and has_alpha:
+                    # JPEG не поддерживает прозрачность: накладываем на белый фон
+                    frame = Image.new('RGB', resized.size, (255, 255, 255))
+                    frame.paste(resized, mask=resized.getchannel('A'))
+                buffer = io.BytesIO()
+                frame.save(buffer, pil_format, quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+                save_variant(target, buffer.getvalue())
+            variants[image_format][str(width)] = target
+
+    variants['source'] = name
+    return variants
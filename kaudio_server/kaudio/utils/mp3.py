@@ -0,0 +1,364 @@
+"""
+Разбор заголовков кадров MPEG audio (MP3) без декодирования.
+
+Используется для построения волновой формы по энергии кадров,
+нарезки файлов на сегменты HLS и вырезания превью по границам кадров,
+а также для чтения длительности и текстовых тегов ID3v2 при импорте каталога.
+"""
+
+import mmap
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+Buffer = Union[bytes, bytearray, mmap.mmap]
+
+
+class UnsupportedAudioFormat(ValueError):
+    """
+    Исключение для файлов, которые нельзя разобрать как поддерживаемый аудиоформат.
+    """
+
+# Биты версии MPEG в заголовке кадра (значение 1 зарезервировано)
+MPEG_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+# Биты слоя в заголовке кадра (значение 0 зарезервировано)
+LAYERS = {1: 3, 2: 2, 3: 1}
+
+# Битрейты в кбит/с по (версия таблицы, слой)
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+
+# Размер side information Layer III в байтах по (MPEG-1, число каналов)
+SIDE_INFO_SIZES = {
+    (True, 1): 17,
+    (True, 2): 32,
+    (False, 1): 9,
+    (False, 2): 17,
+}
+
+
+# Текстовые кадры ID3v2.3/2.4 и ID3v2.2 с метаданными трека
+ID3_TEXT_FRAMES = {
+    'TIT2': 'title', 'TT2': 'title',
+    'TPE1': 'artist', 'TP1': 'artist',
+    'TALB': 'album', 'TAL': 'album',
+    'TRCK': 'track_number', 'TRK': 'track_number',
+    'TCON': 'genre', 'TCO': 'genre',
+    'TDRC': 'year', 'TYER': 'year', 'TYE': 'year',
+}
+
+ID3_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+
+class Mp3Frame(NamedTuple):
+    """
+    Описание одного кадра MPEG audio.
+    """
+    offset: int
+    length: int
+    version: float
+    layer: int
+    bitrate: int
+    sample_rate: int
+    samples: int
+    channels: int
+    crc: bool
+
+    @property
+    def duration(self) -> float:
+        """
+        Длительность кадра в секундах.
+
+        Returns:
+            float: Длительность кадра
+        """
+        return self.samples / self.sample_rate
+
+
+def _synchsafe(data: bytes) -> int:
+    """
+    Декодирует synchsafe-целое ID3v2 (7 значащих бит в каждом байте).
+
+    Args:
+        data: Байты числа
+
+    Returns:
+        int: Значение
+    """
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def id3v2_size(data: Buffer) -> int:
+    """
+    Возвращает размер тега ID3v2 в начале файла.
+
+    Args:
+        data: Содержимое файла
+
+    Returns:
+        int: Размер тега в байтах или 0, если тега нет
+    """
+    if len(data) < 10 or bytes(data[0:3]) != b'ID3':
+        return 0
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + _synchsafe(bytes(data[6:10])) + footer
+
+
+def read_id3_tags(data: Buffer) -> Dict[str, str]:
+    """
+    Читает текстовые теги ID3v2 в начале файла.
+
+    Поддерживаются версии 2.2-2.4 без рассинхронизации всего тега.
+    Несколько значений кадра (ID3v2.4) объединяются через "; ".
+
+    Args:
+        data: Содержимое файла
+
+    Returns:
+        Dict[str, str]: Значения title, artist, album, track_number, genre и year,
+            найденные в теге
+    """
+    size = id3v2_size(data)
+    major, flags = (data[3], data[5]) if size else (0, 0)
+    if not size or major not in (2, 3, 4) or flags & 0x80:
+        return {}
+
+    end = min(10 + _synchsafe(bytes(data[6:10])), len(data))
+    offset = 10
+    if flags & 0x40 and major == 3:
+        offset += 4 + int.from_bytes(bytes(data[10:14]), 'big')
+    elif flags & 0x40 and major == 4:
+        offset += _synchsafe(bytes(data[10:14]))
+    id_length, header_length = (3, 6) if major == 2 else (4, 10)
+
+    tags: Dict[str, str] = {}
+    while offset + header_length <= end:
+        frame_id = bytes(data[offset:offset + id_length])
+        if not frame_id.isalnum():
+            # Начало заполнения нулями
+            break
+        size_bytes = bytes(data[offset + id_length:offset + id_length * 2 if major == 2 else offset + 8])
+        frame_size = _synchsafe(size_bytes) if major == 4 else int.from_bytes(size_bytes, 'big')
+        body = bytes(data[offset + header_length:offset + header_length + frame_size])
+        offset += header_length + frame_size
+
+        key = ID3_TEXT_FRAMES.get(frame_id.decode('ascii'))
+        if key is None or key in tags or len(body) < 2:
+            continue
+        text = body[1:].decode(ID3_ENCODINGS.get(body[0], 'latin-1'), errors='replace')
+        values = [value.strip() for value in text.split('\x00') if value.strip()]
+        if values:
+            tags[key] = '; '.join(values)
+    return tags
+
+
+def parse_frame_header(data: Buffer, offset: int) -> Optional[Mp3Frame]:
+    """
+    Разбирает заголовок кадра по указанному смещению.
+
+    Args:
+        data: Содержимое файла
+        offset: Смещение предполагаемого заголовка
+
+    Returns:
+        Optional[Mp3Frame]: Кадр или None, если заголовок некорректен
+    """
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    # Свободный битрейт (индекс 0) не поддерживается
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = MPEG_VERSIONS[version_bits]
+    layer = LAYERS[layer_bits]
+    table_version = 1 if version == 1 else 2
+    table_layer = layer if table_version == 1 or layer == 1 else 2
+    bitrate = BITRATES[(table_version, table_layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+        samples = 384
+    elif layer == 2 or version == 1:
+        length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+    else:
+        length = 72 * bitrate // sample_rate + padding
+        samples = 576
+
+    return Mp3Frame(
+        offset=offset,
+        length=length,
+        version=version,
+        layer=layer,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        samples=samples,
+        channels=1 if (b3 >> 6) == 3 else 2,
+        crc=not (b1 & 0x01),
+    )
+
+
+def iter_frames(data: Buffer) -> Iterator[Mp3Frame]:
+    """
+    Перебирает кадры MPEG audio в файле.
+
+    Теги ID3v2 пропускаются. После потери синхронизации ложные синхрослова
+    отбрасываются проверкой того, что следом идет совместимый заголовок
+    следующего кадра.
+
+    Args:
+        data: Содержимое файла (bytes или mmap)
+
+    Yields:
+        Mp3Frame: Очередной кадр
+    """
+    size = len(data)
+    offset = id3v2_size(data)
+    synced = False
+    while offset + 4 <= size:
+        frame = parse_frame_header(data, offset)
+        if frame and offset + frame.length <= size:
+            end = offset + frame.length
+            following = parse_frame_header(data, end)
+            if synced or end + 4 > size or (
+                following and following.layer == frame.layer and following.sample_rate == frame.sample_rate
+            ):
+                yield frame
+                offset = end
+                synced = True
+                continue
+        # Поиск следующего синхрослова
+        synced = False
+        offset = data.find(b'\xff', offset + 1)
+        if offset < 0:
+            return
+
+
+def is_info_frame(data: Buffer, frame: Mp3Frame) -> bool:
+    """
+    Проверяет, является ли кадр служебным заголовком Xing/Info/VBRI.
+
+    Такой кадр не содержит звука и не учитывается в волновой форме.
+
+    Args:
+        data: Содержимое файла
+        frame: Первый кадр файла
+
+    Returns:
+        bool: True, если кадр служебный
+    """
+    if frame.layer != 3:
+        return False
+    side_info = SIDE_INFO_SIZES[(frame.version == 1, frame.channels)]
+    start = frame.offset + 4 + (2 if frame.crc else 0) + side_info
+    if bytes(data[start:start + 4]) in (b'Xing', b'Info'):
+        return True
+    return bytes(data[frame.offset + 36:frame.offset + 40]) == b'VBRI'
+
+
+def granule_gains(data: Buffer, frame: Mp3Frame) -> List[int]:
+    """
+    Извлекает global_gain каждой гранулы кадра Layer III.
+
+    Для каждой гранулы берется максимум по каналам. Гранулы без данных
+    (part2_3_length равен нулю) считаются тишиной и возвращаются как 0.
+
+    Args:
+        data: Содержимое файла
+        frame: Кадр Layer III
+
+    Returns:
+        List[int]: Значения global_gain (2 гранулы для MPEG-1, 1 для MPEG-2/2.5)
+    """
+    mpeg1 = frame.version == 1
+    side_size = SIDE_INFO_SIZES[(mpeg1, frame.channels)]
+    start = frame.offset + 4 + (2 if frame.crc else 0)
+    side = int.from_bytes(bytes(data[start:start + side_size]), 'big')
+    total_bits = side_size * 8
+
+    def read(position: int, count: int) -> int:
+        return (side >> (total_bits - position - count)) & ((1 << count) - 1)
+
+    if mpeg1:
+        # main_data_begin, private_bits, scfsi
+        position = 9 + (5 if frame.channels == 1 else 3) + 4 * frame.channels
+        granules, block = 2, 59
+    else:
+        position = 8 + (1 if frame.channels == 1 else 2)
+        granules, block = 1, 63
+
+    gains: List[int] = []
+    for _ in range(granules):
+        gain = 0
+        for _ in range(frame.channels):
+            if read(position, 12):
+                gain = max(gain, read(position + 21, 8))
+            position += block
+        gains.append(gain)
+    return gains
+
+
+def frame_index_at(frames: Sequence[Mp3Frame], seconds: float) -> int:
+    """
+    Возвращает индекс кадра, с которого начинается указанный момент времени.
+
+    Args:
+        frames: Кадры файла
+        seconds: Время от начала в секундах
+
+    Returns:
+        int: Индекс кадра
+    """
+    elapsed = 0.0
+    for index, frame in enumerate(frames):
+        if elapsed + frame.duration > seconds:
+            return index
+        elapsed += frame.duration
+    return len(frames)
+
+
+def audio_duration(data: Buffer) -> float:
+    """
+    Считает длительность звука по кадрам файла.
+
+    Args:
+        data: Содержимое файла
+
+    Returns:
+        float: Длительность в секундах
+
+    Raises:
+        UnsupportedAudioFormat: Если в файле нет кадров MPEG audio
+    """
+    duration = 0.0
+    found = False
+    for index, frame in enumerate(iter_frames(data)):
+        found = True
+        if index == 0 and is_info_frame(data, frame):
+            continue
+        duration += frame.duration
+    if not found:
+        raise UnsupportedAudioFormat('В файле не найдено кадров MPEG audio')
+    return duration
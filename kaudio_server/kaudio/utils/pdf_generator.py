@@ -1,20 +1,27 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import inch
-from django.utils.translation import gettext as _
-from django.db.models import F, ExpressionWrapper, FloatField
-from django.http import HttpResponse
-from typing import List, Any, Union
+from reportlab.pdfgen import canvas
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Iterable, Optional, Sequence
 import os
 
-# Регистрируем шрифт Montserrat вместо DejaVuSans
+# Шрифт Montserrat вместо DejaVuSans
 font_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 
                         'kaudio_client', 'src', 'fonts', 'Montserrat-Medium.ttf')
-pdfmetrics.registerFont(TTFont('Montserrat', font_path))
+
+
+@lru_cache(maxsize=None)
+def register_fonts() -> None:
+    """
+    Регистрирует шрифт Montserrat при первом построении PDF.
+    
+    Разбор TTF файла занимает заметное время, поэтому он выполняется
+    не при импорте модуля, а только когда отчет действительно строится.
+    """
+    pdfmetrics.registerFont(TTFont('Montserrat', font_path))
+
 
 def calculate_popularity_score(track: 'Track') -> float:
     """
@@ -38,139 +45,103 @@ def calculate_popularity_score(track: 'Track') -> float:
     
     return (normalized_plays * play_weight + normalized_likes * like_weight) * 100
 
-def generate_track_pdf(tracks: List['Track'], response: HttpResponse) -> None:
+
+PDF_MARGIN = 36
+PDF_TITLE_SIZE = 16
+PDF_HEADER_SIZE = 10
+PDF_ROW_SIZE = 8
+PDF_ROW_HEIGHT = 14
+
+
+def _fit(text: str, width: float, size: float) -> str:
     """
-    Генерирует PDF документ со списком треков.
-    
-    Создает таблицу с информацией о треках включая название, исполнителя,
-    альбом, длительность, статистику и рейтинг популярности.
+    Обрезает текст до ширины колонки.
     
     Args:
-        tracks: Список треков для включения в отчет
-        response: HTTP ответ для записи PDF
+        text: Текст ячейки
+        width: Доступная ширина в пунктах
+        size: Размер шрифта
+        
+    Returns:
+        str: Текст, помещающийся в колонку
     """
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    
-    # Стили
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontName='Montserrat',  # Используем Montserrat
-        fontSize=16,
-        spaceAfter=30
-    )
-    
-    # Заголовок
-    elements.append(Paragraph(_("Отчет по трекам"), title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Данные для таблицы
-    data = [[
-        _("Название"),
-        _("Исполнитель"),
-        _("Альбом"),
-        _("Длительность"),
-        _("Прослушивания"),
-        _("Лайки"),
-        _("Рейтинг")
-    ]]
-    
-    for track in tracks:
-        data.append([
-            track.title,
-            track.artist.email if track.artist else _("Нет исполнителя"),
-            track.album.title if track.album else _("Нет альбома"),
-            f"{track.duration // 60}:{track.duration % 60:02d}",
-            str(track.play_count),
-            str(track.likes_count),
-            f"{calculate_popularity_score(track):.2f}"
-        ])
-    
-    # Создаем таблицу
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Montserrat'),  # Используем Montserrat
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
+    if pdfmetrics.stringWidth(text, 'Montserrat', size) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(text + '…', 'Montserrat', size) > width:
+        text = text[:-1]
+    return text + '…'
 
-def generate_album_pdf(albums: List['Album'], response: HttpResponse) -> None:
+
+def write_table_pdf(
+    output: BinaryIO,
+    title: str,
+    headers: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    widths: Sequence[float],
+    on_row: Optional[Callable[[int], None]] = None
+) -> int:
     """
-    Генерирует PDF документ со списком альбомов.
+    Записывает таблицу в PDF постранично.
     
-    Создает таблицу с информацией об альбомах включая название, исполнителя,
-    дату выпуска, количество треков, длительность и жанры.
+    В отличие от platypus.Table, строки не накапливаются в памяти:
+    каждая строка сразу рисуется на холсте, а заполненная страница
+    закрывается, и на следующей повторяется шапка таблицы.
     
     Args:
-        albums: Список альбомов для включения в отчет
-        response: HTTP ответ для записи PDF
+        output: Файл или HTTP ответ для записи PDF
+        title: Заголовок отчета
+        headers: Заголовки колонок
+        rows: Строки таблицы
+        widths: Относительные ширины колонок
+        on_row: Вызывается с количеством записанных строк
+        
+    Returns:
+        int: Количество записанных строк
     """
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    
-    # Стили
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontName='Montserrat',  # Используем Montserrat
-        fontSize=16,
-        spaceAfter=30
-    )
-    
-    # Заголовок
-    elements.append(Paragraph(_("Отчет по альбомам"), title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Данные для таблицы
-    data = [[
-        _("Название"),
-        _("Исполнитель"),
-        _("Дата выпуска"),
-        _("Треков"),
-        _("Длительность"),
-        _("Жанры")
-    ]]
-    
-    for album in albums:
-        genres = ", ".join([genre.title for genre in album.genres.all()])
-        data.append([
-            album.title,
-            album.artist.email if album.artist else _("Нет исполнителя"),
-            album.release_date.strftime("%d.%m.%Y"),
-            str(album.total_tracks),
-            f"{album.total_duration // 60}:{album.total_duration % 60:02d}",
-            genres or _("Нет жанров")
-        ])
-    
-    # Создаем таблицу
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Montserrat'),  # Используем Montserrat
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
+    register_fonts()
+    page_width, page_height = letter
+    table_width = page_width - 2 * PDF_MARGIN
+    scale = table_width / sum(widths)
+    columns = [width * scale for width in widths]
+    pdf = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+    pdf.setTitle(title)
+    
+    def start_page(first: bool) -> float:
+        y = page_height - PDF_MARGIN
+        if first:
+            pdf.setFont('Montserrat', PDF_TITLE_SIZE)
+            pdf.drawString(PDF_MARGIN, y - PDF_TITLE_SIZE, title)
+            y -= PDF_TITLE_SIZE * 3
+        pdf.setFillColor(colors.grey)
+        pdf.rect(PDF_MARGIN, y - PDF_ROW_HEIGHT, table_width, PDF_ROW_HEIGHT, stroke=1, fill=1)
+        pdf.setFillColor(colors.whitesmoke)
+        pdf.setFont('Montserrat', PDF_HEADER_SIZE)
+        draw_cells(headers, y, PDF_HEADER_SIZE)
+        pdf.setFillColor(colors.black)
+        pdf.setFont('Montserrat', PDF_ROW_SIZE)
+        return y - PDF_ROW_HEIGHT
+    
+    def draw_cells(values: Sequence[Any], y: float, size: float) -> None:
+        x = PDF_MARGIN
+        for value, width in zip(values, columns):
+            pdf.drawCentredString(x + width / 2, y - PDF_ROW_HEIGHT + 4, _fit(str(value), width - 6, size))
+            pdf.line(x, y, x, y - PDF_ROW_HEIGHT)
+            x += width
+        pdf.line(x, y, x, y - PDF_ROW_HEIGHT)
+        pdf.line(PDF_MARGIN, y - PDF_ROW_HEIGHT, x, y - PDF_ROW_HEIGHT)
+    
+    y = start_page(first=True)
+    count = 0
+    for row in rows:
+        if y - PDF_ROW_HEIGHT < PDF_MARGIN:
+            pdf.showPage()
+            y = start_page(first=False)
+        draw_cells(row, y, PDF_ROW_SIZE)
+        y -= PDF_ROW_HEIGHT
+        count += 1
+        if on_row is not None:
+            on_row(count)
+    
+    pdf.showPage()
+    pdf.save()
+    return count
@@ -0,0 +1,94 @@
+"""
+Вырезание коротких превью из MP3 без перекодирования.
+
+Превью состоит из целых кадров MPEG исходного файла: начиная с заданного
+смещения или с самого громкого участка, громкость которого оценивается
+по global_gain гранул, как и для волновой формы.
+
+Модуль не импортирует модели и может использоваться в дочерних процессах.
+"""
+
+import mmap
+from typing import List, Optional
+
+from .mp3 import (
+    Buffer, Mp3Frame, UnsupportedAudioFormat, frame_index_at, granule_gains, is_info_frame, iter_frames
+)
+
+
+def loudest_window(frames: List[Mp3Frame], data: Buffer, window: int) -> int:
+    """
+    Находит начало окна из window кадров с наибольшей суммарной энергией.
+
+    Args:
+        frames: Кадры файла
+        data: Содержимое файла
+        window: Длина окна в кадрах
+
+    Returns:
+        int: Индекс первого кадра окна
+    """
+    if window >= len(frames):
+        return 0
+    # numpy загружается только при расчете, а не при импорте модуля задач
+    import numpy as np
+
+    gains = np.array([max(granule_gains(data, frame)) for frame in frames], dtype=np.float32)
+    energy = np.where(gains > 0, np.exp2((gains - 210) / 2), 0)
+    sums = np.convolve(energy, np.ones(window), mode='valid')
+    return int(np.argmax(sums))
+
+
+def cut_preview(data: Buffer, duration: float, offset: Optional[float] = None) -> bytes:
+    """
+    Вырезает превью из MP3 по границам кадров.
+
+    Args:
+        data: Содержимое MP3 файла
+        duration: Длительность превью в секундах
+        offset: Начало превью в секундах; None - самый громкий участок
+
+    Returns:
+        bytes: Кадры превью подряд
+
+    Raises:
+        UnsupportedAudioFormat: Если файл не является MP3
+    """
+    frames = list(iter_frames(data))
+    if frames and is_info_frame(data, frames[0]):
+        frames = frames[1:]
+    if not frames or any(frame.layer != 3 for frame in frames):
+        raise UnsupportedAudioFormat('Для превью поддерживаются только MP3 (MPEG Layer III)')
+
+    window = max(1, frame_index_at(frames, duration))
+    if offset is None:
+        start = loudest_window(frames, data, window)
+    else:
+        # Если трек короче смещения и превью, превью берется с конца трека
+        start = max(0, min(frame_index_at(frames, offset), len(frames) - window))
+    end = min(start + window, len(frames))
+    return bytes(data[frames[start].offset:frames[end - 1].offset + frames[end - 1].length])
+
+
+def cut_preview_file(path: str, duration: float, offset: Optional[float] = None) -> bytes:
+    """
+    Вырезает превью из аудиофайла на диске.
+
+    Args:
+        path: Путь к аудиофайлу
+        duration: Длительность превью в секундах
+        offset: Начало превью в секундах; None - самый громкий участок
+
+    Returns:
+        bytes: Содержимое превью
+
+    Raises:
+        UnsupportedAudioFormat: Если файл не является MP3
+    """
+    with open(path, 'rb') as source:
+        try:
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise UnsupportedAudioFormat('Пустой файл')
+        with data:
+            return cut_preview(data, duration, offset)
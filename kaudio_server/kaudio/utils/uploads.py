@@ -0,0 +1,232 @@
+"""
+Вспомогательные функции для возобновляемой загрузки аудиофайлов.
+
+Реализует серверную часть протокола tus 1.0.0: разбор метаданных,
+потоковую запись частей файла на диск с подсчетом SHA-256 за один проход
+и перенос готового файла в хранилище без повторного копирования.
+"""
+
+import base64
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+
+if TYPE_CHECKING:
+    from kaudio.models import TrackUpload
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,termination'
+
+# Кэш состояний хэширования по идентификатору загрузки: (смещение, объект hashlib).
+# Позволяет не перечитывать уже принятую часть файла при каждом PATCH запросе.
+_hashers: Dict[str, Tuple[int, Any]] = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadSizeExceeded(Exception):
+    """
+    Исключение при попытке записать больше байт, чем было объявлено.
+    """
+
+
+class UploadStateLost(Exception):
+    """
+    Исключение, если временный файл короче подтвержденного смещения.
+    """
+
+
+class PartialUploadFile(File):
+    """
+    Обертка над полностью загруженным временным файлом.
+
+    Метод temporary_file_path позволяет FileSystemStorage переместить файл
+    в MEDIA_ROOT переименованием, без повторной записи содержимого.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(open(path, 'rb'), name=os.path.basename(path))
+        self.path = path
+
+    def temporary_file_path(self) -> str:
+        """
+        Возвращает путь к временному файлу на диске.
+
+        Returns:
+            str: Абсолютный путь к файлу
+        """
+        return self.path
+
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """
+    Разбирает заголовок Upload-Metadata протокола tus.
+
+    Заголовок содержит пары "ключ значение_base64", разделенные запятыми.
+
+    Args:
+        header: Значение заголовка Upload-Metadata
+
+    Returns:
+        Dict[str, str]: Словарь декодированных метаданных
+
+    Raises:
+        ValueError: Если значение не является корректным base64
+    """
+    metadata: Dict[str, str] = {}
+    if not header:
+        return metadata
+
+    for pair in header.split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, value = pair.partition(' ')
+        metadata[key] = base64.b64decode(value.strip(), validate=True).decode('utf-8') if value else ''
+    return metadata
+
+
+def partial_upload_path(upload: 'TrackUpload') -> str:
+    """
+    Возвращает путь к файлу с принятыми частями загрузки.
+
+    Args:
+        upload: Сессия загрузки
+
+    Returns:
+        str: Абсолютный путь к временному файлу
+    """
+    return os.path.join(settings.TRACK_UPLOAD_TEMP_DIR, f'{upload.id}.part')
+
+
+@contextmanager
+def upload_lock(upload: 'TrackUpload') -> Iterator[None]:
+    """
+    Блокирует загрузку на время приема части файла.
+
+    Блокировка fcntl.flock на отдельном файле действует между процессами
+    сервера: параллельный PATCH ждет ее и затем заново проверяет смещение,
+    поэтому части файла не перемешиваются.
+
+    Args:
+        upload: Сессия загрузки
+    """
+    path = f'{partial_upload_path(upload)}.lock'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _resume_hasher(upload: 'TrackUpload', path: str) -> Any:
+    """
+    Возвращает объект SHA-256 для уже принятой части файла.
+
+    Если состояние хэширования отсутствует в кэше процесса (например, запрос
+    пришел в другой воркер), хэш восстанавливается чтением принятой части.
+
+    Args:
+        upload: Сессия загрузки
+        path: Путь к временному файлу
+
+    Returns:
+        Any: Объект hashlib.sha256
+    """
+    key = str(upload.id)
+    with _hashers_lock:
+        cached = _hashers.pop(key, None)
+    if cached and cached[0] == upload.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    if remaining:
+        with open(path, 'rb') as source:
+            while remaining:
+                chunk = source.read(min(settings.TRACK_UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    return hasher
+
+
+def append_upload_chunk(upload: 'TrackUpload', stream: Optional[BinaryIO], content_length: int) -> Tuple[int, Optional[str]]:
+    """
+    Дописывает тело PATCH запроса в временный файл загрузки.
+
+    Вызывается под upload_lock после проверки смещения. Данные читаются из потока блоками фиксированного размера, поэтому
+    потребление памяти не зависит от размера файла. Размер проверяется
+    по мере записи, SHA-256 считается в том же проходе.
+
+    Args:
+        upload: Сессия загрузки
+        stream: Поток тела запроса
+        content_length: Значение заголовка Content-Length
+
+    Returns:
+        Tuple[int, Optional[str]]: Новое смещение и SHA-256 файла,
+        если загрузка завершена
+
+    Raises:
+        UploadSizeExceeded: Если запрос превышает объявленный размер файла
+        UploadStateLost: Если принятая ранее часть файла утеряна
+    """
+    if upload.offset + content_length > upload.upload_length:
+        raise UploadSizeExceeded()
+
+    path = partial_upload_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if upload.offset and (not os.path.exists(path) or os.path.getsize(path) < upload.offset):
+        raise UploadStateLost()
+    hasher = _resume_hasher(upload, path)
+    offset = upload.offset
+    remaining = content_length
+
+    with open(path, 'ab') as destination:
+        # Отбрасываем байты, записанные после последнего подтвержденного смещения
+        destination.truncate(offset)
+        destination.seek(offset)
+        while remaining and stream is not None:
+            try:
+                chunk = stream.read(min(settings.TRACK_UPLOAD_CHUNK_SIZE, remaining))
+            except OSError:
+                # Соединение оборвалось: сохраняем все, что успели принять
+                break
+            if not chunk:
+                break
+            destination.write(chunk)
+            hasher.update(chunk)
+            offset += len(chunk)
+            remaining -= len(chunk)
+        destination.flush()
+        os.fsync(destination.fileno())
+
+    if offset < upload.upload_length:
+        with _hashers_lock:
+            _hashers[str(upload.id)] = (offset, hasher)
+
+    if offset >= upload.upload_length:
+        return offset, hasher.hexdigest()
+    return offset, None
+
+
+def discard_partial_upload(upload: 'TrackUpload') -> None:
+    """
+    Удаляет временный файл и состояние хэширования загрузки.
+
+    Args:
+        upload: Сессия загрузки
+    """
+    with _hashers_lock:
+        _hashers.pop(str(upload.id), None)
+    for path in (partial_upload_path(upload), f'{partial_upload_path(upload)}.lock'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,175 @@
+"""
+Построение волновой формы трека (пиков min/max) для плеера.
+
+Для WAV файлов пики считаются по отсчетам PCM, для MP3 - по энергии
+гранул (global_gain из side information), без декодирования звука.
+Результат квантуется в int8 и хранится как массив пар (min, max).
+
+UnsupportedAudioFormat определено в модуле mp3 и доступно отсюда
+для обратной совместимости.
+"""
+
+import mmap
+import wave
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .mp3 import UnsupportedAudioFormat, granule_gains, is_info_frame, iter_frames
+
+# Количество отсчетов PCM, сворачиваемых в одну точку промежуточной огибающей
+PCM_UNIT = 256
+PCM_BLOCK_FRAMES = PCM_UNIT * 256
+
+
+def quantize_peaks(minimums: np.ndarray, maximums: np.ndarray, resolution: int) -> bytes:
+    """
+    Сворачивает огибающую до заданного числа точек и квантует ее в int8.
+
+    Args:
+        minimums: Минимумы огибающей в диапазоне [-1, 1]
+        maximums: Максимумы огибающей в диапазоне [-1, 1]
+        resolution: Требуемое количество точек
+
+    Returns:
+        bytes: Пары (min, max) int8 подряд
+    """
+    count = min(resolution, len(minimums))
+    if not count:
+        return b''
+    edges = (np.arange(count) * len(minimums)) // count
+    peaks = np.empty(count * 2, dtype=np.float32)
+    peaks[0::2] = np.minimum.reduceat(minimums, edges)
+    peaks[1::2] = np.maximum.reduceat(maximums, edges)
+    return np.clip(np.round(peaks * 127), -128, 127).astype(np.int8).tobytes()
+
+
+def _pcm_samples(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """
+    Преобразует блок PCM в массив float32 [-1, 1] формы (кадры, каналы).
+
+    Args:
+        raw: Байты блока
+        sample_width: Размер отсчета в байтах
+        channels: Количество каналов
+
+    Returns:
+        np.ndarray: Нормализованные отсчеты
+
+    Raises:
+        UnsupportedAudioFormat: Для неподдерживаемой разрядности
+    """
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif sample_width == 3:
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        samples = np.where(values >= 1 << 23, values - (1 << 24), values).astype(np.float32) / (1 << 23)
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / (1 << 31)
+    else:
+        raise UnsupportedAudioFormat(f'Неподдерживаемая разрядность PCM: {sample_width * 8} бит')
+    return samples.reshape(-1, channels)
+
+
+def pcm_envelope(path: str) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Строит огибающую WAV файла, читая его блоками.
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, float]: Минимумы, максимумы и длительность в секундах
+    """
+    minimums, maximums = [], []
+    with wave.open(path, 'rb') as source:
+        channels = source.getnchannels()
+        sample_width = source.getsampwidth()
+        duration = source.getnframes() / source.getframerate()
+        while True:
+            raw = source.readframes(PCM_BLOCK_FRAMES)
+            if not raw:
+                break
+            samples = _pcm_samples(raw, sample_width, channels)
+            edges = np.arange(0, len(samples), PCM_UNIT)
+            minimums.append(np.minimum.reduceat(samples.min(axis=1), edges))
+            maximums.append(np.maximum.reduceat(samples.max(axis=1), edges))
+
+    if not minimums:
+        return np.zeros(0, np.float32), np.zeros(0, np.float32), duration
+    return np.concatenate(minimums), np.concatenate(maximums), duration
+
+
+def mp3_envelope(data: mmap.mmap) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Строит огибающую MP3 по global_gain гранул.
+
+    global_gain задает шаг квантования гранулы в логарифмической шкале
+    (2^(1/4) на единицу), поэтому амплитуда оценивается как 2^((gain - 210) / 4)
+    и нормализуется по 99-му перцентилю, чтобы редкие выбросы не сжимали график.
+
+    Args:
+        data: Содержимое файла
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, float]: Минимумы, максимумы и длительность в секундах
+
+    Raises:
+        UnsupportedAudioFormat: Если в файле нет кадров Layer III
+    """
+    gains = []
+    duration = 0.0
+    for index, frame in enumerate(iter_frames(data)):
+        if frame.layer != 3:
+            raise UnsupportedAudioFormat('Поддерживаются только MP3 (MPEG Layer III)')
+        if index == 0 and is_info_frame(data, frame):
+            continue
+        gains.extend(granule_gains(data, frame))
+        duration += frame.duration
+
+    if not gains:
+        raise UnsupportedAudioFormat('В файле не найдено кадров MP3')
+
+    gains = np.asarray(gains, dtype=np.float32)
+    amplitudes = np.where(gains > 0, np.exp2((gains - 210) / 4), 0).astype(np.float32)
+    reference = np.percentile(amplitudes, 99) or amplitudes.max() or 1.0
+    amplitudes = np.clip(amplitudes / reference, 0, 1)
+    return -amplitudes, amplitudes, duration
+
+
+def compute_waveforms(path: str, resolutions: Tuple[int, ...]) -> Tuple[Dict[int, bytes], float]:
+    """
+    Вычисляет волновую форму файла в нескольких разрешениях.
+
+    Args:
+        path: Путь к аудиофайлу
+        resolutions: Требуемые количества точек
+
+    Returns:
+        Tuple[Dict[int, bytes], float]: Пики по разрешению и длительность в секундах
+
+    Raises:
+        UnsupportedAudioFormat: Если формат файла не поддерживается
+    """
+    with open(path, 'rb') as source:
+        header = source.read(12)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            try:
+                minimums, maximums, duration = pcm_envelope(path)
+            except wave.Error as e:
+                raise UnsupportedAudioFormat(str(e))
+        else:
+            try:
+                data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise UnsupportedAudioFormat('Пустой файл')
+            with data:
+                minimums, maximums, duration = mp3_envelope(data)
+
+    return {
+        resolution: quantize_peaks(minimums, maximums, resolution)
+        for resolution in resolutions
+    }, duration
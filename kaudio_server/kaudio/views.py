@@ -2,18 +2,19 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action, api_view, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework.request import Request
-from django.db.models import Q, Sum, Count, Avg, F, Prefetch, QuerySet
+from django.db.models import Q, Sum, Count, Avg, F, Prefetch, QuerySet, Case, When, FloatField
 from .models import (
     Statistics, User, Artist, Genre, Album, Track, Playlist, UserActivity,
     Subscribe, UserSubscribe, UserAlbum, UserTrack, PlaylistTrack,
-    AlbumGenre, TrackGenre, TrackReview, AlbumReview
+    AlbumGenre, TrackGenre, TrackReview, AlbumReview, TrackWaveform, Job
 )
 from .serializers import (
     StatisticsSerializer, UserSerializer, ArtistSerializer, GenreSerializer, AlbumSerializer,
     TrackSerializer, PlaylistSerializer, UserActivitySerializer,
     SubscribeSerializer, UserSubscribeSerializer, UserAlbumSerializer,
     UserTrackSerializer, PlaylistTrackSerializer, AlbumGenreSerializer,
-    TrackGenreSerializer, TrackReviewSerializer, AlbumReviewSerializer
+    TrackGenreSerializer, TrackReviewSerializer, AlbumReviewSerializer, JobSerializer,
+    RatingDistributionSerializer
 )
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.authtoken.models import Token
@@ -21,12 +22,14 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-import os
 from django.conf import settings
 import logging
 from rest_framework.views import APIView
 from django.utils import timezone
-from django.http import FileResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.views.decorators.http import require_safe
 from django.db.models.functions import Lower
 from rest_framework.exceptions import PermissionDenied
 from datetime import timedelta
@@ -34,13 +37,16 @@ from django.db.models import Count
 from django.db.models.functions import TruncDate
 from django.db import connection
 import time
-from .filters import TrackFilter, AlbumFilter, ArtistFilter, PlaylistFilter, UserActivityFilter
+from .filters import TrackFilter, AlbumFilter, ArtistFilter, PlaylistFilter, UserActivityFilter, year_range
 import django_filters.rest_framework
+from .jobs import submit_job, track_audio_job_key, track_processing_job
+from .utils.audio_cache import open_audio
+from .utils.hls import PLAYLIST_NAME, hls_directory
+from .write_queue import run_write
+from .async_views import AsyncReadMixin, AsyncStreamMixin
+from .throttling import TokenBucketThrottle, shed_counts
 from typing import Dict, Any, Optional, List, Union, Callable, TypeVar, cast
 from django.core.files.uploadedfile import UploadedFile
-import requests
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 
 logger = logging.getLogger(__name__)
 
@@ -420,7 +426,7 @@ class ArtistViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -442,13 +448,15 @@ class GenreViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class AlbumViewSet(viewsets.ModelViewSet):
+class AlbumViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Album.objects.all()
     serializer_class = AlbumSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, django_filters.rest_framework.DjangoFilterBackend]
     filterset_class = AlbumFilter
     search_fields = ['title', 'artist__user__username']
     ordering_fields = ['release_date', 'total_tracks', 'total_duration']
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scopes = {'like': 'like', 'unlike': 'like'}
 
     def get_queryset(self):
         queryset = Album.objects.all()
@@ -467,8 +475,8 @@ class AlbumViewSet(viewsets.ModelViewSet):
             )
         if genre:
             queryset = queryset.filter(genres__title__icontains=genre)
-        if year:
-            queryset = queryset.filter(release_date__year=year)
+        if year and year.isdigit():
+            queryset = queryset.filter(**year_range('release_date', int(year)))
             
         return queryset.distinct()
 
@@ -507,6 +515,13 @@ class AlbumViewSet(viewsets.ModelViewSet):
         serializer = TrackSerializer(tracks, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='rating-distribution', url_name='rating-distribution')
+    def rating_distribution(self, request, pk=None):
+        """
+        Возвращает средний рейтинг и распределение оценок 1-5 из хранимых агрегатов.
+        """
+        return Response(RatingDistributionSerializer(self.get_object()).data)
+
     @action(detail=True, methods=['get'])
     def genres(self, request, pk=None):
         album = self.get_object()
@@ -517,9 +532,6 @@ class AlbumViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
         album = self.get_object()
-        
-        album.likes_count += 1
-        album.save()
 
         try:
             user = request.user
@@ -537,16 +549,15 @@ class AlbumViewSet(viewsets.ModelViewSet):
                     'message': 'Existing activity found'
                 })
             
-            activity = UserActivity.objects.create(
+            activity = run_write(
+                UserActivity.objects.create,
                 user=user,
                 activity_type='like_album',
                 album=album
             )
             
-            if not activity.album:
-                activity.album = album
-                activity.save()
-            
+            # Счетчик лайков обновлен сигналом активности
+            album.refresh_from_db(fields=['likes_count'])
             activity_serializer = UserActivitySerializer(activity)
             
             
@@ -567,18 +578,14 @@ class AlbumViewSet(viewsets.ModelViewSet):
     def unlike(self, request, pk=None):
         album = self.get_object()
         
-        if album.likes_count > 0:
-            album.likes_count -= 1
-            album.save()
-        
         try:
             user = request.user
-            deleted, _ = UserActivity.objects.filter(
+            deleted, _ = run_write(UserActivity.objects.filter(
                 user=user,
                 activity_type='like_album',
                 album=album
-            ).delete()
-            
+            ).delete)
+            album.refresh_from_db(fields=['likes_count'])
             
             return Response({
                 'album': self.get_serializer(album).data,
@@ -588,13 +595,15 @@ class AlbumViewSet(viewsets.ModelViewSet):
             return Response(self.get_serializer(album).data)
 
 
-class TrackViewSet(viewsets.ModelViewSet):
+class TrackViewSet(AsyncStreamMixin, viewsets.ModelViewSet):
     queryset = Track.objects.all()
     serializer_class = TrackSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, django_filters.rest_framework.DjangoFilterBackend]
     filterset_class = TrackFilter
     search_fields = ['title', 'artist__user__username', 'album__title']
     ordering_fields = ['release_date', 'play_count', 'likes_count', 'duration', 'avg_rating']
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scopes = {'play': 'play', 'like': 'like', 'unlike': 'like'}
 
     def get_queryset(self) -> QuerySet[Track]:
         """
@@ -602,11 +611,17 @@ class TrackViewSet(viewsets.ModelViewSet):
         """
         return Track.objects.all()
 
+    def get_list_queryset(self) -> QuerySet[Track]:
+        """
+        Возвращает queryset списка треков с аннотациями и предзагрузкой связанных данных.
+        """
+        return get_optimized_tracks_queryset(self.request)
+
     def list(self, request, *args, **kwargs):
         """
         Получает список треков с применением фильтрации, аннотаций и предзагрузки связанных данных.
         """
-        queryset = self.filter_queryset(get_optimized_tracks_queryset(request))
+        queryset = self.filter_queryset(self.get_list_queryset())
         logger.info(f"TrackViewSet: Найдено {queryset.count()} треков")
 
         page = self.paginate_queryset(queryset)
@@ -616,46 +631,151 @@ class TrackViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'], url_path='rating-distribution', url_name='rating-distribution')
+    def rating_distribution(self, request, pk=None):
+        """
+        Возвращает средний рейтинг и распределение оценок 1-5 из хранимых агрегатов.
+        """
+        return Response(RatingDistributionSerializer(self.get_object()).data)
+
     @action(detail=True, methods=['get'])
     def stream(self, request, pk=None):
-        """Возвращает аудиофайл для прослушивания"""
+        """
+        Возвращает аудиофайл для прослушивания.
+        
+        Начало файлов популярных треков отдается из общего кэша в памяти,
+        остаток читается с диска.
+        """
         track = self.get_object()
         
         if not track.audio_file:
             return Response({'error': 'Аудиофайл не найден'}, status=status.HTTP_404_NOT_FOUND)
         
-        response = FileResponse(track.audio_file, content_type='audio/mpeg')
+        audio = open_audio(track.audio_file.name, track.audio_file.path, track.play_count)
+        response = FileResponse(audio, content_type='audio/mpeg')
         response['Content-Disposition'] = f'inline; filename="{track.title}.mp3"'
         return response
 
+    @action(detail=True, methods=['get'])
+    def waveform(self, request, pk=None):
+        """
+        Возвращает предрасчитанную волновую форму трека.
+        
+        Тело ответа - массив int8 пар (min, max). Параметр resolution выбирает
+        ближайшее сохраненное разрешение не меньше запрошенного. Если параметр v
+        совпадает с текущей версией аудиофайла, ответ кэшируется бессрочно.
+        """
+        track = self.get_object()
+        try:
+            resolution = int(request.query_params.get('resolution', settings.WAVEFORM_RESOLUTIONS[0]))
+        except ValueError:
+            return Response({'error': 'Некорректное разрешение'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        waveforms = TrackWaveform.objects.filter(track=track, audio_version=track.audio_version)
+        waveform = (
+            waveforms.filter(resolution__gte=resolution).order_by('resolution').first()
+            or waveforms.order_by('-resolution').first()
+        )
+        if waveform is None:
+            return self.audio_not_ready(track, 'Волновая форма еще не готова')
+        
+        etag = f'"{waveform.audio_version}-{waveform.resolution}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(bytes(waveform.peaks), content_type='application/octet-stream')
+        response['ETag'] = etag
+        response['X-Waveform-Resolution'] = str(waveform.resolution)
+        if request.query_params.get('v') == waveform.audio_version:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def hls(self, request, pk=None):
+        """
+        Перенаправляет на плейлист HLS текущей версии аудиофайла.
+        
+        Плейлист и сегменты лежат по адресу с версией аудиофайла и кэшируются
+        бессрочно; само перенаправление кэшируется ненадолго.
+        """
+        track = self.get_object()
+        if not track.audio_file or not default_storage.exists(
+            f'{hls_directory(track.pk, track.audio_version)}/{PLAYLIST_NAME}'
+        ):
+            return self.audio_not_ready(track, 'Поток HLS еще не готов')
+        
+        response = HttpResponseRedirect(reverse('track-hls-file', args=[track.pk, track.audio_version, PLAYLIST_NAME]))
+        response['Cache-Control'] = 'private, max-age=60'
+        return response
+
+    def audio_not_ready(self, track: Track, message: str) -> Response:
+        """
+        Отвечает на запрос производных данных аудиофайла, которые еще не готовы.
+        
+        Волновая форма, HLS и превью рассчитываются одной задачей
+        process_track_audio с ключом идемпотентности трека. Задача ставится,
+        только если текущий аудиофайл еще не обрабатывался: пока она в работе
+        или если она завершилась ошибкой, повторные запросы ее не ставят.
+        
+        Args:
+            track: Трек
+            message: Сообщение об ошибке для ответа 404
+        
+        Returns:
+            Response: Ответ 404 или 415, если формат аудиофайла не поддерживается
+        """
+        if not track.audio_file:
+            return Response({'error': 'Аудиофайл не найден'}, status=status.HTTP_404_NOT_FOUND)
+        if track.unsupported_audio_version == track.audio_version:
+            return Response(
+                {'error': 'Формат аудиофайла не поддерживается'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        
+        key = track_audio_job_key(track.pk)
+        job = Job.objects.filter(idempotency_key=key).first()
+        processed = job is not None and job.status == Job.STATUS_SUCCEEDED and (
+            (job.result or {}).get('audio_file') == track.audio_file.name
+        )
+        if job is None or not job.is_finished or (job.status == Job.STATUS_SUCCEEDED and not processed):
+            job = submit_job('process_track_audio', {'track_id': track.pk}, idempotency_key=key)
+        elif job.status == Job.STATUS_FAILED:
+            message = 'Не удалось обработать аудиофайл'
+        return Response({'error': message, 'processing_job': str(job.pk)}, status=status.HTTP_404_NOT_FOUND)
+
     @action(detail=True, methods=['post'])
     def play(self, request, pk=None):
         track = self.get_object()
-        track.play_count += 1
-        track.save()
 
         try:
             user = request.user
-            activity = UserActivity.objects.create(
-                user=user,
-                activity_type='play',
-                track=track,
-                duration=request.data.get('duration', track.duration)
-            )
-            
-            if track.album:
-                album_activity = UserActivity.objects.create(
+            duration = request.data.get('duration', track.duration)
+
+            def record_play() -> UserActivity:
+                activity = UserActivity.objects.create(
                     user=user,
                     activity_type='play',
-                    album=track.album,
-                    duration=request.data.get('duration', track.duration)
+                    track=track,
+                    duration=duration
                 )
-            
+                if track.album_id:
+                    UserActivity.objects.create(
+                        user=user,
+                        activity_type='play',
+                        album_id=track.album_id,
+                        duration=duration
+                    )
+                Artist.objects.filter(pk=track.artist_id).update(monthly_listeners=F('monthly_listeners') + 1)
+                return activity
+
+            # Активность и счетчики пишет поток-писатель пакетом с другими запросами
+            activity = run_write(record_play)
             activity_serializer = UserActivitySerializer(activity, context={'request': request})
-            
-            artist = track.artist
-            artist.monthly_listeners += 1
-            artist.save()
+            # Счетчик прослушиваний обновлен сигналом активности
+            track.refresh_from_db(fields=['play_count'])
+            track.artist.refresh_from_db(fields=['monthly_listeners'])
             
             return Response({
                 'track': self.get_serializer(track).data,
@@ -669,17 +789,16 @@ class TrackViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
         track = self.get_object()
-        
-        track.likes_count += 1
-        track.save()
 
         try:
             user = request.user
-            activity = UserActivity.objects.create(
+            activity = run_write(
+                UserActivity.objects.create,
                 user=user,
                 activity_type='like',
                 track=track
             )
+            track.refresh_from_db(fields=['likes_count'])
             activity_serializer = UserActivitySerializer(activity)
             
             
@@ -695,18 +814,14 @@ class TrackViewSet(viewsets.ModelViewSet):
     def unlike(self, request, pk=None):
         track = self.get_object()
         
-        if track.likes_count > 0:
-            track.likes_count -= 1
-            track.save()
-        
         try:
             user = request.user
-            deleted, _ = UserActivity.objects.filter(
+            deleted, _ = run_write(UserActivity.objects.filter(
                 user=user,
                 activity_type='like',
                 track=track
-            ).delete()
-            
+            ).delete)
+            track.refresh_from_db(fields=['likes_count'])
             
             return Response({
                 'track': self.get_serializer(track).data,
@@ -848,10 +963,6 @@ class PlaylistViewSet(viewsets.ModelViewSet):
             position=position
         )
         
-        playlist.total_tracks = PlaylistTrack.objects.filter(playlist=playlist).count()
-        playlist.total_duration += track.duration
-        playlist.save()
-        
         if 'user_id' in request.data:
             try:
                 user = User.objects.get(pk=request.data['user_id'])
@@ -879,10 +990,6 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         except (Track.DoesNotExist, PlaylistTrack.DoesNotExist):
             return Response({'error': 'Track not found in playlist'}, status=404)
         
-        playlist.total_tracks -= 1
-        playlist.total_duration -= track.duration
-        playlist.save()
-        
         playlist_track.delete()
         
         track_ids = PlaylistTrack.objects.filter(playlist=playlist).order_by('position').values_list('id', flat=True)
@@ -954,6 +1061,48 @@ class UserActivityViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для просмотра состояния фоновых задач.
+    
+    Пользователь видит только свои задачи, администратор - все.
+    Клиент опрашивает /api/jobs/{id}/, пока статус не станет
+    succeeded или failed.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self) -> QuerySet[Job]:
+        """
+        Возвращает задачи, доступные текущему пользователю.
+        
+        Returns:
+            QuerySet[Job]: Задачи пользователя
+        """
+        queryset = Job.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """
+        Отдает файл результата задачи.
+        
+        Задача ищется среди доступных пользователю, поэтому файл получают
+        только владелец задачи и администратор.
+        """
+        job = self.get_object()
+        if not job.result_file:
+            return Response({'error': 'Файл результата не найден'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            result = job.result_file.open('rb')
+        except FileNotFoundError:
+            return Response({'error': 'Файл результата не найден'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(result, as_attachment=True)
+
+
 class SubscribeViewSet(viewsets.ModelViewSet):
     queryset = Subscribe.objects.all()
     serializer_class = SubscribeSerializer
@@ -1201,13 +1350,12 @@ def upload_track_view(request):
                 genre = get_object_or_404(Genre, id=genre_id)
                 TrackGenre.objects.create(track=track, genre=genre)
         
-        album.total_tracks = Track.objects.filter(album=album).count()
-        album.total_duration = Track.objects.filter(album=album).aggregate(
-            total=Sum('duration'))['total'] or 0
-        album.save()
-        
         serializer = TrackSerializer(track)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        job = track_processing_job(track.pk, request.user)
+        return Response(
+            {**serializer.data, 'processing_job': str(job.pk) if job else None},
+            status=status.HTTP_201_CREATED
+        )
         
     except Exception as e:
         return Response({
@@ -1266,20 +1414,10 @@ class ArtistPhotoUploadView(APIView):
                     'error': 'У вас нет прав для редактирования этого исполнителя'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            artist_images_dir = os.path.join(settings.MEDIA_ROOT, 'artist_images')
-            if not os.path.exists(artist_images_dir):
-                os.makedirs(artist_images_dir)
-            
-            filename = f"artist_{artist.id}_{image.name}"
-            filepath = os.path.join(artist_images_dir, filename)
-            
-            with open(filepath, 'wb+') as destination:
-                for chunk in image.chunks():
-                    destination.write(chunk)
-            
-            cover_image_url = f"{settings.MEDIA_URL}artist_images/{filename}"
+            # Хранилище само записывает файл один раз и пропускает дубликаты
             artist.cover_image = image
             artist.save()
+            cover_image_url = artist.cover_image.url
             
             return Response({
                 'cover_image_url': cover_image_url
@@ -1296,6 +1434,36 @@ class ArtistPhotoUploadView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@require_safe
+def hls_file(request, track_id: int, version: str, name: str) -> FileResponse:
+    """
+    Отдает плейлист или сегмент HLS трека.
+    
+    Путь содержит версию аудиофайла, поэтому содержимое по нему никогда
+    не меняется и может храниться в промежуточных кэшах бессрочно.
+    
+    Args:
+        request: HTTP запрос
+        track_id: ID трека
+        version: Версия аудиофайла
+        name: Имя плейлиста или сегмента
+        
+    Returns:
+        FileResponse: Содержимое файла
+        
+    Raises:
+        Http404: Если файл не найден
+    """
+    path = f'{hls_directory(track_id, version)}/{name}'
+    if not default_storage.exists(path):
+        raise Http404('Файл HLS не найден')
+    
+    content_type = 'application/vnd.apple.mpegurl' if name.endswith('.m3u8') else 'audio/mpeg'
+    response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def recent_tracks(request):
@@ -1350,6 +1518,8 @@ class StatisticsViewSet(viewsets.ViewSet):
 
 class ReviewViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scopes = {'create': 'review', 'update': 'review', 'partial_update': 'review', 'destroy': 'review'}
     
     def get_queryset(self):
         return self.queryset.all()
@@ -1448,16 +1618,15 @@ def get_tracks_analytics(request):
                 user_activities__timestamp__gte=start_date
             )
         ),
-        calculated_avg_rating=Avg("reviews__rating"),
-        review_count=Count("reviews")
     ).filter(total_plays__gt=0).order_by("-total_plays")[:10]
 
+    # Рейтинг и количество отзывов берутся из хранимых агрегатов трека
     data = [
         {
             "title": track.title,
             "play_count": track.total_plays,
-            "avg_rating": round(track.calculated_avg_rating, 2) if track.calculated_avg_rating else 0,
-            "review_count": track.review_count,
+            "avg_rating": round(track.average_rating, 2) if track.rating_count else 0,
+            "review_count": track.rating_count,
             "artist": track.artist.user.username if track.artist else "Неизвестный исполнитель"
         }
         for track in tracks
@@ -1465,6 +1634,15 @@ def get_tracks_analytics(request):
 
     return Response(data)
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def load_shedding_stats(request):
+    """
+    Возвращает количество отклоненных запросов по причинам.
+    """
+    return Response({'shed': shed_counts()})
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_user_activity(request):
@@ -1532,8 +1710,14 @@ def get_optimized_tracks_queryset(request, filters=None):
                 'genres',
                 Prefetch('trackgenre_set', queryset=TrackGenre.objects.select_related('genre'))
     ).annotate(
-        calculated_avg_rating=Avg('reviews__rating'),
-        total_plays=Count('user_activities', filter=Q(user_activities__activity_type='play'))
+        calculated_avg_rating=Case(
+            When(rating_count__gt=0, then=F('rating_sum') * 1.0 / F('rating_count')),
+            default=None,
+            output_field=FloatField()
+        ),
+        # play_count - счетчик прослушиваний, без JOIN и GROUP BY по активности
+        # сортировка по нему идет по индексу
+        total_plays=F('play_count')
     )
     if filters:
         qs = qs.filter(**filters)
@@ -1618,6 +1802,10 @@ def social_login_view(request):
     if provider != 'google' or not id_token_str:
         return Response({'error': 'provider и access_token обязательны'}, status=400)
 
+    # Клиент Google подключается только при входе через соцсеть
+    from google.auth.transport import requests as google_requests
+    from google.oauth2 import id_token
+
     try:
         idinfo = id_token.verify_oauth2_token(id_token_str, google_requests.Request())
         email = idinfo.get('email')
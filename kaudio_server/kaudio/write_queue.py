@@ -0,0 +1,241 @@
+"""
+Очередь записи с одним пакетным потоком-писателем.
+
+SQLite допускает одну пишущую транзакцию: при одновременных прослушиваниях
+и лайках каждый запрос открывает свою транзакцию, и запросы ждут
+блокировки друг друга. Частые записи (активность пользователей
+и счетчики) ставятся в очередь процесса, а один поток выполняет
+накопившиеся операции одной транзакцией: каждая операция - в своей
+точке сохранения, приращения счетчиков суммируются и применяются
+одним UPDATE на объект в конце пакета. Вызывающий поток ждет фиксации
+пакета и получает результат своей операции, поэтому ответ API содержит
+уже сохраненные данные.
+
+Для других баз или при WRITE_QUEUE_ENABLED = False операции выполняются
+сразу в вызывающем потоке.
+
+Пример:
+    activity = run_write(UserActivity.objects.create, user=user, activity_type='play', track=track)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import defer_counter_updates
+from .routers import mark_written
+
+logger = logging.getLogger(__name__)
+
+
+class WriteOperation(NamedTuple):
+    """
+    Операция записи, ожидающая выполнения.
+    """
+    func: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    future: Future
+
+
+class BatchedWriter:
+    """
+    Поток, выполняющий операции записи пакетами.
+
+    Args:
+        batch_size: Максимальное количество операций в одной транзакции
+        flush_interval: Сколько ждать следующих операций после первой (секунды)
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.pid: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Ставит операцию в очередь.
+
+        Args:
+            func: Функция, выполняющая запись
+            *args: Позиционные аргументы функции
+            **kwargs: Именованные аргументы функции
+
+        Returns:
+            Future: Результат функции после фиксации пакета
+        """
+        self.start()
+        future: Future = Future()
+        self.queue.put(WriteOperation(func, args, kwargs, future))
+        return future
+
+    def start(self) -> None:
+        """
+        Запускает поток-писатель, если он еще не запущен в этом процессе.
+
+        Поток запускается при первой операции, поэтому процессы, созданные
+        fork после импорта модуля, получают собственный поток.
+        """
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+                return
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self.run, name='kaudio-writer', daemon=True)
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Выполняет оставшиеся операции и останавливает поток.
+
+        Args:
+            timeout: Максимальное время ожидания (секунды)
+        """
+        if self.thread is None or self.pid != os.getpid():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def next_batch(self) -> Optional[List[WriteOperation]]:
+        """
+        Ждет первую операцию и добирает пакет операциями, пришедшими за flush_interval.
+
+        Returns:
+            Optional[List[WriteOperation]]: Пакет или None, если поток нужно остановить
+        """
+        operation = self.queue.get()
+        if operation is None:
+            return None
+        batch = [operation]
+        while len(batch) < self.batch_size:
+            try:
+                operation = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                break
+            if operation is None:
+                # Сигнал остановки обрабатывается после текущего пакета
+                self.queue.put(None)
+                break
+            batch.append(operation)
+        return batch
+
+    def run(self) -> None:
+        """
+        Цикл потока-писателя.
+        """
+        try:
+            while True:
+                batch = self.next_batch()
+                if batch is None:
+                    break
+                self.write_batch(batch)
+        finally:
+            connections.close_all()
+
+    def write_batch(self, batch: List[WriteOperation]) -> None:
+        """
+        Выполняет пакет операций одной транзакцией.
+
+        Ошибка одной операции откатывает только ее точку сохранения;
+        результаты передаются вызывающим потокам после фиксации.
+
+        Args:
+            batch: Операции пакета
+        """
+        results: List[Any] = []
+        try:
+            with transaction.atomic(), defer_counter_updates():
+                for operation in batch:
+                    try:
+                        # Приращения операции, откатившей точку сохранения, отбрасываются
+                        with transaction.atomic(), defer_counter_updates():
+                            results.append((True, operation.func(*operation.args, **operation.kwargs)))
+                    except Exception as e:
+                        results.append((False, e))
+        except Exception as e:
+            logger.exception('Не удалось зафиксировать пакет записи из %d операций', len(batch))
+            for operation in batch:
+                operation.future.set_exception(e)
+            return
+        for operation, (ok, value) in zip(batch, results):
+            if ok:
+                operation.future.set_result(value)
+            else:
+                operation.future.set_exception(value)
+
+
+_writer: Optional[BatchedWriter] = None
+
+
+def get_writer() -> BatchedWriter:
+    """
+    Возвращает поток-писатель процесса.
+
+    Returns:
+        BatchedWriter: Поток-писатель
+    """
+    global _writer
+    if _writer is None:
+        _writer = BatchedWriter(settings.WRITE_QUEUE_BATCH_SIZE, settings.WRITE_QUEUE_FLUSH_INTERVAL)
+        atexit.register(_writer.stop, settings.WRITE_QUEUE_TIMEOUT)
+    return _writer
+
+
+def backlog() -> int:
+    """
+    Возвращает количество операций, ожидающих в очереди процесса.
+
+    Returns:
+        int: Размер очереди потока-писателя
+    """
+    if _writer is None or _writer.pid != os.getpid():
+        return 0
+    return _writer.queue.qsize()
+
+
+def write_queue_enabled() -> bool:
+    """
+    Проверяет, выполняются ли записи через поток-писатель.
+
+    Returns:
+        bool: True для SQLite при включенной очереди записи
+    """
+    return settings.WRITE_QUEUE_ENABLED and connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+
+def run_write(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Выполняет операцию записи через поток-писатель и ждет ее фиксации.
+
+    Внутри открытой транзакции операция выполняется сразу: поток-писатель
+    не видит ее незафиксированных изменений.
+
+    Args:
+        func: Функция, выполняющая запись
+        *args: Позиционные аргументы функции
+        **kwargs: Именованные аргументы функции
+
+    Returns:
+        Any: Результат функции
+
+    Raises:
+        Exception: Исключение, выброшенное функцией
+    """
+    if not write_queue_enabled() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    mark_written()
+    return get_writer().submit(func, *args, **kwargs).result(settings.WRITE_QUEUE_TIMEOUT)
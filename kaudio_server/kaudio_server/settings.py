@@ -23,6 +23,7 @@ from datetime import timedelta
 import os
 import sentry_sdk
 import sys
+import tempfile
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -83,7 +84,16 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # CORS middleware должен быть первым
     'corsheaders.middleware.CorsMiddleware',
+    # Метрики Prometheus, при METRICS_ENABLED = False отключается
+    'kaudio.metrics.MetricsMiddleware',
     
+    # Сброс нагрузки до обращения к базе
+    'kaudio.throttling.LoadSheddingMiddleware',
+
+    # Чтение с реплик для безопасных запросов; до сессий, чтобы их запись
+    # закрепляла клиента за основной базой
+    'kaudio.routers.ReplicaRoutingMiddleware',
+
     # Django middleware
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -91,6 +101,8 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Профилирование запросов по требованию, при PROFILING_ENABLED = False отключается
+    'kaudio.profiling.ProfilingMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -110,6 +122,7 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
+    'HEAD',
     'OPTIONS',
     'PATCH',
     'POST',
@@ -125,11 +138,25 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    # Заголовки протокола возобновляемой загрузки tus
+    'tus-resumable',
+    'upload-length',
+    'upload-metadata',
+    'upload-offset',
 ]
 
 # Дополнительные настройки CORS
 CORS_URLS_REGEX = r'^.*$'
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = [
+    'Content-Type',
+    'X-CSRFToken',
+    'Location',
+    'Tus-Resumable',
+    'Upload-Length',
+    'Upload-Offset',
+    'ETag',
+    'X-Waveform-Resolution',
+]
 
 ROOT_URLCONF = 'kaudio_server.urls'
 
@@ -157,10 +184,24 @@ WSGI_APPLICATION = 'kaudio_server.wsgi.application'
 # Настройки базы данных
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite с журналом WAL: читатели не блокируются, фиксация без fsync
+# (он выполняется при контрольной точке), транзакции сразу берут блокировку записи
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'kaudio.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                # Отрицательное значение - размер кэша страниц в КБ
+                'cache_size': -64 * 1024,
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
@@ -171,6 +212,26 @@ if 'DATABASE_URL' in os.environ:
         ssl_require=True
     )
 
+# Реплики для чтения (kaudio.routers): адреса через запятую в
+# DATABASE_REPLICA_URLS. Для локальной проверки подойдет копия базы SQLite:
+# DATABASE_REPLICA_URLS=sqlite:////path/to/replica.sqlite3
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = dj_database_url.parse(_url.strip(), conn_max_age=600)
+    # В тестах реплика - зеркало тестовой основной базы
+    DATABASES[f'replica{_index}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['kaudio.routers.ReplicaRouter']
+
+# Реплика с отставанием больше REPLICA_MAX_LAG секунд пропускается; отставание
+# проверяется не чаще раза в REPLICA_LAG_CHECK_INTERVAL секунд. После записи
+# клиент REPLICA_PIN_SECONDS читает с основной базы (должно быть больше REPLICA_MAX_LAG)
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_PIN_SECONDS = 15
+REPLICA_PIN_COOKIE = 'kaudio_primary'
+
 
 # Валидация паролей
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -255,6 +316,61 @@ REST_FRAMEWORK = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Настройки возобновляемой загрузки треков
+TRACK_UPLOAD_MAX_SIZE = int(os.environ.get('TRACK_UPLOAD_MAX_SIZE', 500 * 1024 * 1024))
+TRACK_UPLOAD_CHUNK_SIZE = 64 * 1024
+TRACK_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'partial')
+# Максимальное количество треков в одной загрузке альбома
+ALBUM_UPLOAD_MAX_TRACKS = 100
+
+# Ширины уменьшенных копий обложек и изображений профиля (WebP и JPEG)
+IMAGE_VARIANT_WIDTHS = [48, 96, 192, 384, 768]
+IMAGE_VARIANT_QUALITY = 80
+
+# Разрешения волновой формы треков (количество пар min/max)
+WAVEFORM_RESOLUTIONS = [256, 1024, 4096]
+
+# Целевая длительность сегмента HLS в секундах
+HLS_SEGMENT_DURATION = 4
+
+# Превью треков: длительность в секундах и смещение начала
+# (None - самый громкий участок трека)
+TRACK_PREVIEW_DURATION = 30
+TRACK_PREVIEW_OFFSET = None
+
+# Кэш начала аудиофайлов популярных треков, общий для всех процессов
+# (каталог в /dev/shm, если он есть). 0 байт - кэш отключен
+AUDIO_HEAD_CACHE_DIR = os.environ.get(
+    'AUDIO_HEAD_CACHE_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'kaudio-audio-heads')
+)
+AUDIO_HEAD_CACHE_BYTES = int(os.environ.get('AUDIO_HEAD_CACHE_BYTES', 256 * 1024 * 1024))
+AUDIO_HEAD_CACHE_HEAD_SIZE = 256 * 1024
+AUDIO_HEAD_CACHE_MIN_PLAYS = 10
+AUDIO_HEAD_CACHE_WARM_ON_STARTUP = os.environ.get('AUDIO_HEAD_CACHE_WARM_ON_STARTUP', '1') == '1'
+
+# Экспорт отчетов: размер порции чтения из базы и максимальное количество
+# строк, которое экспортируется прямо в запросе (больше - фоновой задачей)
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_SYNC_MAX_ROWS = 5000
+
+# Пересчет итогов альбомов и плейлистов: выборки до TOTALS_SYNC_MAX_ROWS
+# обновляются в запросе, большие - фоновой задачей частями по TOTALS_CHUNK_SIZE
+TOTALS_SYNC_MAX_ROWS = 2000
+TOTALS_CHUNK_SIZE = 5000
+
+# Очередь записи (kaudio.write_queue): активность и счетчики пишет один поток
+# процесса пакетами до WRITE_QUEUE_BATCH_SIZE операций в транзакции, добирая
+# пакет WRITE_QUEUE_FLUSH_INTERVAL секунд. Используется только с SQLite
+WRITE_QUEUE_ENABLED = os.environ.get('WRITE_QUEUE_ENABLED', '1') == '1' and 'test' not in sys.argv
+WRITE_QUEUE_BATCH_SIZE = 200
+WRITE_QUEUE_FLUSH_INTERVAL = 0.005
+WRITE_QUEUE_TIMEOUT = 30
+
+# Импорт каталога (manage.py ingest_catalog): количество треков в одной
+# транзакции с пакетными INSERT
+INGEST_BATCH_SIZE = 500
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -303,6 +419,20 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Очереди: latency - короткие задачи, результата которых ждет пользователь,
+# bulk - массовые пересчеты и экспорт. Воркеры запускаются отдельно для каждой
+CELERY_TASK_DEFAULT_QUEUE = 'latency'
+CELERY_TASK_ROUTES = {
+    'kaudio.tasks.send_statistics_email': {'queue': 'bulk'},
+    'kaudio.tasks.print_hello': {'queue': 'bulk'},
+    'kaudio.tasks.refresh_admin_stats': {'queue': 'bulk'},
+    'kaudio.tasks.reconcile_counter_caches': {'queue': 'bulk'},
+    'kaudio.tasks.generate_track_waveform': {'queue': 'bulk'},
+    'kaudio.tasks.package_track_hls': {'queue': 'bulk'},
+    'kaudio.tasks.generate_track_preview': {'queue': 'bulk'},
+    'kaudio.tasks.probe_track_metadata': {'queue': 'bulk'},
+}
+
 from celery.schedules import crontab
 CELERY_BEAT_SCHEDULE = {
     'send-statistics-every-minute': {
@@ -313,7 +443,89 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'kaudio.tasks.print_hello',
         'schedule': crontab(),
     },
+    'refresh-admin-stats': {
+        'task': 'kaudio.tasks.refresh_admin_stats',
+        'schedule': crontab(minute='*/5'),
+    },
+    'reconcile-counter-caches': {
+        'task': 'kaudio.tasks.reconcile_counter_caches',
+        'schedule': crontab(minute=30),
+    },
+}
+
+# Задача, которая ждет исполнителя дольше этого срока (в секундах), снова
+# отправляется в очередь при повторной постановке: сообщение могло потеряться
+# при недоступном брокере
+JOB_REENQUEUE_AFTER = int(os.environ.get('JOB_REENQUEUE_AFTER', 300))
+
+# Файлы результатов фоновых задач (отчеты) хранятся вне MEDIA_ROOT и отдаются
+# только владельцу задачи и администратору через /api/jobs/{id}/result/
+JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', os.path.join(BASE_DIR, 'job_results'))
+
+# Задача, которая выполняется дольше этого срока (в секундах), считается
+# брошенной: исполнитель мог завершиться аварийно. Она возвращается в pending
+# и снова отправляется в очередь при повторной постановке. Срок должен быть
+# больше времени выполнения самой долгой задачи
+JOB_RUNNING_LEASE = int(os.environ.get('JOB_RUNNING_LEASE', 2 * 60 * 60))
+
+# Снимки статистики админки старше этого срока (в секундах) пересчитываются
+# при открытии страницы, не дожидаясь периодической задачи
+ADMIN_STATS_MAX_AGE = 15 * 60
+
+# Ограничение частоты (kaudio.throttling): класс действий - емкость корзины
+# и пополнение токенов в секунду. Корзины общие для процессов в Redis,
+# при его недоступности - в памяти процесса (повторное подключение через
+# THROTTLE_REDIS_RETRY секунд)
+THROTTLE_BUCKETS = {
+    'play': (30, 0.5),
+    'like': (30, 0.5),
+    'review': (5, 1 / 30),
 }
+THROTTLE_REDIS_URL = None if 'test' in sys.argv else os.environ.get('THROTTLE_REDIS_URL', CELERY_BROKER_URL)
+THROTTLE_REDIS_RETRY = 30
+
+# Сброс нагрузки: одновременно обрабатываемые запросы процесса (для потоковых
+# и ASGI-воркеров), сверх лимита - 503 с Retry-After
+LOAD_SHED_MAX_CONCURRENT = int(os.environ.get('LOAD_SHED_MAX_CONCURRENT', 64))
+LOAD_SHED_MAX_CONCURRENT_WRITES = int(os.environ.get('LOAD_SHED_MAX_CONCURRENT_WRITES', 16))
+LOAD_SHED_RETRY_AFTER = 1
+
+# Замеры производительности API (manage.py benchmark): каталог результатов
+# и заголовки с количеством SQL-запросов для замеров по HTTP
+BENCHMARK_RESULTS_DIR = os.environ.get('BENCHMARK_RESULTS_DIR', os.path.join(BASE_DIR, 'benchmark_results'))
+BENCHMARK_QUERY_HEADERS = os.environ.get('BENCHMARK_QUERY_HEADERS', '0') == '1'
+if BENCHMARK_QUERY_HEADERS:
+    MIDDLEWARE.insert(MIDDLEWARE.index('kaudio.routers.ReplicaRoutingMiddleware'), 'kaudio.benchmarks.middleware.QueryCountMiddleware')
+
+# Профилирование запросов (kaudio.profiling): доля профилируемых запросов
+# и заголовок, по которому сотрудник профилирует свой запрос. Режим
+# cprofile - профиль вызовов, sample - снимки стека каждые
+# PROFILING_SAMPLE_INTERVAL секунд. Хранятся последние PROFILING_MAX_FILES
+# профилей, в отчет попадают PROFILING_TOP функций и форм SQL
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_HEADER = 'X-Profile'
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = 200
+PROFILING_TOP = 50
+
+# Метрики Prometheus (kaudio.metrics, /metrics): снимки процессов в общем
+# каталоге METRICS_DIR суммируются при запросе. Каталог общий для воркеров
+# gunicorn и Celery одной машины. Доступ - с METRICS_ALLOWED_IPS (за прокси
+# это адрес прокси), с токеном METRICS_TOKEN или для сотрудников
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1' and 'test' not in sys.argv
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'kaudio-metrics')
+)
+METRICS_FLUSH_INTERVAL = 1
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_TASK_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_CELERY_BROKER_URL = None if 'test' in sys.argv else os.environ.get('METRICS_CELERY_BROKER_URL', CELERY_BROKER_URL)
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'localhost'
@@ -1,12 +1,79 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, AsyncClient, Client, RequestFactory
+from asgiref.sync import sync_to_async
 from django.core.exceptions import ValidationError
 from django.urls import reverse, NoReverseMatch
 from rest_framework import status
-from kaudio.models import User, Artist, Genre, Album, Track, Playlist
+from kaudio.models import (
+    User, Artist, Genre, Album, Track, Playlist, PlaylistTrack, MediaBlob, Job, StatsSnapshot, TrackReview, AlbumReview
+)
 from kaudio.admin import TrackAdmin
 from django.contrib.admin.sites import AdminSite
 from datetime import date
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.conf import settings
+from django.http import HttpResponse
+from unittest import mock
+import base64
+import hashlib
+import csv
+import json
+import subprocess
+import sys
+import zipfile
+import os
+import io
+import tempfile
+from PIL import Image
+from kaudio.jobs import execute_job, submit_job
+from kaudio.utils.audio_cache import AudioHeadCache, get_audio_head_cache
+from kaudio.tasks import generate_image_variants, generate_track_preview, generate_track_waveform, package_track_hls
+
+class TemporaryMediaMixin:
+    """Подменяет MEDIA_ROOT временным каталогом, который удаляется после теста."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.temporary_directory()
+        self.override(MEDIA_ROOT=self.media_root)
+
+    def temporary_directory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+    def override(self, **values):
+        override = override_settings(**values)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+def make_id3(**frames):
+    """Собирает тег ID3v2.3 из текстовых кадров в UTF-8."""
+    body = b"".join(
+        frame_id.encode() + (len(text.encode()) + 1).to_bytes(4, "big") + b"\x00\x00" + b"\x03" + text.encode()
+        for frame_id, text in frames.items()
+    )
+    size = len(body)
+    return b"ID3\x03\x00\x00" + bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0)) + body
+
+
+def make_mp3(gains):
+    """Собирает MP3 из кадров MPEG-1 Layer III (128 кбит/с, 44.1 кГц, моно) с заданными global_gain."""
+    frames = []
+    for gain in gains:
+        side = 0
+        position = 18
+        for _ in range(2):
+            side |= 100 << (136 - position - 12)
+            side |= gain << (136 - position - 21 - 8)
+            position += 59
+        frame = b"\xff\xfb\x90\xc4" + side.to_bytes(17, "big")
+        frames.append(frame + bytes(417 - len(frame)))
+    return b"".join(frames)
+
 
 class TrackModelValidationTests(TestCase):
     def setUp(self):
@@ -162,7 +229,7 @@ class TrackLikeTests(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
         self.track.refresh_from_db()
-        self.assertEqual(self.track.likes_count, old_likes + 2)
+        self.assertEqual(self.track.likes_count, old_likes + 1)
 
 class TrackReviewTests(TestCase):
     def setUp(self):
@@ -179,6 +246,64 @@ class TrackReviewTests(TestCase):
         response = self.client.post('/api/track-reviews/', data)
         self.assertIn(response.status_code, (201, 400))
 
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f"rater{number}", password="pass123", email=f"rater{number}@ex.com")
+            for number in range(3)
+        ]
+        self.artist = Artist.objects.create(email="ratings@ex.com")
+        self.album = Album.objects.create(title="Rated", artist=self.artist, release_date=date.today())
+        self.track = Track.objects.create(title="Rated", artist=self.artist, album=self.album, duration=120)
+        self.client = Client()
+        self.client.force_login(self.users[0])
+
+    def _aggregates(self, obj):
+        obj.refresh_from_db()
+        return obj.rating_sum, obj.rating_count, obj.rating_distribution()
+
+    def test_reviews_update_aggregates_with_deltas(self):
+        reviews = [
+            TrackReview.objects.create(author=user, track=self.track, rating=rating, text="ok")
+            for user, rating in zip(self.users, [5, 3, 4])
+        ]
+        self.assertEqual(self._aggregates(self.track), (12, 3, {1: 0, 2: 0, 3: 1, 4: 1, 5: 1}))
+        self.assertEqual(str(self.track.avg_rating), "4.00")
+
+        review = TrackReview.objects.get(pk=reviews[1].pk)
+        review.rating = 1
+        with self.assertNumQueries(2):
+            review.save()
+        reviews[0].delete()
+        self.assertEqual(self._aggregates(self.track), (5, 2, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0}))
+        self.assertEqual(str(self.track.avg_rating), "2.50")
+
+        AlbumReview.objects.create(author=self.users[0], album=self.album, rating=2, text="meh")
+        response = self.client.get(f'/api/albums/{self.album.pk}/rating-distribution/')
+        self.assertEqual(response.json(), {
+            'average': 2.0, 'count': 1, 'distribution': {'1': 0, '2': 1, '3': 0, '4': 0, '5': 0}
+        })
+        response = self.client.get(f'/api/tracks/{self.track.pk}/rating-distribution/')
+        self.assertEqual(response.json()['average'], 2.5)
+
+        self.track.delete()
+        self.assertFalse(TrackReview.objects.exists())
+
+    def test_reconcile_command_fixes_drift(self):
+        from django.core.management import call_command
+        for user, rating in zip(self.users, [5, 3, 4]):
+            TrackReview.objects.create(author=user, track=self.track, rating=rating, text="ok")
+        TrackReview.objects.filter(rating=5).update(rating=2)
+        Album.objects.update(rating_count=7)
+
+        out = io.StringIO()
+        call_command('reconcile_ratings', '--check', stdout=out)
+        self.assertIn('расхождений 1', out.getvalue())
+        call_command('reconcile_ratings', stdout=io.StringIO())
+        self.assertEqual(self._aggregates(self.track), (9, 3, {1: 0, 2: 1, 3: 1, 4: 1, 5: 0}))
+        self.assertEqual(str(self.track.avg_rating), "3.00")
+        self.assertEqual(self._aggregates(self.album), (0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
 class FileUploadTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="fileuser", password="pass123", email="file@ex.com")
@@ -221,3 +346,1589 @@ class FileUploadTests(TestCase):
         response = self.client.post('/api/upload/artist-image/', data, format='multipart')
         self.assertEqual(response.status_code, 200)
         self.assertIn('img_cover_url', response.json())
+
+
+class AlbumUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="albumup", password="pass123", email="albumup@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="albumup@ex.com")
+        self.rock = Genre.objects.create(title="Rock")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def _post(self, manifest, files):
+        data = {"manifest": json.dumps(manifest)}
+        for name, frames in files.items():
+            data[name] = SimpleUploadedFile(f"{name}.mp3", make_mp3([100] * frames), content_type="audio/mpeg")
+        return self.client.post('/api/upload/album/', data)
+
+    def test_album_is_saved_with_bulk_writes(self):
+        manifest = {
+            "title": "Bulk", "release_date": "2024-05-17", "genre_ids": [self.rock.id],
+            "tracks": [
+                {"file": f"audio{number}", "title": f"Song {number}", "track_number": number}
+                for number in range(1, 4)
+            ],
+        }
+        from kaudio.storage import media_storage
+
+        # Файлы записываются до транзакции, не удерживая блокировку базы
+        write_blob = media_storage.write_blob
+        depths = []
+
+        def tracking_write_blob(name, content):
+            depths.append(len(connection.atomic_blocks))
+            return write_blob(name, content)
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch.object(media_storage, 'write_blob', side_effect=tracking_write_blob):
+            response = self._post(manifest, {"audio1": 380, "audio2": 190, "audio3": 38})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(depths, [len(connection.atomic_blocks)] * 3)
+        track_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "kaudio_track"')]
+        self.assertEqual(len(track_inserts), 1)
+
+        album = Album.objects.get(title="Bulk")
+        self.assertEqual(album.total_tracks, 3)
+        self.assertEqual(list(album.genres.all()), [self.rock])
+        self.assertEqual((self.user.user_tracks.count(), self.user.user_albums.count()), (3, 1))
+        self.assertEqual([track['track_number'] for track in response.json()['tracks']], [1, 2, 3])
+
+        jobs = Job.objects.filter(kind='process_track_audio', user=self.user)
+        self.assertEqual(jobs.count(), 3)
+        for job in jobs:
+            execute_job(job.pk)
+        album.refresh_from_db()
+        self.assertEqual(album.total_duration, 10 + 5 + 1)
+
+    def test_manifest_is_validated_as_a_whole(self):
+        manifest = {
+            "title": "Broken", "release_date": "2024-05-17",
+            "tracks": [
+                {"file": "audio1", "title": "One", "track_number": 1, "genre_ids": [self.rock.id]},
+                {"file": "audio2", "title": "Two", "track_number": 1},
+                {"file": "missing", "title": "Three", "track_number": 3},
+            ],
+        }
+        response = self._post(manifest, {"audio1": 38, "audio2": 38})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()['tracks']), ['1', '2'])
+        self.assertFalse(Album.objects.filter(title="Broken").exists())
+        self.assertFalse(Track.objects.exists())
+
+
+class ResumableUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.override(TRACK_UPLOAD_TEMP_DIR=os.path.join(self.media_root, 'uploads', 'partial'))
+        self.user = User.objects.create_user(username="tususer", password="pass123", email="tus@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="tus@ex.com")
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.content = b"ID3\x03\x00\x00\x00\x00\x00\x21" + os.urandom(1000)
+
+    def _metadata(self, **values):
+        return ','.join(f"{key} {base64.b64encode(str(value).encode()).decode()}" for key, value in values.items())
+
+    def _patch(self, url, offset, data):
+        return self.client.generic(
+            'PATCH', url, data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_TUS_RESUMABLE='1.0.0',
+        )
+
+    def test_resumable_upload_creates_track_after_last_chunk(self):
+        response = self.client.post(
+            '/api/upload/track/resumable/',
+            HTTP_UPLOAD_LENGTH=str(len(self.content)),
+            HTTP_UPLOAD_METADATA=self._metadata(title="Tus Track", duration=90, filename="tus.mp3"),
+            HTTP_TUS_RESUMABLE='1.0.0',
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+
+        response = self._patch(url, 0, self.content[:500])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '500')
+        self.assertFalse(Track.objects.filter(title="Tus Track").exists())
+
+        response = self.client.head(url, HTTP_TUS_RESUMABLE='1.0.0')
+        self.assertEqual(response['Upload-Offset'], '500')
+
+        response = self._patch(url, 100, self.content[100:])
+        self.assertEqual(response.status_code, 409)
+
+        response = self._patch(url, 500, self.content[500:])
+        self.assertEqual(response.status_code, 201)
+        track = Track.objects.get(title="Tus Track")
+        job = Job.objects.get(pk=response.json()['processing_job'])
+        self.assertEqual((job.kind, job.user), ('process_track_audio', self.user))
+        with track.audio_file.open('rb') as audio:
+            self.assertEqual(audio.read(), self.content)
+
+    def test_concurrent_patch_at_same_offset_does_not_write(self):
+        from kaudio_server import upload_views
+
+        response = self.client.post(
+            '/api/upload/track/resumable/',
+            HTTP_UPLOAD_LENGTH=str(len(self.content)),
+            HTTP_UPLOAD_METADATA=self._metadata(title="Raced", duration=90, filename="raced.mp3"),
+            HTTP_TUS_RESUMABLE='1.0.0',
+        )
+        url = response['Location']
+        real_lock = upload_views.upload_lock
+
+        def racing_lock(upload):
+            # Параллельный PATCH с тем же смещением успевает взять блокировку первым
+            with mock.patch.object(upload_views, 'upload_lock', real_lock):
+                self.assertEqual(self._patch(url, 0, self.content[:500]).status_code, 204)
+            return real_lock(upload)
+
+        with mock.patch.object(upload_views, 'upload_lock', racing_lock):
+            response = self._patch(url, 0, b'x' * 500)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '500')
+
+        response = self._patch(url, 500, self.content[500:])
+        self.assertEqual(response.status_code, 201)
+        with Track.objects.get(title="Raced").audio_file.open('rb') as audio:
+            self.assertEqual(audio.read(), self.content)
+
+    def test_patch_after_concurrent_delete_returns_404(self):
+        from kaudio_server import upload_views
+        from kaudio.models import TrackUpload
+
+        response = self.client.post(
+            '/api/upload/track/resumable/',
+            HTTP_UPLOAD_LENGTH=str(len(self.content)),
+            HTTP_UPLOAD_METADATA=self._metadata(title="Cancelled", duration=90, filename="cancelled.mp3"),
+            HTTP_TUS_RESUMABLE='1.0.0',
+        )
+        url = response['Location']
+        real_lock = upload_views.upload_lock
+
+        def racing_lock(upload):
+            # Загрузку отменяют, пока PATCH ждет блокировку
+            self.assertEqual(self.client.delete(url, HTTP_TUS_RESUMABLE='1.0.0').status_code, 204)
+            return real_lock(upload)
+
+        with mock.patch.object(upload_views, 'upload_lock', racing_lock):
+            response = self._patch(url, 0, self.content[:500])
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(TrackUpload.objects.exists())
+
+    def test_resumable_upload_rejects_oversized_chunk(self):
+        response = self.client.post(
+            '/api/upload/track/resumable/',
+            HTTP_UPLOAD_LENGTH='10',
+            HTTP_UPLOAD_METADATA=self._metadata(title="Small", duration=10),
+            HTTP_TUS_RESUMABLE='1.0.0',
+        )
+        response = self._patch(response['Location'], 0, self.content)
+        self.assertEqual(response.status_code, 413)
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = Artist.objects.create(email="first@ex.com")
+        self.second = Artist.objects.create(email="second@ex.com")
+
+    def test_duplicate_upload_is_stored_once(self):
+        content = b"\x89PNG\r\n\x1a\n" + b"same image"
+        self.first.cover_image = SimpleUploadedFile("a.png", content, content_type="image/png")
+        self.first.save()
+        self.second.cover_image = SimpleUploadedFile("b.png", content, content_type="image/png")
+        self.second.save()
+
+        self.assertEqual(self.first.cover_image.name, self.second.cover_image.name)
+        self.assertTrue(self.first.cover_image.name.startswith('cas/'))
+        blob = MediaBlob.objects.get(name=self.first.cover_image.name)
+        self.assertEqual(blob.ref_count, 2)
+
+        path = self.first.cover_image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_name_uses_digest_of_stored_bytes_and_gc_keeps_fresh_blobs(self):
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from kaudio.storage import get_media_storage
+
+        content = ContentFile(b"actual bytes", name="a.mp3")
+        content.sha256 = '0' * 64
+        name = get_media_storage().save("a.mp3", content)
+        self.assertIn(hashlib.sha256(b"actual bytes").hexdigest(), name)
+
+        # Ссылающаяся строка могла быть еще не зафиксирована
+        call_command('media_gc', stdout=io.StringIO())
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+        call_command('media_gc', grace=0, stdout=io.StringIO())
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(get_media_storage().exists(name))
+
+    def test_deleting_blob_keeps_variants_of_same_bytes_with_other_extension(self):
+        from django.core.files.base import ContentFile
+        from kaudio.storage import get_media_storage
+        from kaudio.utils.images import render_image_variants
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 32), (0, 0, 255)).save(buffer, 'PNG')
+        storage = get_media_storage()
+        png = storage.save("a.png", ContentFile(buffer.getvalue()))
+        jpg = storage.save("a.jpg", ContentFile(buffer.getvalue()))
+        png_variant = render_image_variants(png)['webp']['48']
+        jpg_variant = render_image_variants(jpg)['webp']['48']
+        self.assertNotEqual(png_variant, jpg_variant)
+
+        storage.delete(png)
+        self.assertFalse(storage.exists(png_variant))
+        self.assertTrue(storage.exists(jpg))
+        self.assertTrue(storage.exists(jpg_variant))
+
+
+class ImageVariantTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="imguser", password="pass123", email="img@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="img@ex.com")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_variants_are_generated_and_serialized(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100), (255, 0, 0)).save(buffer, 'PNG')
+        self.artist.cover_image = SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.artist.save()
+        self.assertEqual(len(callbacks), 1)
+
+        response = self.client.get(f'/api/artists/{self.artist.id}/')
+        self.assertEqual(response.json()['cover_image_variants'], {})
+
+        generate_image_variants('kaudio.Artist', self.artist.id, 'cover_image')
+        self.artist.refresh_from_db()
+        self.assertEqual(sorted(self.artist.image_variants['webp'], key=int), ['48', '96', '192', '200'])
+
+        response = self.client.get(f'/api/artists/{self.artist.id}/')
+        variants = response.json()['cover_image_variants']
+        self.assertTrue(variants['webp']['48'].endswith('_48.webp'))
+        self.assertTrue(variants['jpeg']['200'].endswith('_200.jpg'))
+
+    def test_concurrently_rendered_variant_keeps_its_name(self):
+        from django.core.files.storage import default_storage
+        from kaudio.utils.images import render_image_variants
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 32), (0, 255, 0)).save(buffer, 'PNG')
+        name = default_storage.save('covers/race.png', io.BytesIO(buffer.getvalue()))
+        first = render_image_variants(name)
+        # Второй обработчик проверил наличие копий до того, как их записал первый
+        with mock.patch.object(default_storage, 'exists', return_value=False):
+            second = render_image_variants(name)
+        self.assertEqual(first, second)
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(default_storage.path(name)))),
+            ['race.png', 'race.png_48.jpg', 'race.png_48.webp', 'race.png_64.jpg', 'race.png_64.webp']
+        )
+
+
+class TrackWaveformTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="waveuser", password="pass123", email="wave@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="wave@ex.com")
+        self.track = Track.objects.create(
+            title="Wave",
+            artist=self.artist,
+            duration=5,
+            audio_file=SimpleUploadedFile("wave.mp3", make_mp3([150] * 50 + [200] * 50), content_type="audio/mpeg"),
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_waveform_is_computed_from_frame_gains(self):
+        generate_track_waveform(self.track.id)
+        self.assertEqual(self.track.waveforms.count(), 3)
+
+        url = f'/api/tracks/{self.track.id}/waveform/?resolution=256&v={self.track.audio_version}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        peaks = [value - 256 if value > 127 else value for value in response.content]
+        self.assertEqual(len(peaks), 400)
+        self.assertEqual(peaks[:2], [0, 0])
+        self.assertEqual(peaks[-2:], [-127, 127])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_waveform_missing_returns_404(self):
+        response = self.client.get(f'/api/tracks/{self.track.id}/waveform/')
+        self.assertEqual(response.status_code, 404)
+        job = Job.objects.get(idempotency_key=f'process_track_audio:{self.track.id}')
+        self.assertEqual(response.json()['processing_job'], str(job.pk))
+
+    def test_unsupported_audio_is_not_enqueued_again(self):
+        track = Track.objects.create(
+            title="Noise",
+            artist=self.artist,
+            duration=5,
+            audio_file=SimpleUploadedFile("noise.mp3", b"not an mp3 file", content_type="audio/mpeg"),
+        )
+        job = Job.objects.get(idempotency_key=f'process_track_audio:{track.id}')
+        execute_job(str(job.pk))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            for action in ('waveform', 'hls', 'waveform'):
+                response = self.client.get(f'/api/tracks/{track.id}/{action}/')
+                self.assertEqual(response.status_code, 415)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Job.objects.filter(params={'track_id': track.id}).count(), 1)
+
+
+@override_settings(HLS_SEGMENT_DURATION=4)
+class TrackHlsTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="hlsuser", password="pass123", email="hls@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="hls@ex.com")
+        # 400 кадров по 1152 отсчета при 44.1 кГц - около 10.4 с
+        self.track = Track.objects.create(
+            title="Stream",
+            artist=self.artist,
+            duration=10,
+            audio_file=SimpleUploadedFile("stream.mp3", make_mp3([180] * 400), content_type="audio/mpeg"),
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_track_is_packaged_into_frame_aligned_segments(self):
+        response = self.client.get(f'/api/tracks/{self.track.id}/hls/')
+        self.assertEqual(response.status_code, 404)
+
+        package_track_hls(self.track.id)
+        response = self.client.get(f'/api/tracks/{self.track.id}/hls/')
+        self.assertEqual(response.status_code, 302)
+
+        playlist = self.client.get(response['Location'])
+        self.assertEqual(playlist['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertIn('immutable', playlist['Cache-Control'])
+        lines = b''.join(playlist.streaming_content).decode().splitlines()
+        segments = [line for line in lines if line.startswith('seg_')]
+        self.assertEqual(segments, ['seg_00000.mp3', 'seg_00001.mp3', 'seg_00002.mp3'])
+        self.assertEqual(lines[-1], '#EXT-X-ENDLIST')
+
+        base = response['Location'].rsplit('/', 1)[0]
+        segment = b''.join(self.client.get(f'{base}/seg_00001.mp3').streaming_content)
+        self.assertTrue(segment.startswith(b'ID3'))
+        body = segment[segment.index(b'\xff\xfb'):]
+        self.assertEqual(len(body) % 417, 0)
+
+    def test_package_is_swapped_in_whole_and_old_versions_removed(self):
+        from kaudio.utils.hls import package_track
+        from kaudio.utils.mp3 import UnsupportedAudioFormat
+
+        path = self.track.audio_file.path
+        root = os.path.join(settings.MEDIA_ROOT, 'hls', str(self.track.id))
+        package_track(path, self.track.id, 'old', 4)
+        package_track(path, self.track.id, 'new', 4)
+        package_track(path, self.track.id, 'new', 6)
+        self.assertEqual([entry for entry in os.listdir(root) if entry != '.lock'], ['new'])
+        self.assertEqual(sorted(os.listdir(os.path.join(root, 'new'))), ['index.m3u8', 'seg_00000.mp3', 'seg_00001.mp3'])
+
+        # Неудачная упаковка не трогает готовый пакет
+        with open(os.path.join(settings.MEDIA_ROOT, 'empty.mp3'), 'wb'):
+            pass
+        with self.assertRaises(UnsupportedAudioFormat):
+            package_track(os.path.join(settings.MEDIA_ROOT, 'empty.mp3'), self.track.id, 'broken', 4)
+        self.assertEqual([entry for entry in os.listdir(root) if entry != '.lock'], ['new'])
+
+
+@override_settings(TRACK_PREVIEW_DURATION=1, TRACK_PREVIEW_OFFSET=None)
+class TrackPreviewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="previewuser", password="pass123", email="preview@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="preview@ex.com")
+        self.audio = make_mp3([120] * 100 + [200] * 60 + [120] * 100)
+        self.track = Track.objects.create(
+            title="Preview",
+            artist=self.artist,
+            duration=7,
+            audio_file=SimpleUploadedFile("preview.mp3", self.audio, content_type="audio/mpeg"),
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_preview_is_cut_from_loudest_region(self):
+        response = self.client.get(f'/api/tracks/{self.track.id}/')
+        self.assertIsNone(response.data['preview_url'])
+
+        generate_track_preview(self.track.id)
+        self.track.refresh_from_db()
+        # 1 секунда - 38 кадров по 417 байт, начиная с первого громкого кадра
+        self.assertEqual(self.track.preview_file.read(), self.audio[100 * 417:138 * 417])
+        self.track.preview_file.close()
+
+        response = self.client.get(f'/api/tracks/{self.track.id}/')
+        self.assertTrue(response.data['preview_url'].endswith(self.track.preview_file.url))
+
+        generate_track_preview(self.track.id)
+        self.assertEqual(MediaBlob.objects.get(name=self.track.preview_file.name).ref_count, 1)
+
+    @override_settings(TRACK_PREVIEW_OFFSET=0.5)
+    def test_preview_starts_at_configured_offset(self):
+        generate_track_preview(self.track.id)
+        self.track.refresh_from_db()
+        with self.track.preview_file.open('rb') as preview:
+            self.assertEqual(preview.read(), self.audio[19 * 417:57 * 417])
+
+
+class AudioHeadCacheTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.override(
+            AUDIO_HEAD_CACHE_DIR=self.temporary_directory(),
+            AUDIO_HEAD_CACHE_HEAD_SIZE=1000,
+            AUDIO_HEAD_CACHE_MIN_PLAYS=5,
+        )
+        self.user = User.objects.create_user(username="cacheuser", password="pass123", email="cache@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="cache@ex.com")
+        self.audio = make_mp3([150] * 20)
+        self.track = Track.objects.create(
+            title="Hot",
+            artist=self.artist,
+            duration=1,
+            play_count=10,
+            audio_file=SimpleUploadedFile("hot.mp3", self.audio, content_type="audio/mpeg"),
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_stream_serves_head_from_cache(self):
+        response = self.client.get(f'/api/tracks/{self.track.id}/stream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.audio)
+        response.close()
+
+        cache = get_audio_head_cache()
+        head = cache.get(self.track.audio_file.name, len(self.audio))
+        self.assertEqual(bytes(head), self.audio[:1000])
+
+        # Подмена фрагмента на месте показывает, что начало берется из кэша
+        with open(cache._path(self.track.audio_file.name), 'r+b') as fragment:
+            fragment.write(b'\x00' * 4)
+        response = self.client.get(f'/api/tracks/{self.track.id}/stream/')
+        content = b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual(content[:4], b'\x00' * 4)
+        self.assertEqual(content[4:], self.audio[4:])
+
+    def test_cold_track_is_not_cached_and_budget_is_enforced(self):
+        Track.objects.filter(pk=self.track.pk).update(play_count=0)
+        response = self.client.get(f'/api/tracks/{self.track.id}/stream/')
+        self.assertEqual(b''.join(response.streaming_content), self.audio)
+        response.close()
+        self.assertIsNone(get_audio_head_cache().get(self.track.audio_file.name, len(self.audio)))
+
+        cache = AudioHeadCache(self.temporary_directory(), budget=2500, head_size=1000)
+        path = self.track.audio_file.path
+        self.assertEqual(cache.warm((f'track-{index}', path) for index in range(5)), 2)
+        cache.put('track-9', path)
+        cache.put('track-10', path)
+        self.assertLessEqual(len(os.listdir(cache.directory)), 2)
+        self.assertIsNotNone(cache.get('track-10', len(self.audio)))
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="jobadmin", password="pass123", email="admin@ex.com")
+        self.artist = Artist.objects.create(email="jobs@ex.com")
+        self.album = Album.objects.create(title="Totals", artist=self.artist, release_date=date.today())
+        for number, duration in enumerate([100, 150], start=1):
+            Track.objects.create(
+                title=f"Track {number}", artist=self.artist, album=self.album,
+                track_number=number, duration=duration
+            )
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    @override_settings(TOTALS_SYNC_MAX_ROWS=0)
+    def test_admin_action_enqueues_job_and_reports_result(self):
+        data = {'action': 'recalculate_duration', '_selected_action': [self.album.id]}
+        self.client.post('/admin/kaudio/album/', data)
+        self.client.post('/admin/kaudio/album/', data)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.queue, job.status), ('recalculate_album_totals', 'bulk', 'pending'))
+
+        execute_job(job.pk)
+        self.assertIsNone(execute_job(job.pk))
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.total_tracks, self.album.total_duration), (2, 250))
+
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'succeeded')
+        self.assertEqual(response.json()['progress'], 100)
+        self.assertEqual(response.json()['result'], {'updated': 1})
+
+        other = User.objects.create_user(username="jobother", password="pass123", email="other@ex.com")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/').status_code, 404)
+
+    def test_failed_job_stores_error(self):
+        job = submit_job('recalculate_album_totals', {'album_ids': [self.album.id], 'unknown': 1})
+        execute_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('unknown', job.error)
+
+    def test_active_job_is_reused_and_stale_pending_job_is_requeued(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        job = submit_job('recalculate_album_totals', {'album_ids': [self.album.id]}, idempotency_key='totals')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+        self.assertEqual(callbacks, [])
+
+        # Сообщение потерялось: задача слишком долго ждет исполнителя
+        Job.objects.filter(pk=job.pk).update(enqueued_at=timezone.now() - timedelta(hours=1))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+        self.assertEqual(len(callbacks), 1)
+
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_RUNNING)
+        self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_SUCCEEDED)
+        self.assertNotEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+
+    def test_running_job_past_its_lease_is_reclaimed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from kaudio.jobs import execute_job
+
+        job = submit_job('recalculate_album_totals', {'album_ids': [self.album.id]}, idempotency_key='totals')
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_RUNNING, started_at=timezone.now())
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+        self.assertEqual(callbacks, [])
+
+        # Исполнитель завершился аварийно: задача так и осталась в running
+        abandoned_at = timezone.now() - timedelta(seconds=settings.JOB_RUNNING_LEASE + 60)
+        Job.objects.filter(pk=job.pk).update(started_at=abandoned_at, progress=40)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+            self.assertEqual(submit_job('recalculate_album_totals', idempotency_key='totals'), job)
+        self.assertEqual(len(callbacks), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.started_at, job.progress), (Job.STATUS_PENDING, None, 0))
+
+        self.assertEqual(execute_job(str(job.pk)).status, Job.STATUS_SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+
+
+class TotalsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="totalsadmin", password="pass123", email="totals@ex.com")
+        self.artist = Artist.objects.create(email="totals@ex.com")
+        self.albums = [
+            Album.objects.create(title=f"Totals {number}", artist=self.artist, release_date=date.today())
+            for number in range(3)
+        ]
+        for number, duration in enumerate([100, 150, 40], start=1):
+            Track.objects.create(
+                title=f"Track {number}", artist=self.artist, album=self.albums[number // 2],
+                track_number=number, duration=duration
+            )
+        self.playlist = Playlist.objects.create(title="Totals", user=self.admin)
+        for position, track in enumerate(Track.objects.all()):
+            PlaylistTrack.objects.create(playlist=self.playlist, track=track, position=position)
+        Album.objects.update(total_tracks=99, total_duration=99)
+        Playlist.objects.update(total_tracks=99, total_duration=99)
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_small_selection_is_updated_with_one_query(self):
+        from kaudio.totals import update_totals
+        with self.assertNumQueries(1):
+            self.assertEqual(update_totals(Album.objects.all()), 3)
+        self.assertEqual(
+            list(Album.objects.order_by('pk').values_list('total_tracks', 'total_duration')),
+            [(1, 100), (2, 190), (0, 0)]
+        )
+
+        self.client.post('/admin/kaudio/playlist/', {
+            'action': 'recalculate_tracks', '_selected_action': [self.playlist.pk]
+        })
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.total_tracks, self.playlist.total_duration), (3, 290))
+        self.assertFalse(Job.objects.exists())
+
+    def test_command_recalculates_catalogue_in_chunks(self):
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('recalculate_totals', '--chunk-size', '1', stdout=out)
+        self.assertEqual(
+            list(Album.objects.order_by('pk').values_list('total_tracks', 'total_duration')),
+            [(1, 100), (2, 190), (0, 0)]
+        )
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.total_tracks, self.playlist.total_duration), (3, 290))
+        self.assertIn('обновлено 3', out.getvalue())
+
+    def test_progress_counts_updated_rows_not_chunks(self):
+        from kaudio.totals import TOTALS, recalculate_in_chunks
+        Album.objects.order_by('pk')[1].delete()
+        progress = []
+        recalculate_in_chunks(TOTALS['album'], chunk_size=1, on_chunk=lambda done, total: progress.append((done, total)))
+        # Часть с удаленным альбомом не двигает прогресс
+        self.assertEqual(progress, [(1, 2), (1, 2), (2, 2)])
+
+
+class CounterCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="counteruser", password="pass123")
+        self.artist = Artist.objects.create(user=self.user, email="counter@ex.com")
+        self.album = Album.objects.create(title="Counters", artist=self.artist, release_date=date.today())
+        self.track = Track.objects.create(title="C1", artist=self.artist, album=self.album, duration=100, track_number=1)
+        self.playlist = Playlist.objects.create(title="Counters", user=self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_album_totals_follow_track_changes(self):
+        other = Track.objects.create(title="C2", artist=self.artist, album=self.album, duration=50, track_number=2)
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.total_tracks, self.album.total_duration), (2, 150))
+
+        other.duration = 80
+        other.save()
+        Track.objects.get(pk=self.track.pk).delete()
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.total_tracks, self.album.total_duration), (1, 80))
+
+        other.album = Album.objects.create(title="Other", artist=self.artist, release_date=date.today())
+        other.save()
+        self.album.refresh_from_db()
+        other.album.refresh_from_db()
+        self.assertEqual((self.album.total_tracks, self.album.total_duration), (0, 0))
+        self.assertEqual((other.album.total_tracks, other.album.total_duration), (1, 80))
+
+    def test_endpoints_update_counters_once(self):
+        response = self.client.post(f'/api/tracks/{self.track.id}/play/')
+        self.assertEqual(response.json()['track']['play_count'], 1)
+        self.client.post(f'/api/tracks/{self.track.id}/like/')
+        self.client.post(f'/api/albums/{self.album.id}/like/')
+        self.album.refresh_from_db()
+        self.track.refresh_from_db()
+        self.assertEqual((self.track.play_count, self.track.likes_count, self.album.likes_count), (1, 1, 1))
+
+        response = self.client.delete(f'/api/tracks/{self.track.id}/unlike/')
+        self.assertEqual(response.json()['track']['likes_count'], 0)
+        self.client.delete(f'/api/albums/{self.album.id}/unlike/')
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.likes_count, 0)
+
+        self.client.post(f'/api/playlists/{self.playlist.id}/add_track/', {"track_id": self.track.id})
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.total_tracks, self.playlist.total_duration), (1, 100))
+        self.client.post(f'/api/playlists/{self.playlist.id}/remove_track/', {"track_id": self.track.id})
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.total_tracks, self.playlist.total_duration), (0, 0))
+
+    def test_reconcile_fixes_only_drifted_objects(self):
+        from django.core.management import call_command
+        from kaudio.counters import reconcile_counters
+        PlaylistTrack.objects.create(playlist=self.playlist, track=self.track, position=1)
+        Album.objects.create(title="Empty", artist=self.artist, release_date=date.today())
+        Track.objects.filter(pk=self.track.pk).update(duration=130, play_count=7)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', '--check', stdout=out)
+        self.assertIn('расхождений 1', out.getvalue())
+        self.assertEqual(reconcile_counters(Album, chunk_size=1), 1)
+        self.assertEqual(reconcile_counters(Playlist), 1)
+        self.assertEqual(reconcile_counters(Track), 1)
+        self.album.refresh_from_db()
+        self.playlist.refresh_from_db()
+        self.track.refresh_from_db()
+        self.assertEqual((self.album.total_tracks, self.album.total_duration), (1, 130))
+        self.assertEqual((self.playlist.total_tracks, self.playlist.total_duration), (1, 130))
+        self.assertEqual(self.track.play_count, 0)
+        self.assertEqual(reconcile_counters(Album), 0)
+
+
+class CatalogIngestTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.temporary_directory()
+        files = {
+            "band/01.mp3": make_id3(TIT2="Intro", TPE1="Band", TALB="Debut", TRCK="1/2", TCON="Rock", TYER="2020")
+            + make_mp3([100] * 380),
+            "band/02.mp3": make_id3(TIT2="Outro", TPE1="Band", TALB="Debut", TRCK="1/2", TCON="(8)Jazz")
+            + make_mp3([100] * 190),
+            "single.mp3": make_id3(TIT2="Single", TPE1="Solo") + make_mp3([100] * 38),
+            "broken.mp3": b"not audio",
+        }
+        for name, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.source, name)), exist_ok=True)
+            with open(os.path.join(self.source, name), "wb") as output:
+                output.write(content)
+
+    def test_directory_is_ingested_once(self):
+        from django.core.management import call_command
+        out, err = io.StringIO(), io.StringIO()
+        call_command('ingest_catalog', self.source, '--workers', '1', '--batch-size', '2', stdout=out, stderr=err)
+        self.assertIn('создано треков 3', out.getvalue())
+        self.assertIn('broken.mp3', err.getvalue())
+
+        album = Album.objects.get(title="Debut")
+        self.assertEqual((album.artist.username, album.release_date), ("Band", date(2020, 1, 1)))
+        self.assertEqual((album.total_tracks, album.total_duration), (2, 15))
+        self.assertEqual(
+            list(album.tracks.order_by('track_number').values_list('title', 'track_number', 'duration')),
+            [("Intro", 1, 10), ("Outro", 2, 5)]
+        )
+        self.assertEqual(sorted(album.genres.values_list('title', flat=True)), ["Jazz", "Rock"])
+        single = Track.objects.get(title="Single")
+        self.assertEqual((single.album, single.artist.username, single.duration), (None, "Solo", 1))
+        self.assertTrue(single.audio_file.name.startswith('cas/'))
+        self.assertEqual(MediaBlob.objects.get(name=single.audio_file.name).ref_count, 1)
+        jobs = Job.objects.filter(kind='process_track_audio')
+        self.assertEqual(
+            sorted(job.params['track_id'] for job in jobs),
+            sorted(Track.objects.values_list('pk', flat=True))
+        )
+
+        out = io.StringIO()
+        call_command('ingest_catalog', self.source, '--workers', '1', stdout=out, stderr=io.StringIO())
+        self.assertIn('Пропущено файлов из предыдущих запусков: 3', out.getvalue())
+        call_command('ingest_catalog', self.source, '--workers', '1', '--restart', stdout=out, stderr=io.StringIO())
+        self.assertIn('пропущено 3', out.getvalue())
+        self.assertEqual(Track.objects.count(), 3)
+
+    def test_skipped_files_leave_no_unreferenced_blobs(self):
+        from django.core.management import call_command
+        files = {
+            "band/01-copy.mp3": make_id3(TIT2="Intro", TPE1="Band", TALB="Debut") + make_mp3([100] * 76),
+            "anonymous.mp3": make_id3(TIT2="Anonymous") + make_mp3([100] * 57),
+        }
+        for name, content in files.items():
+            with open(os.path.join(self.source, name), "wb") as output:
+                output.write(content)
+
+        err = io.StringIO()
+        call_command('ingest_catalog', self.source, '--workers', '1', '--batch-size', '2', stdout=io.StringIO(), stderr=err)
+        self.assertIn('anonymous.mp3', err.getvalue())
+        self.assertEqual(Track.objects.count(), 3)
+        stored = {
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(os.path.join(self.media_root, 'cas'))
+            for name in names
+        }
+        self.assertEqual(stored, set(MediaBlob.objects.values_list('name', flat=True)))
+        self.assertEqual(stored, set(Track.objects.values_list('audio_file', flat=True)))
+
+        # Повторный импорт тех же файлов не удаляет используемые объекты
+        call_command('ingest_catalog', self.source, '--workers', '1', '--restart',
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        for track in Track.objects.all():
+            self.assertTrue(track.audio_file.storage.exists(track.audio_file.name))
+
+    def test_interrupted_ingest_keeps_album_totals_current(self):
+        from django.core.management import call_command
+        from kaudio.management.commands import ingest_catalog
+
+        append_state = ingest_catalog.append_state
+        calls = []
+
+        def crash_after_first_batch(path, sources):
+            append_state(path, sources)
+            calls.append(sources)
+            if len(calls) == 1:
+                raise RuntimeError('interrupted')
+
+        with mock.patch.object(ingest_catalog, 'append_state', crash_after_first_batch):
+            with self.assertRaises(RuntimeError):
+                call_command('ingest_catalog', self.source, '--workers', '1', '--batch-size', '1',
+                             stdout=io.StringIO(), stderr=io.StringIO())
+        album = Album.objects.get(title="Debut")
+        self.assertEqual(album.total_tracks, 1)
+        self.assertEqual(album.total_duration, album.tracks.get().duration)
+
+        call_command('ingest_catalog', self.source, '--workers', '1', stdout=io.StringIO(), stderr=io.StringIO())
+        album.refresh_from_db()
+        self.assertEqual((album.total_tracks, album.total_duration), (2, 15))
+
+    def test_manifest_overrides_tags(self):
+        from django.core.management import call_command
+        manifest = os.path.join(self.source, "catalog.csv")
+        with open(manifest, "w", newline="", encoding="utf-8") as output:
+            writer = csv.writer(output)
+            writer.writerow(["path", "title", "artist", "album", "genres"])
+            writer.writerow(["single.mp3", "Renamed", "", "Singles", "Pop; Dance"])
+        call_command('ingest_catalog', manifest, '--workers', '1', stdout=io.StringIO())
+        track = Track.objects.get()
+        self.assertEqual((track.title, track.artist.username, track.album.title), ("Renamed", "Solo", "Singles"))
+        self.assertEqual(sorted(track.genres.values_list('title', flat=True)), ["Dance", "Pop"])
+        self.assertTrue(os.path.exists(f"{manifest}.state"))
+
+
+class ExportTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.results_dir = self.temporary_directory()
+        self.override(JOB_RESULTS_DIR=self.results_dir)
+        self.admin = User.objects.create_superuser(username="exportadmin", password="pass123", email="export@ex.com")
+        self.artist = Artist.objects.create(email="export@ex.com")
+        self.genre = Genre.objects.create(title="Export Genre")
+        for number in range(3):
+            album = Album.objects.create(title=f"Album {number}", artist=self.artist, release_date=date.today())
+            album.genres.add(self.genre)
+        album = Album.objects.first()
+        for number in range(1, 81):
+            Track.objects.create(
+                title=f"Track {number}", artist=self.artist, album=album, track_number=number,
+                duration=61, play_count=500, likes_count=number
+            )
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def _export(self, model, action):
+        ids = list(model.objects.values_list('pk', flat=True))
+        return self.client.post(f'/admin/kaudio/{model._meta.model_name}/', {
+            'action': action, '_selected_action': ids
+        })
+
+    def test_csv_export_streams_rows_with_popularity_from_database(self):
+        response = self._export(Track, 'export_as_csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(len(rows), 81)
+        row = next(row for row in rows if row[0] == 'Track 50')
+        self.assertEqual(row[3:], ['1:01', '500', '50', '50.0'])
+
+    def test_album_rows_use_prefetched_genres(self):
+        from kaudio.exports import EXPORTS, export_rows
+        with self.assertNumQueries(2):
+            rows = list(export_rows(EXPORTS['album'], Album.objects.all()))
+        self.assertEqual({row[5] for row in rows}, {"Export Genre"})
+
+    def test_pdf_and_xlsx_exports(self):
+        response = self._export(Track, 'export_as_pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertGreater(response.content.count(b'/Type /Page\n'), 1)
+
+        response = self._export(Album, 'export_as_xlsx')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('Album 2', sheet)
+
+    @override_settings(EXPORT_SYNC_MAX_ROWS=10)
+    def test_large_export_runs_as_job(self):
+        from django.contrib import admin
+        from kaudio.admin import JobAdmin
+
+        response = self._export(Track, 'export_as_csv')
+        self.assertEqual(response.status_code, 302)
+        self._export(Track, 'export_as_csv')
+        job = Job.objects.get(kind='export_report')
+        self.assertIsNone(job.params['ids'])
+
+        execute_job(job.pk)
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.json()['result'], {'rows': 80, 'format': 'csv'})
+        job.refresh_from_db()
+        self.assertTrue(os.path.isfile(os.path.join(self.results_dir, job.result_file.name)))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, job.result_file.name)))
+        self.assertTrue(response.json()['result_url'].endswith(f'/api/jobs/{job.pk}/result/'))
+
+        response = self.client.get(f'/api/jobs/{job.pk}/result/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(content.splitlines()), 81)
+        self.assertIn(f'/api/jobs/{job.pk}/result/', JobAdmin(Job, admin.site).result_link(job))
+
+        # Файл результата получают только владелец задачи и администратор
+        other = User.objects.create_user(username="exportother", password="pass123", email="other@ex.com")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/result/').status_code, 404)
+        self.client.logout()
+        self.assertIn(self.client.get(f'/api/jobs/{job.pk}/result/').status_code, (401, 403))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class TrackChangelistStatsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="statsadmin", password="pass123", email="stats@ex.com")
+        self.artist = Artist.objects.create(email="stats@ex.com")
+        self.genre = Genre.objects.create(title="Stats Genre")
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def _add_tracks(self, count):
+        for number in range(count):
+            track = Track.objects.create(
+                title=f"Stats {number}", artist=self.artist, duration=120, play_count=number, likes_count=1
+            )
+            track.genres.add(self.genre)
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/kaudio/track/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_statistics_come_from_snapshot(self):
+        self._add_tracks(3)
+        response = self.client.get('/admin/kaudio/track/')
+        self.assertEqual(response.context['genre_statistics'], [])
+        job = Job.objects.get(kind='refresh_admin_stats')
+
+        execute_job(job.pk)
+        snapshot = StatsSnapshot.objects.get(key='track_changelist')
+        self.assertEqual(snapshot.data['genre_statistics'][0]['tracks_count'], 3)
+
+        response = self.client.get('/admin/kaudio/track/')
+        self.assertContains(response, "Stats Genre")
+        self.assertEqual(response.context['top_artists'][0]['total_duration'], 360)
+        self.assertEqual(Job.objects.filter(kind='refresh_admin_stats').count(), 1)
+
+    def test_changelist_query_count_does_not_depend_on_rows(self):
+        from kaudio.admin_stats import refresh_stats_snapshot
+        refresh_stats_snapshot('track_changelist')
+        self._add_tracks(2)
+        few = self._changelist_queries()
+        self._add_tracks(40)
+        self.assertEqual(self._changelist_queries(), few)
+        self.assertContains(self.client.get('/admin/kaudio/track/?o=-6'), "2.74")
+
+
+class StartupImportTests(TestCase):
+    def test_heavy_modules_are_not_imported_on_startup(self):
+        code = (
+            "import sys, django; django.setup(); "
+            "import kaudio.admin, kaudio.views, kaudio.tasks, kaudio.exports, kaudio.metrics, kaudio.profiling, "
+            "kaudio_server.urls; "
+            "print(','.join(m for m in ('reportlab', 'google.oauth2', 'numpy', 'PIL.Image', 'kaudio.benchmarks') "
+            "if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='kaudio_server.settings'),
+            capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_parse_importtime(self):
+        from kaudio.management.commands.profile_startup import package_totals, parse_importtime
+
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     numpy.core\n"
+            "import time:        30 |        150 |   numpy\n"
+            "import time:        10 |        160 | kaudio.utils.waveform\n"
+        )
+        timings = parse_importtime(output)
+        self.assertEqual([(t.module, t.depth) for t in timings], [
+            ('numpy.core', 2), ('numpy', 1), ('kaudio.utils.waveform', 0)
+        ])
+        self.assertEqual(timings[-1].cumulative_us, 160)
+        self.assertEqual(package_totals(timings), {'numpy': 150, 'kaudio': 10})
+
+
+class IndexAdvisorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="indexadmin", password="pass123", email="index@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="index@ex.com")
+        self.old = Track.objects.create(
+            title="Old", artist=self.artist, duration=100, release_date=date(2023, 12, 31)
+        )
+        self.new = Track.objects.create(
+            title="New", artist=self.artist, duration=100, release_date=date(2024, 1, 1)
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_year_filter_uses_date_range(self):
+        response = self.client.get('/api/tracks/?year=2024')
+        titles = [track['title'] for track in response.json()]
+        self.assertEqual(titles, ['New'])
+        response = self.client.get('/api/tracks/?year=99999')
+        self.assertEqual(response.json(), [])
+
+    def test_normalize_sql(self):
+        from kaudio.index_advisor import normalize_sql
+
+        sql = 'SELECT "kaudio_track"."id" FROM "kaudio_track"\n WHERE "kaudio_track"."title" = \'It\'\'s\' AND "kaudio_track"."id" IN (1, 2, 3) LIMIT 20'
+        self.assertEqual(
+            normalize_sql(sql),
+            'SELECT "kaudio_track"."id" FROM "kaudio_track" WHERE "kaudio_track"."title" = ? '
+            'AND "kaudio_track"."id" IN (...) LIMIT ?'
+        )
+
+    def test_command_reports_index_usage(self):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command('index_advisor', '--url', '/api/tracks/?ordering=-play_count', stdout=out)
+        report = out.getvalue()
+        self.assertIn('kaudio_trac_play_co_179ba0_idx', report.split('Индексы, не использованные')[0])
+        self.assertIn('Избыточные индексы', report)
+        self.assertEqual(Track.objects.count(), 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        from kaudio.routers import replica_lag, reset_lag_checks
+
+        # Зеркало видит только зафиксированные данные, поэтому запросы
+        # к реплике проверяются по выбранному псевдониму, без выполнения
+        self.assertEqual(replica_lag('default'), 0.0)
+        patcher = mock.patch('kaudio.routers.replica_lag', return_value=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_lag_checks()
+        self.addCleanup(reset_lag_checks)
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        from kaudio.routers import ReplicaRoutingMiddleware
+
+        def view(request):
+            used = [Genre.objects.all().db]
+            if write:
+                Genre.objects.create(title="Routed")
+                used.append(Genre.objects.all().db)
+            return HttpResponse(','.join(used))
+
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.route(self.factory.get('/api/tracks/'))
+        self.assertEqual(response.content, b'replica1')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(Genre.objects.all().db, 'default')
+
+    def test_write_pins_request_and_client_to_primary(self):
+        response = self.route(self.factory.get('/api/tracks/'), write=True)
+        self.assertEqual(response.content, b'replica1,default')
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        response = self.route(self.factory.post('/api/tracks/'))
+        self.assertEqual(response.content, b'default')
+
+        request = self.factory.get('/api/tracks/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request).content, b'default')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        from kaudio.routers import reset_lag_checks, use_replica
+
+        with mock.patch('kaudio.routers.replica_lag', return_value=settings.REPLICA_MAX_LAG + 1) as lag:
+            self.assertEqual(self.route(self.factory.get('/')).content, b'default')
+            self.assertEqual(self.route(self.factory.get('/')).content, b'default')
+        self.assertEqual(lag.call_count, 1)
+
+        reset_lag_checks()
+        with mock.patch('kaudio.routers.replica_lag', return_value=None):
+            self.assertEqual(self.route(self.factory.get('/')).content, b'default')
+
+        reset_lag_checks()
+        with use_replica() as state:
+            Genre.objects.create(title="Export progress")
+            self.assertEqual(Genre.objects.all().db, 'replica1')
+        self.assertTrue(state.wrote)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_routing_disabled_without_replicas(self):
+        response = self.route(self.factory.get('/'), write=True)
+        self.assertEqual(response.content, b'default,default')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64 * 1024)
+
+    def test_batch_coalesces_counter_updates(self):
+        from concurrent.futures import Future
+        from kaudio.models import UserActivity
+        from kaudio.write_queue import BatchedWriter, WriteOperation
+
+        user = User.objects.create_user(username="writer", password="pass123")
+        artist = Artist.objects.create(user=user, email="writer@ex.com")
+        track = Track.objects.create(title="Batched", artist=artist, duration=100)
+
+        def fail():
+            UserActivity.objects.create(user=user, activity_type='play', track=track)
+            raise ValueError('rejected')
+
+        operations = [
+            WriteOperation(UserActivity.objects.create, (), {'user': user, 'activity_type': 'play', 'track': track}, Future())
+            for _ in range(3)
+        ]
+        operations.insert(1, WriteOperation(fail, (), {}, Future()))
+        with CaptureQueriesContext(connection) as queries:
+            BatchedWriter(batch_size=10, flush_interval=0).write_batch(operations)
+
+        self.assertIsInstance(operations[1].future.exception(), ValueError)
+        self.assertEqual(operations[0].future.result().activity_type, 'play')
+        track.refresh_from_db()
+        self.assertEqual(track.play_count, 3)
+        self.assertEqual(UserActivity.objects.filter(track=track).count(), 3)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "kaudio_track"')]
+        self.assertEqual(len(updates), 1)
+
+
+class BatchedWriterThreadTests(TransactionTestCase):
+    def test_writer_thread_commits_operations(self):
+        from kaudio.models import UserActivity
+        from kaudio.write_queue import BatchedWriter
+
+        user = User.objects.create_user(username="threadwriter", password="pass123")
+        artist = Artist.objects.create(user=user, email="thread@ex.com")
+        track = Track.objects.create(title="Threaded", artist=artist, duration=100)
+        writer = BatchedWriter(batch_size=50, flush_interval=0.01)
+        futures = [
+            writer.submit(UserActivity.objects.create, user=user, activity_type='like', track=track)
+            for _ in range(5)
+        ]
+        self.assertTrue(all(future.result(10).pk for future in futures))
+        writer.stop(10)
+        track.refresh_from_db()
+        self.assertEqual(track.likes_count, 5)
+
+
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="asyncuser", password="pass123", email="async@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="async@ex.com")
+        self.audio = make_mp3([150] * 50)
+        self.track = Track.objects.create(
+            title="Async",
+            artist=self.artist,
+            duration=2,
+            play_count=7,
+            audio_file=SimpleUploadedFile("async.mp3", self.audio, content_type="audio/mpeg"),
+        )
+        Track.objects.create(title="Quiet", artist=self.artist, duration=1)
+        self.async_client = AsyncClient()
+
+    async def test_stream_is_served_by_async_iterator(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/api/tracks/{self.track.id}/stream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(self.audio)))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.audio)
+
+    async def test_list_and_detail_match_sync_views(self):
+        await self.async_client.aforce_login(self.user)
+        client = Client()
+        await sync_to_async(client.force_login)(self.user)
+        for path in ('/api/tracks/?ordering=-play_count', f'/api/tracks/{self.track.id}/', '/api/genres/'):
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 200)
+            expected = await sync_to_async(client.get)(path)
+            self.assertEqual(response.json(), expected.json())
+        response = await self.async_client.get('/api/tracks/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_views_require_authentication(self):
+        response = await self.async_client.get('/api/tracks/')
+        self.assertIn(response.status_code, (401, 403))
+
+
+@override_settings(
+    THROTTLE_BUCKETS={'play': (2, 0.01), 'like': (30, 1), 'review': (1, 0.01)},
+    THROTTLE_REDIS_URL='redis://127.0.0.1:1/0',
+)
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        from kaudio.throttling import reset_throttling
+
+        reset_throttling()
+        self.addCleanup(reset_throttling)
+        self.user = User.objects.create_user(username="throttled", password="pass123")
+        self.other = User.objects.create_user(username="patient", password="pass123")
+        self.artist = Artist.objects.create(user=self.user, email="throttle@ex.com")
+        self.track = Track.objects.create(title="Loop", artist=self.artist, duration=100)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_play_is_throttled_per_user_with_memory_fallback(self):
+        from kaudio.throttling import shed_counts
+
+        url = f'/api/tracks/{self.track.id}/play/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.play_count, 2)
+
+        other = Client()
+        other.force_login(self.other)
+        self.assertEqual(other.post(url).status_code, 200)
+        self.assertEqual(self.client.post(f'/api/tracks/{self.track.id}/like/').status_code, 200)
+        self.assertEqual(shed_counts(), {'throttle:play': 1})
+
+        self.assertEqual(self.client.get('/api/load-shedding/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/load-shedding/')
+        self.assertEqual(response.json(), {'shed': {'throttle:play': 1}})
+
+    def test_review_writes_are_throttled(self):
+        url = '/api/track-reviews/'
+        self.client.post(url, {'track': self.track.id, 'rating': 5, 'text': 'Хорошо'})
+        response = self.client.post(url, {'track': self.track.id, 'rating': 4, 'text': 'Еще раз'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(LOAD_SHED_MAX_CONCURRENT=1)
+    def test_concurrency_limit_sheds_with_retry_after(self):
+        from kaudio.throttling import LoadSheddingMiddleware, shed_counts
+
+        factory = RequestFactory()
+        nested = []
+
+        def view(request):
+            if not nested:
+                nested.append(middleware(factory.get('/api/tracks/')))
+            return HttpResponse('ok')
+
+        middleware = LoadSheddingMiddleware(view)
+        self.assertEqual(middleware(factory.post('/api/tracks/1/play/')).status_code, 200)
+        self.assertEqual(nested[0].status_code, 503)
+        self.assertEqual(nested[0]['Retry-After'], '1')
+        self.assertEqual(middleware(factory.get('/api/tracks/')).status_code, 200)
+        self.assertEqual(shed_counts(), {'concurrency': 1})
+        self.assertEqual(middleware(factory.get('/media/covers/1.jpg')).status_code, 200)
+
+    def test_shed_is_sent_to_redis_off_the_request_thread(self):
+        import threading
+        from kaudio import throttling
+
+        threads = []
+        client = mock.MagicMock()
+
+        def get_redis():
+            threads.append(threading.current_thread())
+            return client
+
+        with mock.patch.object(throttling, 'get_redis', get_redis), mock.patch.object(throttling, 'SHED_FLUSH_INTERVAL', 0):
+            throttling.record_shed('concurrency')
+            flusher = throttling._shed_flusher
+            if flusher is not None:
+                flusher.join(5)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+        client.pipeline.return_value.hincrby.assert_called_once_with(throttling.SHED_KEY, 'concurrency', 1)
+
+    def test_memory_buckets_are_evicted_by_their_own_rate_and_lru(self):
+        import time
+        from kaudio import throttling
+
+        throttling._take_memory_token('fast', 1, 1000)
+        time.sleep(0.01)
+        # Корзина fast уже пополнилась по своей скорости, хотя текущая медленная
+        throttling._take_memory_token('slow', 1, 0.001)
+        self.assertEqual(list(throttling._memory_buckets), ['slow'])
+
+        with mock.patch.object(throttling, 'MEMORY_BUCKETS_LIMIT', 2):
+            throttling._take_memory_token('second', 1, 0.001)
+            throttling._take_memory_token('slow', 1, 0.001)
+            throttling._take_memory_token('third', 1, 0.001)
+        self.assertEqual(list(throttling._memory_buckets), ['slow', 'third'])
+        self.assertGreater(throttling._take_memory_token('slow', 1, 0.001), 0)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="bencher", password="pass123", email="bench@ex.com")
+        self.artist = Artist.objects.create(user=self.user, email="bench-artist@ex.com")
+        self.album = Album.objects.create(title="Bench", artist=self.artist, release_date=date(2024, 1, 1))
+        for number in range(3):
+            Track.objects.create(
+                title=f"Bench {number}", artist=self.artist, album=self.album, duration=100, release_date=date(2024, 1, 1)
+            )
+
+    def test_percentile_interpolates(self):
+        from kaudio.benchmarks.runner import percentile
+
+        self.assertEqual(percentile([], 95), 0.0)
+        self.assertEqual(percentile([5.0], 99), 5.0)
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0], 50), 2.5)
+        self.assertAlmostEqual(percentile(list(range(1, 101)), 95), 95.05)
+
+    def test_scenarios_report_latency_and_queries(self):
+        from kaudio.benchmarks.clients import InProcessClient
+        from kaudio.benchmarks.runner import compare_results, latest_result, load_result, run_benchmark, save_result
+        from kaudio.benchmarks.scenarios import collect_data
+
+        data = collect_data(self.user)
+        with override_settings(THROTTLE_BUCKETS={}):
+            result = run_benchmark(lambda index: InProcessClient(self.user), data, ['play', 'playlist'], iterations=2, seed=7)
+
+        self.assertEqual(result['total']['errors'], 0)
+        self.assertEqual(result['endpoints']['tracks:play']['requests'], 10)
+        self.assertEqual(result['endpoints']['playlists:add-track']['requests'], 2)
+        self.assertGreater(result['endpoints']['tracks:play']['queries_per_request'], 0)
+        self.assertGreater(result['throughput_rps'], 0)
+        # Правки плейлиста не накапливаются между итерациями
+        self.assertFalse(PlaylistTrack.objects.filter(playlist_id=data.playlist_ids[0]).exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = save_result(result, directory)
+            self.assertEqual(latest_result(directory), path)
+            baseline = load_result(path)
+        slower = json.loads(json.dumps(result))
+        slower['endpoints']['tracks:play']['p95_ms'] = baseline['endpoints']['tracks:play']['p95_ms'] * 2 + 1
+        # Адреса, которых нет в предыдущем замере, не сравниваются
+        slower['endpoints']['tracks:stream'] = slower['endpoints']['tracks:play']
+        regressions = [(c.endpoint, c.metric) for c in compare_results(baseline, slower, 50) if c.regression]
+        self.assertEqual(regressions, [('tracks:play', 'p95_ms')])
+
+    def test_query_count_middleware_sets_headers(self):
+        from kaudio.benchmarks.middleware import QUERY_COUNT_HEADER, QueryCountMiddleware
+
+        def view(request):
+            list(Track.objects.all())
+            list(Album.objects.all())
+            return HttpResponse('ok')
+
+        response = QueryCountMiddleware(view)(RequestFactory().get('/api/tracks/'))
+        self.assertEqual(response[QUERY_COUNT_HEADER], '2')
+        self.assertIn('X-Query-Time', response)
+
+
+class SeedScaleTests(TestCase):
+    COUNTS = dict(
+        users=40, artists=5, albums=8, tracks=60, playlists=6, playlist_tracks=30,
+        track_reviews=50, album_reviews=10, activities=600,
+    )
+
+    def seed(self, seed=1):
+        from kaudio.models import UserActivity
+        from kaudio.seeding import CatalogSeeder
+
+        CatalogSeeder(dict(self.COUNTS), seed=seed, batch_size=100).run()
+        return (
+            list(Track.objects.order_by('pk').values_list('title', 'track_number', 'duration')),
+            list(UserActivity.objects.order_by('pk').values_list('activity_type', 'user__username', 'track__title')),
+        )
+
+    def test_generates_consistent_catalogue(self):
+        from kaudio.counters import drifted_ids
+        from kaudio.models import UserActivity
+        from kaudio.ratings import count_drift
+
+        self.seed()
+        self.assertEqual(Track.objects.count(), 60)
+        self.assertEqual(UserActivity.objects.count(), 600)
+        self.assertEqual(PlaylistTrack.objects.count(), PlaylistTrack.objects.values('playlist', 'track').distinct().count())
+        for model in (Track, Album, Playlist):
+            self.assertEqual(drifted_ids(model.objects.all()), [])
+        self.assertEqual(count_drift(Track.objects.all()), 0)
+        self.assertGreater(Track.objects.filter(rating_count__gt=0).count(), 0)
+        # Распределение по Ципфу: самый популярный трек заметно выше среднего
+        plays = sorted(Track.objects.values_list('play_count', flat=True), reverse=True)
+        self.assertGreater(plays[0], 3 * sum(plays) / len(plays))
+
+    def test_same_seed_gives_same_rows(self):
+        from django.db import transaction
+
+        with transaction.atomic():
+            first = self.seed(seed=5)
+            transaction.set_rollback(True)
+        self.assertEqual(self.seed(seed=5), first)
+        with self.assertRaises(ValueError):
+            self.seed(seed=5)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.staff = User.objects.create_user(username="profiler", password="pass123", is_staff=True)
+        self.user = User.objects.create_user(username="listener", password="pass123")
+        artist = Artist.objects.create(user=self.user, email="profiled@ex.com")
+        Track.objects.create(title="Profiled", artist=artist, duration=100)
+
+    def test_disabled_middleware_is_not_used(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        from kaudio.profiling import ProfilingMiddleware
+
+        self.assertFalse(settings.PROFILING_ENABLED)
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_staff_header_profiles_request_and_store_rotates(self):
+        from rest_framework.authtoken.models import Token
+        from kaudio.profiling import list_profiles, load_profile
+
+        token = Token.objects.create(user=self.staff)
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directory.name, PROFILING_MAX_FILES=2):
+            client = Client()
+            self.assertNotIn('X-Profile-Id', client.get('/api/tracks/', HTTP_X_PROFILE='1'))
+            client.force_login(self.user)
+            self.assertNotIn('X-Profile-Id', client.get('/api/tracks/', HTTP_X_PROFILE='1'))
+            self.assertEqual(list_profiles(), [])
+
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            response = client.get('/api/tracks/', HTTP_X_PROFILE='1')
+            self.assertEqual(response.status_code, 200)
+            report = load_profile(response['X-Profile-Id'])
+            self.assertEqual(report['mode'], 'cprofile')
+            self.assertEqual(report['path'], '/api/tracks/')
+            self.assertTrue(report['has_prof'])
+            self.assertGreater(report['sql']['count'], 0)
+            self.assertTrue(any('"kaudio_track"' in row['sql'] for row in report['sql']['statements']))
+            self.assertTrue(report['functions'])
+
+            with override_settings(PROFILING_MODE='sample', PROFILING_SAMPLE_INTERVAL=0.001):
+                sampled = client.get('/api/tracks/', HTTP_X_PROFILE='1')['X-Profile-Id']
+                self.assertEqual(load_profile(sampled)['mode'], 'sample')
+                newest = client.get('/api/tracks/', HTTP_X_PROFILE='1')['X-Profile-Id']
+            self.assertEqual([profile['id'] for profile in list_profiles()], sorted([sampled, newest], reverse=True))
+            self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_admin_lists_downloads_and_diffs_profiles(self):
+        from kaudio.profiling import save_profile
+
+        def report(duration, statements):
+            return {
+                'method': 'GET', 'path': '/api/tracks/', 'status': 200, 'user': None, 'mode': 'sample',
+                'created_at': '2026-01-01T00:00:00', 'duration_ms': duration,
+                'sql': {'count': len(statements), 'time_ms': sum(statements.values()), 'statements': [
+                    {'sql': sql, 'count': 1, 'time_ms': time_ms} for sql, time_ms in statements.items()
+                ]},
+                'functions': [{'function': 'views.py:1(list)', 'calls': None, 'tottime_ms': 1.0, 'cumtime_ms': duration}],
+            }
+
+        with override_settings(PROFILING_DIR=self.directory.name):
+            before = save_profile(report(10.0, {'SELECT a': 2.0}))
+            after = save_profile(report(25.0, {'SELECT a': 2.0, 'SELECT b': 9.0}))
+            client = Client()
+            client.force_login(self.user)
+            self.assertEqual(client.get('/admin/profiles/').status_code, 302)
+
+            client.force_login(self.staff)
+            response = client.get('/admin/profiles/')
+            self.assertContains(response, before)
+            self.assertContains(response, after)
+            response = client.get(f'/admin/profiles/{before}.json')
+            self.assertEqual(json.loads(b''.join(response.streaming_content))['duration_ms'], 10.0)
+            self.assertEqual(client.get(f'/admin/profiles/{before}.prof').status_code, 404)
+            self.assertEqual(client.get('/admin/profiles/..%2Fsettings.json').status_code, 404)
+
+            response = client.get('/admin/profiles/diff/', {'a': before, 'b': after})
+            self.assertEqual(response.status_code, 200)
+            diff = response.context['diff']
+            self.assertEqual(diff['duration_ms']['delta'], 15.0)
+            self.assertEqual(diff['functions'][0]['delta'], 15.0)
+            self.assertEqual(diff['sql'][0], {'name': 'SELECT b', 'before': 0.0, 'after': 9.0, 'delta': 9.0})
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        from kaudio.metrics import reset_metrics
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(METRICS_ENABLED=True, METRICS_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+        self.directory = directory.name
+        self.user = User.objects.create_user(username="observer", password="pass123")
+        artist = Artist.objects.create(user=self.user, email="observed@ex.com")
+        Track.objects.create(title="Observed", artist=artist, duration=100)
+
+    def test_metrics_endpoint_reports_routes_sql_cache_and_shedding(self):
+        from kaudio.metrics import inc
+        from kaudio.throttling import record_shed
+
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get('/api/tracks/').status_code, 200)
+        self.assertEqual(client.get('/api/tracks/').status_code, 200)
+        record_shed('concurrency')
+        inc('kaudio_cache_requests_total', cache='audio_head', result='hit')
+        inc('kaudio_cache_requests_total', 3, cache='audio_head', result='miss')
+
+        client.logout()
+        self.assertEqual(client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            response = client.get('/metrics', REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        labels = 'method="GET",route="track-list",status="200"'
+        self.assertIn('# TYPE kaudio_http_request_duration_seconds histogram', body)
+        self.assertIn(f'kaudio_http_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'kaudio_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn('kaudio_sql_queries_total{route="track-list"}', body)
+        self.assertIn('kaudio_requests_shed_total{reason="concurrency"} 1', body)
+        self.assertIn('kaudio_cache_hit_ratio{cache="audio_head"} 0.25', body)
+        self.assertIn('kaudio_write_queue_backlog 0', body)
+
+    def test_snapshots_of_all_processes_are_summed_and_archived(self):
+        from kaudio.metrics import collect, inc, render_metrics
+
+        inc('kaudio_stream_bytes_total', 100, route='track-stream')
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        for name, pid in (('worker.json', os.getppid()), ('exited.json', exited.pid)):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                json.dump({
+                    'pid': pid,
+                    'counters': [['kaudio_stream_bytes_total', [['route', 'track-stream']], 50]],
+                    'histograms': [['kaudio_celery_task_duration_seconds', [['state', 'SUCCESS'], ['task', 'kaudio.tasks.x']], {'0.5': 1}, 0.2]],
+                    'gauges': [['kaudio_write_queue_backlog', [], 3]],
+                }, f)
+
+        body = render_metrics()
+        self.assertIn('kaudio_stream_bytes_total{route="track-stream"} 200', body)
+        self.assertIn('kaudio_celery_task_duration_seconds_count{state="SUCCESS",task="kaudio.tasks.x"} 2', body)
+        self.assertIn('kaudio_write_queue_backlog 3', body)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'exited.json')))
+        # Архив не учитывается повторно
+        self.assertEqual(collect().counters[('kaudio_stream_bytes_total', (('route', 'track-stream'),))], 200)
+
+        from celery.signals import task_postrun, task_prerun
+
+        task = mock.Mock()
+        task.name = 'kaudio.tasks.x'
+        task_prerun.send(sender=task, task_id='t1', task=task)
+        task_postrun.send(sender=task, task_id='t1', task=task, state='SUCCESS')
+        self.assertIn('kaudio_celery_task_duration_seconds_count{state="SUCCESS",task="kaudio.tasks.x"} 3', render_metrics())
@@ -4,15 +4,26 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, serializers
 from rest_framework.request import Request
-from kaudio.models import User, Artist, Album, Genre, Track, TrackGenre, AlbumGenre, UserAlbum, UserTrack, Playlist, Review
-from kaudio.serializers import TrackSerializer
+from rest_framework.exceptions import APIException
+from kaudio.models import User, Artist, Album, Genre, Track, TrackGenre, AlbumGenre, UserAlbum, UserTrack, Playlist, Review, TrackUpload
+from kaudio.jobs import submit_jobs, track_audio_job_key, track_processing_job
+from kaudio.serializers import AlbumSerializer, TrackSerializer
+from kaudio.storage import media_storage
+from kaudio.totals import update_totals
+from kaudio.utils.uploads import (
+    TUS_VERSION, TUS_EXTENSIONS, PartialUploadFile, UploadSizeExceeded, UploadStateLost,
+    parse_upload_metadata, partial_upload_path, append_upload_chunk, discard_partial_upload, upload_lock
+)
 from django.conf import settings
-from django.db.models import Sum, Prefetch, QuerySet
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet
 from django.shortcuts import get_object_or_404
-from django.http import HttpRequest
+from django.http import Http404, HttpRequest
+from django.urls import reverse
+import json
 import os
 from django.utils import timezone
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
 from django.core.files.uploadedfile import UploadedFile
 
 class PlaylistSerializer(serializers.ModelSerializer):
@@ -73,6 +84,65 @@ class ReviewSerializer(serializers.ModelSerializer):
             'email': obj.user.email
         }
 
+def uploaded_track_data(data: Dict[str, Any], track: Track, user: User) -> Dict[str, Any]:
+    """
+    Дополняет данные загруженного трека ID задачи обработки аудиофайла.
+    
+    Args:
+        data: Сериализованный трек
+        track: Созданный трек
+        user: Пользователь, загрузивший трек
+        
+    Returns:
+        Dict[str, Any]: Данные трека с полем processing_job
+    """
+    job = track_processing_job(track.pk, user)
+    return {**data, 'processing_job': str(job.pk) if job else None}
+
+
+def attach_uploaded_track(user: User, track: Track, genre_ids: List[int]) -> None:
+    """
+    Связывает загруженный трек с жанрами, альбомом и библиотекой пользователя.
+    
+    Общая часть обычной и возобновляемой загрузки трека.
+    
+    Args:
+        user: Пользователь, загрузивший трек
+        track: Созданный трек
+        genre_ids: Список ID жанров трека
+        
+    Raises:
+        Http404: Если один из жанров не найден
+    """
+    album: Optional[Album] = track.album
+    
+    if genre_ids:
+        for genre_id in genre_ids:
+            genre: Genre = get_object_or_404(Genre, id=genre_id)
+            
+            TrackGenre.objects.create(track=track, genre=genre)
+            
+            if album:
+                AlbumGenre.objects.get_or_create(album=album, genre=genre)
+    
+    if album:
+        user_album, created = UserAlbum.objects.get_or_create(
+            user=user,
+            album=album,
+            defaults={
+                'position': UserAlbum.objects.filter(user=user).count() + 1,
+                'added_at': timezone.now()
+            }
+        )
+    
+    UserTrack.objects.create(
+        user=user,
+        track=track,
+        position=UserTrack.objects.filter(user=user).count() + 1,
+        added_at=timezone.now()
+    )
+
+
 class ProfileImageUploadView(APIView):
     """
     API представление для загрузки изображения профиля пользователя.
@@ -271,39 +341,13 @@ class TrackUploadView(APIView):
                 audio_file=audio_file
             )
             
-            if genre_ids:
-                for genre_id in genre_ids:
-                    genre: Genre = get_object_or_404(Genre, id=genre_id)
-                    
-                    TrackGenre.objects.create(track=track, genre=genre)
-                    
-                    if album:
-                        AlbumGenre.objects.get_or_create(album=album, genre=genre)
-            
-            if album:
-                user_album, created = UserAlbum.objects.get_or_create(
-                    user=user,
-                    album=album,
-                    defaults={
-                        'position': UserAlbum.objects.filter(user=user).count() + 1,
-                        'added_at': timezone.now()
-                    }
-                )
-                
-                album.total_tracks = Track.objects.filter(album=album).count()
-                album.total_duration = Track.objects.filter(album=album).aggregate(
-                    total=Sum('duration'))['total'] or 0
-                album.save()
-            
-            UserTrack.objects.create(
-                user=user,
-                track=track,
-                position=UserTrack.objects.filter(user=user).count() + 1,
-                added_at=timezone.now()
-            )
+            attach_uploaded_track(user, track, genre_ids)
             
             serializer = TrackSerializer(track, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(
+                uploaded_track_data(serializer.data, track, user),
+                status=status.HTTP_201_CREATED
+            )
             
         except Exception as e:
             return Response({
@@ -327,6 +371,642 @@ class TrackUploadView(APIView):
         return response
 
 
+class AlbumUploadTrackSerializer(serializers.Serializer):
+    """
+    Сериализатор описания одного трека в манифесте загрузки альбома.
+    
+    Поле file - имя поля multipart-запроса с аудиофайлом трека.
+    Длительность необязательна: она уточняется фоновой задачей по кадрам файла.
+    """
+    file = serializers.CharField()
+    title = serializers.CharField(max_length=255)
+    track_number = serializers.IntegerField(min_value=1)
+    duration = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    genre_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    is_explicit = serializers.BooleanField(required=False, default=False)
+
+
+class AlbumUploadManifestSerializer(serializers.Serializer):
+    """
+    Сериализатор манифеста загрузки альбома.
+    
+    Проверяет все треки вместе: наличие и размер файлов, уникальность
+    номеров и названий, в том числе среди уже загруженных треков альбома,
+    и существование жанров. В контексте передаются исполнитель (artist)
+    и файлы запроса (files).
+    """
+    album_id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=200, required=False)
+    release_date = serializers.DateField(required=False)
+    genre_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    tracks = AlbumUploadTrackSerializer(many=True, allow_empty=False)
+    
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Проверяет альбом, файлы, треки и жанры.
+        
+        Args:
+            attrs: Данные манифеста
+            
+        Returns:
+            Dict[str, Any]: Данные с найденным альбомом в поле album (None - новый альбом)
+            
+        Raises:
+            serializers.ValidationError: Если манифест некорректен
+        """
+        artist: Artist = self.context['artist']
+        files = self.context['files']
+        tracks: List[Dict[str, Any]] = attrs['tracks']
+        
+        album: Optional[Album] = None
+        if 'album_id' in attrs:
+            album = Album.objects.filter(pk=attrs['album_id'], artist=artist).first()
+            if album is None:
+                raise serializers.ValidationError({'album_id': 'Альбом не найден у этого исполнителя'})
+        elif not attrs.get('title') or not attrs.get('release_date'):
+            raise serializers.ValidationError('Для нового альбома необходимо указать title и release_date')
+        
+        if len(tracks) > settings.ALBUM_UPLOAD_MAX_TRACKS:
+            raise serializers.ValidationError({
+                'tracks': f'Не больше {settings.ALBUM_UPLOAD_MAX_TRACKS} треков за одну загрузку'
+            })
+        
+        existing_numbers, existing_titles = set(), set()
+        if album is not None:
+            for number, title in Track.objects.filter(album=album).values_list('track_number', 'title'):
+                existing_numbers.add(number)
+                existing_titles.add(title)
+        
+        errors: Dict[int, List[str]] = {}
+        numbers, titles, file_fields = set(), set(), set()
+        for index, track in enumerate(tracks):
+            problems = []
+            upload = files.get(track['file'])
+            if upload is None:
+                problems.append(f'Файл {track["file"]} не передан')
+            elif upload.size > settings.TRACK_UPLOAD_MAX_SIZE:
+                problems.append(f'Файл {track["file"]} больше {settings.TRACK_UPLOAD_MAX_SIZE} байт')
+            if track['file'] in file_fields:
+                problems.append(f'Файл {track["file"]} указан для нескольких треков')
+            if track['track_number'] in numbers or track['track_number'] in existing_numbers:
+                problems.append(f'Номер трека {track["track_number"]} уже занят')
+            if track['title'] in titles or track['title'] in existing_titles:
+                problems.append(f'Трек "{track["title"]}" уже есть в альбоме')
+            file_fields.add(track['file'])
+            numbers.add(track['track_number'])
+            titles.add(track['title'])
+            if problems:
+                errors[index] = problems
+        if errors:
+            raise serializers.ValidationError({'tracks': errors})
+        
+        genre_ids = set(attrs['genre_ids']).union(*(track['genre_ids'] for track in tracks))
+        missing = genre_ids - set(Genre.objects.filter(pk__in=genre_ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError({'genre_ids': f'Жанры не найдены: {sorted(missing)}'})
+        
+        attrs['album'] = album
+        return attrs
+
+
+def create_uploaded_album(
+    user: User,
+    artist: Artist,
+    data: Dict[str, Any],
+    files: Dict[str, UploadedFile]
+) -> Tuple[Album, List[Track]]:
+    """
+    Сохраняет треки загруженного альбома пакетными запросами в одной транзакции.
+    
+    Аудиофайлы записываются в хранилище до начала транзакции, чтобы запись
+    на диск не удерживала блокировку базы. Треки, связи с жанрами и записи
+    библиотеки создаются bulk_create, ссылки на аудиофайлы добавляются
+    пакетом, итоги альбома пересчитываются одним UPDATE.
+    
+    Args:
+        user: Пользователь, загрузивший альбом
+        artist: Исполнитель
+        data: Проверенные данные AlbumUploadManifestSerializer
+        files: Файлы запроса
+        
+    Returns:
+        Tuple[Album, List[Track]]: Альбом и созданные треки
+    """
+    blob_names: List[str] = []
+    blobs: Dict[str, Tuple[str, int, int]] = {}
+    for track_data in data['tracks']:
+        upload = files[track_data['file']]
+        blob_name, digest, size = media_storage.write_blob(upload.name, upload)
+        _, _, count = blobs.get(blob_name, (digest, size, 0))
+        blobs[blob_name] = (digest, size, count + 1)
+        blob_names.append(blob_name)
+    
+    with transaction.atomic():
+        album: Album = data['album'] or Album.objects.create(
+            title=data['title'],
+            artist=artist,
+            release_date=data['release_date']
+        )
+        
+        tracks = Track.objects.bulk_create([
+            Track(
+                title=track_data['title'],
+                artist=artist,
+                album=album,
+                track_number=track_data['track_number'],
+                release_date=album.release_date,
+                duration=track_data.get('duration'),
+                is_explicit=track_data['is_explicit'],
+                audio_file=blob_name
+            )
+            for track_data, blob_name in zip(data['tracks'], blob_names)
+        ])
+        media_storage.add_references(blobs)
+        
+        # Треки без своих жанров получают жанры альбома
+        track_genres = [
+            (track, track_data['genre_ids'] or data['genre_ids'])
+            for track, track_data in zip(tracks, data['tracks'])
+        ]
+        TrackGenre.objects.bulk_create([
+            TrackGenre(track=track, genre_id=genre_id)
+            for track, genre_ids in track_genres
+            for genre_id in dict.fromkeys(genre_ids)
+        ])
+        AlbumGenre.objects.bulk_create([
+            AlbumGenre(album=album, genre_id=genre_id)
+            for genre_id in dict.fromkeys(genre_id for _, genre_ids in track_genres for genre_id in genre_ids)
+        ], ignore_conflicts=True)
+        
+        now = timezone.now()
+        UserAlbum.objects.get_or_create(
+            user=user,
+            album=album,
+            defaults={
+                'position': UserAlbum.objects.filter(user=user).count() + 1,
+                'added_at': now
+            }
+        )
+        start = UserTrack.objects.filter(user=user).count() + 1
+        UserTrack.objects.bulk_create([
+            UserTrack(user=user, track=track, position=position, added_at=now)
+            for position, track in enumerate(tracks, start=start)
+        ])
+        update_totals(Album.objects.filter(pk=album.pk))
+    return album, tracks
+
+
+class AlbumUploadView(APIView):
+    """
+    API представление для загрузки альбома из нескольких треков одним запросом.
+    
+    Принимает манифест (JSON в поле manifest) и аудиофайлы треков.
+    Все треки проверяются вместе и сохраняются в одной транзакции;
+    обработка аудиофайлов (длительность, волновая форма, HLS, превью)
+    ставится отдельной фоновой задачей на каждый трек и выполняется
+    воркерами параллельно.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def post(self, request: Request, format: Optional[str] = None) -> Response:
+        """
+        Обрабатывает POST запрос для загрузки альбома.
+        
+        Args:
+            request: HTTP запрос с манифестом и аудиофайлами
+            format: Формат ответа (опционально)
+            
+        Returns:
+            Response: JSON ответ с альбомом, треками и ID задач обработки или ошибкой
+        """
+        artist: Optional[Artist] = Artist.objects.filter(user=request.user).first()
+        if not artist:
+            return Response({
+                'error': 'У вас нет профиля исполнителя. Сначала создайте артиста.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            manifest = json.loads(request.data.get('manifest') or '')
+        except ValueError:
+            return Response({
+                'error': 'Манифест альбома должен быть JSON-объектом'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = AlbumUploadManifestSerializer(
+            data=manifest,
+            context={'artist': artist, 'files': request.FILES}
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        album, created = create_uploaded_album(request.user, artist, serializer.validated_data, request.FILES)
+        # Сигналы сохранения при bulk_create не срабатывают, поэтому обработка ставится явно
+        jobs = submit_jobs(
+            'process_track_audio',
+            [{'track_id': track.pk} for track in created],
+            user=request.user,
+            idempotency_keys=[track_audio_job_key(track.pk) for track in created]
+        )
+        
+        tracks = Track.objects.filter(pk__in=[track.pk for track in created]).select_related(
+            'artist', 'album__artist'
+        ).prefetch_related('genres', 'album__genres').order_by('track_number')
+        job_ids = {track.pk: str(job.pk) for track, job in zip(created, jobs)}
+        album = Album.objects.select_related('artist').prefetch_related('genres').get(pk=album.pk)
+        context = {'request': request}
+        return Response({
+            'album': AlbumSerializer(album, context=context).data,
+            'tracks': [
+                {**TrackSerializer(track, context=context).data, 'processing_job': job_ids[track.pk]}
+                for track in tracks
+            ]
+        }, status=status.HTTP_201_CREATED)
+    
+    def options(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Обработка CORS preflight запроса OPTIONS.
+        
+        Args:
+            request: HTTP запрос
+            *args: Дополнительные позиционные аргументы
+            **kwargs: Дополнительные именованные аргументы
+            
+        Returns:
+            Response: HTTP ответ с заголовками CORS
+        """
+        response = Response()
+        response['Allow'] = 'POST, OPTIONS'
+        return response
+
+
+class TusVersionNotSupported(APIException):
+    """
+    Исключение для запросов с неподдерживаемой версией протокола tus.
+    """
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Неподдерживаемая версия протокола tus'
+
+
+class TusUploadMixin:
+    """
+    Общая логика представлений протокола tus.
+    
+    Проверяет заголовок Tus-Resumable и добавляет его во все ответы.
+    """
+    
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        """
+        Проверяет версию протокола перед обработкой запроса.
+        
+        Args:
+            request: HTTP запрос
+            *args: Дополнительные позиционные аргументы
+            **kwargs: Дополнительные именованные аргументы
+            
+        Raises:
+            TusVersionNotSupported: Если клиент использует другую версию протокола
+        """
+        super().initial(request, *args, **kwargs)
+        version = request.headers.get('Tus-Resumable')
+        if request.method != 'OPTIONS' and version and version != TUS_VERSION:
+            raise TusVersionNotSupported()
+    
+    def finalize_response(self, request: Request, response: Response, *args: Any, **kwargs: Any) -> Response:
+        """
+        Добавляет заголовки протокола tus в ответ.
+        
+        Args:
+            request: HTTP запрос
+            response: HTTP ответ
+            *args: Дополнительные позиционные аргументы
+            **kwargs: Дополнительные именованные аргументы
+            
+        Returns:
+            Response: Ответ с заголовками протокола
+        """
+        response = super().finalize_response(request, response, *args, **kwargs)
+        response['Tus-Resumable'] = TUS_VERSION
+        if response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+            response['Tus-Version'] = TUS_VERSION
+        return response
+    
+    def options(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Сообщает возможности сервера загрузки.
+        
+        Args:
+            request: HTTP запрос
+            *args: Дополнительные позиционные аргументы
+            **kwargs: Дополнительные именованные аргументы
+            
+        Returns:
+            Response: HTTP ответ с заголовками протокола tus
+        """
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response['Allow'] = ', '.join(self.allowed_methods)
+        response['Tus-Version'] = TUS_VERSION
+        response['Tus-Extension'] = TUS_EXTENSIONS
+        response['Tus-Max-Size'] = str(settings.TRACK_UPLOAD_MAX_SIZE)
+        return response
+
+
+def _validate_upload_metadata(artist: Optional[Artist], metadata: Dict[str, str]) -> Optional[str]:
+    """
+    Проверяет метаданные трека до приема аудиофайла.
+    
+    Args:
+        artist: Профиль исполнителя пользователя
+        metadata: Метаданные из заголовка Upload-Metadata
+        
+    Returns:
+        Optional[str]: Текст ошибки или None, если данные корректны
+    """
+    if not artist:
+        return 'У вас нет профиля исполнителя. Сначала создайте артиста.'
+    if not all([metadata.get('title'), metadata.get('duration')]):
+        return 'Не все обязательные поля заполнены'
+    album_id = metadata.get('album_id')
+    if album_id:
+        if not Album.objects.filter(id=album_id).exists():
+            return 'Альбом не найден'
+        if not metadata.get('track_number'):
+            return 'При выборе альбома необходимо указать номер трека'
+    return None
+
+
+class ResumableTrackUploadView(TusUploadMixin, APIView):
+    """
+    API представление для создания возобновляемой загрузки трека.
+    
+    Принимает заголовки Upload-Length и Upload-Metadata (title, duration,
+    album_id, track_number, genre_ids, filename, sha256) и возвращает
+    в заголовке Location адрес, на который отправляются части файла.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request: Request, format: Optional[str] = None) -> Response:
+        """
+        Создает сессию загрузки без приема тела файла.
+        
+        Args:
+            request: HTTP запрос с заголовками протокола tus
+            format: Формат ответа (опционально)
+            
+        Returns:
+            Response: Пустой ответ 201 с заголовком Location или ошибка
+        """
+        try:
+            upload_length = int(request.headers.get('Upload-Length', ''))
+            metadata = parse_upload_metadata(request.headers.get('Upload-Metadata'))
+        except ValueError:
+            return Response({
+                'error': 'Некорректные заголовки Upload-Length или Upload-Metadata'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if upload_length <= 0 or upload_length > settings.TRACK_UPLOAD_MAX_SIZE:
+            return Response({
+                'error': 'Недопустимый размер файла'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        artist: Optional[Artist] = Artist.objects.filter(user=request.user).first()
+        error = _validate_upload_metadata(artist, metadata)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        filename = os.path.basename(metadata.get('filename') or '') or f"{metadata['title']}.mp3"
+        upload = TrackUpload.objects.create(
+            user=request.user,
+            filename=filename,
+            upload_length=upload_length,
+            metadata=metadata
+        )
+        
+        response = Response(status=status.HTTP_201_CREATED)
+        response['Location'] = request.build_absolute_uri(
+            reverse('upload-track-resumable-detail', args=[upload.id])
+        )
+        response['Upload-Offset'] = '0'
+        return response
+
+
+class ResumableTrackUploadDetailView(TusUploadMixin, APIView):
+    """
+    API представление для передачи частей аудиофайла.
+    
+    HEAD возвращает текущее смещение, PATCH дописывает часть файла,
+    DELETE отменяет загрузку. После получения последнего байта
+    проверяется размер и SHA-256, файл переносится в хранилище
+    и только затем создается трек.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_upload(self, request: Request, upload_id: str) -> TrackUpload:
+        """
+        Получает сессию загрузки текущего пользователя.
+        
+        Args:
+            request: HTTP запрос
+            upload_id: ID сессии загрузки
+            
+        Returns:
+            TrackUpload: Сессия загрузки
+            
+        Raises:
+            Http404: Если сессия не найдена
+        """
+        return get_object_or_404(TrackUpload, id=upload_id, user=request.user)
+    
+    def head(self, request: Request, upload_id: str, format: Optional[str] = None) -> Response:
+        """
+        Возвращает смещение, с которого нужно продолжить загрузку.
+        
+        Args:
+            request: HTTP запрос
+            upload_id: ID сессии загрузки
+            format: Формат ответа (опционально)
+            
+        Returns:
+            Response: Пустой ответ с заголовками Upload-Offset и Upload-Length
+        """
+        upload = self.get_upload(request, upload_id)
+        response = Response(status=status.HTTP_200_OK)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.upload_length)
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    def patch(self, request: Request, upload_id: str, format: Optional[str] = None) -> Response:
+        """
+        Принимает очередную часть аудиофайла.
+        
+        Args:
+            request: HTTP запрос с телом application/offset+octet-stream
+            upload_id: ID сессии загрузки
+            format: Формат ответа (опционально)
+            
+        Returns:
+            Response: Ответ 204 с новым смещением, данные трека после
+            завершения загрузки или ошибка
+        """
+        upload = self.get_upload(request, upload_id)
+        
+        if request.content_type.split(';')[0].strip() != 'application/offset+octet-stream':
+            return Response({
+                'error': 'Ожидается Content-Type application/offset+octet-stream'
+            }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({
+                'error': 'Некорректный заголовок Upload-Offset'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Параллельный PATCH той же загрузки ждет блокировку и видит новое смещение
+        with upload_lock(upload):
+            try:
+                upload.refresh_from_db(fields=['offset', 'track'])
+            except TrackUpload.DoesNotExist:
+                raise Http404('Загрузка не найдена')
+            return self.append_chunk(request, upload, offset, content_length)
+    
+    def append_chunk(self, request: Request, upload: TrackUpload, offset: int, content_length: int) -> Response:
+        """
+        Дописывает часть файла под блокировкой загрузки.
+        
+        Args:
+            request: HTTP запрос
+            upload: Сессия загрузки с актуальным смещением
+            offset: Смещение из заголовка Upload-Offset
+            content_length: Размер тела запроса
+            
+        Returns:
+            Response: Ответ 204 с новым смещением, данные трека после
+            завершения загрузки или ошибка
+        """
+        if upload.track_id or offset != upload.offset:
+            response = Response({
+                'error': 'Смещение не совпадает с состоянием загрузки'
+            }, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = str(upload.offset)
+            return response
+        
+        try:
+            new_offset, digest = append_upload_chunk(upload, request.stream, content_length)
+        except UploadSizeExceeded:
+            return Response({
+                'error': 'Размер данных превышает объявленный размер файла'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except UploadStateLost:
+            TrackUpload.objects.filter(pk=upload.pk).update(offset=0, updated_at=timezone.now())
+            discard_partial_upload(upload)
+            response = Response({
+                'error': 'Принятая часть файла утеряна, начните загрузку заново'
+            }, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = '0'
+            return response
+        
+        TrackUpload.objects.filter(pk=upload.pk).update(offset=new_offset, updated_at=timezone.now())
+        upload.offset = new_offset
+        
+        if digest is None:
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+            response['Upload-Offset'] = str(upload.offset)
+            return response
+        
+        return self.finalize_upload(request, upload, digest)
+    
+    def delete(self, request: Request, upload_id: str, format: Optional[str] = None) -> Response:
+        """
+        Отменяет незавершенную загрузку и удаляет принятые данные.
+        
+        Args:
+            request: HTTP запрос
+            upload_id: ID сессии загрузки
+            format: Формат ответа (опционально)
+            
+        Returns:
+            Response: Пустой ответ 204
+        """
+        upload = self.get_upload(request, upload_id)
+        discard_partial_upload(upload)
+        if not upload.track_id:
+            upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    def finalize_upload(self, request: Request, upload: TrackUpload, digest: str) -> Response:
+        """
+        Переносит полностью принятый файл в хранилище и создает трек.
+        
+        Args:
+            request: HTTP запрос
+            upload: Завершенная сессия загрузки
+            digest: SHA-256 принятого файла
+            
+        Returns:
+            Response: Данные созданного трека или ошибка
+        """
+        metadata = upload.metadata
+        expected_digest = metadata.get('sha256', '').lower()
+        if expected_digest and expected_digest != digest:
+            TrackUpload.objects.filter(pk=upload.pk).update(offset=0, updated_at=timezone.now())
+            discard_partial_upload(upload)
+            # 460 - код протокола tus для несовпадения контрольной суммы
+            return Response({
+                'error': 'Контрольная сумма файла не совпадает'
+            }, status=460)
+        
+        user: User = request.user
+        artist: Optional[Artist] = Artist.objects.filter(user=user).first()
+        error = _validate_upload_metadata(artist, metadata)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        album: Optional[Album] = Album.objects.filter(id=metadata['album_id']).first() if metadata.get('album_id') else None
+        genre_ids: List[str] = [genre_id for genre_id in metadata.get('genre_ids', '').split(',') if genre_id]
+        field = Track._meta.get_field('audio_file')
+        audio_file = PartialUploadFile(partial_upload_path(upload))
+        stored_name: Optional[str] = None
+        
+        try:
+            stored_name = field.storage.save(
+                field.generate_filename(None, upload.filename),
+                audio_file,
+                max_length=field.max_length
+            )
+            with transaction.atomic():
+                track: Track = Track.objects.create(
+                    title=metadata['title'],
+                    artist=artist,
+                    album=album,
+                    track_number=metadata.get('track_number') if album else None,
+                    release_date=album.release_date if album else None,
+                    duration=metadata['duration'],
+                    audio_file=stored_name
+                )
+                attach_uploaded_track(user, track, genre_ids)
+                upload.sha256 = digest
+                upload.track = track
+                upload.save(update_fields=['sha256', 'track', 'updated_at'])
+        except Exception as e:
+            if stored_name:
+                field.storage.delete(stored_name)
+            TrackUpload.objects.filter(pk=upload.pk).update(offset=0, updated_at=timezone.now())
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            audio_file.close()
+            discard_partial_upload(upload)
+        
+        serializer = TrackSerializer(track, context={'request': request})
+        response = Response(uploaded_track_data(serializer.data, track, user), status=status.HTTP_201_CREATED)
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+
 class AlbumImageUploadView(APIView):
     """
     API представление для загрузки изображения обложки альбома.
@@ -370,20 +1050,10 @@ class AlbumImageUploadView(APIView):
                     'error': 'У вас нет прав для редактирования этого альбома'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            album_images_dir: str = os.path.join(settings.MEDIA_ROOT, 'album_images')
-            if not os.path.exists(album_images_dir):
-                os.makedirs(album_images_dir)
-            
-            filename: str = f"album_{album.id}_{image.name}"
-            filepath: str = os.path.join(album_images_dir, filename)
-            
-            with open(filepath, 'wb+') as destination:
-                for chunk in image.chunks():
-                    destination.write(chunk)
+            album.cover_image = image
+            album.save(update_fields=['cover_image'])
             
-            cover_image_url: str = f"{settings.MEDIA_URL}album_images/{filename}"
-            album.img_url = cover_image_url
-            album.save()
+            cover_image_url: str = request.build_absolute_uri(album.cover_image.url)
             
             return Response({
                 'img_url': cover_image_url,
@@ -28,8 +28,13 @@ from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.static import serve
-from .upload_views import ProfileImageUploadView, ArtistImageUploadView, TrackUploadView, AlbumImageUploadView
+from .upload_views import (
+    ProfileImageUploadView, ArtistImageUploadView, TrackUploadView, AlbumImageUploadView,
+    ResumableTrackUploadView, ResumableTrackUploadDetailView, AlbumUploadView
+)
 from kaudio import views as kaudio_views
+from kaudio.admin import profile_urls
+from kaudio.metrics import metrics_view
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -59,9 +64,15 @@ def trigger_error(request):
     division_by_zero = 1 / 0
 
 urlpatterns = [
+    # Профили запросов (kaudio.profiling) в административной панели
+    path('admin/profiles/', include(profile_urls)),
+    
     # Административная панель Django
     path('admin/', admin.site.urls),
     
+    # Метрики Prometheus
+    path('metrics', metrics_view, name='metrics'),
+    
     # Sentry
     path('sentry-debug/', trigger_error),
     
@@ -73,6 +84,9 @@ urlpatterns = [
     path('api/upload/artist-image/', ArtistImageUploadView.as_view(), name='upload-artist-image'),
     path('api/upload/album-image/', AlbumImageUploadView.as_view(), name='upload-album-image'),
     path('api/upload/track/', TrackUploadView.as_view(), name='upload-track'),    
+    path('api/upload/track/resumable/', ResumableTrackUploadView.as_view(), name='upload-track-resumable'),
+    path('api/upload/track/resumable/<uuid:upload_id>/', ResumableTrackUploadDetailView.as_view(), name='upload-track-resumable-detail'),
+    path('api/upload/album/', AlbumUploadView.as_view(), name='upload-album'),
     
     # Swagger документация API
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', 